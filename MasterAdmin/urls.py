@@ -21,6 +21,7 @@ from .views import (
     MasterAdminProvidersView,
     MasterAdminProviderRatesView,
     MasterAdminFreightRateFCLView,
+    MasterAdminFreightRateImportView,
     MasterAdminProfitMarginView,
     MasterAdminLocalCostView,
     MasterAdminTrackingView,
@@ -32,6 +33,7 @@ from .views import (
     HSCodeExportView,
     TrackingTemplatesView,
     RUCApprovalHistoryView,
+    MasterAdminAIUsageView,
 )
 
 urlpatterns = [
@@ -52,6 +54,7 @@ urlpatterns = [
     path('providers/', MasterAdminProvidersView.as_view(), name='master-admin-providers'),
     path('provider-rates/', MasterAdminProviderRatesView.as_view(), name='master-admin-provider-rates'),
     path('freight-rates/', MasterAdminFreightRateFCLView.as_view(), name='master-admin-freight-rates'),
+    path('freight-rates/import/', MasterAdminFreightRateImportView.as_view(), name='master-admin-freight-rates-import'),
     path('profit-margins/', MasterAdminProfitMarginView.as_view(), name='master-admin-profit-margins'),
     path('local-costs/', MasterAdminLocalCostView.as_view(), name='master-admin-local-costs'),
     path('tracking/', MasterAdminTrackingView.as_view(), name='master-admin-tracking'),
@@ -71,4 +74,7 @@ urlpatterns = [
     
     # RUC Approval History
     path('ruc-history/', RUCApprovalHistoryView.as_view(), name='ruc-history'),
+    
+    # AI usage and quotas
+    path('ai-usage/', MasterAdminAIUsageView.as_view(), name='master-admin-ai-usage'),
 ]
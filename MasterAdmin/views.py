@@ -2202,6 +2202,56 @@ class MasterAdminFreightRateFCLView(APIView):
             return Response({'error': 'Tarifa no encontrada'}, status=404)
 
 
+class MasterAdminFreightRateImportView(APIView):
+    """
+    POST: Upload a freight rate file (CSV ';' or Excel) through the unified import engine.
+    Form fields:
+      - file: rate sheet
+      - format: 'fcl', 'lcl', 'air' or 'air_simple'
+      - mode: 'upsert' (default) or 'replace'
+      - dry_run: 'true' to return the diff report without writing
+    """
+    authentication_classes = [MasterAdminAuthentication]
+    permission_classes = [IsMasterAdmin]
+    
+    def post(self, request):
+        from SalesModule.rate_import import importar_tarifas, RateImportError, FORMATS
+        
+        if 'file' not in request.FILES:
+            return Response({'error': 'No se proporcionó archivo'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        file = request.FILES['file']
+        file_format = request.data.get('format', '')
+        if file_format not in FORMATS:
+            return Response({
+                'error': f"Formato no soportado. Use: {', '.join(sorted(FORMATS))}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        mode = request.data.get('mode', 'upsert')
+        dry_run = str(request.data.get('dry_run', 'false')).lower() in ['true', '1', 'si', 'yes']
+        
+        try:
+            resultado = importar_tarifas(file, file_format, mode=mode, dry_run=dry_run, nombre_archivo=file.name)
+        except RateImportError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Error importando tarifas {file.name}: {e}")
+            return Response({
+                'error': f'Error procesando archivo: {str(e)}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        if dry_run:
+            message = f'Simulación: {resultado.created} nuevas, {resultado.updated} actualizadas'
+        else:
+            message = f'Importación completada: {resultado.created} creadas, {resultado.updated} actualizadas'
+        
+        return Response({
+            'success': True,
+            'message': message,
+            **resultado.to_dict()
+        })
+
+
 class MasterAdminProfitMarginView(APIView):
     """
     Full CRUD access to profit margin configuration.
@@ -3731,3 +3781,77 @@ class RUCApprovalHistoryView(APIView):
             'total_pages': (total + page_size - 1) // page_size,
             'history': history_data
         })
+
+
+class MasterAdminAIUsageView(APIView):
+    """
+    AI usage per user (requests served and rejected by quota) and AI scheduler state.
+    Query params: days (default 7), user_id, operation.
+    """
+    authentication_classes = [MasterAdminAuthentication]
+    permission_classes = [IsMasterAdmin]
+    
+    def get(self, request):
+        from SalesModule.models import AIUsageCounter
+        from SalesModule.ai_scheduler import obtener_programador
+        
+        try:
+            days = max(1, int(request.query_params.get('days', 7)))
+        except ValueError:
+            days = 7
+        user_id = request.query_params.get('user_id', '').strip()
+        operation = request.query_params.get('operation', '').strip()
+        
+        date_from = timezone.localdate() - timedelta(days=days - 1)
+        counters = AIUsageCounter.objects.filter(day__gte=date_from).select_related('user')
+        if user_id:
+            try:
+                counters = counters.filter(user_id=int(user_id))
+            except ValueError:
+                pass
+        if operation:
+            counters = counters.filter(operation=operation)
+        
+        users = {}
+        for counter in counters.order_by('user_key', 'day'):
+            entry = users.setdefault(counter.user_key, {
+                'user_key': counter.user_key,
+                'user_id': counter.user_id,
+                'email': counter.user.email if counter.user else None,
+                'role': counter.user.role if counter.user else None,
+                'tier': counter.tier,
+                'requests': 0,
+                'rejected': 0,
+                'units': 0,
+                'by_operation': {},
+                'last_used_at': None,
+            })
+            entry['tier'] = counter.tier or entry['tier']
+            entry['requests'] += counter.requests
+            entry['rejected'] += counter.rejected
+            entry['units'] += counter.units
+            op = entry['by_operation'].setdefault(counter.operation, {'requests': 0, 'rejected': 0})
+            op['requests'] += counter.requests
+            op['rejected'] += counter.rejected
+            if counter.last_used_at and (entry['last_used_at'] is None or counter.last_used_at > entry['last_used_at']):
+                entry['last_used_at'] = counter.last_used_at
+        
+        users_list = sorted(users.values(), key=lambda u: (u['requests'] + u['rejected']), reverse=True)
+        for entry in users_list:
+            entry['last_used_at'] = entry['last_used_at'].isoformat() if entry['last_used_at'] else None
+        
+        return Response({
+            'period': {
+                'date_from': date_from.isoformat(),
+                'date_to': timezone.localdate().isoformat(),
+                'days': days,
+            },
+            'totals': {
+                'users': len(users_list),
+                'requests': sum(u['requests'] for u in users_list),
+                'rejected': sum(u['rejected'] for u in users_list),
+            },
+            'users': users_list,
+            'scheduler': obtener_programador().stats(),
+            'timestamp': timezone.now().isoformat()
+        })
@@ -1,32 +1,45 @@
 """
 Servicio de validación de direcciones con Gemini AI
 Valida direcciones de entrega terrestre y obtiene coordenadas de Google Maps
+
+validate_address resuelve primero con el nomenclátor local (gazetteer.py) y
+con las direcciones ya validadas (ValidatedAddress); Gemini solo se consulta
+para direcciones desconocidas y su resultado queda guardado.
 """
+import hashlib
 import json
-import os
+import logging
 from datetime import datetime
 from decimal import Decimal
 from django.core.mail import send_mail
 from django.conf import settings
 from django.utils import timezone
 
+from . import gemini_gateway
+
 try:
     from google import genai
     GEMINI_AVAILABLE = True
 except ImportError:
     GEMINI_AVAILABLE = False
 
+logger = logging.getLogger(__name__)
+
+# Límites aproximados de Ecuador continental e insular
+LATITUD_ECUADOR = (Decimal('-5.1'), Decimal('1.7'))
+LONGITUD_ECUADOR = (Decimal('-92.1'), Decimal('-75.1'))
+
 
 def get_gemini_client():
-    """Obtiene el cliente de Gemini AI"""
+    """Obtiene el cliente de Gemini AI del gateway (None si no hay o el circuito está abierto)"""
     if not GEMINI_AVAILABLE:
         return None
     
-    api_key = os.environ.get('GEMINI_API_KEY')
-    if not api_key:
+    client = gemini_gateway.get_client()
+    if client is None or not gemini_gateway.disponible(client):
         return None
     
-    return genai.Client(api_key=api_key)
+    return client
 
 
 def validate_address_with_gemini(address: str, city: str, country: str = "Ecuador") -> dict:
@@ -99,7 +112,8 @@ NOTAS IMPORTANTES:
 Responde SOLO con el JSON, sin texto adicional."""
 
     try:
-        response = client.models.generate_content(
+        response = gemini_gateway.generate_content(
+            client,
             model="gemini-2.0-flash",
             contents=prompt
         )
@@ -166,6 +180,129 @@ Responde SOLO con el JSON, sin texto adicional."""
         }
 
 
+def _clave_direccion(address: str, city: str) -> str:
+    from .gazetteer import normalizar_direccion
+    clave = f"{normalizar_direccion(address)}|{normalizar_direccion(city)}"
+    return hashlib.sha256(clave.encode('utf-8')).hexdigest()
+
+
+def _en_ecuador(latitude, longitude) -> bool:
+    return (
+        LATITUD_ECUADOR[0] <= latitude <= LATITUD_ECUADOR[1]
+        and LONGITUD_ECUADOR[0] <= longitude <= LONGITUD_ECUADOR[1]
+    )
+
+
+def _resultado_local(address: str, ubicacion, zona: str) -> dict:
+    """Resultado con la forma de validate_address_with_gemini a partir del nomenclátor"""
+    lugar, ciudad = ubicacion.lugar, ubicacion.ciudad
+    es_ciudad = lugar is ciudad
+    if es_ciudad:
+        mensaje = f'Ubicación aproximada al centro de {ciudad.nombre}'
+    else:
+        mensaje = f'Ubicación aproximada a {lugar.nombre}, {ciudad.nombre}'
+    return {
+        'success': True,
+        'source': 'gazetteer',
+        'validated_address': f"{address.strip()}, {ciudad.nombre}, {ciudad.provincia}, Ecuador",
+        'street': '',
+        'number': '',
+        'neighborhood': '' if es_ciudad else lugar.nombre,
+        'city': ciudad.nombre,
+        'province': ciudad.provincia,
+        'postal_code': '',
+        'latitude': lugar.latitud,
+        'longitude': lugar.longitud,
+        'google_maps_link': lugar.google_maps_link(),
+        'confidence': lugar.confianza,
+        'notes': '',
+        'is_valid': True,
+        'validation_message': mensaje,
+        'tariff_zone': zona,
+        'raw_response': '',
+    }
+
+
+def _buscar_validada(clave: str) -> dict:
+    from django.db.models import F
+    from .models import ValidatedAddress
+
+    try:
+        registro = ValidatedAddress.objects.filter(address_key=clave).only('id', 'result').first()
+        if registro is None:
+            return None
+        ValidatedAddress.objects.filter(pk=registro.pk).update(hits=F('hits') + 1, last_used_at=timezone.now())
+    except Exception as e:
+        logger.warning(f"No se pudo consultar el caché de direcciones: {e}")
+        return None
+
+    resultado = dict(registro.result)
+    for campo in ('latitude', 'longitude'):
+        if resultado.get(campo) is not None:
+            resultado[campo] = Decimal(str(resultado[campo]))
+    return resultado
+
+
+def _guardar_validada(clave: str, address: str, city: str, resultado: dict) -> None:
+    from .models import ValidatedAddress
+
+    try:
+        ValidatedAddress.objects.update_or_create(
+            address_key=clave,
+            defaults={'address': address, 'city': city[:100], 'source': 'ai', 'result': resultado},
+        )
+    except Exception as e:
+        logger.warning(f"No se pudo guardar la dirección validada: {e}")
+
+
+def validate_address(address: str, city: str, country: str = "Ecuador") -> dict:
+    """
+    Valida una dirección de entrega con el menor costo posible:
+    1. Nomenclátor local: si la dirección menciona un sector, parroquia o zona
+       industrial conocido de la ciudad, se devuelven sus coordenadas
+    2. Direcciones ya validadas (misma dirección y ciudad normalizadas)
+    3. Gemini AI; el resultado se guarda para las siguientes solicitudes
+    4. Si Gemini no está disponible o responde fuera de Ecuador, el centro
+       de la ciudad según el nomenclátor
+
+    Returns:
+        dict con la forma de validate_address_with_gemini más source
+        (gazetteer, cache o ai) y tariff_zone
+    """
+    from .gazetteer import obtener_gazetteer, PRECISION, TIPO_CIUDAD
+
+    gazetteer = obtener_gazetteer()
+    ubicacion = gazetteer.ubicar(address, city)
+    ciudad = ubicacion.ciudad.nombre if ubicacion else (city or '')
+    zona = gazetteer.zona_tarifaria(ciudad) or ''
+
+    if ubicacion and ubicacion.precision > PRECISION[TIPO_CIUDAD]:
+        return _resultado_local(address, ubicacion, zona)
+
+    clave = _clave_direccion(address, ciudad)
+    guardada = _buscar_validada(clave)
+    if guardada is not None:
+        guardada['source'] = 'cache'
+        return guardada
+
+    resultado = validate_address_with_gemini(address, ciudad, country)
+    latitud, longitud = resultado.get('latitude'), resultado.get('longitude')
+    if resultado.get('success') and latitud is not None and longitud is not None and _en_ecuador(latitud, longitud):
+        resultado['source'] = 'ai'
+        resultado['tariff_zone'] = zona
+        _guardar_validada(clave, address, ciudad, resultado)
+        return resultado
+
+    if ubicacion:
+        if resultado.get('success'):
+            logger.warning(f"Coordenadas de IA fuera de Ecuador para '{address}' ({latitud}, {longitud})")
+        local = _resultado_local(address, ubicacion, zona)
+        local['raw_response'] = resultado.get('raw_response', '')
+        return local
+
+    return resultado
+
+
 def send_forwarder_notification_email(quote_submission, validated_address_data: dict) -> dict:
     """
     Envía correo electrónico al freight forwarder notificando la dirección de entrega.
@@ -266,7 +403,8 @@ def process_inland_transport_address(quote_submission) -> dict:
     """
     Proceso completo de validación de dirección y notificación al forwarder.
     
-    1. Valida la dirección con Gemini AI
+    1. Valida la dirección (nomenclátor local, direcciones ya validadas y
+       Gemini AI solo para direcciones desconocidas)
     2. Verifica que se obtuvieron coordenadas válidas
     3. Guarda los datos en la base de datos
     4. Envía correo al freight forwarder solo si la validación fue exitosa
@@ -289,7 +427,7 @@ def process_inland_transport_address(quote_submission) -> dict:
             'error': 'No se ha proporcionado dirección de entrega'
         }
     
-    validation_result = validate_address_with_gemini(
+    validation_result = validate_address(
         address=quote_submission.inland_transport_address,
         city=quote_submission.inland_transport_city or quote_submission.city,
         country='Ecuador'
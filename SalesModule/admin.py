@@ -7,7 +7,7 @@ from .models import (
     ShippingInstruction, ShippingInstructionDocument, ShipmentMilestone,
     FreightForwarderConfig, FFQuoteCost, InlandFCLTariff, InlandSecurityTariff,
     LogisticsProvider, ProviderRate, Airport, AirportRegion, Container, 
-    ManualQuoteRequest, TrackingTemplate
+    ManualQuoteRequest, TrackingTemplate, RateSnapshot
 )
 
 # --- CRM ---
@@ -118,4 +118,10 @@ admin.site.register(InlandFCLTariff)
 admin.site.register(InlandSecurityTariff)
 admin.site.register(ProviderRate)
 admin.site.register(AirportRegion)
-admin.site.register(TrackingTemplate)
\ No newline at end of file
+admin.site.register(TrackingTemplate)
+
+@admin.register(RateSnapshot)
+class RateSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('id', 'scope', 'status', 'row_count', 'label', 'created_at', 'activated_at')
+    list_filter = ('scope', 'status')
+    exclude = ('rows',)
@@ -0,0 +1,414 @@
+"""
+AI Work Scheduler for ImportaYa.ia
+Cuotas por usuario y por rol, y cupos con prioridad para el trabajo de IA.
+
+Nada limitaba cuántas veces un usuario disparaba endpoints con Gemini
+(clasificación HS, chat, extracción de documentos, validación de
+direcciones); un solo usuario intensivo podía ocupar todos los workers.
+Cada solicitud de IA pide un turno al programador:
+
+1. Clase del usuario (CLASES, sobrescribible con AI_SCHEDULER_CLASSES):
+   master admin, staff, cliente con cotizaciones aprobadas (paying),
+   freight forwarder, lead y anónimo. La clase fija cuotas y acceso a cupos.
+2. Token bucket por usuario y otro por clase (capacidad y recarga por
+   minuto) en el caché compartido (CACHES en settings: tabla de la base o
+   Redis). La lectura y escritura de cada bucket se hace bajo un candado
+   del mismo caché (cache.add es atómico), así dos workers de gunicorn no
+   gastan las mismas fichas. Sin fichas -> CuotaIAExcedida con el tiempo
+   de recarga; candado ocupado más de unos milisegundos -> CuotaIAExcedida
+   'saturated' (nunca se descuenta sin candado).
+3. Cupos de ejecución compartidos por todos los workers (AI_SCHEDULER_SLOTS,
+   por defecto el tope de concurrencia del gateway): cada cupo es una clave
+   del caché tomada con cache.add y liberada al terminar; vence sola tras
+   AI_SCHEDULER_SLOT_TTL_S si el worker muere. Las clases bajas solo pueden
+   tomar una fracción de los cupos, así siempre queda lugar para clientes y
+   master admin. No hay espera dentro de la solicitud: sin cupo ->
+   CuotaIAExcedida inmediata con una sugerencia de reintento basada en la
+   latencia reciente de Gemini.
+4. Contadores diarios por usuario y operación (AIUsageCounter) que
+   MasterAdmin consulta en /ai-usage/.
+
+Las vistas convierten CuotaIAExcedida en 429 con Retry-After.
+"""
+import logging
+import math
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CLASE_MASTER_ADMIN = 'master_admin'
+CLASE_STAFF = 'staff'
+CLASE_CLIENTE = 'paying'
+CLASE_FORWARDER = 'freight_forwarder'
+CLASE_LEAD = 'lead'
+CLASE_ANONIMO = 'anonymous'
+
+# Estados de LeadCotizacion que convierten al lead en cliente
+ESTADOS_CLIENTE = ['aprobada', 'ro_generado', 'en_transito', 'entregado']
+CLIENTE_CACHE_TTL_S = 600
+
+BUCKET_KEY = 'ai_scheduler:bucket:{}'
+BUCKET_LOCK_KEY = 'ai_scheduler:bucket-lock:{}'
+SLOT_KEY = 'ai_scheduler:slot:{}'
+CLIENTE_KEY = 'ai_scheduler:paying:{}'
+
+# Candado de un bucket: lo que dura leer y escribir una entrada del caché
+BUCKET_LOCK_TTL_S = 5
+BUCKET_LOCK_INTENTOS = 20
+BUCKET_LOCK_PAUSA_S = 0.005
+
+# Valores por defecto; se pueden sobrescribir en settings
+AI_SCHEDULER_RETRY_S = 5
+# Más que el timeout de gunicorn (120 s): un cupo de un worker caído se libera solo
+AI_SCHEDULER_SLOT_TTL_S = 180
+
+
+@dataclass(frozen=True)
+class ClaseIA:
+    """Cuotas y acceso a cupos de una clase de usuario."""
+    capacidad: int
+    por_minuto: float
+    fraccion_cupos: float
+    capacidad_clase: Optional[int] = None
+    por_minuto_clase: Optional[float] = None
+
+
+CLASES: Dict[str, ClaseIA] = {
+    CLASE_MASTER_ADMIN: ClaseIA(capacidad=120, por_minuto=60, fraccion_cupos=1.0),
+    CLASE_STAFF: ClaseIA(capacidad=60, por_minuto=30, fraccion_cupos=1.0),
+    CLASE_CLIENTE: ClaseIA(capacidad=40, por_minuto=20, fraccion_cupos=1.0),
+    CLASE_FORWARDER: ClaseIA(capacidad=20, por_minuto=10, fraccion_cupos=0.75,
+                             capacidad_clase=200, por_minuto_clase=100),
+    CLASE_LEAD: ClaseIA(capacidad=10, por_minuto=5, fraccion_cupos=0.5,
+                        capacidad_clase=200, por_minuto_clase=100),
+    CLASE_ANONIMO: ClaseIA(capacidad=3, por_minuto=1, fraccion_cupos=0.25,
+                           capacidad_clase=30, por_minuto_clase=10),
+}
+
+
+class CuotaIAExcedida(Exception):
+    """Sin fichas o sin cupo para trabajo de IA; reintentar tras espera_s segundos"""
+
+    def __init__(self, mensaje: str, espera_s: int, motivo: str):
+        super().__init__(mensaje)
+        self.espera_s = espera_s
+        self.motivo = motivo
+
+
+def _config(nombre: str, defecto):
+    from django.conf import settings
+    return getattr(settings, nombre, defecto)
+
+
+def obtener_clase(nombre: str) -> ClaseIA:
+    clases = dict(CLASES)
+    for clave, valores in (_config('AI_SCHEDULER_CLASSES', None) or {}).items():
+        base = clases.get(clave, CLASES[CLASE_LEAD])
+        clases[clave] = ClaseIA(**{**base.__dict__, **valores})
+    return clases.get(nombre, clases[CLASE_LEAD])
+
+
+def _es_cliente(user) -> bool:
+    from django.core.cache import cache
+
+    clave = CLIENTE_KEY.format(user.pk)
+    cliente = cache.get(clave)
+    if cliente is None:
+        try:
+            from .models import LeadCotizacion
+            cliente = LeadCotizacion.objects.filter(lead_user_id=user.pk, estado__in=ESTADOS_CLIENTE).exists()
+        except Exception as e:
+            logger.warning(f"No se pudo determinar si el usuario {user.pk} es cliente: {e}")
+            return False
+        cache.set(clave, cliente, timeout=CLIENTE_CACHE_TTL_S)
+    return cliente
+
+
+def clase_usuario(user) -> str:
+    if user is None or not getattr(user, 'is_authenticated', False):
+        return CLASE_ANONIMO
+    if getattr(user, 'is_master_admin', False):
+        return CLASE_MASTER_ADMIN
+    if getattr(user, 'is_staff', False) or getattr(user, 'role', '') == 'staff':
+        return CLASE_STAFF
+    if getattr(user, 'role', '') == 'freight_forwarder':
+        return CLASE_FORWARDER
+    return CLASE_CLIENTE if _es_cliente(user) else CLASE_LEAD
+
+
+def clave_usuario(user) -> str:
+    if getattr(user, 'is_master_admin', False):
+        return CLASE_MASTER_ADMIN
+    pk = getattr(user, 'pk', None)
+    return f"user:{pk}" if pk is not None else CLASE_ANONIMO
+
+
+# --- Token buckets (caché compartido) ---
+
+class _CandadoBucket:
+    """
+    Exclusión mutua entre workers sobre un bucket con cache.add. Si no se
+    obtiene en unos milisegundos se rechaza la solicitud (CuotaIAExcedida
+    'saturated'): seguir sin candado dejaría que solicitudes concurrentes
+    gasten las mismas fichas, y esperar más retendría al worker.
+    """
+
+    def __init__(self, clave: str):
+        self.clave = BUCKET_LOCK_KEY.format(clave)
+        self.token = uuid.uuid4().hex
+        self.obtenido = False
+
+    def __enter__(self) -> '_CandadoBucket':
+        from django.core.cache import cache
+
+        for _ in range(BUCKET_LOCK_INTENTOS):
+            if cache.add(self.clave, self.token, timeout=BUCKET_LOCK_TTL_S):
+                self.obtenido = True
+                return self
+            time.sleep(BUCKET_LOCK_PAUSA_S)
+        logger.warning(f"Bucket de IA {self.clave} ocupado por otra solicitud")
+        raise CuotaIAExcedida(
+            'El servicio de IA está ocupado. Intente nuevamente en unos segundos.',
+            espera_s=1, motivo='saturated',
+        )
+
+    def __exit__(self, *exc) -> None:
+        from django.core.cache import cache
+
+        if self.obtenido and cache.get(self.clave) == self.token:
+            cache.delete(self.clave)
+
+
+def consumir_fichas(clave: str, capacidad: int, por_minuto: float, costo: float = 1,
+                    ahora: Optional[float] = None) -> Tuple[bool, float]:
+    """
+    Descuenta `costo` fichas del bucket si alcanzan.
+
+    Returns:
+        (permitido, segundos hasta tener fichas suficientes)
+
+    Raises:
+        CuotaIAExcedida: otra solicitud tiene tomado el candado del bucket
+    """
+    from django.core.cache import cache
+
+    ahora = time.time() if ahora is None else ahora
+    recarga_s = por_minuto / 60.0
+    with _CandadoBucket(clave):
+        fichas, desde = cache.get(BUCKET_KEY.format(clave)) or (float(capacidad), ahora)
+        fichas = min(float(capacidad), fichas + max(0.0, ahora - desde) * recarga_s)
+        permitido = fichas >= costo
+        if permitido:
+            fichas -= costo
+        # Tiempo hasta llenarse: después de eso la entrada equivale a un bucket nuevo
+        ttl = int((capacidad - fichas) / recarga_s) + 60 if recarga_s > 0 else None
+        cache.set(BUCKET_KEY.format(clave), (fichas, ahora), timeout=ttl)
+    if permitido:
+        return True, 0.0
+    return False, (costo - fichas) / recarga_s if recarga_s > 0 else float('inf')
+
+
+# --- Cupos de ejecución (caché compartido) ---
+
+class CuposCompartidos:
+    """
+    Cupos de ejecución comunes a todos los workers: el cupo i es la clave
+    SLOT_KEY.format(i), tomada con cache.add. Una clase con `fraccion` solo
+    prueba los primeros cupos; las demás quedan para las clases altas.
+    """
+
+    def __init__(self, cupos: int):
+        self.cupos = cupos
+        self._lock = threading.Lock()
+        self.atendidas = 0
+        self.rechazadas = 0
+
+    def _limite(self, fraccion: float) -> int:
+        return max(1, int(math.floor(self.cupos * fraccion)))
+
+    def _contar(self, campo: str) -> None:
+        with self._lock:
+            setattr(self, campo, getattr(self, campo) + 1)
+
+    def adquirir(self, fraccion: float = 1.0) -> Optional[Tuple[str, str]]:
+        """(clave, token) del cupo tomado, o None de inmediato si no hay."""
+        from django.core.cache import cache
+
+        token = uuid.uuid4().hex
+        ttl = int(_config('AI_SCHEDULER_SLOT_TTL_S', AI_SCHEDULER_SLOT_TTL_S))
+        for i in range(self._limite(fraccion)):
+            clave = SLOT_KEY.format(i)
+            if cache.add(clave, token, timeout=ttl):
+                self._contar('atendidas')
+                return clave, token
+        self._contar('rechazadas')
+        return None
+
+    def liberar(self, clave: str, token: str) -> None:
+        from django.core.cache import cache
+
+        # Si el cupo venció y otro worker lo tomó, no es nuestro
+        if cache.get(clave) == token:
+            cache.delete(clave)
+
+    def en_uso(self) -> int:
+        from django.core.cache import cache
+
+        return len(cache.get_many([SLOT_KEY.format(i) for i in range(self.cupos)]))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            atendidas, rechazadas = self.atendidas, self.rechazadas
+        return {
+            'cupos': self.cupos,
+            'en_uso': self.en_uso(),
+            # Contadores de este proceso
+            'atendidas': atendidas,
+            'rechazadas': rechazadas,
+        }
+
+
+# --- Contadores de uso ---
+
+def registrar_uso(user, clase: str, operacion: str, costo: float = 1, rechazada: bool = False) -> None:
+    """Suma la solicitud al contador diario del usuario (AIUsageCounter)."""
+    from django.db import IntegrityError, transaction
+    from django.db.models import F
+    from django.utils import timezone
+    from .models import AIUsageCounter
+
+    clave = clave_usuario(user)
+    hoy = timezone.localdate()
+    cambios = {'last_used_at': timezone.now(), 'tier': clase}
+    if rechazada:
+        cambios['rejected'] = F('rejected') + 1
+    else:
+        cambios['requests'] = F('requests') + 1
+        cambios['units'] = F('units') + costo
+    try:
+        filtro = AIUsageCounter.objects.filter(user_key=clave, day=hoy, operation=operacion)
+        if filtro.update(**cambios):
+            return
+        try:
+            with transaction.atomic():
+                AIUsageCounter.objects.create(
+                    user_key=clave,
+                    user_id=getattr(user, 'pk', None) if clave.startswith('user:') else None,
+                    day=hoy,
+                    operation=operacion,
+                    tier=clase,
+                    requests=0 if rechazada else 1,
+                    rejected=1 if rechazada else 0,
+                    units=0 if rechazada else costo,
+                )
+        except IntegrityError:
+            filtro.update(**cambios)
+    except Exception as e:
+        logger.warning(f"No se pudo registrar el uso de IA de {clave}: {e}")
+
+
+# --- Programador ---
+
+class Turno:
+    """Cupo reservado; liberar() es idempotente."""
+
+    def __init__(self, programador: 'ProgramadorIA', clase: str, cupo: Tuple[str, str]):
+        self.clase = clase
+        self._programador = programador
+        self._cupo = cupo
+        self._liberado = False
+        self._lock = threading.Lock()
+
+    def liberar(self) -> None:
+        with self._lock:
+            if self._liberado:
+                return
+            self._liberado = True
+        self._programador.cupos.liberar(*self._cupo)
+
+    def __enter__(self) -> 'Turno':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.liberar()
+
+
+class ProgramadorIA:
+
+    def __init__(self, cupos: int):
+        self.cupos = CuposCompartidos(cupos)
+
+    def _reintento_saturado(self) -> int:
+        try:
+            from .gemini_gateway import obtener_metricas
+            latencia_s = obtener_metricas().get('latencia_ms_promedio', 0) / 1000
+        except Exception:
+            latencia_s = 0
+        return max(1, int(math.ceil(latencia_s)) or _config('AI_SCHEDULER_RETRY_S', AI_SCHEDULER_RETRY_S))
+
+    def _consumir_cuotas(self, user, nombre: str, clase: ClaseIA, costo: float) -> None:
+        """Descuenta el costo del bucket del usuario y, si tiene, del de su clase."""
+        permitido, espera = consumir_fichas(clave_usuario(user), clase.capacidad, clase.por_minuto, costo)
+        if not permitido:
+            raise CuotaIAExcedida(
+                'Límite de uso de IA alcanzado. Intente nuevamente en unos segundos.',
+                espera_s=max(1, int(math.ceil(espera))), motivo='user_quota',
+            )
+        if clase.capacidad_clase and clase.por_minuto_clase:
+            permitido, espera = consumir_fichas(f"clase:{nombre}", clase.capacidad_clase, clase.por_minuto_clase, costo)
+            if not permitido:
+                raise CuotaIAExcedida(
+                    'El servicio de IA está con alta demanda. Intente nuevamente en unos segundos.',
+                    espera_s=max(1, int(math.ceil(espera))), motivo='role_quota',
+                )
+
+    def reservar(self, user, operacion: str, costo: float = 1) -> Turno:
+        """
+        Turno para una operación de IA del usuario.
+
+        Raises:
+            CuotaIAExcedida: cuota del usuario o de su clase agotada, o sin cupo
+        """
+        nombre = clase_usuario(user)
+        clase = obtener_clase(nombre)
+        # Una operación más cara que el bucket completo nunca pasaría
+        costo = min(costo, clase.capacidad)
+
+        try:
+            self._consumir_cuotas(user, nombre, clase, costo)
+        except CuotaIAExcedida:
+            registrar_uso(user, nombre, operacion, costo, rechazada=True)
+            raise
+
+        cupo = self.cupos.adquirir(clase.fraccion_cupos)
+        if cupo is None:
+            registrar_uso(user, nombre, operacion, costo, rechazada=True)
+            raise CuotaIAExcedida(
+                'El servicio de IA está ocupado. Intente nuevamente en unos segundos.',
+                espera_s=self._reintento_saturado(), motivo='saturated',
+            )
+
+        registrar_uso(user, nombre, operacion, costo)
+        return Turno(self, nombre, cupo)
+
+    def stats(self) -> Dict:
+        return self.cupos.stats()
+
+
+_programador: Optional[ProgramadorIA] = None
+_programador_lock = threading.Lock()
+
+
+def obtener_programador() -> ProgramadorIA:
+    global _programador
+    if _programador is None:
+        with _programador_lock:
+            if _programador is None:
+                from .gemini_gateway import GEMINI_MAX_CONCURRENCY
+                cupos = _config('AI_SCHEDULER_SLOTS', _config('GEMINI_MAX_CONCURRENCY', GEMINI_MAX_CONCURRENCY))
+                _programador = ProgramadorIA(int(cupos))
+    return _programador
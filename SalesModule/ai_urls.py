@@ -2,9 +2,16 @@
 URL patterns for AI endpoints
 """
 from django.urls import path
-from .ai_views import AduanaChatView, ClassifyProductView
+from .ai_views import (
+    AduanaChatView, AduanaChatStreamView, AduanaChatCancelView,
+    ClassifyProductView, BatchClassifyProductsView, GeminiGatewayStatusView,
+)
 
 urlpatterns = [
     path('aduana-chat/', AduanaChatView.as_view(), name='aduana-chat'),
+    path('aduana-chat/stream/', AduanaChatStreamView.as_view(), name='aduana-chat-stream'),
+    path('aduana-chat/stream/cancel/', AduanaChatCancelView.as_view(), name='aduana-chat-stream-cancel'),
     path('classify-product/', ClassifyProductView.as_view(), name='classify-product'),
+    path('classify-products/', BatchClassifyProductsView.as_view(), name='classify-products'),
+    path('gateway-status/', GeminiGatewayStatusView.as_view(), name='gemini-gateway-status'),
 ]
@@ -5,13 +5,35 @@ import logging
 import base64
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework import status
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 
 logger = logging.getLogger(__name__)
 
 
+def _read_attachment(request):
+    """First attachment_* file as (base64 data, mime type), or (None, None)"""
+    for key in request.FILES:
+        if key.startswith('attachment_'):
+            file = request.FILES[key]
+            try:
+                file_content = file.read()
+                return base64.b64encode(file_content).decode('utf-8'), file.content_type
+            except Exception as e:
+                logger.error(f"Error processing attachment: {e}")
+    return None, None
+
+
+def _quota_response(error):
+    """429 with a retry hint for an AI scheduler rejection"""
+    return Response({
+        'error': str(error),
+        'reason': error.motivo,
+        'retry_after': error.espera_s,
+    }, status=status.HTTP_429_TOO_MANY_REQUESTS, headers={'Retry-After': str(error.espera_s)})
+
+
 class AduanaChatView(APIView):
     """
     POST /api/ai/aduana-chat/
@@ -21,6 +43,7 @@ class AduanaChatView(APIView):
     parser_classes = [MultiPartParser, FormParser, JSONParser]
     
     def post(self, request):
+        from .ai_scheduler import CuotaIAExcedida, obtener_programador
         from .gemini_service import ai_assistant_chat
         import json
         
@@ -33,23 +56,7 @@ class AduanaChatView(APIView):
         except json.JSONDecodeError:
             conversation_history = []
         
-        image_data = None
-        image_mime_type = None
-        
-        for key in request.FILES:
-            if key.startswith('attachment_'):
-                file = request.FILES[key]
-                try:
-                    file_content = file.read()
-                    image_data = base64.b64encode(file_content).decode('utf-8')
-                    image_mime_type = file.content_type
-                    
-                    if image_mime_type == 'application/pdf':
-                        pass
-                    
-                    break
-                except Exception as e:
-                    logger.error(f"Error processing attachment: {e}")
+        image_data, image_mime_type = _read_attachment(request)
         
         if not message and not image_data:
             return Response({
@@ -59,15 +66,90 @@ class AduanaChatView(APIView):
         if not message and image_data:
             message = "Analiza este documento y extrae la información relevante para importación a Ecuador."
         
-        result = ai_assistant_chat(
-            message=message,
-            image_data=image_data,
-            image_mime_type=image_mime_type
-        )
+        try:
+            turno = obtener_programador().reservar(request.user, 'chat', 3 if image_data else 1)
+        except CuotaIAExcedida as e:
+            return _quota_response(e)
+        
+        with turno:
+            result = ai_assistant_chat(
+                message=message,
+                image_data=image_data,
+                image_mime_type=image_mime_type
+            )
         
         return Response(result)
 
 
+class AduanaChatStreamView(APIView):
+    """
+    POST /api/ai/aduana-chat/stream/
+    Streaming chat (Server-Sent Events): start, token..., done | cancelled | error.
+    Conversation context is kept server-side; send session_id from the start event to continue.
+    """
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser, FormParser, JSONParser]
+    
+    def post(self, request):
+        from django.core.handlers.asgi import ASGIRequest
+        from django.http import StreamingHttpResponse
+        from .ai_scheduler import CuotaIAExcedida, obtener_programador
+        from .assistant_chat import ChatEnFlujo, SesionChatError, obtener_sesion
+        
+        message = (request.data.get('message') or '').strip()
+        image_data, image_mime_type = _read_attachment(request)
+        
+        if not message and not image_data:
+            return Response({
+                'error': 'Se requiere un mensaje o un archivo adjunto'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        if not message and image_data:
+            message = "Analiza este documento y extrae la información relevante para importación a Ecuador."
+        
+        try:
+            sesion = obtener_sesion(request.user, request.data.get('session_id'))
+        except SesionChatError as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        try:
+            turno = obtener_programador().reservar(request.user, 'chat_stream', 3 if image_data else 1)
+        except CuotaIAExcedida as e:
+            return _quota_response(e)
+        
+        chat = ChatEnFlujo(sesion, message, image_data=image_data, image_mime_type=image_mime_type)
+        # Under ASGI the async iterator keeps the event loop free; under WSGI the generator streams synchronously
+        content = chat if isinstance(request._request, ASGIRequest) else iter(chat)
+        response = StreamingHttpResponse(content, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        # The slot is held until the stream ends; both handlers call response.close() afterwards
+        response._resource_closers.append(turno.liberar)
+        return response
+
+
+class AduanaChatCancelView(APIView):
+    """
+    POST /api/ai/aduana-chat/stream/cancel/
+    Stop a running chat stream of the current user
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request):
+        from .assistant_chat import cancelar_stream
+        
+        stream_id = str(request.data.get('stream_id') or '').strip()
+        if not stream_id:
+            return Response({
+                'error': 'Se requiere stream_id'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        cancelar_stream(request.user, stream_id)
+        return Response({'stream_id': stream_id, 'cancelled': True}, status=status.HTTP_202_ACCEPTED)
+
+
 class ClassifyProductView(APIView):
     """
     POST /api/ai/classify-product/
@@ -76,6 +158,7 @@ class ClassifyProductView(APIView):
     permission_classes = [IsAuthenticated]
     
     def post(self, request):
+        from .ai_scheduler import CuotaIAExcedida, obtener_programador
         from .gemini_service import suggest_hs_code
         
         description = request.data.get('description', '').strip()
@@ -87,12 +170,61 @@ class ClassifyProductView(APIView):
                 'error': 'Se requiere la descripción del producto'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        result = suggest_hs_code(
-            product_description=description,
-            origin_country=origin_country,
-            fob_value=fob_value
-        )
+        try:
+            turno = obtener_programador().reservar(request.user, 'hs_suggestion')
+        except CuotaIAExcedida as e:
+            return _quota_response(e)
+        
+        with turno:
+            result = suggest_hs_code(
+                product_description=description,
+                origin_country=origin_country,
+                fob_value=fob_value
+            )
         
         return Response({
             'classification': result
         })
+
+
+class BatchClassifyProductsView(APIView):
+    """
+    POST /api/ai/classify-products/
+    Classify many products at once (deduplicated, local matches first, packed Gemini prompts)
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request):
+        from .ai_scheduler import CuotaIAExcedida, obtener_programador
+        from .hs_classification import HS_BATCH_AI_CHUNK, clasificar_productos, ClasificacionLoteError
+        
+        products = request.data.get('products')
+        # One unit per packed prompt the batch may send
+        cost = 1 + (len(products) // HS_BATCH_AI_CHUNK if isinstance(products, list) else 0)
+        try:
+            turno = obtener_programador().reservar(request.user, 'hs_batch', cost)
+        except CuotaIAExcedida as e:
+            return _quota_response(e)
+        
+        with turno:
+            try:
+                result = clasificar_productos(products)
+            except ClasificacionLoteError as e:
+                return Response({
+                    'error': str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response(result)
+
+
+class GeminiGatewayStatusView(APIView):
+    """
+    GET /api/ai/gateway-status/
+    Latency, error, coalescing and circuit breaker counters of the Gemini gateway
+    """
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request):
+        from .gemini_gateway import obtener_metricas
+        
+        return Response(obtener_metricas())
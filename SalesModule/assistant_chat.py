@@ -0,0 +1,249 @@
+"""
+Assistant Chat Streaming for ImportaYa.ia
+Chat del asistente de aduanas con respuesta en flujo (SSE).
+
+ai_assistant_chat espera la respuesta completa de Gemini: las explicaciones
+largas retenían un worker varios segundos y el usuario no veía nada hasta el
+final. Aquí:
+- Los fragmentos de Gemini se reenvían como eventos SSE a medida que llegan
+  (gemini_gateway.generate_content_stream: mismo circuito y semáforo).
+- El contexto de la conversación vive en el servidor (AssistantChatSession):
+  el cliente envía solo session_id y el mensaje nuevo. Se guardan los
+  últimos CHAT_CONTEXT_MAX_TURNS mensajes, cada uno recortado a
+  CHAT_TURN_MAX_CHARS, y los adjuntos solo como referencia, así el prompt de
+  cada turno tiene tamaño acotado.
+- Cancelación: cancelar_stream() marca el flujo en el caché compartido
+  (CACHES en settings: tabla de la base o Redis), así la petición de
+  cancelación puede llegar a cualquier worker de gunicorn; el flujo consulta
+  la marca tras cada fragmento y se corta en el siguiente. Cerrar la conexión
+  o el generador también cierra la llamada a Gemini. La respuesta parcial se
+  guarda en el contexto.
+
+Bajo ASGI (hsamp/asgi.py) el flujo se entrega como iterador asíncrono y cada
+fragmento se espera en un hilo, sin bloquear el event loop. Bajo WSGI
+(run_production.sh: gunicorn con workers síncronos) se entrega el mismo flujo
+como generador síncrono: el usuario ve los fragmentos a medida que llegan,
+pero el worker queda ocupado hasta que el flujo termina. Liberar el worker
+durante la espera solo ocurre sirviendo hsamp.asgi con un servidor ASGI.
+"""
+import json
+import logging
+import uuid
+from typing import Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Valores por defecto; se pueden sobrescribir en settings
+CHAT_CONTEXT_MAX_TURNS = 8
+CHAT_TURN_MAX_CHARS = 1200
+CHAT_CANCEL_TTL_S = 600
+
+CANCEL_KEY = 'assistant_chat:cancel:{usuario}:{stream}'
+
+ESTADO_EXITO = 'success'
+ESTADO_CANCELADO = 'cancelled'
+ESTADO_ERROR = 'error'
+
+
+class SesionChatError(ValueError):
+    """Sesión de chat inexistente o de otro usuario"""
+    pass
+
+
+def _config(nombre: str, defecto):
+    from django.conf import settings
+    return getattr(settings, nombre, defecto)
+
+
+def recortar(texto: str, limite: int) -> str:
+    texto = (texto or '').strip()
+    return texto if len(texto) <= limite else texto[:limite - 1].rstrip() + '…'
+
+
+def compactar_turnos(turnos: List[Dict]) -> List[Dict]:
+    """Últimos mensajes, cada uno recortado."""
+    maximo = _config('CHAT_CONTEXT_MAX_TURNS', CHAT_CONTEXT_MAX_TURNS)
+    limite = _config('CHAT_TURN_MAX_CHARS', CHAT_TURN_MAX_CHARS)
+    return [{'role': t['role'], 'text': recortar(t['text'], limite)} for t in turnos[-maximo:]]
+
+
+def obtener_sesion(user, session_id: Optional[str] = None):
+    """Sesión del usuario; sin session_id se crea una nueva."""
+    from django.core.exceptions import ValidationError
+    from .models import AssistantChatSession
+
+    if not session_id:
+        return AssistantChatSession.objects.create(user=user)
+    try:
+        return AssistantChatSession.objects.get(session_key=session_id, user=user)
+    except (AssistantChatSession.DoesNotExist, ValidationError, ValueError) as e:
+        raise SesionChatError("Sesión de chat no encontrada") from e
+
+
+def _clave_cancelacion(user_id, stream_id: str) -> str:
+    return CANCEL_KEY.format(usuario=user_id, stream=stream_id)
+
+
+def cancelar_stream(user, stream_id: str) -> None:
+    """Pide cortar un flujo en curso del usuario."""
+    from django.core.cache import cache
+    cache.set(_clave_cancelacion(user.pk, stream_id), True, timeout=_config('CHAT_CANCEL_TTL_S', CHAT_CANCEL_TTL_S))
+
+
+def evento_sse(evento: str, datos: Dict) -> bytes:
+    return f"event: {evento}\ndata: {json.dumps(datos, ensure_ascii=False)}\n\n".encode('utf-8')
+
+
+class ChatEnFlujo:
+    """
+    Un turno de chat en flujo. eventos() no toca los modelos (solo Gemini y
+    la marca de cancelación en el caché); guardar() persiste el turno al terminar.
+    """
+
+    def __init__(self, sesion, message: str, image_data: str = None, image_mime_type: str = None):
+        self.sesion = sesion
+        self.message = message
+        self.image_data = image_data
+        self.image_mime_type = image_mime_type
+        self.stream_id = uuid.uuid4().hex
+        self.mode = 'text_query'
+        self.estado = None
+        self._respuesta: List[str] = []
+        self._guardado = False
+
+    def _datos(self, **extra) -> Dict:
+        datos = {'session_id': str(self.sesion.session_key), 'stream_id': self.stream_id}
+        datos.update(extra)
+        return datos
+
+    def _cancelado(self) -> bool:
+        from django.core.cache import cache
+        return bool(cache.get(_clave_cancelacion(self.sesion.user_id, self.stream_id)))
+
+    def _contenidos(self, parts) -> List:
+        from google.genai import types
+
+        contenidos = [
+            types.Content(role=turno['role'], parts=[types.Part(text=turno['text'])])
+            for turno in compactar_turnos(self.sesion.turns or [])
+        ]
+        contenidos.append(types.Content(role='user', parts=parts))
+        return contenidos
+
+    def eventos(self) -> Iterator[bytes]:
+        from . import gemini_gateway
+        from .gemini_service import AI_ASSISTANT_PROMPT, GEMINI_AVAILABLE, _assistant_parts, client
+
+        yield evento_sse('start', self._datos())
+
+        if not GEMINI_AVAILABLE or client is None or not gemini_gateway.disponible(client):
+            self.estado = ESTADO_ERROR
+            yield evento_sse('error', self._datos(
+                response='El servicio de IA no esta disponible en este momento. Por favor contacte a soporte tecnico.',
+                mode='error', ai_status='unavailable',
+            ))
+            return
+
+        from google.genai import types
+
+        self.mode, parts, error = _assistant_parts(self.message, self.image_data, self.image_mime_type)
+        if error:
+            self.estado = ESTADO_ERROR
+            yield evento_sse('error', self._datos(**error))
+            return
+
+        flujo = gemini_gateway.generate_content_stream(
+            client,
+            model="gemini-2.5-flash",
+            contents=self._contenidos(parts),
+            config=types.GenerateContentConfig(system_instruction=AI_ASSISTANT_PROMPT),
+        )
+        try:
+            for fragmento in flujo:
+                texto = getattr(fragmento, 'text', None)
+                if texto:
+                    self._respuesta.append(texto)
+                    yield evento_sse('token', {'text': texto})
+                if self._cancelado():
+                    self.estado = ESTADO_CANCELADO
+                    break
+            else:
+                self.estado = ESTADO_EXITO
+        except GeneratorExit:
+            self.estado = ESTADO_CANCELADO
+            raise
+        except Exception as e:
+            logger.error(f"AI Assistant chat stream failed: {e}")
+            self.estado = ESTADO_ERROR
+            yield evento_sse('error', self._datos(
+                response='Error en el servicio de IA. Por favor intente nuevamente.',
+                mode='error', ai_status='error',
+            ))
+            return
+        finally:
+            flujo.close()
+
+        if self.estado == ESTADO_CANCELADO:
+            yield evento_sse('cancelled', self._datos())
+        elif self._respuesta:
+            yield evento_sse('done', self._datos(mode=self.mode, ai_status='success'))
+        else:
+            self.estado = ESTADO_ERROR
+            yield evento_sse('error', self._datos(
+                response='No se pudo generar una respuesta. Por favor intente nuevamente.',
+                mode=self.mode, ai_status='empty_response',
+            ))
+
+    def guardar(self) -> None:
+        """Agrega el turno (respuesta parcial incluida) al contexto compacto de la sesión."""
+        if self._guardado:
+            return
+        self._guardado = True
+        respuesta = ''.join(self._respuesta)
+        if not respuesta:
+            return
+        if self.estado != ESTADO_EXITO:
+            respuesta = respuesta.rstrip() + ' [respuesta interrumpida]'
+
+        pregunta = self.message
+        if self.image_data:
+            pregunta = f"[documento adjunto: {self.image_mime_type}] {pregunta}"
+        turnos = list(self.sesion.turns or []) + [
+            {'role': 'user', 'text': pregunta},
+            {'role': 'model', 'text': respuesta},
+        ]
+        self.sesion.turns = compactar_turnos(turnos)
+        self.sesion.turn_count += 1
+        try:
+            self.sesion.save(update_fields=['turns', 'turn_count', 'updated_at'])
+        except Exception as e:
+            logger.warning(f"No se pudo guardar el contexto del chat {self.sesion.session_key}: {e}")
+
+    def __iter__(self) -> Iterator[bytes]:
+        try:
+            yield from self.eventos()
+        finally:
+            self.guardar()
+
+    async def __aiter__(self):
+        from asgiref.sync import sync_to_async
+
+        eventos = self.eventos()
+        # Cada fragmento se espera en un hilo propio (no el hilo síncrono compartido)
+        siguiente = sync_to_async(next, thread_sensitive=False)
+        cerrar = sync_to_async(eventos.close, thread_sensitive=False)
+        try:
+            while True:
+                parte = await siguiente(eventos, None)
+                if parte is None:
+                    break
+                yield parte
+        finally:
+            try:
+                await cerrar()
+            except ValueError:
+                # Cancelado mientras next() seguía en su hilo: el flujo se corta en el siguiente fragmento
+                from django.core.cache import cache
+                cache.set(_clave_cancelacion(self.sesion.user_id, self.stream_id), True,
+                          timeout=_config('CHAT_CANCEL_TTL_S', CHAT_CANCEL_TTL_S))
+            await sync_to_async(self.guardar)()
@@ -0,0 +1,236 @@
+"""
+Port & Airport Autocomplete for ImportaYa.ia
+Índice en memoria para los selectores de origen/destino de la app.
+
+Se construye una sola vez por proceso (catálogo de load_ports + tablas Port
+y Airport) como un trie de prefijos sin acentos sobre nombres, UN/LOCODE,
+códigos IATA, ciudades y países. Cada nodo guarda sus mejores resultados
+ordenados por popularidad (frecuencia en QuoteSubmission), de modo que
+una búsqueda es O(longitud del prefijo) y no toca la base de datos.
+
+Los cambios en Port / Airport incrementan la versión compartida del índice
+(signals.py, shared_versions.py) y cada worker lo reconstruye en su
+siguiente búsqueda tras ver la versión nueva. La versión también sirve como
+base del ETag de las respuestas.
+"""
+import hashlib
+import logging
+import math
+import threading
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional
+
+from .resolvers import normalizar_texto
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION_KEY = 'autocomplete:index_version'
+
+# Resultados precalculados por nodo del trie
+TOP_K_POR_NODO = 25
+
+
+@dataclass
+class AutocompleteItem:
+    """Puerto o aeropuerto indexado."""
+    kind: str
+    code: str
+    name: str
+    city: str
+    country: str
+    region: str = ''
+    popularity: int = 0
+
+    @property
+    def score(self) -> float:
+        return math.log1p(self.popularity)
+
+    def to_dict(self) -> Dict:
+        data = asdict(self)
+        data['label'] = f"{self.name} ({self.code}) - {self.country}" if self.country else f"{self.name} ({self.code})"
+        return data
+
+
+class _Nodo:
+    __slots__ = ('hijos', 'items')
+
+    def __init__(self):
+        self.hijos: Dict[str, '_Nodo'] = {}
+        self.items: List[int] = []
+
+
+class PrefixTrie:
+    """
+    Trie de prefijos con los TOP_K mejores ítems en cada nodo.
+    """
+
+    def __init__(self, items: List[AutocompleteItem], top_k: int = TOP_K_POR_NODO):
+        self.items = items
+        self.top_k = top_k
+        self.raiz = _Nodo()
+        self._codigos: Dict[str, List[int]] = {}
+
+        # Ordenar una vez por popularidad: al insertar en orden, cada nodo
+        # conserva automáticamente los top_k más populares.
+        orden = sorted(range(len(items)), key=lambda i: (-items[i].score, items[i].name))
+        for idx in orden:
+            item = items[idx]
+            self._codigos.setdefault(normalizar_texto(item.code), []).append(idx)
+            for termino in self._terminos(item):
+                self._insertar(termino, idx)
+
+    @staticmethod
+    def _terminos(item: AutocompleteItem) -> set:
+        terminos = set()
+        for texto in (item.name, item.city, item.country, item.code):
+            normalizado = normalizar_texto(texto)
+            if not normalizado:
+                continue
+            terminos.add(normalizado)
+            palabras = normalizado.split()
+            # Permitir buscar desde cualquier palabra: "angeles" -> Los Angeles
+            for i in range(1, len(palabras)):
+                terminos.add(' '.join(palabras[i:]))
+        return terminos
+
+    def _insertar(self, termino: str, idx: int) -> None:
+        nodo = self.raiz
+        for caracter in termino:
+            nodo = nodo.hijos.setdefault(caracter, _Nodo())
+            if len(nodo.items) < self.top_k and idx not in nodo.items:
+                nodo.items.append(idx)
+
+    def buscar(self, prefijo: str, limit: int = 10) -> List[AutocompleteItem]:
+        consulta = normalizar_texto(prefijo)
+        if not consulta:
+            return []
+
+        resultados: List[int] = []
+        for idx in self._codigos.get(consulta, []):
+            resultados.append(idx)
+
+        nodo = self.raiz
+        for caracter in consulta:
+            nodo = nodo.hijos.get(caracter)
+            if nodo is None:
+                break
+        else:
+            for idx in nodo.items:
+                if idx not in resultados:
+                    resultados.append(idx)
+
+        return [self.items[i] for i in resultados[:limit]]
+
+
+class AutocompleteIndex:
+    """Índice del proceso con su versión."""
+
+    KINDS = ('port', 'airport')
+
+    def __init__(self, items: List[AutocompleteItem], version: int):
+        self.version = version
+        self.size = len(items)
+        self.tries = {'all': PrefixTrie(items)}
+        for kind in self.KINDS:
+            self.tries[kind] = PrefixTrie([i for i in items if i.kind == kind])
+
+    def search(self, query: str, kind: Optional[str] = None, limit: int = 10) -> List[Dict]:
+        trie = self.tries.get(kind or 'all', self.tries['all'])
+        return [item.to_dict() for item in trie.buscar(query, limit=limit)]
+
+    def etag(self, query: str, kind: Optional[str], limit: int) -> str:
+        base = f"{self.version}:{normalizar_texto(query)}:{kind or 'all'}:{limit}"
+        return '"' + hashlib.sha1(base.encode('utf-8')).hexdigest()[:20] + '"'
+
+
+_index: Optional[AutocompleteIndex] = None
+_index_lock = threading.Lock()
+
+
+def obtener_version_indice() -> int:
+    from .shared_versions import leer_version
+    return leer_version(INDEX_VERSION_KEY)
+
+
+def invalidar_indice() -> None:
+    """Marca el índice como desactualizado en todos los workers."""
+    from .shared_versions import incrementar_version
+    incrementar_version(INDEX_VERSION_KEY)
+
+
+def _popularidad() -> Dict[str, int]:
+    """
+    Frecuencia de cada puerto / aeropuerto en las solicitudes de cotización,
+    indexada por UN/LOCODE o código IATA.
+    """
+    from django.db.models import Count
+    from .models import QuoteSubmission
+    from .resolvers import resolve_port
+
+    conteo: Dict[str, int] = {}
+    for campo in ('origin', 'destination'):
+        for fila in QuoteSubmission.objects.values(campo).annotate(total=Count('id')):
+            texto = fila[campo] or ''
+            codigo = resolve_port(texto)
+            if not codigo:
+                posible_iata = normalizar_texto(texto)
+                codigo = posible_iata if len(posible_iata) == 3 else None
+            if codigo:
+                conteo[codigo] = conteo.get(codigo, 0) + fila['total']
+    return conteo
+
+
+def _cargar_items() -> List[AutocompleteItem]:
+    from .management.commands.load_ports import DATA_PUERTOS
+    from .models import Port, Airport
+    from .resolvers import EXTRA_PUERTOS
+
+    popularidad = _popularidad()
+
+    puertos: Dict[str, AutocompleteItem] = {}
+    for p in list(DATA_PUERTOS) + list(EXTRA_PUERTOS):
+        puertos[p['locode']] = AutocompleteItem(
+            kind='port', code=p['locode'], name=p['name'], city=p['name'],
+            country=p['country'], region=p.get('region', ''),
+        )
+    for p in Port.objects.filter(is_active=True).values('un_locode', 'name', 'country', 'region'):
+        puertos[p['un_locode']] = AutocompleteItem(
+            kind='port', code=p['un_locode'], name=p['name'], city=p['name'],
+            country=p['country'], region=p['region'],
+        )
+
+    aeropuertos = [
+        AutocompleteItem(
+            kind='airport', code=a['iata_code'], name=a['name'], city=a['ciudad_exacta'],
+            country=a['country'], region=a['region_name'],
+        )
+        for a in Airport.objects.filter(is_active=True).values(
+            'iata_code', 'name', 'ciudad_exacta', 'country', 'region_name'
+        )
+    ]
+
+    items = list(puertos.values()) + aeropuertos
+    for item in items:
+        item.popularity = popularidad.get(item.code, 0)
+    return items
+
+
+def get_autocomplete_index() -> AutocompleteIndex:
+    """
+    Índice del proceso; se reconstruye si otro proceso lo invalidó.
+    Solo la reconstrucción consulta la base de datos.
+    """
+    global _index
+    version = obtener_version_indice()
+    if _index is None or _index.version != version:
+        with _index_lock:
+            if _index is None or _index.version != version:
+                items = _cargar_items()
+                _index = AutocompleteIndex(items, version)
+                logger.info(f"Índice de autocompletado construido: {len(items)} entradas (versión {version})")
+    return _index
+
+
+def buscar_ubicaciones(query: str, kind: Optional[str] = None, limit: int = 10) -> List[Dict]:
+    """Atajo para búsquedas de typeahead."""
+    return get_autocomplete_index().search(query, kind=kind, limit=limit)
@@ -0,0 +1,437 @@
+"""
+batch_calculator.py - Peso Cobrable por lotes (packing lists) para ImportaYa.ia
+
+Versión vectorizada (NumPy) de calculator.calcular_peso_cobrable_completo para
+listas de empaque con cientos o miles de líneas.
+
+Para obtener exactamente los mismos valores que la versión escalar (Decimal con
+ROUND_HALF_UP / ROUND_HALF_EVEN) los cálculos se hacen en enteros escalados:
+- dimensiones en centésimas de cm (0.01 cm)
+- pesos en gramos (0.001 kg)
+- volumen en diezmilésimas de CBM (0.0001 CBM)
+
+Las líneas cuyos valores no se pueden representar sin pérdida (más de 6
+decimales, dimensiones de más de 200 m) se calculan con la función escalar, así que
+el resultado siempre coincide línea a línea con calculator.py.
+
+Los pesos y dimensiones son por pieza; `piezas` multiplica los totales.
+"""
+
+from decimal import Decimal
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Union
+import logging
+
+import numpy as np
+
+from .calculator import (
+    CalculatorError,
+    FACTOR_VOLUMETRICO_AEREO,
+    ResultadoPesoCobrable,
+    TipoTransporte,
+    UnidadLongitud,
+    UnidadPeso,
+    _parse_tipo_transporte,
+    _parse_unidad_longitud,
+    _parse_unidad_peso,
+    calcular_peso_cobrable,
+    calcular_peso_cobrable_completo,
+)
+
+logger = logging.getLogger(__name__)
+
+Columna = Union[Sequence, np.ndarray]
+
+ESCALA_ENTRADA = 10 ** 6
+
+# Conversión valor*1e6 -> centésimas de cm, como fracción (numerador, denominador)
+FRACCION_LONGITUD = {
+    UnidadLongitud.CMT: (1, 10_000),
+    UnidadLongitud.MTR: (1, 100),
+    UnidadLongitud.INH: (127, 500_000),  # 2.54 cm
+}
+
+# Conversión valor*1e6 -> gramos
+FRACCION_PESO = {
+    UnidadPeso.KGM: (1, 1_000),
+    UnidadPeso.LBR: (56_699, 125_000_000),  # 0.453592 kg
+    UnidadPeso.TNE: (1, 1),
+}
+
+# Volumen (1e-6 cm³) -> gramos volumétricos aéreos: / 6000 cm³/kg
+DIVISOR_VOLUMETRICO = int(FACTOR_VOLUMETRICO_AEREO) * 1_000
+DIVISOR_CBM = 10 ** 8
+
+# Límites del camino vectorizado: valores de entrada < 1e8 y dimensiones
+# < 200 m, así ningún producto intermedio desborda int64
+MAX_VALOR_ENTRADA = 1e8
+MAX_DIMENSION_CM100 = 2_000_000
+
+
+def _redondear_half_up(n: np.ndarray, den: Union[int, np.ndarray]) -> np.ndarray:
+    """n / den redondeado ROUND_HALF_UP (n >= 0)."""
+    q, r = np.divmod(n, den)
+    return q + (2 * r >= den)
+
+
+def _redondear_half_even(n: np.ndarray, den: int) -> np.ndarray:
+    """n / den redondeado ROUND_HALF_EVEN (n >= 0), igual que Decimal.quantize."""
+    q, r = np.divmod(n, den)
+    return q + ((2 * r > den) | ((2 * r == den) & (q % 2 == 1)))
+
+
+def _a_enteros(valores: Columna):
+    """
+    Convierte una columna a enteros escalados por 1e6.
+
+    Returns:
+        (enteros, exactos): exactos es False en las líneas que no se pueden
+        representar sin pérdida (se calculan con la función escalar).
+    """
+    try:
+        flotantes = np.asarray(valores, dtype=np.float64)
+    except (TypeError, ValueError):
+        flotantes = np.array([_a_float(v) for v in valores], dtype=np.float64)
+
+    with np.errstate(invalid='ignore', over='ignore'):
+        escalados = np.rint(flotantes * ESCALA_ENTRADA)
+        exactos = (
+            np.isfinite(flotantes)
+            & (np.abs(flotantes) < MAX_VALOR_ENTRADA)
+            & (escalados / ESCALA_ENTRADA == flotantes)
+        )
+    enteros = np.where(exactos, escalados, 0).astype(np.int64)
+    return enteros, exactos
+
+
+def _a_float(valor) -> float:
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return float('nan')
+
+
+def _expandir(valor, n: int) -> list:
+    """Una unidad/valor escalar se aplica a todas las líneas."""
+    if isinstance(valor, (str, int, float, Decimal)) or valor is None:
+        return [valor] * n
+    return list(valor)
+
+
+def _fracciones(unidades: list, parser, tabla: Dict):
+    """Numerador/denominador por línea; None si la unidad no se reconoce."""
+    por_unidad = {}
+    for unidad in set(unidades):
+        try:
+            por_unidad[unidad] = tabla[parser(str(unidad))]
+        except CalculatorError:
+            por_unidad[unidad] = None
+    fracciones = [por_unidad[u] for u in unidades]
+    validas = np.array([f is not None for f in fracciones], dtype=bool)
+    num = np.array([f[0] if f else 1 for f in fracciones], dtype=np.int64)
+    den = np.array([f[1] if f else 1 for f in fracciones], dtype=np.int64)
+    return num, den, validas
+
+
+def peso_cobrable_agregado(tipo_transporte: str, peso_bruto_g: int, peso_volumetrico_g: int, volumen_cbm4: int):
+    """
+    Regla de peso cobrable sobre totales de embarque (enteros escalados).
+
+    Returns:
+        (peso_cobrable, unidad_cobrable, base_cobro); peso_cobrable es None en FCL
+    """
+    if tipo_transporte == 'AEREO':
+        base = 'PESO_BRUTO' if peso_bruto_g >= peso_volumetrico_g else 'PESO_VOLUMETRICO'
+        return max(peso_bruto_g, peso_volumetrico_g) / 1_000, 'KG', base
+    if tipo_transporte == 'LCL':
+        if peso_bruto_g >= volumen_cbm4 * 100:
+            return int(_redondear_half_even(np.int64(peso_bruto_g), 100)) / 10_000, 'TON', 'PESO'
+        return volumen_cbm4 / 10_000, 'CBM', 'VOLUMEN'
+    return None, 'CONTENEDOR', 'CONTENEDOR'
+
+
+@dataclass
+class ResultadoLotePesoCobrable:
+    """
+    Resultado por línea (por pieza) y agregado de un packing list.
+    Los arreglos *_raw están en enteros escalados (ver docstring del módulo).
+    """
+    tipo_transporte: str
+    piezas: np.ndarray
+    peso_bruto_g: np.ndarray
+    peso_volumetrico_g: np.ndarray
+    volumen_cbm4: np.ndarray
+    peso_cobrable_raw: np.ndarray
+    base_cobro: np.ndarray
+    validos: np.ndarray
+    errores: List[Dict] = field(default_factory=list)
+
+    @property
+    def escala_cobrable(self) -> int:
+        return {'AEREO': 1_000, 'LCL': 10_000}.get(self.tipo_transporte, 1)
+
+    @property
+    def unidad_cobrable(self) -> np.ndarray:
+        if self.tipo_transporte == 'AEREO':
+            return np.full(len(self), 'KG', dtype=object)
+        if self.tipo_transporte == 'LCL':
+            return np.where(self.base_cobro == 'PESO', 'TON', 'CBM').astype(object)
+        return np.full(len(self), 'CONTENEDOR', dtype=object)
+
+    def _unidad_linea(self, i: int) -> str:
+        if self.tipo_transporte == 'AEREO':
+            return 'KG'
+        if self.tipo_transporte == 'LCL':
+            return 'TON' if self.base_cobro[i] == 'PESO' else 'CBM'
+        return 'CONTENEDOR'
+
+    # --- Vistas en float para consumidores vectorizados ---
+
+    @property
+    def peso_bruto_kg(self) -> np.ndarray:
+        return self.peso_bruto_g / 1_000
+
+    @property
+    def peso_volumetrico_kg(self) -> np.ndarray:
+        return self.peso_volumetrico_g / 1_000
+
+    @property
+    def volumen_cbm(self) -> np.ndarray:
+        return self.volumen_cbm4 / 10_000
+
+    @property
+    def peso_cobrable(self) -> np.ndarray:
+        return self.peso_cobrable_raw / self.escala_cobrable
+
+    def __len__(self) -> int:
+        return len(self.piezas)
+
+    def resultado(self, i: int) -> ResultadoPesoCobrable:
+        """Resultado de la línea i (una pieza) con los mismos Decimal que calculator.py."""
+        if not self.validos[i]:
+            raise CalculatorError(f"Línea {i} inválida")
+
+        if self.tipo_transporte == 'FCL':
+            peso_volumetrico = Decimal("0")
+            peso_cobrable = Decimal("1")
+        else:
+            peso_volumetrico = Decimal(int(self.peso_volumetrico_g[i])).scaleb(-3)
+            exponente = -3 if self.tipo_transporte == 'AEREO' else -4
+            peso_cobrable = Decimal(int(self.peso_cobrable_raw[i])).scaleb(exponente)
+
+        return ResultadoPesoCobrable(
+            peso_bruto_kg=Decimal(int(self.peso_bruto_g[i])).scaleb(-3),
+            peso_volumetrico_kg=peso_volumetrico,
+            peso_cobrable=peso_cobrable,
+            unidad_cobrable=self._unidad_linea(i),
+            volumen_cbm=Decimal(int(self.volumen_cbm4[i])).scaleb(-4),
+            tipo_transporte=self.tipo_transporte,
+            base_cobro=str(self.base_cobro[i]),
+            detalle=f"Línea {i} de packing list ({int(self.piezas[i])} pieza(s))",
+        )
+
+    def sumas(self) -> Dict[str, int]:
+        """Sumas exactas (enteros escalados) de las líneas válidas × piezas."""
+        v = self.validos
+        piezas = self.piezas[v].astype(object)
+        return {
+            'piezas': int(np.sum(piezas)) if len(piezas) else 0,
+            'peso_bruto_g': int(np.sum(self.peso_bruto_g[v].astype(object) * piezas)),
+            'peso_volumetrico_g': int(np.sum(self.peso_volumetrico_g[v].astype(object) * piezas)),
+            'volumen_cbm4': int(np.sum(self.volumen_cbm4[v].astype(object) * piezas)),
+        }
+
+    def totales(self) -> Dict:
+        """
+        Totales del embarque (solo líneas válidas). El peso cobrable agregado
+        aplica la regla del tipo de transporte sobre los totales, como se
+        cobra un embarque consolidado.
+        """
+        sumas = self.sumas()
+        peso_cobrable, unidad, base = peso_cobrable_agregado(
+            self.tipo_transporte, sumas['peso_bruto_g'], sumas['peso_volumetrico_g'], sumas['volumen_cbm4']
+        )
+        return {
+            'tipo_transporte': self.tipo_transporte,
+            'lineas': len(self),
+            'lineas_validas': int(self.validos.sum()),
+            'piezas': sumas['piezas'],
+            'peso_bruto_kg': sumas['peso_bruto_g'] / 1_000,
+            'peso_volumetrico_kg': sumas['peso_volumetrico_g'] / 1_000,
+            'volumen_cbm': sumas['volumen_cbm4'] / 10_000,
+            'peso_cobrable': peso_cobrable,
+            'unidad_cobrable': unidad,
+            'base_cobro': base,
+            'errores': len(self.errores),
+        }
+
+    def to_dict(self, incluir_lineas: bool = True) -> Dict:
+        data = {'totales': self.totales(), 'errores': self.errores}
+        if incluir_lineas:
+            unidades = self.unidad_cobrable
+            data['lineas'] = [
+                {
+                    'linea': i,
+                    'valida': bool(self.validos[i]),
+                    'piezas': int(self.piezas[i]),
+                    'peso_bruto_kg': float(self.peso_bruto_kg[i]),
+                    'peso_volumetrico_kg': float(self.peso_volumetrico_kg[i]),
+                    'volumen_cbm': float(self.volumen_cbm[i]),
+                    'peso_cobrable': float(self.peso_cobrable[i]),
+                    'unidad_cobrable': unidades[i],
+                    'base_cobro': str(self.base_cobro[i]),
+                }
+                for i in range(len(self))
+            ]
+        return data
+
+
+def calcular_peso_cobrable_lote(
+    largo: Columna,
+    ancho: Columna,
+    alto: Columna,
+    peso_bruto: Columna,
+    tipo_transporte: str,
+    unidad_dimensiones: Union[str, Sequence[str]] = "CMT",
+    unidad_peso: Union[str, Sequence[str]] = "KGM",
+    piezas: Optional[Columna] = None,
+    normalizar: bool = True
+) -> ResultadoLotePesoCobrable:
+    """
+    Calcula el peso cobrable de todas las líneas de un packing list.
+
+    Args:
+        largo, ancho, alto: Columnas de dimensiones (por pieza)
+        peso_bruto: Columna de peso bruto (por pieza)
+        tipo_transporte: AEREO, LCL o FCL (uno para todo el lote)
+        unidad_dimensiones: Unidad común o una por línea (CMT, MTR, INH)
+        unidad_peso: Unidad común o una por línea (KGM, LBR, TNE)
+        piezas: Cantidad de piezas por línea (default 1)
+        normalizar: True replica calcular_peso_cobrable_completo (redondea
+            dimensiones a 0.01 cm y peso a 0.001 kg); False replica
+            calcular_peso_cobrable con valores ya en cm / kg.
+
+    Returns:
+        ResultadoLotePesoCobrable. Las líneas inválidas quedan marcadas en
+        `validos` y descritas en `errores` en lugar de abortar el lote.
+
+    Raises:
+        UnidadDesconocidaError: Si el tipo de transporte no es reconocido
+    """
+    tipo = _parse_tipo_transporte(tipo_transporte)
+    tipo_codigo = tipo.value
+
+    columnas = [largo, ancho, alto, peso_bruto]
+    n = len(largo)
+    if any(len(c) != n for c in columnas):
+        raise CalculatorError("Las columnas del lote deben tener la misma longitud")
+
+    if piezas is None:
+        cantidad_piezas = np.ones(n, dtype=np.int64)
+    else:
+        cantidad_piezas = np.nan_to_num(np.asarray(piezas, dtype=np.float64), nan=0).astype(np.int64)
+
+    unidades_dim = _expandir(unidad_dimensiones if normalizar else "CMT", n)
+    unidades_peso = _expandir(unidad_peso if normalizar else "KGM", n)
+    num_l, den_l, unidad_l_ok = _fracciones(unidades_dim, _parse_unidad_longitud, FRACCION_LONGITUD)
+    num_p, den_p, unidad_p_ok = _fracciones(unidades_peso, _parse_unidad_peso, FRACCION_PESO)
+
+    (l_raw, l_ok), (a_raw, a_ok), (h_raw, h_ok), (p_raw, p_ok) = [_a_enteros(c) for c in columnas]
+    exactos = l_ok & a_ok & h_ok & p_ok & unidad_l_ok & unidad_p_ok
+
+    positivos = (l_raw > 0) & (a_raw > 0) & (h_raw > 0) & (p_raw > 0)
+    vectorizable = exactos & positivos & (cantidad_piezas > 0)
+
+    if normalizar:
+        l_cm = _redondear_half_up(l_raw * num_l, den_l)
+        a_cm = _redondear_half_up(a_raw * num_l, den_l)
+        h_cm = _redondear_half_up(h_raw * num_l, den_l)
+        bruto_g = _redondear_half_up(p_raw * num_p, den_p)
+    else:
+        # Sin normalizar solo son exactas las líneas ya expresadas en 0.01 cm / 0.001 kg
+        vectorizable &= (l_raw % 10_000 == 0) & (a_raw % 10_000 == 0) & (h_raw % 10_000 == 0) & (p_raw % 1_000 == 0)
+        l_cm, a_cm, h_cm = l_raw // 10_000, a_raw // 10_000, h_raw // 10_000
+        bruto_g = p_raw // 1_000
+
+    vectorizable &= (l_cm > 0) & (a_cm > 0) & (h_cm > 0) & (bruto_g > 0)
+    vectorizable &= (l_cm < MAX_DIMENSION_CM100) & (a_cm < MAX_DIMENSION_CM100) & (h_cm < MAX_DIMENSION_CM100)
+
+    # Producto de dimensiones en 1e-6 cm³ (las líneas fuera de rango se descartan)
+    l_cm, a_cm, h_cm = (np.where(vectorizable, x, 0) for x in (l_cm, a_cm, h_cm))
+    producto = l_cm * a_cm * h_cm
+
+    volumen_cbm4 = _redondear_half_up(producto, DIVISOR_CBM)
+
+    if tipo == TipoTransporte.AEREO:
+        volumetrico_g = _redondear_half_up(producto, DIVISOR_VOLUMETRICO)
+        por_peso = bruto_g >= volumetrico_g
+        cobrable = np.where(por_peso, bruto_g, volumetrico_g)
+        base = np.where(por_peso, 'PESO_BRUTO', 'PESO_VOLUMETRICO').astype(object)
+    elif tipo == TipoTransporte.MARITIMO_LCL:
+        volumetrico_g = volumen_cbm4 * 100
+        por_peso = bruto_g >= volumetrico_g
+        cobrable = np.where(por_peso, _redondear_half_even(bruto_g, 100), volumen_cbm4)
+        base = np.where(por_peso, 'PESO', 'VOLUMEN').astype(object)
+    else:
+        volumetrico_g = np.zeros(n, dtype=np.int64)
+        cobrable = np.ones(n, dtype=np.int64)
+        base = np.full(n, 'CONTENEDOR', dtype=object)
+
+    resultado = ResultadoLotePesoCobrable(
+        tipo_transporte=tipo_codigo,
+        piezas=cantidad_piezas,
+        peso_bruto_g=np.where(vectorizable, bruto_g, 0).astype(np.int64),
+        peso_volumetrico_g=np.where(vectorizable, volumetrico_g, 0).astype(np.int64),
+        volumen_cbm4=np.where(vectorizable, volumen_cbm4, 0).astype(np.int64),
+        peso_cobrable_raw=np.where(vectorizable, cobrable, 0).astype(np.int64),
+        base_cobro=base,
+        validos=vectorizable.copy(),
+    )
+
+    pendientes = np.flatnonzero(~vectorizable)
+    for i in pendientes:
+        _calcular_linea_escalar(resultado, int(i), columnas, unidades_dim, unidades_peso, tipo_transporte, normalizar)
+
+    if len(pendientes):
+        logger.debug(f"Lote de {n} líneas: {len(pendientes)} calculadas en modo escalar")
+    return resultado
+
+
+def _calcular_linea_escalar(
+    resultado: ResultadoLotePesoCobrable,
+    i: int,
+    columnas: List[Columna],
+    unidades_dim: list,
+    unidades_peso: list,
+    tipo_transporte: str,
+    normalizar: bool
+) -> None:
+    """Completa una línea no vectorizable con la función escalar (o registra el error)."""
+    largo, ancho, alto, peso = (c[i] for c in columnas)
+
+    if resultado.piezas[i] <= 0:
+        resultado.errores.append({'linea': i, 'error': "La cantidad de piezas debe ser mayor a cero"})
+        return
+
+    try:
+        if normalizar:
+            linea = calcular_peso_cobrable_completo(
+                largo, ancho, alto, str(unidades_dim[i]), peso, str(unidades_peso[i]), tipo_transporte
+            )
+        else:
+            linea = calcular_peso_cobrable(largo, ancho, alto, peso, tipo_transporte)
+    except CalculatorError as e:
+        resultado.errores.append({'linea': i, 'error': str(e)})
+        return
+
+    exponente = {'AEREO': 3, 'LCL': 4}.get(resultado.tipo_transporte, 0)
+    try:
+        resultado.peso_bruto_g[i] = int(linea.peso_bruto_kg.scaleb(3))
+        resultado.peso_volumetrico_g[i] = int(linea.peso_volumetrico_kg.scaleb(3))
+        resultado.volumen_cbm4[i] = int(linea.volumen_cbm.scaleb(4))
+        resultado.peso_cobrable_raw[i] = int(linea.peso_cobrable.scaleb(exponente))
+    except OverflowError:
+        resultado.errores.append({'linea': i, 'error': "Valores fuera de rango"})
+        return
+    resultado.base_cobro[i] = linea.base_cobro
+    resultado.validos[i] = True
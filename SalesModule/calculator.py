@@ -218,21 +218,9 @@ def normalizar_dimensiones(
     return largo_cm, ancho_cm, alto_cm
 
 
-def normalizar_peso(
-    peso: Union[int, float, Decimal],
-    unidad_origen: str
-) -> Decimal:
-    """
-    Normaliza peso a Kilogramos (KGM).
-    
-    Args:
-        peso: Valor del peso
-        unidad_origen: Unidad del peso (KGM, LBR, TNE)
-    
-    Returns:
-        Peso en kilogramos como Decimal
-    """
-    unidad_upper = unidad_origen.upper().strip()
+def _parse_unidad_peso(unidad: str) -> UnidadPeso:
+    """Parsea una unidad de peso desde string"""
+    unidad_upper = unidad.upper().strip()
     
     aliases = {
         "KG": UnidadPeso.KGM,
@@ -250,13 +238,30 @@ def normalizar_peso(
         "MT": UnidadPeso.TNE,
     }
     
-    if unidad_upper not in aliases:
-        raise UnidadDesconocidaError(
-            f"Unidad de peso '{unidad_origen}' no reconocida. "
-            f"Unidades válidas: KGM (kg), LBR (lb), TNE (ton)"
-        )
+    if unidad_upper in aliases:
+        return aliases[unidad_upper]
     
-    unidad = aliases[unidad_upper]
+    raise UnidadDesconocidaError(
+        f"Unidad de peso '{unidad}' no reconocida. "
+        f"Unidades válidas: KGM (kg), LBR (lb), TNE (ton)"
+    )
+
+
+def normalizar_peso(
+    peso: Union[int, float, Decimal],
+    unidad_origen: str
+) -> Decimal:
+    """
+    Normaliza peso a Kilogramos (KGM).
+    
+    Args:
+        peso: Valor del peso
+        unidad_origen: Unidad del peso (KGM, LBR, TNE)
+    
+    Returns:
+        Peso en kilogramos como Decimal
+    """
+    unidad = _parse_unidad_peso(unidad_origen)
     factor = FACTORES_CONVERSION_PESO[unidad]
     
     peso_dec = _to_decimal(peso)
@@ -31,6 +31,14 @@ Lógica de Decisión:
 
 Soporte Multi-Contenedor:
 - El LEAD puede seleccionar tipo, cantidad y mezcla de contenedores
+- optimizar_mezcla_contenedores() busca la mezcla más barata (ej: 1x40HC + 1x20GP)
+  con flete + gastos locales de las tarifas vigentes (branch and bound)
+- validar_seleccion_multicontenedor() con volumen y peso de la carga compara la
+  selección del LEAD con el plan óptimo (endpoint de cotización container-plan/)
+- Gastos locales en una mezcla: la parte por contenedor (THC, DTHC...) se suma
+  por unidad; la parte fija por B/L (documentación, handling...) se cobra una
+  sola vez por el embarque, como el mayor fijo entre los tipos usados:
+  costo = Σ cantidad × (flete + local variable) + max(local fijo de los tipos usados)
 - Contenedores automáticos: 20GP, 40GP, 40HC, 40NOR
 - Contenedores manuales: REEFER, FLAT RACK, OPEN TOP
 
@@ -39,9 +47,11 @@ Versión: 3.0.0
 """
 
 from decimal import Decimal, ROUND_HALF_UP, ROUND_CEILING
-from typing import Dict, Union, Optional, List
+from typing import Dict, Union, Optional, List, Tuple
 from dataclasses import dataclass, field
+import heapq
 import logging
+import math
 
 logger = logging.getLogger(__name__)
 
@@ -592,6 +602,10 @@ class ResultadoMultiContenedor:
     resumen: str
     advertencias: List[str]
     descripcion_completa: str
+    cubre_carga: Optional[bool] = None
+    costo_seleccion_usd: Optional[float] = None
+    plan_optimo: Optional["PlanContenedores"] = None
+    ahorro_usd: Optional[float] = None
 
 
 def get_contenedores_disponibles() -> Dict:
@@ -628,7 +642,13 @@ def get_contenedores_disponibles() -> Dict:
 
 
 def validar_seleccion_multicontenedor(
-    selecciones: List[Dict[str, Union[str, int]]]
+    selecciones: List[Dict[str, Union[str, int]]],
+    volumen_cbm: Optional[Union[int, float, Decimal]] = None,
+    peso_kg: Optional[Union[int, float, Decimal]] = None,
+    pol: Optional[str] = None,
+    pod: Optional[str] = None,
+    destination_port: str = 'GYE',
+    costos: Optional[Dict[str, "CostoContenedor"]] = None
 ) -> ResultadoMultiContenedor:
     """
     Valida y procesa una selección multi-contenedor del LEAD.
@@ -636,6 +656,10 @@ def validar_seleccion_multicontenedor(
     Args:
         selecciones: Lista de diccionarios con formato:
             [{"tipo": "20GP", "cantidad": 2}, {"tipo": "40HC", "cantidad": 1}]
+        volumen_cbm / peso_kg: Carga a embarcar. Si se indican, se verifica que
+            la selección la cubra y se compara con optimizar_mezcla_contenedores
+        pol / pod / destination_port: Ruta para las tarifas vigentes
+        costos: Costos por tipo ya calculados (omite la consulta de tarifas)
     
     Returns:
         ResultadoMultiContenedor con validación completa
@@ -702,7 +726,7 @@ def validar_seleccion_multicontenedor(
             "Un asesor le contactará en 2-3 días laborables con el precio."
         )
     
-    return ResultadoMultiContenedor(
+    resultado = ResultadoMultiContenedor(
         selecciones=contenedores_procesados,
         volumen_total_cbm=volumen_total,
         peso_max_total_kg=peso_max_total,
@@ -715,21 +739,71 @@ def validar_seleccion_multicontenedor(
         descripcion_completa=" | ".join(descripcion_parts)
     )
 
+    if volumen_cbm is not None and peso_kg is not None:
+        _comparar_con_plan_optimo(resultado, volumen_cbm, peso_kg, pol, pod, destination_port, costos)
+    return resultado
+
+
+def _comparar_con_plan_optimo(
+    resultado: ResultadoMultiContenedor,
+    volumen_cbm: Union[int, float, Decimal],
+    peso_kg: Union[int, float, Decimal],
+    pol: Optional[str],
+    pod: Optional[str],
+    destination_port: str,
+    costos: Optional[Dict[str, "CostoContenedor"]]
+) -> None:
+    """Verifica que la selección cubra la carga y la compara con el plan más barato."""
+    volumen = _to_decimal(volumen_cbm)
+    peso = _to_decimal(peso_kg)
+    resultado.cubre_carga = resultado.volumen_total_cbm >= volumen and resultado.peso_max_total_kg >= peso
+    if not resultado.cubre_carga:
+        resultado.advertencias.append(
+            f"La selección ({resultado.volumen_total_cbm:.0f} CBM / {resultado.peso_max_total_kg/1000:.1f} TON) "
+            f"no cubre la carga ({volumen:.2f} CBM / {peso/1000:.2f} TON)"
+        )
+
+    if resultado.requiere_cotizacion_manual:
+        return
+    if costos is None:
+        costos = obtener_costos_contenedores(pol, pod, destination_port) if pol and pod else {}
+
+    try:
+        optimo = optimizar_mezcla_contenedores(volumen, peso, costos=costos, top_k=1)[0]
+    except (ValueError, IndexError) as e:
+        logger.warning(f"No se pudo calcular el plan óptimo para {volumen} CBM / {peso} kg: {e}")
+        return
+    resultado.plan_optimo = optimo
+    cantidades = {s.tipo_codigo: s.cantidad for s in resultado.selecciones}
+    resultado.costo_seleccion_usd = costo_plan_contenedores(cantidades, costos)
+
+    if optimo.costo_total_usd is not None and resultado.costo_seleccion_usd is not None:
+        resultado.ahorro_usd = round(max(resultado.costo_seleccion_usd - optimo.costo_total_usd, 0.0), 2)
+        if resultado.cubre_carga and resultado.ahorro_usd > 0:
+            resultado.advertencias.append(
+                f"{optimo.resumen} cubre la carga por USD {optimo.costo_total_usd:,.2f} "
+                f"(ahorro USD {resultado.ahorro_usd:,.2f})"
+            )
+    if not resultado.cubre_carga:
+        resultado.advertencias.append(f"Sugerencia: {optimo.resumen}")
+
 
 def validar_seleccion_multicontenedor_json(
-    selecciones: List[Dict[str, Union[str, int]]]
+    selecciones: List[Dict[str, Union[str, int]]],
+    **carga
 ) -> Dict:
     """
     Versión JSON de validar_seleccion_multicontenedor.
     
     Args:
         selecciones: Lista de diccionarios con tipo y cantidad
+        **carga: volumen_cbm, peso_kg, pol, pod, destination_port (opcionales)
     
     Returns:
         Diccionario con el resultado de la validación
     """
     try:
-        resultado = validar_seleccion_multicontenedor(selecciones)
+        resultado = validar_seleccion_multicontenedor(selecciones, **carga)
         
         return {
             "exito": True,
@@ -746,6 +820,10 @@ def validar_seleccion_multicontenedor_json(
             "resumen": resultado.resumen,
             "advertencias": resultado.advertencias,
             "descripcion_completa": resultado.descripcion_completa,
+            "cubre_carga": resultado.cubre_carga,
+            "costo_seleccion_usd": resultado.costo_seleccion_usd,
+            "plan_optimo": resultado.plan_optimo.to_dict() if resultado.plan_optimo else None,
+            "ahorro_usd": resultado.ahorro_usd,
         }
     except ValueError as e:
         return {
@@ -801,6 +879,299 @@ def calcular_capacidad_seleccion(
     }
 
 
+# --- OPTIMIZACIÓN DE MEZCLAS POR COSTO ---
+
+# Tamaño en TEU; se usa para ordenar los planes cuando no hay tarifas vigentes
+TEU_POR_CONTENEDOR = {"20GP": 1, "40GP": 2, "40HC": 2, "40NOR": 2}
+
+_EPS = 1e-9
+
+
+@dataclass
+class CostoContenedor:
+    """Costo unitario de un tipo de contenedor para una ruta"""
+    codigo: str
+    flete_usd: float
+    local_variable_usd: float = 0.0
+    local_fijo_usd: float = 0.0
+
+    @property
+    def unitario_usd(self) -> float:
+        return self.flete_usd + self.local_variable_usd
+
+
+@dataclass
+class PlanContenedores:
+    """Combinación de contenedores que cubre la carga"""
+    cantidades: Dict[str, int]
+    costo_total_usd: Optional[float]
+    capacidad_volumen_cbm: float
+    capacidad_peso_kg: float
+    uso_volumen_pct: float
+    uso_peso_pct: float
+
+    @property
+    def total_contenedores(self) -> int:
+        return sum(self.cantidades.values())
+
+    @property
+    def resumen(self) -> str:
+        return " + ".join(f"{n}x{codigo}" for codigo, n in self.cantidades.items())
+
+    def to_dict(self) -> Dict:
+        return {
+            "resumen": self.resumen,
+            "selecciones": [{"tipo": codigo, "cantidad": n} for codigo, n in self.cantidades.items()],
+            "total_contenedores": self.total_contenedores,
+            "costo_total_usd": self.costo_total_usd,
+            "capacidad_volumen_cbm": self.capacidad_volumen_cbm,
+            "capacidad_peso_kg": self.capacidad_peso_kg,
+            "uso_volumen_pct": self.uso_volumen_pct,
+            "uso_peso_pct": self.uso_peso_pct,
+        }
+
+
+def obtener_costos_contenedores(
+    pol: str,
+    pod: str,
+    destination_port: str = 'GYE',
+    tipos: Optional[List[str]] = None
+) -> Dict[str, CostoContenedor]:
+    """
+    Costo por contenedor (flete + gastos locales) de cada tipo con tarifa vigente
+    (ProviderRate). Los tipos sin tarifa se omiten; los errores de consulta no
+    se ocultan como "sin tarifa".
+
+    Los gastos locales, de la misma naviera del flete, se consultan para 1 y 2
+    unidades para separar la parte por contenedor (THC de destino) de la parte
+    fija por B/L, que en una mezcla se cobra una sola vez.
+    """
+    from .money import Money, sumar
+    from .quotation_engine import obtener_tarifa_flete, obtener_gastos_locales_db
+
+    costos: Dict[str, CostoContenedor] = {}
+    for codigo in tipos or list(CONTENEDORES.keys()):
+        flete = obtener_tarifa_flete(pol, pod, 'FCL', container_type=codigo)
+        if not flete:
+            continue
+
+        local_1, local_2 = (
+            sumar(Money.of(item.get('monto')) for item in obtener_gastos_locales_db(
+                'FCL', port=destination_port, container_type=codigo, quantity=cantidad,
+                carrier_code=flete.get('carrier_code')
+            ).get('items', []))
+            for cantidad in (1, 2)
+        )
+
+        variable = max(local_2 - local_1, Money.zero())
+        costos[codigo] = CostoContenedor(
+            codigo=codigo,
+            flete_usd=Money.of(flete['monto']).to_float(),
+            local_variable_usd=variable.to_float(),
+            local_fijo_usd=max(local_1 - variable, Money.zero()).to_float(),
+        )
+    return costos
+
+
+def costo_plan_contenedores(cantidades: Dict[str, int], costos: Dict[str, CostoContenedor]) -> Optional[float]:
+    """
+    Costo de una combinación de contenedores con la regla de gastos fijos por B/L.
+
+    Todos los contenedores del embarque viajan bajo un mismo B/L, así que la
+    parte fija de los gastos locales (documentación, handling...) se cobra una
+    vez: el mayor fijo entre los tipos usados, no la suma. Ej: 1x40HC + 1x20GP
+    paga 2 fletes y 2 THC pero una sola documentación.
+
+    Returns:
+        Costo total en USD, o None si algún tipo no tiene costo vigente
+    """
+    usados = {codigo: n for codigo, n in cantidades.items() if n}
+    if not usados or any(codigo not in costos for codigo in usados):
+        return None
+    variable = sum(costos[codigo].unitario_usd * n for codigo, n in usados.items())
+    return round(variable + max(costos[codigo].local_fijo_usd for codigo in usados), 2)
+
+
+def _es_minimo(cantidades: Tuple[int, ...], specs: List[Tuple[float, float]], volumen: float, peso: float) -> bool:
+    """True si al quitar cualquier contenedor la carga ya no cabe."""
+    vol_total = sum(n * v for n, (v, _) in zip(cantidades, specs))
+    peso_total = sum(n * w for n, (_, w) in zip(cantidades, specs))
+    for n, (v, w) in zip(cantidades, specs):
+        if n and vol_total - v >= volumen - _EPS and peso_total - w >= peso - _EPS:
+            return False
+    return True
+
+
+def _buscar_planes(
+    volumen: float,
+    peso: float,
+    specs: List[Tuple[float, float]],
+    unitarios: List[float],
+    fijos: List[float],
+    top_k: int
+) -> List[Tuple[float, Tuple[int, ...]]]:
+    """
+    Branch and bound sobre las cantidades de cada tipo de contenedor.
+    El último tipo se resuelve en forma cerrada (mínimo que cubre el resto),
+    y una rama se poda cuando su costo + cota inferior del resto no mejora
+    el k-ésimo mejor plan encontrado.
+    """
+    n_tipos = len(specs)
+    # Cota inferior: costo mínimo por CBM y por kg entre los tipos restantes
+    min_por_cbm = [min(unitarios[j] / specs[j][0] for j in range(i, n_tipos)) for i in range(n_tipos)]
+    min_por_kg = [min(unitarios[j] / specs[j][1] for j in range(i, n_tipos)) for i in range(n_tipos)]
+
+    mejores: List[Tuple[float, Tuple[int, ...]]] = []  # max-heap por costo negativo
+    cantidades = [0] * n_tipos
+
+    def umbral() -> float:
+        return -mejores[0][0] if len(mejores) >= top_k else math.inf
+
+    def registrar(costo_variable: float):
+        usados = [fijos[i] for i in range(n_tipos) if cantidades[i]]
+        if not usados:
+            return
+        # Fijo por B/L: una vez por embarque (ver costo_plan_contenedores)
+        costo = costo_variable + max(usados)
+        plan = tuple(cantidades)
+        if costo > umbral() + _EPS or not _es_minimo(plan, specs, volumen, peso):
+            return
+        if any(p == plan for _, p in mejores):
+            return
+        heapq.heappush(mejores, (-costo, plan))
+        if len(mejores) > top_k:
+            heapq.heappop(mejores)
+
+    def explorar(i: int, vol_restante: float, peso_restante: float, costo: float):
+        vol_restante = max(vol_restante, 0.0)
+        peso_restante = max(peso_restante, 0.0)
+        cota = costo + max(vol_restante * min_por_cbm[i], peso_restante * min_por_kg[i])
+        if cota > umbral() + _EPS:
+            return
+
+        v, w = specs[i]
+        necesarios = max(math.ceil(vol_restante / v - _EPS), math.ceil(peso_restante / w - _EPS), 0)
+
+        if i == n_tipos - 1:
+            cantidades[i] = necesarios
+            registrar(costo + necesarios * unitarios[i])
+            cantidades[i] = 0
+            return
+
+        for n in range(necesarios + 1):
+            cantidades[i] = n
+            explorar(i + 1, vol_restante - n * v, peso_restante - n * w, costo + n * unitarios[i])
+        cantidades[i] = 0
+
+    explorar(0, volumen, peso, 0.0)
+    return sorted((-c, p) for c, p in mejores)
+
+
+def optimizar_mezcla_contenedores(
+    volumen_cbm: Union[int, float, Decimal],
+    peso_kg: Union[int, float, Decimal],
+    pol: Optional[str] = None,
+    pod: Optional[str] = None,
+    destination_port: str = 'GYE',
+    costos: Optional[Dict[str, CostoContenedor]] = None,
+    top_k: int = 3
+) -> List[PlanContenedores]:
+    """
+    Busca las top_k combinaciones de contenedores (incluye mezclas como
+    1x40HC + 1x20GP) con menor costo total de flete + gastos locales que
+    cubren el volumen y el peso de la carga (27 TON por contenedor).
+
+    Args:
+        volumen_cbm: Volumen total en CBM
+        peso_kg: Peso total en kg
+        pol / pod: Ruta para consultar tarifas vigentes
+        destination_port: Puerto para gastos locales
+        costos: Costos por tipo ya calculados (omite la consulta de tarifas)
+        top_k: Número de planes a retornar
+
+    Returns:
+        Lista de PlanContenedores ordenada por costo. Si ninguna tarifa está
+        vigente, los planes se ordenan por TEU y costo_total_usd es None.
+    """
+    volumen = float(_to_decimal(volumen_cbm))
+    peso = float(_to_decimal(peso_kg))
+
+    if volumen <= 0 or peso <= 0:
+        raise ValueError("El volumen y peso deben ser mayores a cero")
+
+    if costos is None:
+        costos = obtener_costos_contenedores(pol, pod, destination_port) if pol and pod else {}
+
+    con_tarifa = bool(costos)
+    if not con_tarifa:
+        costos = {
+            codigo: CostoContenedor(codigo=codigo, flete_usd=float(teu))
+            for codigo, teu in TEU_POR_CONTENEDOR.items()
+        }
+
+    codigos = [c for c in CONTENEDORES if c in costos and costos[c].unitario_usd > 0]
+    if not codigos:
+        raise ValueError("No hay costos válidos para ningún tipo de contenedor")
+
+    # Explorar primero los tipos más baratos por CBM mejora la poda
+    codigos.sort(key=lambda c: costos[c].unitario_usd / float(CONTENEDORES[c].volumen_max_cbm))
+    specs = [(float(CONTENEDORES[c].volumen_max_cbm), float(CONTENEDORES[c].peso_max_kg)) for c in codigos]
+
+    resultados = _buscar_planes(
+        volumen, peso, specs,
+        unitarios=[costos[c].unitario_usd for c in codigos],
+        fijos=[costos[c].local_fijo_usd for c in codigos],
+        top_k=max(1, top_k),
+    )
+
+    planes = []
+    for costo, plan in resultados:
+        por_codigo = dict(zip(codigos, plan))
+        cap_vol = sum(n * v for n, (v, _) in zip(plan, specs))
+        cap_peso = sum(n * w for n, (_, w) in zip(plan, specs))
+        planes.append(PlanContenedores(
+            cantidades={c: por_codigo[c] for c in CONTENEDORES if por_codigo.get(c)},
+            costo_total_usd=round(costo, 2) if con_tarifa else None,
+            capacidad_volumen_cbm=cap_vol,
+            capacidad_peso_kg=cap_peso,
+            uso_volumen_pct=round(volumen / cap_vol * 100, 1),
+            uso_peso_pct=round(peso / cap_peso * 100, 1),
+        ))
+
+    if not con_tarifa:
+        # A igual TEU, preferir menos unidades y mayor holgura de volumen
+        planes.sort(key=lambda p: (
+            sum(n * TEU_POR_CONTENEDOR[c] for c, n in p.cantidades.items()),
+            p.total_contenedores,
+            -p.capacidad_volumen_cbm,
+        ))
+    return planes
+
+
+def optimizar_mezcla_contenedores_json(
+    volumen_cbm: Union[int, float, Decimal],
+    peso_kg: Union[int, float, Decimal],
+    pol: Optional[str] = None,
+    pod: Optional[str] = None,
+    destination_port: str = 'GYE',
+    top_k: int = 3
+) -> Dict:
+    """Versión JSON de optimizar_mezcla_contenedores."""
+    try:
+        planes = optimizar_mezcla_contenedores(
+            volumen_cbm, peso_kg, pol=pol, pod=pod,
+            destination_port=destination_port, top_k=top_k
+        )
+    except ValueError as e:
+        return {"exito": False, "error": str(e)}
+
+    return {
+        "exito": True,
+        "costo_con_tarifas": bool(planes) and planes[0].costo_total_usd is not None,
+        "planes": [plan.to_dict() for plan in planes],
+    }
+
+
 if __name__ == "__main__":
     print("=" * 70)
     print("IMPORTAYA.IA - OPTIMIZADOR DE CONTENEDORES")
@@ -0,0 +1,426 @@
+"""
+Document Extraction Cache for ImportaYa.ia
+Extracción de datos de documentos comerciales indexada por contenido.
+
+La misma factura o packing list se vuelve a subir en varias solicitudes de
+cotización y revisiones, y cada vez se leía completa en memoria, se
+codificaba en base64 y se enviaba a Gemini. Aquí cada archivo se identifica
+por el SHA-256 de su contenido, calculado leyendo el archivo por bloques
+(sin cargarlo completo), y el resultado estructurado se guarda en
+DocumentExtraction:
+
+- Archivo ya visto: el resultado se devuelve sin cargar el archivo en memoria
+  ni llamar a la IA.
+- Archivo nuevo con texto (PDF con capa de texto, XLSX, CSV, TXT): se
+  intenta primero la extracción local (local_extraction) y la IA solo se usa
+  si no encuentra suficientes campos.
+- PDF con cambios: con pypdf, cada página tiene su propio hash (contenido +
+  imágenes); solo las páginas nuevas o modificadas se envían a la IA y las
+  demás se toman de la caché. Las páginas pendientes viajan juntas en un
+  solo PDF por llamada (hasta PAGINAS_POR_LLAMADA y MAX_INLINE_BYTES), y la
+  IA devuelve un resultado por página que se guarda con el hash de su página.
+- Sin pypdf el PDF se trata como un archivo único.
+
+Cada campo del resultado combinado lleva su confianza (field_confidence) y
+los de baja confianza se listan en low_confidence_fields.
+
+La función que llama a la IA se recibe como parámetro (extractor), de modo
+que este módulo no depende de Gemini y se puede probar con un extractor local.
+"""
+import hashlib
+import io
+import logging
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+try:
+    from pypdf import PdfReader, PdfWriter
+    PYPDF_AVAILABLE = True
+except ImportError:
+    PYPDF_AVAILABLE = False
+
+CHUNK_SIZE = 64 * 1024
+
+# Límite de datos en línea por solicitud a Gemini (~20 MB)
+MAX_INLINE_BYTES = 15 * 1024 * 1024
+
+MAX_TEXTO = 8000
+
+# Páginas PDF pendientes que se envían juntas en una llamada
+PAGINAS_POR_LLAMADA = 10
+
+# Campos con confianza por debajo de este valor se marcan para revisión
+CONFIANZA_BAJA = 70
+
+CAMPOS_META = ('extraction_confidence', 'field_confidence', 'low_confidence_fields', 'extraction_source')
+
+MIME_TYPES = {
+    'pdf': 'application/pdf',
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+    'txt': 'text/plain',
+    'csv': 'text/csv',
+}
+
+
+@dataclass
+class DocumentoFuente:
+    """Documento subido: nombre en el storage + metadatos para el prompt."""
+    storage_name: str
+    file_name: str
+    document_type: str = ''
+    type_label: str = ''
+
+    @property
+    def extension(self) -> str:
+        return self.file_name.lower().rsplit('.', 1)[-1] if '.' in self.file_name else ''
+
+    @property
+    def mime_type(self) -> str:
+        return MIME_TYPES.get(self.extension, '')
+
+    def descriptor(self) -> Dict:
+        info = {'type': self.type_label or self.document_type, 'filename': self.file_name}
+        if self.document_type and self.document_type != info['type']:
+            info['type_code'] = self.document_type
+        return info
+
+
+@dataclass
+class ParteDocumento:
+    """
+    Lo que recibe el extractor: un archivo completo, una página PDF o varias
+    páginas en un solo PDF. Con `paginas` (números de página del original,
+    en orden) el extractor devuelve una lista con un resultado por página.
+    """
+    descriptor: Dict
+    mime_type: str = ''
+    data: Optional[bytes] = None
+    texto: Optional[str] = None
+    paginas: Optional[List[int]] = None
+
+
+Extractor = Callable[[ParteDocumento], Optional[Union[Dict, List[Dict]]]]
+
+
+@dataclass
+class ResultadoExtraccion:
+    datos: Dict = field(default_factory=dict)
+    documentos: int = 0
+    desde_cache: int = 0
+    locales: int = 0
+    paginas_extraidas: int = 0
+    paginas_desde_cache: int = 0
+    llamadas_ia: int = 0
+    errores: List[str] = field(default_factory=list)
+
+    def stats(self) -> Dict:
+        return {
+            'documentos': self.documentos,
+            'desde_cache': self.desde_cache,
+            'locales': self.locales,
+            'paginas_extraidas': self.paginas_extraidas,
+            'paginas_desde_cache': self.paginas_desde_cache,
+            'llamadas_ia': self.llamadas_ia,
+            'errores': len(self.errores),
+        }
+
+
+def _bloques(archivo) -> Iterable[bytes]:
+    if hasattr(archivo, 'chunks'):
+        yield from archivo.chunks(CHUNK_SIZE)
+        return
+    while True:
+        bloque = archivo.read(CHUNK_SIZE)
+        if not bloque:
+            return
+        yield bloque
+
+
+def hash_contenido(archivo) -> Tuple[str, int]:
+    """SHA-256 y tamaño leyendo por bloques; deja el archivo al inicio si se puede."""
+    sha = hashlib.sha256()
+    total = 0
+    for bloque in _bloques(archivo):
+        if isinstance(bloque, str):
+            bloque = bloque.encode('utf-8')
+        sha.update(bloque)
+        total += len(bloque)
+    if hasattr(archivo, 'seek'):
+        archivo.seek(0)
+    return sha.hexdigest(), total
+
+
+def _confianza(valor) -> Optional[float]:
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def combinar_resultados(resultados: Iterable[Dict]) -> Dict:
+    """
+    Une extracciones de varios documentos o páginas. Por campo se conserva el
+    valor con mayor confianza (field_confidence, o la confianza general del
+    resultado si no la trae); a igual confianza, el primero. La confianza
+    general es el promedio.
+    """
+    combinado: Dict = {}
+    confianza_campos: Dict[str, float] = {}
+    confianzas = []
+    fuentes = []
+    for resultado in resultados:
+        if not resultado:
+            continue
+        general = _confianza(resultado.get('extraction_confidence'))
+        if general is not None:
+            confianzas.append(general)
+        fuente = resultado.get('extraction_source')
+        if fuente and fuente not in fuentes:
+            fuentes.append(fuente)
+        por_campo = resultado.get('field_confidence') or {}
+        for campo, valor in resultado.items():
+            if campo in CAMPOS_META or valor in (None, '', [], {}):
+                continue
+            confianza = _confianza(por_campo.get(campo))
+            if confianza is None:
+                confianza = general if general is not None else 0
+            if campo not in combinado or confianza > confianza_campos[campo]:
+                combinado[campo] = valor
+                confianza_campos[campo] = confianza
+    if confianzas:
+        combinado['extraction_confidence'] = round(sum(confianzas) / len(confianzas))
+    if confianza_campos:
+        combinado['field_confidence'] = {campo: round(c) for campo, c in confianza_campos.items()}
+        combinado['low_confidence_fields'] = sorted(c for c, v in confianza_campos.items() if v < CONFIANZA_BAJA)
+    if fuentes:
+        combinado['extraction_source'] = ', '.join(fuentes)
+    return combinado
+
+
+def _renombrar(datos: Dict, alias: Optional[Dict[str, str]]) -> Dict:
+    if not alias:
+        return datos
+    renombrados = {alias.get(campo, campo): valor for campo, valor in datos.items()}
+    if 'field_confidence' in datos:
+        renombrados['field_confidence'] = {alias.get(c, c): v for c, v in datos['field_confidence'].items()}
+    return renombrados
+
+
+# --- Caché persistente ---
+
+def _buscar(scope: str, content_hash: str, kind: str) -> Optional[Dict]:
+    from django.db.models import F
+    from django.utils import timezone
+    from .models import DocumentExtraction
+
+    registro = DocumentExtraction.objects.filter(content_hash=content_hash, scope=scope, kind=kind).only('id', 'result').first()
+    if registro is None:
+        return None
+    DocumentExtraction.objects.filter(pk=registro.pk).update(hits=F('hits') + 1, last_used_at=timezone.now())
+    return registro.result
+
+
+def _guardar(scope: str, content_hash: str, kind: str, result: Dict, documento: DocumentoFuente, size: int) -> None:
+    from .models import DocumentExtraction
+
+    DocumentExtraction.objects.update_or_create(
+        content_hash=content_hash, scope=scope, kind=kind,
+        defaults={
+            'result': result,
+            'file_name': documento.file_name[:255],
+            'mime_type': documento.mime_type,
+            'size_bytes': size,
+        },
+    )
+
+
+# --- Páginas PDF ---
+
+def _hash_pagina(pagina) -> str:
+    """Hash del flujo de contenido y de las imágenes/XObjects que usa la página."""
+    sha = hashlib.sha256()
+    contenido = pagina.get_contents()
+    if contenido is not None:
+        sha.update(contenido.get_data())
+    recursos = pagina.get('/Resources')
+    xobjects = recursos.get_object().get('/XObject') if recursos is not None else None
+    if xobjects is not None:
+        xobjects = xobjects.get_object()
+        for nombre in sorted(xobjects.keys()):
+            sha.update(nombre.encode('utf-8'))
+            sha.update(getattr(xobjects[nombre].get_object(), '_data', b'') or b'')
+    return sha.hexdigest()
+
+
+def _pdf_de_paginas(paginas) -> bytes:
+    escritor = PdfWriter()
+    for pagina in paginas:
+        escritor.add_page(pagina)
+    buffer = io.BytesIO()
+    escritor.write(buffer)
+    return buffer.getvalue()
+
+
+def _lotes_de_paginas(pendientes: List[Tuple[int, str, object]]) -> Iterable[Tuple[List[Tuple[int, str, object]], bytes]]:
+    """Agrupa las páginas pendientes en PDFs de hasta PAGINAS_POR_LLAMADA páginas y MAX_INLINE_BYTES."""
+    for inicio in range(0, len(pendientes), PAGINAS_POR_LLAMADA):
+        por_enviar = [pendientes[inicio:inicio + PAGINAS_POR_LLAMADA]]
+        while por_enviar:
+            lote = por_enviar.pop(0)
+            data = _pdf_de_paginas([pagina for _, _, pagina in lote])
+            if len(data) > MAX_INLINE_BYTES and len(lote) > 1:
+                mitad = len(lote) // 2
+                por_enviar[:0] = [lote[:mitad], lote[mitad:]]
+                continue
+            yield lote, data
+
+
+def _resultados_por_pagina(parte: ParteDocumento, extractor: Extractor) -> Optional[List[Dict]]:
+    """Llama al extractor y valida que haya un resultado por página de la parte."""
+    datos = extractor(parte)
+    if parte.paginas is None:
+        return [datos] if isinstance(datos, dict) else None
+    if not isinstance(datos, list) or len(datos) != len(parte.paginas):
+        return None
+    if not all(isinstance(pagina, dict) for pagina in datos):
+        return None
+    return datos
+
+
+def _extraer_pdf_por_paginas(archivo, documento: DocumentoFuente, scope: str,
+                             extractor: Extractor, resultado: ResultadoExtraccion) -> Optional[Dict]:
+    lector = PdfReader(archivo)
+    total_paginas = len(lector.pages)
+    por_pagina: Dict[int, Dict] = {}
+    pendientes = []
+    for numero, pagina in enumerate(lector.pages, start=1):
+        hash_pagina = _hash_pagina(pagina)
+        datos = _buscar(scope, hash_pagina, 'page')
+        if datos is not None:
+            resultado.paginas_desde_cache += 1
+            por_pagina[numero] = datos
+        else:
+            pendientes.append((numero, hash_pagina, pagina))
+
+    for lote, data in _lotes_de_paginas(pendientes):
+        numeros = [numero for numero, _, _ in lote]
+        if len(lote) == 1:
+            parte = ParteDocumento(dict(documento.descriptor(), page=numeros[0], pages=total_paginas),
+                                   'application/pdf', data=data)
+        else:
+            parte = ParteDocumento(dict(documento.descriptor(), included_pages=numeros, pages=total_paginas),
+                                   'application/pdf', data=data, paginas=numeros)
+        resultado.llamadas_ia += 1
+        extraidos = _resultados_por_pagina(parte, extractor)
+        if extraidos is None:
+            # Un lote fallido invalida el resultado del archivo, no el de las páginas ya guardadas
+            resultado.errores.append(f"{documento.file_name} p.{','.join(map(str, numeros))}")
+            return None
+        for (numero, hash_pagina, _), datos in zip(lote, extraidos):
+            datos.setdefault('extraction_source', 'ai')
+            _guardar(scope, hash_pagina, 'page', datos, documento, 0)
+            resultado.paginas_extraidas += 1
+            por_pagina[numero] = datos
+    return combinar_resultados(por_pagina[numero] for numero in sorted(por_pagina))
+
+
+# --- Entrada principal ---
+
+def _extraer_archivo(archivo, documento: DocumentoFuente, size: int,
+                     extractor: Extractor, resultado: ResultadoExtraccion) -> Optional[Dict]:
+    descriptor = documento.descriptor()
+    if documento.extension in ('txt', 'csv'):
+        texto = archivo.read(MAX_TEXTO * 4)
+        if isinstance(texto, bytes):
+            texto = texto.decode('utf-8', errors='replace')
+        parte = ParteDocumento(descriptor, documento.mime_type, texto=texto[:MAX_TEXTO])
+    elif documento.mime_type:
+        if size > MAX_INLINE_BYTES:
+            resultado.errores.append(f"{documento.file_name}: supera {MAX_INLINE_BYTES // (1024 * 1024)} MB")
+            return None
+        parte = ParteDocumento(descriptor, documento.mime_type, data=archivo.read())
+    else:
+        parte = ParteDocumento(dict(descriptor, note=f"Archivo {documento.extension.upper()} - {documento.file_name}"))
+    resultado.llamadas_ia += 1
+    datos = extractor(parte)
+    if datos is None:
+        resultado.errores.append(documento.file_name)
+    else:
+        datos.setdefault('extraction_source', 'ai')
+    return datos
+
+
+def _extraer_local(archivo, documento: DocumentoFuente):
+    from .local_extraction import extraer_local
+
+    try:
+        return extraer_local(archivo, documento.file_name)
+    except Exception as e:
+        logger.info(f"Local extraction failed for {documento.file_name}: {e}")
+        return None
+
+
+def extraer_documentos(documentos: List[DocumentoFuente], scope: str, extractor: Extractor,
+                       storage=None, alias_locales: Optional[Dict[str, str]] = None) -> ResultadoExtraccion:
+    """
+    Extrae y combina los datos de los documentos, reutilizando resultados
+    por hash de archivo y de página PDF. `scope` separa esquemas de
+    extracción distintos (p. ej. cotización vs. shipping instructions).
+
+    Cada documento pasa primero por la extracción local (local_extraction);
+    la IA solo recibe los escaneados o los que no se pudieron leer.
+    `alias_locales` renombra los campos locales al esquema del scope.
+    """
+    if storage is None:
+        from django.core.files.storage import default_storage
+        storage = default_storage
+
+    resultado = ResultadoExtraccion()
+    por_documento = []
+    for documento in documentos:
+        resultado.documentos += 1
+        local = None
+        try:
+            with storage.open(documento.storage_name, 'rb') as archivo:
+                content_hash, size = hash_contenido(archivo)
+                datos = _buscar(scope, content_hash, 'file')
+                if datos is not None:
+                    resultado.desde_cache += 1
+                    por_documento.append(datos)
+                    continue
+
+                local = _extraer_local(archivo, documento)
+                if local is not None and local.suficiente:
+                    resultado.locales += 1
+                    datos = _renombrar(local.to_dict(), alias_locales)
+                elif documento.extension == 'pdf' and PYPDF_AVAILABLE:
+                    try:
+                        archivo.seek(0)
+                        datos = _extraer_pdf_por_paginas(archivo, documento, scope, extractor, resultado)
+                    except Exception as e:
+                        # PDF que pypdf no puede leer: se envía completo
+                        logger.info(f"PDF {documento.file_name} not split into pages: {e}")
+                        archivo.seek(0)
+                        datos = _extraer_archivo(archivo, documento, size, extractor, resultado)
+                else:
+                    archivo.seek(0)
+                    datos = _extraer_archivo(archivo, documento, size, extractor, resultado)
+        except Exception as e:
+            logger.warning(f"Document extraction failed for {documento.file_name}: {e}")
+            resultado.errores.append(documento.file_name)
+            continue
+
+        if datos is not None:
+            _guardar(scope, content_hash, 'file', datos, documento, size)
+            por_documento.append(datos)
+        elif local is not None:
+            # La IA falló: se usa lo encontrado localmente, sin guardarlo en la caché
+            por_documento.append(_renombrar(local.to_dict(), alias_locales))
+
+    resultado.datos = combinar_resultados(por_documento)
+    logger.info(f"Document extraction ({scope}): {resultado.stats()}")
+    return resultado
@@ -0,0 +1,375 @@
+"""
+duty_engine.py - Pre-liquidación de tributos por lotes para ImportaYa.ia
+
+Calcula los tributos de importación de una factura comercial completa
+(decenas o cientos de líneas con distintas subpartidas) en una sola pasada:
+
+1. Resuelve todas las subpartidas en una consulta por tabla
+   (CustomsDutyRate y, como respaldo, HSCodeEntry).
+2. Prorratea el flete y el seguro de la factura por valor FOB de cada línea
+   (método del mayor residuo, así la suma de las líneas cuadra al centavo).
+3. Calcula Ad-Valorem, FODINFA, ICE, Salvaguardia, IVA e ISD vectorizados
+   con NumPy en centavos enteros y redondeo ROUND_HALF_UP por línea.
+
+Bases (mismas que PreLiquidation / generate_test_data):
+- Ad-Valorem, FODINFA, ICE, Salvaguardia: % sobre el CIF de la línea
+- IVA: % sobre CIF + Ad-Valorem + FODINFA + ICE + Salvaguardia
+- ISD: 5% sobre el valor FOB pagado al exterior (opcional)
+"""
+
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from functools import cached_property
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+import logging
+import re
+
+import numpy as np
+
+from .batch_calculator import _redondear_half_up
+
+logger = logging.getLogger(__name__)
+
+# Impuesto a la Salida de Divisas sobre el pago al proveedor del exterior
+ISD_RATE = Decimal('0.05')
+
+# Tasas por defecto en centésimas de punto porcentual (1250 = 12.50%)
+ESCALA_TASA = 10_000
+TASAS_DEFAULT = {
+    'ad_valorem': 1000,
+    'fodinfa': 50,
+    'ice': 0,
+    'salvaguardia': 0,
+    'iva': 1500,
+}
+
+# Límites por línea para que ningún producto intermedio desborde int64
+MAX_VALOR_LINEA_USD = Decimal('1000000000')
+MAX_TASA_PCT = Decimal('1000')
+
+TRIBUTOS = ('ad_valorem', 'fodinfa', 'ice', 'salvaguardia', 'iva', 'isd')
+
+
+class DutyEngineError(ValueError):
+    """Datos de factura inválidos para la pre-liquidación"""
+    pass
+
+
+def normalizar_hs_code(hs_code) -> str:
+    """Solo dígitos: '8471.30.00' y '84713000' son la misma subpartida."""
+    return re.sub(r'\D', '', str(hs_code or ''))
+
+
+def _variantes_hs(digitos: str) -> List[str]:
+    """Escrituras con las que una subpartida puede estar guardada."""
+    variantes = [digitos]
+    if len(digitos) >= 8:
+        variantes.append(f"{digitos[:4]}.{digitos[4:6]}.{digitos[6:8]}{('.' + digitos[8:]) if len(digitos) > 8 else ''}")
+    elif len(digitos) >= 6:
+        variantes.append(f"{digitos[:4]}.{digitos[4:6]}")
+    return variantes
+
+
+def _a_tasa(valor, default: int) -> int:
+    """Porcentaje (12.5) -> centésimas de punto (1250)."""
+    if valor is None or valor == '':
+        return default
+    try:
+        tasa = Decimal(str(valor))
+    except InvalidOperation:
+        raise DutyEngineError(f"Tasa inválida: {valor!r}")
+    if not tasa.is_finite():
+        raise DutyEngineError(f"Tasa inválida: {valor!r}")
+    if tasa < 0:
+        raise DutyEngineError(f"Tasa negativa no permitida: {valor}")
+    if tasa > MAX_TASA_PCT:
+        raise DutyEngineError(f"Tasa demasiado alta: {valor}")
+    return int((tasa * 100).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def _a_centavos(valor) -> int:
+    try:
+        monto = Decimal(str(valor if valor not in (None, '') else 0))
+    except InvalidOperation:
+        raise DutyEngineError(f"Valor inválido: {valor!r}")
+    # NaN no se puede comparar (InvalidOperation) e Infinity no tiene centavos
+    if not monto.is_finite():
+        raise DutyEngineError(f"Valor inválido: {valor!r}")
+    if monto < 0:
+        raise DutyEngineError(f"Valor negativo no permitido: {valor}")
+    if monto > MAX_VALOR_LINEA_USD:
+        raise DutyEngineError(f"Valor demasiado alto: {valor}")
+    return int((monto * 100).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def resolver_tasas(hs_codes: Iterable[str]) -> Dict[str, Dict]:
+    """
+    Tasas por subpartida (clave: solo dígitos) en una consulta por tabla.
+    CustomsDutyRate tiene prioridad; HSCodeEntry completa las que falten.
+    """
+    digitos = {normalizar_hs_code(c) for c in hs_codes} - {''}
+    if not digitos:
+        return {}
+    variantes = [v for d in digitos for v in _variantes_hs(d)]
+    tasas: Dict[str, Dict] = {}
+
+    try:
+        from .models import CustomsDutyRate
+        for rate in CustomsDutyRate.objects.filter(hs_code__in=variantes, is_active=True):
+            clave = normalizar_hs_code(rate.hs_code)
+            tasas.setdefault(clave, {
+                'ad_valorem': _a_tasa(rate.ad_valorem_percentage, TASAS_DEFAULT['ad_valorem']),
+                'fodinfa': _a_tasa(getattr(rate, 'fodinfa_percentage', None), TASAS_DEFAULT['fodinfa']),
+                'ice': _a_tasa(getattr(rate, 'ice_percentage', None), TASAS_DEFAULT['ice']),
+                'salvaguardia': _a_tasa(getattr(rate, 'salvaguardia_percentage', None), TASAS_DEFAULT['salvaguardia']),
+                'iva': _a_tasa(getattr(rate, 'iva_percentage', None), TASAS_DEFAULT['iva']),
+                'fuente': 'CustomsDutyRate',
+                'descripcion': rate.description,
+            })
+    except Exception as e:
+        logger.warning(f"No se pudieron consultar CustomsDutyRate: {e}")
+
+    pendientes = [v for d in digitos - set(tasas) for v in _variantes_hs(d)]
+    if pendientes:
+        try:
+            from .models import HSCodeEntry
+            for entry in HSCodeEntry.objects.filter(hs_code__in=pendientes, is_active=True):
+                clave = normalizar_hs_code(entry.hs_code)
+                tasas.setdefault(clave, {
+                    **TASAS_DEFAULT,
+                    'ad_valorem': _a_tasa(entry.ad_valorem_rate, TASAS_DEFAULT['ad_valorem']),
+                    'ice': _a_tasa(entry.ice_rate, TASAS_DEFAULT['ice']),
+                    'fuente': 'HSCodeEntry',
+                    'descripcion': entry.description,
+                })
+        except Exception as e:
+            logger.warning(f"No se pudieron consultar HSCodeEntry: {e}")
+
+    return tasas
+
+
+def prorratear(total_centavos: int, pesos: np.ndarray) -> np.ndarray:
+    """
+    Reparte un monto en centavos proporcionalmente a `pesos` (enteros >= 0)
+    usando el método del mayor residuo: la suma es exactamente el total.
+    """
+    suma = int(pesos.sum())
+    if total_centavos == 0 or suma == 0:
+        return np.zeros(len(pesos), dtype=np.int64)
+    if total_centavos * int(pesos.max()) < 2 ** 62:
+        cuota, residuo = np.divmod(pesos.astype(np.int64) * total_centavos, suma)
+    else:
+        productos = np.array([int(p) * total_centavos for p in pesos], dtype=object)
+        cuota, residuo = np.divmod(productos, suma)
+        cuota, residuo = cuota.astype(np.int64), residuo.astype(np.float64)
+    faltante = total_centavos - int(cuota.sum())
+    if faltante:
+        # Mayor residuo primero; en empate, la primera línea
+        orden = np.lexsort((np.arange(len(pesos)), -residuo))
+        cuota[orden[:faltante]] += 1
+    return cuota
+
+
+def _centavos_a_decimal(centavos) -> Decimal:
+    return Decimal(int(centavos)) / 100
+
+
+@dataclass
+class ResultadoPreLiquidacion:
+    """Tributos por línea (arrays en centavos) y totales de la factura"""
+    lineas: List[Dict]
+    fob: np.ndarray
+    flete: np.ndarray
+    seguro: np.ndarray
+    cif: np.ndarray
+    tributos: Dict[str, np.ndarray]
+    tasas: Dict[str, np.ndarray]
+    fuentes: List[str]
+    aplica_isd: bool
+    advertencias: List[str] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.lineas)
+
+    @cached_property
+    def total_tributos_senae(self) -> np.ndarray:
+        """Tributos liquidados por SENAE (sin ISD), por línea."""
+        return sum(self.tributos[t] for t in TRIBUTOS if t != 'isd')
+
+    def totales(self) -> Dict[str, Decimal]:
+        totales = {
+            'fob_usd': _centavos_a_decimal(self.fob.sum()),
+            'flete_usd': _centavos_a_decimal(self.flete.sum()),
+            'seguro_usd': _centavos_a_decimal(self.seguro.sum()),
+            'cif_usd': _centavos_a_decimal(self.cif.sum()),
+        }
+        for tributo in TRIBUTOS:
+            totales[f'{tributo}_usd'] = _centavos_a_decimal(self.tributos[tributo].sum())
+        totales['total_tributos_usd'] = _centavos_a_decimal(self.total_tributos_senae.sum())
+        totales['total_con_isd_usd'] = totales['total_tributos_usd'] + totales['isd_usd']
+        return totales
+
+    def linea(self, i: int) -> Dict:
+        datos = self.lineas[i]
+        tributos = {f'{t}_usd': float(_centavos_a_decimal(self.tributos[t][i])) for t in TRIBUTOS}
+        return {
+            'linea': i + 1,
+            'hs_code': datos.get('hs_code', ''),
+            'descripcion': datos.get('descripcion') or datos.get('description', ''),
+            'fuente_tasas': self.fuentes[i],
+            'tasas_pct': {t: int(self.tasas[t][i]) / 100 for t in self.tasas},
+            'fob_usd': float(_centavos_a_decimal(self.fob[i])),
+            'flete_usd': float(_centavos_a_decimal(self.flete[i])),
+            'seguro_usd': float(_centavos_a_decimal(self.seguro[i])),
+            'cif_usd': float(_centavos_a_decimal(self.cif[i])),
+            **tributos,
+            'total_tributos_usd': float(_centavos_a_decimal(self.total_tributos_senae[i])),
+        }
+
+    def to_dict(self) -> Dict:
+        return {
+            'total_lineas': len(self),
+            'aplica_isd': self.aplica_isd,
+            'lineas': [self.linea(i) for i in range(len(self))],
+            'totales': {k: float(v) for k, v in self.totales().items()},
+            'advertencias': self.advertencias,
+        }
+
+    def aplicar_a(self, pre_liquidation) -> None:
+        """Copia los totales en una PreLiquidation (sin guardar)."""
+        totales = self.totales()
+        pre_liquidation.fob_value_usd = totales['fob_usd']
+        pre_liquidation.freight_usd = totales['flete_usd']
+        pre_liquidation.insurance_usd = totales['seguro_usd']
+        pre_liquidation.cif_value_usd = totales['cif_usd']
+        pre_liquidation.ad_valorem_usd = totales['ad_valorem_usd']
+        pre_liquidation.fodinfa_usd = totales['fodinfa_usd']
+        pre_liquidation.ice_usd = totales['ice_usd']
+        pre_liquidation.salvaguardia_usd = totales['salvaguardia_usd']
+        pre_liquidation.iva_usd = totales['iva_usd']
+        pre_liquidation.total_tributos_usd = totales['total_tributos_usd']
+
+
+def _valor_fob_linea(linea: Dict):
+    for clave in ('fob_value_usd', 'valor_fob_usd', 'valor_usd', 'total_usd'):
+        if linea.get(clave) not in (None, ''):
+            return linea[clave]
+    cantidad, precio = linea.get('cantidad'), linea.get('precio_unitario')
+    if cantidad not in (None, '') and precio not in (None, ''):
+        try:
+            return Decimal(str(cantidad)) * Decimal(str(precio))
+        except InvalidOperation:
+            raise DutyEngineError(f"Cantidad o precio inválido: {cantidad!r} x {precio!r}")
+    return None
+
+
+def liquidar_factura(
+    lineas: Sequence[Dict],
+    flete_usd: Union[int, float, Decimal] = 0,
+    seguro_usd: Union[int, float, Decimal] = 0,
+    aplicar_isd: bool = False,
+    tasas: Optional[Dict[str, Dict]] = None,
+) -> ResultadoPreLiquidacion:
+    """
+    Pre-liquida una factura comercial de varias líneas.
+
+    Args:
+        lineas: [{'hs_code': '8471.30.00', 'descripcion': '...', 'fob_value_usd': 1200}, ...]
+            También acepta cantidad + precio_unitario, y 'ad_valorem_pct' / 'ice_pct'
+            para forzar la tasa de una línea.
+        flete_usd: Flete internacional de la factura (se prorratea por FOB)
+        seguro_usd: Seguro de la factura (se prorratea por FOB)
+        aplicar_isd: Si se calcula el ISD sobre el FOB
+        tasas: Tasas ya resueltas (resolver_tasas); si no se dan, se consultan
+
+    Returns:
+        ResultadoPreLiquidacion con tributos por línea y totales
+
+    Raises:
+        DutyEngineError: si la factura no tiene líneas o los valores son inválidos
+    """
+    if not lineas:
+        raise DutyEngineError("La factura no tiene líneas")
+
+    n = len(lineas)
+    advertencias: List[str] = []
+
+    fob = np.empty(n, dtype=np.int64)
+    for i, linea in enumerate(lineas):
+        valor = _valor_fob_linea(linea)
+        if valor is None:
+            raise DutyEngineError(f"Línea {i + 1}: falta el valor FOB")
+        fob[i] = _a_centavos(valor)
+
+    if tasas is None:
+        tasas = resolver_tasas(linea.get('hs_code', '') for linea in lineas)
+
+    matriz = {t: np.empty(n, dtype=np.int64) for t in TASAS_DEFAULT}
+    fuentes: List[str] = []
+    sin_tasa = set()
+    for i, linea in enumerate(lineas):
+        hs = normalizar_hs_code(linea.get('hs_code'))
+        encontrada = tasas.get(hs)
+        base = encontrada or TASAS_DEFAULT
+        fuente = encontrada['fuente'] if encontrada else 'default'
+        for tributo in TASAS_DEFAULT:
+            matriz[tributo][i] = base[tributo]
+        if linea.get('ad_valorem_pct') not in (None, ''):
+            matriz['ad_valorem'][i] = _a_tasa(linea['ad_valorem_pct'], TASAS_DEFAULT['ad_valorem'])
+            fuente = 'manual'
+        if linea.get('ice_pct') not in (None, ''):
+            matriz['ice'][i] = _a_tasa(linea['ice_pct'], TASAS_DEFAULT['ice'])
+            fuente = 'manual'
+        if fuente == 'default':
+            sin_tasa.add(linea.get('hs_code') or '(sin código)')
+        fuentes.append(fuente)
+
+    if sin_tasa:
+        advertencias.append(
+            f"Subpartidas sin tasa registrada (Ad-Valorem {TASAS_DEFAULT['ad_valorem'] / 100:.0f}% por defecto): "
+            + ", ".join(sorted(sin_tasa))
+        )
+
+    flete_total, seguro_total = _a_centavos(flete_usd), _a_centavos(seguro_usd)
+    if int(fob.sum()) == 0 and (flete_total or seguro_total):
+        raise DutyEngineError("El valor FOB total debe ser mayor que cero para prorratear flete y seguro")
+    flete = prorratear(flete_total, fob)
+    seguro = prorratear(seguro_total, fob)
+    cif = fob + flete + seguro
+
+    tributos: Dict[str, np.ndarray] = {}
+    for tributo in ('ad_valorem', 'fodinfa', 'ice', 'salvaguardia'):
+        tributos[tributo] = _redondear_half_up(cif * matriz[tributo], ESCALA_TASA)
+    base_iva = cif + tributos['ad_valorem'] + tributos['fodinfa'] + tributos['ice'] + tributos['salvaguardia']
+    tributos['iva'] = _redondear_half_up(base_iva * matriz['iva'], ESCALA_TASA)
+    if aplicar_isd:
+        tributos['isd'] = _redondear_half_up(fob * int(ISD_RATE * ESCALA_TASA), ESCALA_TASA)
+    else:
+        tributos['isd'] = np.zeros(n, dtype=np.int64)
+
+    return ResultadoPreLiquidacion(
+        lineas=list(lineas),
+        fob=fob,
+        flete=flete,
+        seguro=seguro,
+        cif=cif,
+        tributos=tributos,
+        tasas=matriz,
+        fuentes=fuentes,
+        aplica_isd=aplicar_isd,
+        advertencias=advertencias,
+    )
+
+
+def liquidar_factura_json(
+    lineas: Sequence[Dict],
+    flete_usd: Union[int, float, Decimal] = 0,
+    seguro_usd: Union[int, float, Decimal] = 0,
+    aplicar_isd: bool = False,
+) -> Dict:
+    """Versión JSON de liquidar_factura."""
+    try:
+        resultado = liquidar_factura(lineas, flete_usd=flete_usd, seguro_usd=seguro_usd, aplicar_isd=aplicar_isd)
+    except DutyEngineError as e:
+        return {"exito": False, "error": str(e)}
+    return {"exito": True, **resultado.to_dict()}
@@ -0,0 +1,356 @@
+"""
+Ecuador Gazetteer for ImportaYa.ia
+Nomenclátor local de provincias, cantones, ciudades, parroquias y zonas
+industriales de Ecuador.
+
+La validación de direcciones de transporte interno pedía a Gemini geocodificar
+cada dirección, incluidas las repetidas y las que solo cambian en mayúsculas o
+abreviaturas ("Av." / "Avenida", "GYE" / "Guayaquil"). El nomenclátor resuelve
+localmente:
+- la ciudad de destino por nombre o alias, con sus coordenadas de referencia
+- el sector, parroquia o zona industrial mencionado en la dirección, dentro
+  de esa ciudad
+- la zona del tarifario de transporte interno que cubre la ciudad
+
+Las coordenadas son centros aproximados (precisión de sector, no de calle).
+Los datos son estáticos; el índice de alias se compila una vez por proceso.
+"""
+import re
+import threading
+import unicodedata
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+TIPO_PROVINCIA = 'provincia'
+TIPO_CIUDAD = 'ciudad'
+TIPO_PARROQUIA = 'parroquia'
+TIPO_SECTOR = 'sector'
+TIPO_ZONA_INDUSTRIAL = 'zona_industrial'
+
+# Más alto = más específico
+PRECISION = {
+    TIPO_PROVINCIA: 0,
+    TIPO_CIUDAD: 1,
+    TIPO_PARROQUIA: 2,
+    TIPO_SECTOR: 3,
+    TIPO_ZONA_INDUSTRIAL: 3,
+}
+
+CONFIANZA = {
+    TIPO_PROVINCIA: 30,
+    TIPO_CIUDAD: 50,
+    TIPO_PARROQUIA: 70,
+    TIPO_SECTOR: 75,
+    TIPO_ZONA_INDUSTRIAL: 80,
+}
+
+# (provincia, capital, alias)
+PROVINCIAS = [
+    ('Azuay', 'Cuenca', ()),
+    ('Bolívar', 'Guaranda', ()),
+    ('Cañar', 'Azogues', ()),
+    ('Carchi', 'Tulcán', ()),
+    ('Chimborazo', 'Riobamba', ()),
+    ('Cotopaxi', 'Latacunga', ()),
+    ('El Oro', 'Machala', ()),
+    ('Esmeraldas', 'Esmeraldas', ()),
+    ('Galápagos', 'Puerto Baquerizo Moreno', ()),
+    ('Guayas', 'Guayaquil', ()),
+    ('Imbabura', 'Ibarra', ()),
+    ('Loja', 'Loja', ()),
+    ('Los Ríos', 'Babahoyo', ()),
+    ('Manabí', 'Portoviejo', ()),
+    ('Morona Santiago', 'Macas', ()),
+    ('Napo', 'Tena', ()),
+    ('Orellana', 'Francisco de Orellana', ()),
+    ('Pastaza', 'Puyo', ()),
+    ('Pichincha', 'Quito', ()),
+    ('Santa Elena', 'Santa Elena', ()),
+    ('Santo Domingo de los Tsáchilas', 'Santo Domingo', ('santo domingo de los tsachilas',)),
+    ('Sucumbíos', 'Nueva Loja', ()),
+    ('Tungurahua', 'Ambato', ()),
+    ('Zamora Chinchipe', 'Zamora', ()),
+]
+
+# (ciudad / cabecera cantonal, provincia, latitud, longitud, alias, zona del tarifario)
+# La zona solo se indica cuando el tarifario usa un nombre distinto al de la ciudad
+CIUDADES = [
+    ('Guayaquil', 'Guayas', '-2.1894', '-79.8891', ('gye', 'santiago de guayaquil'), 'PERIMETRO URBANO'),
+    ('Durán', 'Guayas', '-2.1700', '-79.8380', (), None),
+    ('Samborondón', 'Guayas', '-1.9628', '-79.7244', (), None),
+    ('Daule', 'Guayas', '-1.8619', '-79.9772', (), None),
+    ('Milagro', 'Guayas', '-2.1342', '-79.5872', (), None),
+    ('Playas', 'Guayas', '-2.6300', '-80.3900', ('general villamil', 'general villamil playas'), None),
+    ('Nobol', 'Guayas', '-1.9136', '-80.0014', (), None),
+    ('El Empalme', 'Guayas', '-1.0447', '-79.6350', (), None),
+    ('Quito', 'Pichincha', '-0.1807', '-78.4678', ('uio', 'san francisco de quito', 'distrito metropolitano de quito'), None),
+    ('Sangolquí', 'Pichincha', '-0.3126', '-78.4455', (), None),
+    ('Cayambe', 'Pichincha', '0.0406', '-78.1453', (), None),
+    ('Machachi', 'Pichincha', '-0.5100', '-78.5670', (), None),
+    ('Cuenca', 'Azuay', '-2.9001', '-79.0059', ('santa ana de los cuatro rios de cuenca',), None),
+    ('Guaranda', 'Bolívar', '-1.5926', '-79.0010', (), None),
+    ('Azogues', 'Cañar', '-2.7397', '-78.8486', (), None),
+    ('Tulcán', 'Carchi', '0.8119', '-77.7173', (), None),
+    ('Riobamba', 'Chimborazo', '-1.6636', '-78.6546', (), None),
+    ('Latacunga', 'Cotopaxi', '-0.9352', '-78.6155', (), None),
+    ('Machala', 'El Oro', '-3.2581', '-79.9554', (), None),
+    ('Pasaje', 'El Oro', '-3.3269', '-79.8070', (), None),
+    ('Santa Rosa', 'El Oro', '-3.4488', '-79.9596', (), None),
+    ('Huaquillas', 'El Oro', '-3.4814', '-80.2432', (), None),
+    ('Esmeraldas', 'Esmeraldas', '0.9682', '-79.6517', (), None),
+    ('Puerto Baquerizo Moreno', 'Galápagos', '-0.9017', '-89.6103', ('san cristobal',), None),
+    ('Puerto Ayora', 'Galápagos', '-0.7433', '-90.3150', ('santa cruz galapagos',), None),
+    ('Ibarra', 'Imbabura', '0.3517', '-78.1223', (), None),
+    ('Otavalo', 'Imbabura', '0.2343', '-78.2625', (), None),
+    ('Loja', 'Loja', '-3.9931', '-79.2042', (), None),
+    ('Babahoyo', 'Los Ríos', '-1.8022', '-79.5344', (), None),
+    ('Quevedo', 'Los Ríos', '-1.0286', '-79.4635', (), None),
+    ('Portoviejo', 'Manabí', '-1.0546', '-80.4545', (), None),
+    ('Manta', 'Manabí', '-0.9677', '-80.7089', (), None),
+    ('Montecristi', 'Manabí', '-1.0458', '-80.6589', (), None),
+    ('Chone', 'Manabí', '-0.6987', '-80.0936', (), None),
+    ('Jipijapa', 'Manabí', '-1.3486', '-80.5786', (), None),
+    ('Macas', 'Morona Santiago', '-2.3087', '-78.1114', (), None),
+    ('Tena', 'Napo', '-0.9938', '-77.8129', (), None),
+    ('Francisco de Orellana', 'Orellana', '-0.4625', '-76.9842', ('coca', 'el coca', 'puerto francisco de orellana'), None),
+    ('Puyo', 'Pastaza', '-1.4924', '-78.0024', (), None),
+    ('Santa Elena', 'Santa Elena', '-2.2262', '-80.8585', (), None),
+    ('La Libertad', 'Santa Elena', '-2.2333', '-80.9000', (), None),
+    ('Salinas', 'Santa Elena', '-2.2146', '-80.9520', (), None),
+    ('Santo Domingo', 'Santo Domingo de los Tsáchilas', '-0.2530', '-79.1754', ('santo domingo de los colorados', 'sto domingo'), None),
+    ('Nueva Loja', 'Sucumbíos', '0.0847', '-76.8828', ('lago agrio',), None),
+    ('Ambato', 'Tungurahua', '-1.2491', '-78.6168', (), None),
+    ('Zamora', 'Zamora Chinchipe', '-4.0692', '-78.9567', (), None),
+]
+
+# (nombre, tipo, ciudad, latitud, longitud, alias)
+SECTORES = [
+    # Guayaquil
+    ('Tarqui', TIPO_PARROQUIA, 'Guayaquil', '-2.1500', '-79.9100', ()),
+    ('Ximena', TIPO_PARROQUIA, 'Guayaquil', '-2.2300', '-79.8900', ()),
+    ('Febres Cordero', TIPO_PARROQUIA, 'Guayaquil', '-2.2000', '-79.9300', ()),
+    ('Pascuales', TIPO_PARROQUIA, 'Guayaquil', '-2.0770', '-79.9600', ()),
+    ('Chongón', TIPO_PARROQUIA, 'Guayaquil', '-2.2300', '-80.0800', ()),
+    ('Urdesa', TIPO_SECTOR, 'Guayaquil', '-2.1700', '-79.9100', ('urdesa central', 'urdesa norte')),
+    ('Kennedy', TIPO_SECTOR, 'Guayaquil', '-2.1690', '-79.9000', ('kennedy norte', 'ciudadela kennedy')),
+    ('Alborada', TIPO_SECTOR, 'Guayaquil', '-2.1380', '-79.9050', ('la alborada', 'ciudadela alborada')),
+    ('Sauces', TIPO_SECTOR, 'Guayaquil', '-2.1250', '-79.9000', ('los sauces',)),
+    ('Los Ceibos', TIPO_SECTOR, 'Guayaquil', '-2.1650', '-79.9450', ('ceibos',)),
+    ('Centro de Guayaquil', TIPO_SECTOR, 'Guayaquil', '-2.1940', '-79.8830', ('centro de guayaquil',)),
+    ('Vía a la Costa', TIPO_SECTOR, 'Guayaquil', '-2.1900', '-80.0000', ('via a la costa', 'via la costa')),
+    ('Parque Industrial Pascuales', TIPO_ZONA_INDUSTRIAL, 'Guayaquil', '-2.0800', '-79.9550', ('parque industrial pascuales',)),
+    ('Inmaconsa', TIPO_ZONA_INDUSTRIAL, 'Guayaquil', '-2.1150', '-79.9380', ('lotizacion industrial inmaconsa', 'parque industrial inmaconsa')),
+    ('Vía a Daule', TIPO_ZONA_INDUSTRIAL, 'Guayaquil', '-2.1000', '-79.9450', ('via a daule', 'via daule')),
+    ('Mapasingue', TIPO_ZONA_INDUSTRIAL, 'Guayaquil', '-2.1570', '-79.9300', ('mapasingue este', 'mapasingue oeste')),
+    ('Puerto Marítimo de Guayaquil', TIPO_ZONA_INDUSTRIAL, 'Guayaquil', '-2.2800', '-79.9100', ('puerto maritimo', 'contecon', 'terminal portuario de guayaquil')),
+    ('Posorja', TIPO_ZONA_INDUSTRIAL, 'Guayaquil', '-2.7019', '-80.2442', ('dp world posorja', 'puerto de posorja')),
+    # Durán y Samborondón
+    ('Vía Durán - Tambo', TIPO_ZONA_INDUSTRIAL, 'Durán', '-2.1800', '-79.8000', ('via duran tambo', 'duran tambo')),
+    ('La Puntilla', TIPO_PARROQUIA, 'Samborondón', '-2.1450', '-79.8660', ('puntilla',)),
+    # Quito
+    ('Calderón', TIPO_PARROQUIA, 'Quito', '-0.1000', '-78.4200', ('carapungo',)),
+    ('Conocoto', TIPO_PARROQUIA, 'Quito', '-0.2920', '-78.4770', ()),
+    ('Cumbayá', TIPO_PARROQUIA, 'Quito', '-0.2010', '-78.4300', ()),
+    ('Tumbaco', TIPO_PARROQUIA, 'Quito', '-0.2130', '-78.4000', ()),
+    ('Pomasqui', TIPO_PARROQUIA, 'Quito', '-0.0500', '-78.4550', ()),
+    ('Pifo', TIPO_PARROQUIA, 'Quito', '-0.2300', '-78.3380', ()),
+    ('Quitumbe', TIPO_PARROQUIA, 'Quito', '-0.2900', '-78.5500', ()),
+    ('Tababela', TIPO_ZONA_INDUSTRIAL, 'Quito', '-0.1250', '-78.3600', ('aeropuerto mariscal sucre', 'zede quito')),
+    ('Parque Industrial Itulcachi', TIPO_ZONA_INDUSTRIAL, 'Quito', '-0.2410', '-78.3010', ('itulcachi',)),
+    ('Carcelén Industrial', TIPO_ZONA_INDUSTRIAL, 'Quito', '-0.0900', '-78.4700', ('carcelen industrial', 'parque industrial carcelen')),
+    ('Turubamba', TIPO_ZONA_INDUSTRIAL, 'Quito', '-0.3000', '-78.5450', ('sector industrial sur',)),
+    # Otras ciudades
+    ('Parque Industrial de Cuenca', TIPO_ZONA_INDUSTRIAL, 'Cuenca', '-2.8750', '-78.9850', ('parque industrial cuenca',)),
+    ('Puerto de Manta', TIPO_ZONA_INDUSTRIAL, 'Manta', '-0.9400', '-80.7250', ('puerto manta', 'terminal portuario de manta')),
+    ('Puerto Bolívar', TIPO_ZONA_INDUSTRIAL, 'Machala', '-3.2667', '-80.0000', ('puerto bolivar',)),
+    ('Parque Industrial Ambato', TIPO_ZONA_INDUSTRIAL, 'Ambato', '-1.2100', '-78.6000', ('parque industrial de ambato',)),
+]
+
+# Abreviaturas frecuentes en direcciones ecuatorianas
+ABREVIATURAS = {
+    'av': 'avenida',
+    'avda': 'avenida',
+    'cdla': 'ciudadela',
+    'cda': 'ciudadela',
+    'urb': 'urbanizacion',
+    'mz': 'manzana',
+    'mzn': 'manzana',
+    'sl': 'solar',
+    'nro': 'numero',
+    'num': 'numero',
+    'pq': 'parque',
+    'ind': 'industrial',
+    'pto': 'puerto',
+    'sto': 'santo',
+    'sta': 'santa',
+}
+
+# Un lugar precedido por estas palabras es el nombre de una calle ("Av. Quito", "Calle Tarqui")
+PALABRAS_CALLE = {'avenida', 'calle', 'pasaje', 'callejon', 'malecon', 'boulevard'}
+
+_RE_NO_ALFANUMERICO = re.compile(r'[^0-9a-z]+')
+
+
+def normalizar_direccion(texto: str) -> str:
+    """Minúsculas sin acentos ni signos, con abreviaturas expandidas."""
+    texto = unicodedata.normalize('NFKD', (texto or '').lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    tokens = _RE_NO_ALFANUMERICO.sub(' ', texto).split()
+    return ' '.join(ABREVIATURAS.get(token, token) for token in tokens)
+
+
+@dataclass(frozen=True)
+class Lugar:
+    """Entrada del nomenclátor."""
+    nombre: str
+    tipo: str
+    provincia: str
+    ciudad: str
+    latitud: Decimal
+    longitud: Decimal
+    zona_tarifa: Optional[str] = None
+
+    @property
+    def precision(self) -> int:
+        return PRECISION[self.tipo]
+
+    @property
+    def confianza(self) -> int:
+        return CONFIANZA[self.tipo]
+
+    def google_maps_link(self) -> str:
+        return f"https://www.google.com/maps?q={self.latitud},{self.longitud}"
+
+
+@dataclass(frozen=True)
+class Ubicacion:
+    """Resolución local de una dirección: la ciudad y el lugar más específico encontrado."""
+    ciudad: Lugar
+    lugar: Lugar
+    alias: str
+
+    @property
+    def precision(self) -> int:
+        return self.lugar.precision
+
+    @property
+    def confianza(self) -> int:
+        return self.lugar.confianza
+
+
+class Gazetteer:
+    """Índice de alias normalizados -> lugares."""
+
+    def __init__(self):
+        self.lugares: List[Lugar] = []
+        self._ciudades: Dict[str, Lugar] = {}
+        self._provincias: Dict[str, Lugar] = {}
+        # Primer token del alias -> [(tokens del alias, lugar)]
+        self._por_token: Dict[str, List[Tuple[Tuple[str, ...], Lugar]]] = {}
+
+        for nombre, provincia, lat, lng, alias, zona in CIUDADES:
+            lugar = Lugar(nombre, TIPO_CIUDAD, provincia, nombre, Decimal(lat), Decimal(lng), zona)
+            self._agregar(lugar, alias)
+            for texto in (nombre,) + alias:
+                self._ciudades.setdefault(normalizar_direccion(texto), lugar)
+
+        for provincia, capital, alias in PROVINCIAS:
+            sede = self._ciudades[normalizar_direccion(capital)]
+            lugar = Lugar(provincia, TIPO_PROVINCIA, provincia, capital, sede.latitud, sede.longitud, sede.zona_tarifa)
+            self._agregar(lugar, alias)
+            for texto in (provincia,) + alias:
+                self._provincias[normalizar_direccion(texto)] = lugar
+
+        for nombre, tipo, ciudad, lat, lng, alias in SECTORES:
+            sede = self._ciudades[normalizar_direccion(ciudad)]
+            self._agregar(Lugar(nombre, tipo, sede.provincia, sede.nombre, Decimal(lat), Decimal(lng), sede.zona_tarifa), alias)
+
+    def _agregar(self, lugar: Lugar, alias: Tuple[str, ...]) -> None:
+        self.lugares.append(lugar)
+        vistos = set()
+        for texto in (lugar.nombre,) + tuple(alias):
+            tokens = tuple(normalizar_direccion(texto).split())
+            if tokens and tokens not in vistos:
+                vistos.add(tokens)
+                self._por_token.setdefault(tokens[0], []).append((tokens, lugar))
+
+    def __len__(self) -> int:
+        return len(self.lugares)
+
+    def ciudad(self, texto: str) -> Optional[Lugar]:
+        """Ciudad por nombre o alias exacto ("GYE", "Durán", "Quito, Pichincha")."""
+        clave = normalizar_direccion(texto)
+        if not clave:
+            return None
+        lugar = self._ciudades.get(clave)
+        if lugar is None:
+            # "Quito, Pichincha" / "Guayaquil - Guayas": ciudad seguida de su provincia
+            for provincia in self._provincias:
+                if clave.endswith(' ' + provincia):
+                    lugar = self._ciudades.get(clave[:-len(provincia) - 1])
+                    if lugar is not None and normalizar_direccion(lugar.provincia) == provincia:
+                        break
+                    lugar = None
+        return lugar
+
+    def _coincidencias(self, texto: str) -> List[Tuple[str, Lugar]]:
+        tokens = normalizar_direccion(texto).split()
+        encontrados = []
+        for i, token in enumerate(tokens):
+            for alias, lugar in self._por_token.get(token, ()):
+                if tuple(tokens[i:i + len(alias)]) != alias:
+                    continue
+                if i > 0 and tokens[i - 1] in PALABRAS_CALLE:
+                    continue
+                encontrados.append((' '.join(alias), lugar))
+        return encontrados
+
+    def ubicar(self, direccion: str, ciudad: str = '') -> Optional[Ubicacion]:
+        """
+        Lugar más específico de la dirección dentro de la ciudad indicada.
+
+        Si la ciudad no está en el nomenclátor se usa la única ciudad
+        mencionada en la dirección. Los sectores de otras ciudades se
+        ignoran (muchas calles llevan nombres de ciudades o parroquias).
+        """
+        coincidencias = self._coincidencias(direccion)
+        sede = self.ciudad(ciudad)
+        if sede is None:
+            ciudades = {lugar for _, lugar in coincidencias if lugar.tipo == TIPO_CIUDAD}
+            if len(ciudades) != 1:
+                return None
+            sede = ciudades.pop()
+
+        mejor = (sede, sede.nombre)
+        for alias, lugar in coincidencias:
+            if lugar.ciudad != sede.nombre or lugar.precision <= PRECISION[TIPO_CIUDAD]:
+                continue
+            if (lugar.precision, len(alias)) > (mejor[0].precision, len(mejor[1])):
+                mejor = (lugar, alias)
+        return Ubicacion(ciudad=sede, lugar=mejor[0], alias=mejor[1])
+
+    def zonas_tarifarias(self, ciudad: str) -> List[str]:
+        """Nombres con los que buscar la ciudad en los tarifarios: canónico y zona."""
+        lugar = self.ciudad(ciudad)
+        if lugar is None:
+            return []
+        return [nombre for nombre in (lugar.nombre, lugar.zona_tarifa) if nombre]
+
+    def zona_tarifaria(self, ciudad: str) -> Optional[str]:
+        """Zona del tarifario de transporte interno para la ciudad ("GYE" -> "PERIMETRO URBANO")."""
+        zonas = self.zonas_tarifarias(ciudad)
+        return zonas[-1] if zonas else None
+
+
+_gazetteer: Optional[Gazetteer] = None
+_gazetteer_lock = threading.Lock()
+
+
+def obtener_gazetteer() -> Gazetteer:
+    global _gazetteer
+    if _gazetteer is None:
+        with _gazetteer_lock:
+            if _gazetteer is None:
+                _gazetteer = Gazetteer()
+    return _gazetteer
@@ -0,0 +1,501 @@
+"""
+Gemini Gateway for ImportaYa.ia
+Capa única frente al cliente de Gemini.
+
+El gateway es dueño del cliente (genai.Client creado una sola vez por
+proceso) y toda llamada a generate_content pasa por aquí:
+
+- Single-flight: cuando llegan a la vez muchas solicitudes con la misma
+  descripción (p. ej. una campaña), las llamadas concurrentes con el mismo
+  prompt normalizado (modelo + contenido + configuración, espacios
+  colapsados y sin distinguir mayúsculas) comparten una sola llamada en
+  vuelo; todas reciben el mismo resultado (o la misma excepción). No es un
+  caché: terminada la llamada, la siguiente vuelve a emitirse.
+- Plazo por llamada (GEMINI_TIMEOUT_S, o timeout= por llamada): la espera
+  se corta en el plazo, para que un API lento no retenga a los workers de
+  gunicorn hasta su timeout de 120 s. El cliente HTTP se crea además con
+  GEMINI_HTTP_TIMEOUT_S para que las llamadas abandonadas no queden colgadas.
+- Semáforo global (GEMINI_MAX_CONCURRENCY): si no se libera un cupo en
+  GEMINI_SLOT_WAIT_S (unos milisegundos, nunca el plazo completo) la
+  llamada se rechaza con GeminiBusyError, sin retener al worker.
+- Circuit breaker: tras GEMINI_CIRCUIT_FAILURES fallos consecutivos el
+  circuito se abre durante GEMINI_CIRCUIT_RESET_S segundos; disponible()
+  devuelve False y los servicios usan directamente sus fallbacks por
+  palabras clave / base de datos. Pasado ese tiempo se permite una llamada
+  de prueba que cierra el circuito si tiene éxito.
+
+generate_content_stream() aplica el mismo circuito y semáforo a las
+respuestas en flujo (chat del asistente); no pasa por single-flight y el
+cupo se libera cuando el flujo termina, falla o se cierra.
+
+obtener_metricas() expone contadores de llamadas, coalescencia, errores,
+timeouts, rechazos, cancelaciones y latencia.
+
+El cliente también se puede recibir como parámetro, de modo que las pruebas
+pueden usar un cliente local falso con la misma interfaz
+(client.models.generate_content).
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Valores por defecto (sobrescribibles en settings)
+GEMINI_TIMEOUT_S = 20.0
+GEMINI_HTTP_TIMEOUT_S = 90.0
+GEMINI_MAX_CONCURRENCY = 4
+GEMINI_SLOT_WAIT_S = 0.05
+GEMINI_CIRCUIT_FAILURES = 5
+GEMINI_CIRCUIT_RESET_S = 30.0
+
+LATENCIAS_MUESTRA = 500
+
+
+class GeminiGatewayError(Exception):
+    """Llamada a Gemini no realizada o fallida en el gateway"""
+    pass
+
+
+class GeminiUnavailableError(GeminiGatewayError):
+    """Sin cliente configurado o circuito abierto"""
+    pass
+
+
+class GeminiBusyError(GeminiGatewayError):
+    """Sin cupo en el semáforo global"""
+    pass
+
+
+class GeminiTimeoutError(GeminiGatewayError):
+    """La llamada excedió su plazo"""
+    pass
+
+
+def _setting(nombre: str, default):
+    try:
+        from django.conf import settings
+        return type(default)(getattr(settings, nombre, default))
+    except Exception:
+        return default
+
+
+class _Vuelo:
+    __slots__ = ('listo', 'resultado', 'error', 'esperando')
+
+    def __init__(self):
+        self.listo = threading.Event()
+        self.resultado = None
+        self.error = None
+        self.esperando = 0
+
+
+class SingleFlight:
+    """
+    Coalescencia de llamadas concurrentes con la misma clave,
+    con contadores de llamadas emitidas y coalescidas.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._en_vuelo: Dict[Hashable, _Vuelo] = {}
+        self.emitidas = 0
+        self.coalescidas = 0
+
+    def do(self, clave: Hashable, funcion: Callable[[], Any]) -> Any:
+        with self._lock:
+            vuelo = self._en_vuelo.get(clave)
+            if vuelo is not None:
+                vuelo.esperando += 1
+                self.coalescidas += 1
+                lider = False
+            else:
+                vuelo = _Vuelo()
+                self._en_vuelo[clave] = vuelo
+                self.emitidas += 1
+                lider = True
+
+        if not lider:
+            vuelo.listo.wait()
+            if vuelo.error is not None:
+                raise vuelo.error
+            return vuelo.resultado
+
+        try:
+            vuelo.resultado = funcion()
+        except BaseException as e:
+            vuelo.error = e
+            raise
+        finally:
+            with self._lock:
+                self._en_vuelo.pop(clave, None)
+            vuelo.listo.set()
+        return vuelo.resultado
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.emitidas + self.coalescidas
+            return {
+                'emitidas': self.emitidas,
+                'coalescidas': self.coalescidas,
+                'en_vuelo': len(self._en_vuelo),
+                'tasa_coalescencia': round(self.coalescidas / total, 4) if total else 0.0,
+            }
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.emitidas = 0
+            self.coalescidas = 0
+
+
+_single_flight = SingleFlight()
+
+
+def _normalizar(valor: Any) -> Any:
+    """
+    Forma canónica de modelo / contenido / configuración para la clave:
+    texto con espacios colapsados y en minúsculas, bytes por su hash.
+    """
+    if valor is None or isinstance(valor, (bool, int, float)):
+        return valor
+    if isinstance(valor, str):
+        return ' '.join(valor.split()).casefold()
+    if isinstance(valor, (bytes, bytearray)):
+        return 'sha256:' + hashlib.sha256(valor).hexdigest()
+    if isinstance(valor, dict):
+        return {str(k): _normalizar(v) for k, v in valor.items() if v is not None}
+    if isinstance(valor, (list, tuple)):
+        return [_normalizar(v) for v in valor]
+    # Tipos de google.genai (pydantic)
+    if hasattr(valor, 'model_dump'):
+        return _normalizar(valor.model_dump(exclude_none=True))
+    if hasattr(valor, '__dict__'):
+        return _normalizar(vars(valor))
+    return _normalizar(str(valor))
+
+
+def clave_prompt(model: str, contents: Any, config: Any = None) -> str:
+    """Clave single-flight de una llamada a generate_content."""
+    canonico = json.dumps(
+        [_normalizar(model), _normalizar(contents), _normalizar(config)],
+        sort_keys=True, ensure_ascii=False, default=str,
+    )
+    return hashlib.sha256(canonico.encode('utf-8')).hexdigest()
+
+
+class CircuitBreaker:
+    """
+    Circuito de tres estados: cerrado -> abierto tras `umbral` fallos
+    consecutivos -> semiabierto (una llamada de prueba) tras `espera_s`.
+    """
+
+    CERRADO = 'cerrado'
+    ABIERTO = 'abierto'
+    SEMIABIERTO = 'semiabierto'
+
+    def __init__(self, umbral: int = GEMINI_CIRCUIT_FAILURES, espera_s: float = GEMINI_CIRCUIT_RESET_S,
+                 reloj: Callable[[], float] = time.monotonic):
+        self.umbral = umbral
+        self.espera_s = espera_s
+        self._reloj = reloj
+        self._lock = threading.Lock()
+        self.estado = self.CERRADO
+        self.fallos_consecutivos = 0
+        self.aperturas = 0
+        self._abierto_desde = 0.0
+        self._prueba_en_curso = False
+
+    def _expirado(self) -> bool:
+        return self._reloj() - self._abierto_desde >= self.espera_s
+
+    def disponible(self) -> bool:
+        """Sin efectos: ¿se permitiría una llamada ahora?"""
+        with self._lock:
+            if self.estado == self.ABIERTO:
+                return self._expirado()
+            if self.estado == self.SEMIABIERTO:
+                return not self._prueba_en_curso
+            return True
+
+    def permitir(self) -> bool:
+        """Reserva la llamada; en semiabierto solo pasa una de prueba."""
+        with self._lock:
+            if self.estado == self.ABIERTO:
+                if not self._expirado():
+                    return False
+                self.estado = self.SEMIABIERTO
+                self._prueba_en_curso = False
+            if self.estado == self.SEMIABIERTO:
+                if self._prueba_en_curso:
+                    return False
+                self._prueba_en_curso = True
+            return True
+
+    def cancelar(self) -> None:
+        """La llamada reservada con permitir() no llegó a emitirse."""
+        with self._lock:
+            self._prueba_en_curso = False
+
+    def registrar_exito(self) -> None:
+        with self._lock:
+            self.estado = self.CERRADO
+            self.fallos_consecutivos = 0
+            self._prueba_en_curso = False
+
+    def registrar_fallo(self) -> None:
+        with self._lock:
+            self.fallos_consecutivos += 1
+            self._prueba_en_curso = False
+            if self.estado == self.SEMIABIERTO or self.fallos_consecutivos >= self.umbral:
+                if self.estado != self.ABIERTO:
+                    self.aperturas += 1
+                    logger.warning(
+                        f"Circuito de Gemini abierto tras {self.fallos_consecutivos} fallos consecutivos "
+                        f"({self.espera_s:.0f}s)"
+                    )
+                self.estado = self.ABIERTO
+                self._abierto_desde = self._reloj()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'circuito': self.estado,
+                'fallos_consecutivos': self.fallos_consecutivos,
+                'aperturas': self.aperturas,
+            }
+
+
+class _MetricasLlamadas:
+    """Contadores de resultado y latencias recientes de las llamadas emitidas."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.exitos = 0
+        self.errores = 0
+        self.timeouts = 0
+        self.rechazadas_circuito = 0
+        self.rechazadas_saturacion = 0
+        self.canceladas = 0
+        self._latencias = deque(maxlen=LATENCIAS_MUESTRA)
+
+    def registrar(self, campo: str, latencia_s: Optional[float] = None) -> None:
+        with self._lock:
+            setattr(self, campo, getattr(self, campo) + 1)
+            if latencia_s is not None:
+                self._latencias.append(latencia_s * 1000)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            latencias = sorted(self._latencias)
+            return {
+                'exitos': self.exitos,
+                'errores': self.errores,
+                'timeouts': self.timeouts,
+                'rechazadas_circuito': self.rechazadas_circuito,
+                'rechazadas_saturacion': self.rechazadas_saturacion,
+                'canceladas': self.canceladas,
+                'latencia_ms_promedio': round(sum(latencias) / len(latencias), 1) if latencias else 0.0,
+                'latencia_ms_p95': round(latencias[int(0.95 * (len(latencias) - 1))], 1) if latencias else 0.0,
+            }
+
+
+class GeminiGateway:
+    """
+    Plazo, semáforo global y circuit breaker alrededor de una llamada.
+    El semáforo se libera cuando la llamada termina de verdad (no al vencer
+    el plazo), así el tope de concurrencia también cubre llamadas colgadas.
+    """
+
+    def __init__(self, timeout_s: float = GEMINI_TIMEOUT_S, max_concurrencia: int = GEMINI_MAX_CONCURRENCY,
+                 breaker: Optional[CircuitBreaker] = None, espera_cupo_s: float = GEMINI_SLOT_WAIT_S):
+        self.timeout_s = timeout_s
+        self.max_concurrencia = max_concurrencia
+        self.espera_cupo_s = espera_cupo_s
+        self.breaker = breaker or CircuitBreaker()
+        self.metricas = _MetricasLlamadas()
+        self._semaforo = threading.BoundedSemaphore(max_concurrencia)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrencia, thread_name_prefix='gemini-gateway')
+
+    def _reservar_cupo(self, plazo: float) -> None:
+        """Espera de cupo breve: con el semáforo lleno se rechaza en milisegundos, no al vencer el plazo."""
+        if not self._semaforo.acquire(timeout=min(self.espera_cupo_s, plazo)):
+            # Saturación local: no cuenta como fallo del API
+            self.breaker.cancelar()
+            self.metricas.registrar('rechazadas_saturacion')
+            raise GeminiBusyError(f"Sin cupo para llamar a Gemini ({self.max_concurrencia} en curso)")
+
+    def llamar(self, funcion: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        plazo = timeout if timeout is not None else self.timeout_s
+        inicio = time.monotonic()
+
+        if not self.breaker.permitir():
+            self.metricas.registrar('rechazadas_circuito')
+            raise GeminiUnavailableError("Circuito de Gemini abierto")
+
+        self._reservar_cupo(plazo)
+
+        def ejecutar():
+            try:
+                return funcion()
+            finally:
+                self._semaforo.release()
+
+        futuro = self._executor.submit(ejecutar)
+        try:
+            resultado = futuro.result(timeout=max(0.0, plazo - (time.monotonic() - inicio)))
+        except FuturesTimeout:
+            self.breaker.registrar_fallo()
+            self.metricas.registrar('timeouts', time.monotonic() - inicio)
+            raise GeminiTimeoutError(f"Gemini no respondió en {plazo:.1f}s")
+        except Exception:
+            self.breaker.registrar_fallo()
+            self.metricas.registrar('errores', time.monotonic() - inicio)
+            raise
+
+        self.breaker.registrar_exito()
+        self.metricas.registrar('exitos', time.monotonic() - inicio)
+        return resultado
+
+    def llamar_stream(self, abrir: Callable[[], Iterable], timeout: Optional[float] = None) -> Iterator:
+        """
+        Versión en flujo de llamar(): reserva circuito y cupo al pedir el
+        primer fragmento y los libera al terminar, fallar o cerrarse el
+        generador (cancelación). La espera de cupo es la misma breve de
+        llamar(); la duración del flujo la acota el timeout HTTP del cliente.
+        """
+        plazo = timeout if timeout is not None else self.timeout_s
+        inicio = time.monotonic()
+
+        if not self.breaker.permitir():
+            self.metricas.registrar('rechazadas_circuito')
+            raise GeminiUnavailableError("Circuito de Gemini abierto")
+
+        self._reservar_cupo(plazo)
+
+        flujo = None
+        try:
+            flujo = iter(abrir())
+            for fragmento in flujo:
+                yield fragmento
+        except GeneratorExit:
+            # El consumidor cerró el flujo: se corta la respuesta HTTP; ni éxito ni fallo del API
+            if hasattr(flujo, 'close'):
+                flujo.close()
+            self.breaker.cancelar()
+            self.metricas.registrar('canceladas', time.monotonic() - inicio)
+            raise
+        except Exception:
+            self.breaker.registrar_fallo()
+            self.metricas.registrar('errores', time.monotonic() - inicio)
+            raise
+        else:
+            self.breaker.registrar_exito()
+            self.metricas.registrar('exitos', time.monotonic() - inicio)
+        finally:
+            self._semaforo.release()
+
+    def stats(self) -> Dict:
+        datos = self.metricas.stats()
+        datos.update(self.breaker.stats())
+        datos['max_concurrencia'] = self.max_concurrencia
+        datos['timeout_s'] = self.timeout_s
+        return datos
+
+
+_gateway: Optional[GeminiGateway] = None
+_client = None
+_client_creado = False
+_init_lock = threading.Lock()
+
+
+def get_gateway() -> GeminiGateway:
+    global _gateway
+    if _gateway is None:
+        with _init_lock:
+            if _gateway is None:
+                _gateway = GeminiGateway(
+                    timeout_s=_setting('GEMINI_TIMEOUT_S', GEMINI_TIMEOUT_S),
+                    max_concurrencia=_setting('GEMINI_MAX_CONCURRENCY', GEMINI_MAX_CONCURRENCY),
+                    espera_cupo_s=_setting('GEMINI_SLOT_WAIT_S', GEMINI_SLOT_WAIT_S),
+                    breaker=CircuitBreaker(
+                        umbral=_setting('GEMINI_CIRCUIT_FAILURES', GEMINI_CIRCUIT_FAILURES),
+                        espera_s=_setting('GEMINI_CIRCUIT_RESET_S', GEMINI_CIRCUIT_RESET_S),
+                    ),
+                )
+    return _gateway
+
+
+def get_client():
+    """
+    Cliente de Gemini del proceso (None sin GEMINI_API_KEY o sin google-genai).
+    Se crea una vez, con GEMINI_HTTP_TIMEOUT_S como timeout HTTP.
+    """
+    global _client, _client_creado
+    if not _client_creado:
+        with _init_lock:
+            if not _client_creado:
+                api_key = os.environ.get('GEMINI_API_KEY')
+                if api_key:
+                    from google import genai
+                    from google.genai import types
+                    timeout_ms = int(_setting('GEMINI_HTTP_TIMEOUT_S', GEMINI_HTTP_TIMEOUT_S) * 1000)
+                    _client = genai.Client(api_key=api_key, http_options=types.HttpOptions(timeout=timeout_ms))
+                _client_creado = True
+    return _client
+
+
+def disponible(client=None) -> bool:
+    """Hay cliente y el circuito permite llamadas; si no, usar el fallback."""
+    if client is None:
+        client = get_client()
+    return client is not None and get_gateway().breaker.disponible()
+
+
+def generate_content(client, model: str, contents: Any, config: Any = None, timeout: Optional[float] = None):
+    """
+    client.models.generate_content a través del gateway: single-flight,
+    plazo, semáforo global y circuit breaker. client=None usa el del gateway.
+    """
+    if client is None:
+        client = get_client()
+        if client is None:
+            raise GeminiUnavailableError("Gemini no configurado (GEMINI_API_KEY)")
+
+    kwargs = {'model': model, 'contents': contents}
+    if config is not None:
+        kwargs['config'] = config
+    gateway = get_gateway()
+    return _single_flight.do(
+        clave_prompt(model, contents, config),
+        lambda: gateway.llamar(lambda: client.models.generate_content(**kwargs), timeout=timeout),
+    )
+
+
+def generate_content_stream(client, model: str, contents: Any, config: Any = None,
+                            timeout: Optional[float] = None) -> Iterator:
+    """
+    client.models.generate_content_stream a través del circuito y el
+    semáforo del gateway. Cerrar el generador cancela el flujo y libera el cupo.
+    """
+    if client is None:
+        client = get_client()
+        if client is None:
+            raise GeminiUnavailableError("Gemini no configurado (GEMINI_API_KEY)")
+
+    kwargs = {'model': model, 'contents': contents}
+    if config is not None:
+        kwargs['config'] = config
+    return get_gateway().llamar_stream(lambda: client.models.generate_content_stream(**kwargs), timeout=timeout)
+
+
+def obtener_metricas() -> Dict:
+    """Contadores de single-flight, resultados, circuito y latencia."""
+    datos = _single_flight.stats()
+    datos.update(get_gateway().stats())
+    return datos
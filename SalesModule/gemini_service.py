@@ -3,22 +3,24 @@ Gemini AI Service for ImportaYa.ia
 Uses google-genai SDK with user's GEMINI_API_KEY
 Enhanced with SENAE Ecuador 2025 regulations knowledge
 """
-import os
 import json
 import logging
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FuturesTimeout
 from decimal import Decimal
 
+from . import gemini_gateway
+
 logger = logging.getLogger(__name__)
 
 GEMINI_AVAILABLE = False
 client = None
 
 try:
-    api_key = os.environ.get("GEMINI_API_KEY")
-    if api_key:
-        from google import genai
-        from google.genai import types
-        client = genai.Client(api_key=api_key)
+    # El gateway es dueño del cliente (plazos, concurrencia, circuit breaker)
+    client = gemini_gateway.get_client()
+    if client is not None:
         GEMINI_AVAILABLE = True
         logger.info("Gemini AI client initialized successfully")
     else:
@@ -26,6 +28,13 @@ try:
 except Exception as e:
     logger.error(f"Failed to initialize Gemini client: {e}")
 
+# Los documentos (PDF/imágenes en base64) tardan más que un prompt de texto
+DOCUMENT_EXTRACTION_TIMEOUT_S = 60.0
+
+
+# Deadline of the generate_intelligent_quote pipeline (overridable in settings)
+INTELLIGENT_QUOTE_TIMEOUT_S = 25.0
+
 
 SENAE_TRIBUTOS_2025 = {
     'iva_rate': Decimal('0.15'),
@@ -349,77 +358,32 @@ def _normalize_text(text: str) -> str:
     return ''.join(c for c in normalized if not unicodedata.combining(c))
 
 
-def _search_hs_database(product_description: str) -> dict:
-    """Search HSCodeEntry database for matching product"""
-    try:
-        from .models import HSCodeEntry
-        
-        entries = HSCodeEntry.search_by_keywords(product_description)
-        if entries.exists():
-            entry = entries.first()
-            permit_info = None
-            if entry.requires_permit and entry.permit_institution:
-                permit_info = {
-                    'institucion': entry.permit_institution,
-                    'permiso': entry.permit_name,
-                    'descripcion': f'Permiso de {entry.permit_institution}',
-                    'tramite_previo': True,
-                    'tiempo_estimado': entry.permit_processing_days or '15-30 dias habiles'
-                }
-            
-            return {
-                'suggested_hs_code': entry.hs_code,
-                'confidence': 90,
-                'reasoning': f'Clasificacion desde base de datos: {entry.description}',
-                'category': entry.category or '',
-                'notes': entry.notes or '',
-                'ai_status': 'database_match',
-                'ad_valorem_rate': float(entry.ad_valorem_rate) if entry.ad_valorem_rate else 0,
-                'requires_permit': entry.requires_permit,
-                'permit_info': permit_info,
-                'tributos_2025': {
-                    'iva_rate': float(SENAE_TRIBUTOS_2025['iva_rate']),
-                    'fodinfa_rate': float(SENAE_TRIBUTOS_2025['fodinfa_rate']),
-                    'ad_valorem_rate': float(entry.ad_valorem_rate) if entry.ad_valorem_rate else 0,
-                    'ice_rate': float(entry.ice_rate) if entry.ice_rate else 0
-                }
-            }
-    except Exception as e:
-        logger.warning(f"Error searching HS database: {e}")
-    
-    return None
-
-
 def _fallback_hs_suggestion(product_description: str) -> dict:
-    """Keyword-based fallback when Gemini is unavailable. Priority: Database > Dictionary"""
-    
-    db_result = _search_hs_database(product_description)
-    if db_result:
-        return db_result
+    """Keyword-based fallback when Gemini is unavailable, from HS_KEYWORD_MAPPING"""
+    from .hs_matcher import obtener_matcher
     
-    description = _normalize_text(product_description)
-    
-    for keyword, (hs_code, confidence, reasoning, category, permit_key, ad_valorem) in HS_KEYWORD_MAPPING.items():
-        if keyword in description:
-            permit_info = _get_permit_info(permit_key)
-            
-            result = {
-                'suggested_hs_code': hs_code,
-                'confidence': confidence,
-                'reasoning': f'Clasificacion basada en palabra clave "{keyword}": {reasoning}',
-                'category': category,
-                'notes': '',
-                'ai_status': 'fallback_keyword',
-                'ad_valorem_rate': float(ad_valorem),
-                'requires_permit': permit_info is not None,
-                'permit_info': permit_info,
-                'tributos_2025': {
-                    'iva_rate': float(SENAE_TRIBUTOS_2025['iva_rate']),
-                    'fodinfa_rate': float(SENAE_TRIBUTOS_2025['fodinfa_rate']),
-                    'ad_valorem_rate': float(ad_valorem)
-                }
+    candidate = obtener_matcher().mejor(product_description)
+    if candidate is not None:
+        keyword = candidate.ref
+        hs_code, confidence, reasoning, category, permit_key, ad_valorem = HS_KEYWORD_MAPPING[keyword]
+        permit_info = _get_permit_info(permit_key)
+        
+        return {
+            'suggested_hs_code': hs_code,
+            'confidence': confidence,
+            'reasoning': f'Clasificacion basada en palabra clave "{keyword}": {reasoning}',
+            'category': category,
+            'notes': '',
+            'ai_status': 'fallback_keyword',
+            'ad_valorem_rate': float(ad_valorem),
+            'requires_permit': permit_info is not None,
+            'permit_info': permit_info,
+            'tributos_2025': {
+                'iva_rate': float(SENAE_TRIBUTOS_2025['iva_rate']),
+                'fodinfa_rate': float(SENAE_TRIBUTOS_2025['fodinfa_rate']),
+                'ad_valorem_rate': float(ad_valorem)
             }
-            return result
+        }
     
     return {
         'suggested_hs_code': '9999.00.00',
@@ -439,20 +403,44 @@ def _fallback_hs_suggestion(product_description: str) -> dict:
     }
 
 
-def suggest_hs_code(product_description: str, origin_country: str = "", fob_value: float = 0) -> dict:
-    """
-    Use Gemini AI to suggest an HS code for a product description.
-    Falls back to keyword matching if Gemini is unavailable.
-    Returns: dict with suggested_hs_code, confidence, reasoning, permit info, tributos
-    """
-    if not GEMINI_AVAILABLE or client is None:
-        logger.info("Using fallback HS code suggestion (Gemini unavailable)")
-        return _fallback_hs_suggestion(product_description)
-    
+def _hs_result_from_ai(data: dict) -> dict:
+    """Normalize one Gemini HS classification (HS_CLASSIFICATION_PROMPT format) into the suggest_hs_code shape"""
+    confidence_raw = data.get('confidence', 50)
     try:
-        from google.genai import types
-        
-        system_prompt = """Eres un experto clasificador arancelario del SENAE (Servicio Nacional de Aduana del Ecuador) con conocimiento actualizado a 2025.
+        confidence = min(max(int(confidence_raw), 0), 100)
+    except (ValueError, TypeError):
+        confidence = 50
+
+    ad_valorem_raw = data.get('ad_valorem_rate', 0.10)
+    try:
+        ad_valorem_rate = float(ad_valorem_raw)
+    except (ValueError, TypeError):
+        ad_valorem_rate = 0.10
+
+    permit_info = data.get('permit_info', None)
+    if permit_info and not isinstance(permit_info, dict):
+        permit_info = None
+
+    return {
+        'suggested_hs_code': str(data.get('hs_code', '9999.00.00') or '9999.00.00'),
+        'confidence': confidence,
+        'reasoning': str(data.get('reasoning', '') or 'Clasificacion por IA Gemini'),
+        'category': str(data.get('category', '') or ''),
+        'notes': str(data.get('notes', '') or ''),
+        'ai_status': 'success',
+        'ad_valorem_rate': ad_valorem_rate,
+        'requires_permit': bool(data.get('requires_permit', False)),
+        'permit_info': permit_info,
+        'special_taxes': data.get('special_taxes', []),
+        'tributos_2025': {
+            'iva_rate': float(SENAE_TRIBUTOS_2025['iva_rate']),
+            'fodinfa_rate': float(SENAE_TRIBUTOS_2025['fodinfa_rate']),
+            'ad_valorem_rate': ad_valorem_rate
+        }
+    }
+
+
+HS_CLASSIFICATION_PROMPT = """Eres un experto clasificador arancelario del SENAE (Servicio Nacional de Aduana del Ecuador) con conocimiento actualizado a 2025.
 
 Tu tarea es analizar productos para importacion a Ecuador y proporcionar:
 1. Codigo HS (subpartida arancelaria de 10 digitos)
@@ -494,19 +482,34 @@ Responde SOLO en formato JSON:
 
 Si no requiere permiso, usar "requires_permit": false y "permit_info": null"""
 
+
+def suggest_hs_code(product_description: str, origin_country: str = "", fob_value: float = 0) -> dict:
+    """
+    Use Gemini AI to suggest an HS code for a product description.
+    Falls back to keyword matching if Gemini is unavailable.
+    Returns: dict with suggested_hs_code, confidence, reasoning, permit info, tributos
+    """
+    if not GEMINI_AVAILABLE or client is None or not gemini_gateway.disponible(client):
+        logger.info("Using fallback HS code suggestion (Gemini unavailable)")
+        return _fallback_hs_suggestion(product_description)
+    
+    try:
+        from google.genai import types
+        
         user_prompt = f"""Producto a importar a Ecuador: {product_description}
 Pais de origen: {origin_country or 'No especificado'}
 Valor FOB aproximado: ${fob_value:,.2f} USD
 
 Proporciona el codigo HS, tasa de Ad-Valorem, y si requiere permisos previos de ARCSA, AGROCALIDAD, INEN u otra institucion."""
 
-        response = client.models.generate_content(
+        response = gemini_gateway.generate_content(
+            client,
             model="gemini-2.5-flash",
             contents=[
                 types.Content(role="user", parts=[types.Part(text=user_prompt)])
             ],
             config=types.GenerateContentConfig(
-                system_instruction=system_prompt,
+                system_instruction=HS_CLASSIFICATION_PROMPT,
                 response_mime_type="application/json",
             ),
         )
@@ -523,39 +526,7 @@ Proporciona el codigo HS, tasa de Ad-Valorem, y si requiere permisos previos de
                 result['ai_status'] = 'fallback_json_error'
                 return result
             
-            confidence_raw = data.get('confidence', 50)
-            try:
-                confidence = min(max(int(confidence_raw), 0), 100)
-            except (ValueError, TypeError):
-                confidence = 50
-            
-            ad_valorem_raw = data.get('ad_valorem_rate', 0.10)
-            try:
-                ad_valorem_rate = float(ad_valorem_raw)
-            except (ValueError, TypeError):
-                ad_valorem_rate = 0.10
-            
-            permit_info = data.get('permit_info', None)
-            if permit_info and not isinstance(permit_info, dict):
-                permit_info = None
-            
-            return {
-                'suggested_hs_code': str(data.get('hs_code', '9999.00.00') or '9999.00.00'),
-                'confidence': confidence,
-                'reasoning': str(data.get('reasoning', '') or 'Clasificacion por IA Gemini'),
-                'category': str(data.get('category', '') or ''),
-                'notes': str(data.get('notes', '') or ''),
-                'ai_status': 'success',
-                'ad_valorem_rate': ad_valorem_rate,
-                'requires_permit': bool(data.get('requires_permit', False)),
-                'permit_info': permit_info,
-                'special_taxes': data.get('special_taxes', []),
-                'tributos_2025': {
-                    'iva_rate': float(SENAE_TRIBUTOS_2025['iva_rate']),
-                    'fodinfa_rate': float(SENAE_TRIBUTOS_2025['fodinfa_rate']),
-                    'ad_valorem_rate': ad_valorem_rate
-                }
-            }
+            return _hs_result_from_ai(data)
         else:
             raise ValueError("Empty response from Gemini")
 
@@ -581,7 +552,7 @@ def analyze_product_for_customs(product_description: str) -> dict:
         'ai_status': 'fallback_unavailable'
     }
     
-    if not GEMINI_AVAILABLE or client is None:
+    if not GEMINI_AVAILABLE or client is None or not gemini_gateway.disponible(client):
         return default_response
     
     try:
@@ -600,7 +571,8 @@ Responde SOLO en formato JSON:
     "customs_notes": "Notas importantes para el agente aduanal"
 }"""
 
-        response = client.models.generate_content(
+        response = gemini_gateway.generate_content(
+            client,
             model="gemini-2.5-flash",
             contents=[
                 types.Content(role="user", parts=[types.Part(text=f"Producto a importar: {product_description}")])
@@ -628,33 +600,7 @@ Responde SOLO en formato JSON:
         return default_response
 
 
-def ai_assistant_chat(message: str, image_data: str = None, image_mime_type: str = None) -> dict:
-    """
-    AI Assistant for ImportaYa.ia - Specialized in Ecuadorian customs and logistics.
-    
-    Mode A: Text queries about tariffs, regulations, processes
-    Mode B: Document analysis (invoices, packing lists, B/L, AWB)
-    
-    Args:
-        message: User's text message
-        image_data: Base64 encoded image data (optional)
-        image_mime_type: MIME type of the image (e.g., 'image/jpeg', 'image/png')
-    
-    Returns:
-        dict with response and metadata
-    """
-    if not GEMINI_AVAILABLE or client is None:
-        return {
-            'response': 'El servicio de IA no esta disponible en este momento. Por favor contacte a soporte tecnico.',
-            'mode': 'error',
-            'ai_status': 'unavailable'
-        }
-    
-    try:
-        from google.genai import types
-        import base64
-        
-        system_prompt = """ERES UN ASISTENTE DE IA AVANZADO ESPECIALIZADO EN LOGISTICA INTERNACIONAL Y ADUANAS DE IMPORTACION PARA ECUADOR.
+AI_ASSISTANT_PROMPT = """ERES UN ASISTENTE DE IA AVANZADO ESPECIALIZADO EN LOGISTICA INTERNACIONAL Y ADUANAS DE IMPORTACION PARA ECUADOR.
 
 Tu objetivo principal es asistir a los usuarios de la plataforma 'ImportaYA.ia'.
 
@@ -714,44 +660,88 @@ Genera una respuesta en formato Markdown estructurado:
 - Indica 'REQUIERE REVISION' si falta algun campo critico
 - Sugiere partida arancelaria si es posible identificar el producto"""
 
-        parts = []
-        
-        if image_data and image_mime_type:
-            mode = 'document_analysis'
-            allowed_mime_types = ['image/jpeg', 'image/png', 'image/gif', 'image/webp', 'image/heic', 'image/heif']
-            if image_mime_type not in allowed_mime_types:
-                return {
-                    'response': f'Formato de imagen no soportado ({image_mime_type}). Use JPG, PNG, GIF o WebP.',
-                    'mode': 'error',
-                    'ai_status': 'unsupported_mime_type'
-                }
-            try:
-                image_bytes = base64.b64decode(image_data)
-                parts.append(types.Part(
-                    inline_data=types.Blob(
-                        data=image_bytes,
-                        mime_type=image_mime_type
-                    )
-                ))
-            except Exception as e:
-                logger.error(f"Failed to decode image: {e}")
-                return {
-                    'response': 'Error al procesar la imagen. Por favor intente con otro formato (JPG, PNG).',
-                    'mode': 'error',
-                    'ai_status': 'image_decode_error'
-                }
-        else:
-            mode = 'text_query'
+ASSISTANT_IMAGE_MIME_TYPES = ['image/jpeg', 'image/png', 'image/gif', 'image/webp', 'image/heic', 'image/heif']
+
+
+def _assistant_parts(message: str, image_data: str = None, image_mime_type: str = None):
+    """
+    Build the user turn parts for the assistant.
+    
+    Returns:
+        (mode, parts, error) - error is a response dict when the image cannot be used
+    """
+    from google.genai import types
+    import base64
+    
+    parts = []
+    
+    if image_data and image_mime_type:
+        mode = 'document_analysis'
+        if image_mime_type not in ASSISTANT_IMAGE_MIME_TYPES:
+            return mode, [], {
+                'response': f'Formato de imagen no soportado ({image_mime_type}). Use JPG, PNG, GIF o WebP.',
+                'mode': 'error',
+                'ai_status': 'unsupported_mime_type'
+            }
+        try:
+            image_bytes = base64.b64decode(image_data)
+            parts.append(types.Part(
+                inline_data=types.Blob(
+                    data=image_bytes,
+                    mime_type=image_mime_type
+                )
+            ))
+        except Exception as e:
+            logger.error(f"Failed to decode image: {e}")
+            return mode, [], {
+                'response': 'Error al procesar la imagen. Por favor intente con otro formato (JPG, PNG).',
+                'mode': 'error',
+                'ai_status': 'image_decode_error'
+            }
+    else:
+        mode = 'text_query'
+    
+    parts.append(types.Part(text=message))
+    return mode, parts, None
+
+
+def ai_assistant_chat(message: str, image_data: str = None, image_mime_type: str = None) -> dict:
+    """
+    AI Assistant for ImportaYa.ia - Specialized in Ecuadorian customs and logistics.
+    
+    Mode A: Text queries about tariffs, regulations, processes
+    Mode B: Document analysis (invoices, packing lists, B/L, AWB)
+    
+    Args:
+        message: User's text message
+        image_data: Base64 encoded image data (optional)
+        image_mime_type: MIME type of the image (e.g., 'image/jpeg', 'image/png')
+    
+    Returns:
+        dict with response and metadata
+    """
+    if not GEMINI_AVAILABLE or client is None or not gemini_gateway.disponible(client):
+        return {
+            'response': 'El servicio de IA no esta disponible en este momento. Por favor contacte a soporte tecnico.',
+            'mode': 'error',
+            'ai_status': 'unavailable'
+        }
+    
+    try:
+        from google.genai import types
         
-        parts.append(types.Part(text=message))
+        mode, parts, error = _assistant_parts(message, image_data, image_mime_type)
+        if error:
+            return error
         
-        response = client.models.generate_content(
+        response = gemini_gateway.generate_content(
+            client,
             model="gemini-2.5-flash",
             contents=[
                 types.Content(role="user", parts=parts)
             ],
             config=types.GenerateContentConfig(
-                system_instruction=system_prompt,
+                system_instruction=AI_ASSISTANT_PROMPT,
             ),
         )
         
@@ -777,7 +767,7 @@ Genera una respuesta en formato Markdown estructurado:
         }
 
 
-def _generate_fallback_scenarios(transport_type: str, weight_kg: float = None, volume_cbm: float = None, container_type: str = None) -> list:
+def _generate_fallback_scenarios(transport_type: str, weight_kg: float = None, volume_cbm: float = None, container_type: str = None, providers: list = None) -> list:
     """
     Generate realistic fallback scenarios when Gemini is unavailable.
     
@@ -1042,111 +1032,136 @@ def _generate_fallback_scenarios(transport_type: str, weight_kg: float = None, v
             }
         ]
     
-    providers = get_providers_for_transport(transport_type, limit=3)
-    if providers:
-        for i, scenario in enumerate(scenarios):
-            if i < len(providers):
-                scenario['proveedor'] = {
-                    'id': providers[i]['id'],
-                    'nombre': providers[i]['name'],
-                    'codigo': providers[i]['code']
-                }
-            else:
-                scenario['proveedor'] = {
-                    'id': providers[0]['id'],
-                    'nombre': providers[0]['name'],
-                    'codigo': providers[0]['code']
-                }
+    if providers is None:
+        providers = get_providers_for_transport(transport_type, limit=3)
+    _assign_providers(scenarios, providers)
     
     return scenarios
 
 
-def generate_intelligent_quote(
+def _assign_providers(scenarios: list, providers: list) -> None:
+    """Attach providers to scenarios that have none (one per scenario, extras get the first)."""
+    if not providers:
+        return
+    for i, scenario in enumerate(scenarios):
+        if not isinstance(scenario, dict) or 'proveedor' in scenario:
+            continue
+        provider = providers[i] if i < len(providers) else providers[0]
+        scenario['proveedor'] = {
+            'id': provider['id'],
+            'nombre': provider['name'],
+            'codigo': provider['code']
+        }
+
+
+def _intelligent_quote_timeout() -> float:
+    from django.conf import settings
+    return float(getattr(settings, 'INTELLIGENT_QUOTE_TIMEOUT_S', INTELLIGENT_QUOTE_TIMEOUT_S))
+
+
+class _QuotePipeline:
+    """
+    Runs and times the stages of generate_intelligent_quote against one deadline.
+    A failing or late stage is logged and yields None instead of aborting the quote.
+
+    The remote stage gets the remaining time as its gateway timeout, so the
+    gateway itself abandons the call at the deadline and releases its slot; no
+    second pool queues requests behind it. Local stages cannot be interrupted,
+    so each one is only started while time remains.
+    """
+
+    def __init__(self, plazo: float):
+        self.inicio = time.perf_counter()
+        self.limite = self.inicio + plazo
+        self.tiempos_ms = {}
+        self.estados = {}
+
+    def restante(self) -> float:
+        return max(0.0, self.limite - time.perf_counter())
+
+    def _registrar(self, nombre: str, inicio: float, estado: str) -> None:
+        self.tiempos_ms[nombre] = round((time.perf_counter() - inicio) * 1000, 1)
+        self.estados[nombre] = estado
+
+    def ejecutar(self, nombre: str, funcion, *args, acotada: bool = True, **kwargs):
+        """
+        Local stage, on the calling thread. Bounded stages (lookups) are skipped
+        once the deadline has passed; acotada=False is for in-memory steps the
+        fallback response needs anyway.
+        """
+        inicio = time.perf_counter()
+        if acotada and self.restante() <= 0:
+            logger.warning(f"Intelligent quote stage '{nombre}' skipped: deadline exceeded")
+            self._registrar(nombre, inicio, 'timeout')
+            return None
+        try:
+            resultado = funcion(*args, **kwargs)
+        except Exception as e:
+            logger.warning(f"Intelligent quote stage '{nombre}' failed: {e}")
+            self._registrar(nombre, inicio, 'error')
+            return None
+        self._registrar(nombre, inicio, 'ok')
+        return resultado
+
+    def enviar(self, nombre: str, funcion, *args) -> Future:
+        """Remote stage, on its own thread with the remaining time as gateway timeout."""
+        futuro = Future()
+        futuro.set_running_or_notify_cancel()
+        plazo = self.restante()
+
+        def correr():
+            try:
+                futuro.set_result(funcion(*args, timeout=plazo))
+            except BaseException as e:
+                futuro.set_exception(e)
+
+        threading.Thread(target=correr, name=f'intelligent-quote-{nombre}', daemon=True).start()
+        return futuro
+
+    def esperar(self, nombre: str, futuro: Future):
+        """Result of a submitted stage; None on failure or once the deadline has passed."""
+        inicio = self.inicio
+        try:
+            resultado = futuro.result(timeout=self.restante())
+        except FuturesTimeout:
+            # The gateway drops the call at the same deadline; nothing to cancel here
+            logger.warning(f"Intelligent quote stage '{nombre}' timed out")
+            self._registrar(nombre, inicio, 'timeout')
+            return None
+        except Exception as e:
+            logger.warning(f"Intelligent quote stage '{nombre}' failed: {e}")
+            self._registrar(nombre, inicio, 'error')
+            return None
+        self._registrar(nombre, inicio, 'timeout' if resultado[1] == 'timeout' else 'ok')
+        return resultado
+
+    def metadata(self) -> dict:
+        return {
+            'etapas_ms': dict(self.tiempos_ms),
+            'etapas_estado': dict(self.estados),
+            'total_ms': round((time.perf_counter() - self.inicio) * 1000, 1),
+        }
+
+
+def _gemini_intelligent_quote(
     cargo_description: str,
     origin: str,
     destination: str,
     transport_type: str,
-    weight_kg: float = None,
-    volume_cbm: float = None,
-    incoterm: str = "FOB",
-    fob_value_usd: float = None,
-    container_type: str = None,
-    hs_code_known: str = None
-) -> dict:
+    weight_kg: float,
+    volume_cbm: float,
+    incoterm: str,
+    fob_value_usd: float,
+    timeout: float = None
+) -> tuple:
     """
-    Generate an intelligent quote using Gemini AI for automatic HS code classification,
-    customs duty calculation, permit detection, and multi-scenario quote generation.
-    
-    Args:
-        cargo_description: Description of the cargo/product
-        origin: Origin port/city
-        destination: Destination port/city in Ecuador
-        transport_type: 'FCL', 'LCL', or 'AEREO'
-        weight_kg: Weight in kilograms
-        volume_cbm: Volume in cubic meters
-        incoterm: Trade term (FOB, CIF, etc.)
-        fob_value_usd: Estimated FOB value in USD
-        container_type: FCL container type (e.g., '1x40HC', '1x20GP', '1x40 REEFER')
-        hs_code_known: Optional HS code provided by the customer for validation
+    Remote stage of generate_intelligent_quote: a single Gemini call.
+    Runs on its own thread, never touches the database and is bounded by
+    `timeout` through the gateway deadline.
     
     Returns:
-        dict with classification, tributes, permits, and quote scenarios
+        (data, ai_status, notas) - data is None when the response is not usable
     """
-    
-    default_response = {
-        'clasificacion': {
-            'hs_code': '9999.00.00',
-            'descripcion': 'Sin clasificar - Requiere revisión manual',
-            'confianza': 30,
-            'categoria': 'General'
-        },
-        'tributos': {
-            'ad_valorem_pct': 10.0,
-            'iva_pct': 15.0,
-            'fodinfa_pct': 0.5,
-            'ice_pct': 0.0
-        },
-        'permisos': [],
-        'escenarios': [],
-        'ai_status': 'fallback',
-        'notas': 'Clasificación automática no disponible. Se requiere revisión manual.'
-    }
-    
-    if not cargo_description:
-        default_response['ai_status'] = 'missing_description'
-        return default_response
-    
-    if not GEMINI_AVAILABLE or client is None:
-        logger.info("Using fallback intelligent quote (Gemini unavailable)")
-        fallback = _fallback_hs_suggestion(cargo_description)
-        
-        ad_valorem_rate = fallback.get('ad_valorem_rate', 0.1)
-        if isinstance(ad_valorem_rate, Decimal):
-            ad_valorem_rate = float(ad_valorem_rate)
-        
-        default_response['clasificacion'] = {
-            'hs_code': fallback.get('suggested_hs_code', '9999.00.00'),
-            'descripcion': fallback.get('reasoning', 'Sin clasificar'),
-            'confianza': int(fallback.get('confidence', 30)),
-            'categoria': fallback.get('category', 'General')
-        }
-        default_response['tributos'] = {
-            'ad_valorem_pct': float(ad_valorem_rate * 100),
-            'iva_pct': 15.0,
-            'fodinfa_pct': 0.5,
-            'ice_pct': 0.0
-        }
-        if fallback.get('permit_info'):
-            default_response['permisos'] = [{
-                'institucion': str(fallback['permit_info'].get('institucion', '')),
-                'permiso': str(fallback['permit_info'].get('permiso', '')),
-                'tiempo_estimado': str(fallback['permit_info'].get('tiempo_estimado', ''))
-            }]
-        
-        default_response['escenarios'] = _generate_fallback_scenarios(transport_type, weight_kg, volume_cbm, container_type)
-        default_response['ai_status'] = 'fallback_keyword'
-        return default_response
-    
     try:
         from google.genai import types
         
@@ -1291,7 +1306,8 @@ INCOTERM: {incoterm}
 Analiza el producto, clasifícalo con su partida arancelaria, calcula los tributos aplicables, 
 identifica si requiere permisos previos, y genera 3 escenarios de cotización (económico, estándar, express)."""
 
-        response = client.models.generate_content(
+        response = gemini_gateway.generate_content(
+            client,
             model="gemini-2.5-flash",
             contents=[
                 types.Content(role="user", parts=[types.Part(text=user_message)])
@@ -1300,49 +1316,251 @@ identifica si requiere permisos previos, y genera 3 escenarios de cotización (e
                 system_instruction=system_prompt,
                 response_mime_type="application/json",
             ),
+            timeout=timeout,
         )
         
         if response.text:
             try:
                 data = json.loads(response.text)
-                data['ai_status'] = 'success'
-                logger.info(f"Intelligent quote generated successfully for: {cargo_description[:50]}...")
-                return data
             except json.JSONDecodeError as e:
                 logger.error(f"JSON decode error in intelligent quote: {e}")
-                default_response['ai_status'] = 'json_parse_error'
-                default_response['notas'] = f'Error al procesar respuesta de IA: {str(e)}'
-                return default_response
+                return None, 'json_parse_error', f'Error al procesar respuesta de IA: {str(e)}'
+            data['ai_status'] = 'success'
+            logger.info(f"Intelligent quote generated successfully for: {cargo_description[:50]}...")
+            return data, 'success', None
         
-        default_response['ai_status'] = 'empty_response'
-        return default_response
+        return None, 'empty_response', None
     
+    except gemini_gateway.GeminiTimeoutError as e:
+        logger.warning(f"Intelligent quote generation timed out: {e}")
+        return None, 'timeout', 'Tiempo de espera agotado en servicio de IA.'
     except Exception as e:
         logger.error(f"Intelligent quote generation failed: {e}")
-        default_response['ai_status'] = 'error'
-        default_response['notas'] = f'Error en servicio de IA: {str(e)}'
+        return None, 'error', f'Error en servicio de IA: {str(e)}'
+
+
+def generate_intelligent_quote(
+    cargo_description: str,
+    origin: str,
+    destination: str,
+    transport_type: str,
+    weight_kg: float = None,
+    volume_cbm: float = None,
+    incoterm: str = "FOB",
+    fob_value_usd: float = None,
+    container_type: str = None,
+    hs_code_known: str = None
+) -> dict:
+    """
+    Generate an intelligent quote using Gemini AI for automatic HS code classification,
+    customs duty calculation, permit detection, and multi-scenario quote generation.
+    
+    The stages run concurrently: the Gemini call runs on its own thread while the
+    keyword/database classification, provider list and best route rate are resolved
+    on the calling thread, so latency tracks the slowest stage (the remote call)
+    instead of the sum. All stages share the INTELLIGENT_QUOTE_TIMEOUT_S deadline:
+    the remote call gets the remaining time as its gateway timeout and local
+    lookups are skipped once it has passed. If Gemini is unavailable, fails or
+    misses the deadline, the response falls back to _fallback_hs_suggestion.
+    Per-stage timings are returned in metadata['etapas_ms'].
+    
+    Args:
+        cargo_description: Description of the cargo/product
+        origin: Origin port/city
+        destination: Destination port/city in Ecuador
+        transport_type: 'FCL', 'LCL', or 'AEREO'
+        weight_kg: Weight in kilograms
+        volume_cbm: Volume in cubic meters
+        incoterm: Trade term (FOB, CIF, etc.)
+        fob_value_usd: Estimated FOB value in USD
+        container_type: FCL container type (e.g., '1x40HC', '1x20GP', '1x40 REEFER')
+        hs_code_known: Optional HS code provided by the customer for validation
+    
+    Returns:
+        dict with classification, tributes, permits, quote scenarios and metadata
+    """
+    from .resolvers import codigo_destino
+    
+    default_response = {
+        'clasificacion': {
+            'hs_code': '9999.00.00',
+            'descripcion': 'Sin clasificar - Requiere revisión manual',
+            'confianza': 30,
+            'categoria': 'General'
+        },
+        'tributos': {
+            'ad_valorem_pct': 10.0,
+            'iva_pct': 15.0,
+            'fodinfa_pct': 0.5,
+            'ice_pct': 0.0
+        },
+        'permisos': [],
+        'escenarios': [],
+        'ai_status': 'fallback',
+        'notas': 'Clasificación automática no disponible. Se requiere revisión manual.'
+    }
+    
+    if not cargo_description:
+        default_response['ai_status'] = 'missing_description'
         return default_response
+    
+    pipeline = _QuotePipeline(_intelligent_quote_timeout())
+    
+    futuro_ia = None
+    if GEMINI_AVAILABLE and client is not None and gemini_gateway.disponible(client):
+        futuro_ia = pipeline.enviar(
+            'clasificacion_ia', _gemini_intelligent_quote,
+            cargo_description, origin, destination, transport_type,
+            weight_kg, volume_cbm, incoterm, fob_value_usd
+        )
+    else:
+        logger.info("Using fallback intelligent quote (Gemini unavailable)")
+    
+    # Local stages while the remote call is in flight
+    fallback = pipeline.ejecutar('clasificacion_local', _fallback_hs_suggestion, cargo_description)
+    providers = pipeline.ejecutar('proveedores', get_providers_for_transport, transport_type, limit=3) or []
+    best_rate = pipeline.ejecutar(
+        'tarifa_ruta', get_best_rate_for_route,
+        transport_type, origin, codigo_destino(destination), container_type
+    )
+    
+    data, ai_status, notas = None, 'fallback_keyword', None
+    if futuro_ia is not None:
+        resultado = pipeline.esperar('clasificacion_ia', futuro_ia)
+        if resultado is None:
+            ai_status = pipeline.estados.get('clasificacion_ia', 'error')
+            notas = 'Tiempo de espera agotado en servicio de IA.' if ai_status == 'timeout' else None
+        else:
+            data, ai_status, notas = resultado
+    
+    if data is not None:
+        response = data
+        escenarios = response.get('escenarios')
+        if isinstance(escenarios, list):
+            _assign_providers(escenarios, providers)
+    else:
+        response = default_response
+        if fallback:
+            ad_valorem_rate = fallback.get('ad_valorem_rate', 0.1)
+            if isinstance(ad_valorem_rate, Decimal):
+                ad_valorem_rate = float(ad_valorem_rate)
+            
+            response['clasificacion'] = {
+                'hs_code': fallback.get('suggested_hs_code', '9999.00.00'),
+                'descripcion': fallback.get('reasoning', 'Sin clasificar'),
+                'confianza': int(fallback.get('confidence', 30)),
+                'categoria': fallback.get('category', 'General')
+            }
+            response['tributos'] = {
+                'ad_valorem_pct': float(ad_valorem_rate * 100),
+                'iva_pct': 15.0,
+                'fodinfa_pct': 0.5,
+                'ice_pct': 0.0
+            }
+            if fallback.get('permit_info'):
+                response['permisos'] = [{
+                    'institucion': str(fallback['permit_info'].get('institucion', '')),
+                    'permiso': str(fallback['permit_info'].get('permiso', '')),
+                    'tiempo_estimado': str(fallback['permit_info'].get('tiempo_estimado', ''))
+                }]
+        
+        response['escenarios'] = pipeline.ejecutar(
+            'escenarios', _generate_fallback_scenarios,
+            transport_type, weight_kg, volume_cbm, container_type, providers, acotada=False
+        ) or []
+        response['ai_status'] = ai_status
+        if notas:
+            response['notas'] = notas
+    
+    if best_rate:
+        response['tarifa_referencia'] = best_rate
+    response['metadata'] = pipeline.metadata()
+    return response
+
+
+# Ámbitos de la caché de extracción; cambiar la versión al modificar el prompt
+QUOTE_DOCUMENTS_SCOPE = 'quote_si:v2'
+SHIPPING_DOCUMENTS_SCOPE = 'shipping_si:v2'
+
+# local_extraction usa los nombres del formulario de cotización
+SHIPPING_LOCAL_FIELD_ALIASES = {
+    'hs_codes': 'hs_code',
+    'packages_count': 'package_count',
+    'packages_type': 'package_type',
+}
+
+
+def _document_extractor(system_prompt: str, instructions: str):
+    """
+    Extractor para document_extraction: un documento (o las páginas PDF
+    pendientes, juntas en un PDF) por llamada, con el archivo como
+    inline_data. Con varias páginas pide un arreglo JSON con un objeto por
+    página. Devuelve None si Gemini no está disponible o falla, para que el
+    resultado no quede en la caché.
+    """
+    def extraer(parte):
+        # Sin Gemini solo se aprovechan los resultados ya guardados en la caché
+        if not GEMINI_AVAILABLE or not gemini_gateway.disponible(client):
+            logger.warning("Gemini AI not available for document extraction")
+            return None
+        from google.genai import types
+        message = f"""{instructions}
+
+DOCUMENTO:
+{json.dumps(parte.descriptor, indent=2, ensure_ascii=False)}"""
+        if parte.texto is not None:
+            message += f"\n\nCONTENIDO:\n{parte.texto}"
+        if parte.paginas:
+            message += (
+                f"\n\nEl PDF adjunto contiene las páginas {', '.join(map(str, parte.paginas))} del documento. "
+                f"Responde con un arreglo JSON de {len(parte.paginas)} objetos, uno por página y en ese orden, "
+                "cada uno con la estructura indicada y solo los datos de su página."
+            )
+        parts = [types.Part(text=message)]
+        if parte.data is not None:
+            parts.append(types.Part(inline_data=types.Blob(data=parte.data, mime_type=parte.mime_type)))
+
+        try:
+            response = gemini_gateway.generate_content(
+                client,
+                model="gemini-2.5-flash",
+                contents=[types.Content(role="user", parts=parts)],
+                config=types.GenerateContentConfig(
+                    system_instruction=system_prompt,
+                    response_mime_type="application/json",
+                ),
+                timeout=DOCUMENT_EXTRACTION_TIMEOUT_S,
+            )
+            data = json.loads(response.text) if response.text else None
+        except json.JSONDecodeError as e:
+            logger.error(f"JSON decode error in document extraction ({parte.descriptor.get('filename')}): {e}")
+            return None
+        except Exception as e:
+            logger.warning(f"Gemini document extraction failed ({parte.descriptor.get('filename')}): {e}")
+            return None
+        if parte.paginas:
+            return data if isinstance(data, list) else None
+        return data if isinstance(data, dict) else None
+
+    return extraer
 
 
 def extract_shipping_data_from_quote_documents(quote_submission_id: int) -> dict:
     """
-    Extrae datos de Shipping Instructions desde documentos de la cotización usando Gemini AI.
+    Extrae datos de Shipping Instructions desde documentos de la cotización.
+    Los documentos con texto se leen localmente; Gemini AI solo recibe los
+    escaneados o los que no se pudieron leer.
     Se usa cuando el usuario accede por primera vez al formulario de instrucción de embarque.
     
     Args:
         quote_submission_id: ID del QuoteSubmission
     
     Returns:
-        Dict con datos extraídos o vacío si no hay datos
+        Dict con datos extraídos (con field_confidence por campo) o vacío si no hay datos
     """
-    if not GEMINI_AVAILABLE:
-        logger.warning("Gemini AI not available for document extraction")
-        return {}
-    
     try:
         from .models import QuoteSubmission, QuoteSubmissionDocument
-        import base64
-        from django.core.files.storage import default_storage
+        from .document_extraction import DocumentoFuente, extraer_documentos
         
         quote_submission = QuoteSubmission.objects.get(id=quote_submission_id)
         documents = quote_submission.documents.all()
@@ -1351,33 +1569,18 @@ def extract_shipping_data_from_quote_documents(quote_submission_id: int) -> dict
             logger.info(f"No documents found for quote submission {quote_submission_id}")
             return {}
         
-        document_contents = []
+        fuentes = []
         for doc in documents:
-            doc_info = {
-                'type': doc.get_document_type_display(),
-                'type_code': doc.document_type,
-                'filename': doc.file_name
-            }
-            
-            if doc.file and doc.file.name:
-                try:
-                    ext = doc.file_name.lower().split('.')[-1] if doc.file_name else ''
-                    
-                    if ext in ['pdf', 'jpg', 'jpeg', 'png']:
-                        with default_storage.open(doc.file.name, 'rb') as f:
-                            file_bytes = f.read()
-                            encoded = base64.b64encode(file_bytes).decode('utf-8')
-                            doc_info['content_base64'] = encoded[:10000]
-                            doc_info['mime_type'] = 'application/pdf' if ext == 'pdf' else f'image/{ext}'
-                    elif ext in ['txt', 'csv']:
-                        with default_storage.open(doc.file.name, 'r') as f:
-                            doc_info['content'] = f.read()[:8000]
-                    else:
-                        doc_info['note'] = f"Archivo {ext.upper()} - {doc.file_name}"
-                except Exception as e:
-                    doc_info['note'] = f"Archivo: {doc.file_name} ({e})"
-            
-            document_contents.append(doc_info)
+            if not (doc.file and doc.file.name):
+                continue
+            file_name = getattr(doc, 'file_name', None) or doc.file.name.rsplit('/', 1)[-1]
+            get_display = getattr(doc, 'get_document_type_display', None)
+            fuentes.append(DocumentoFuente(
+                storage_name=doc.file.name,
+                file_name=file_name,
+                document_type=doc.document_type or '',
+                type_label=get_display() if get_display else '',
+            ))
         
         system_prompt = """Eres un experto en documentación de comercio internacional y logística de carga para Ecuador.
 Tu tarea es extraer información estructurada de facturas comerciales, packing lists y otros documentos comerciales.
@@ -1419,45 +1622,23 @@ IMPORTANTE:
 - Responde SOLO con JSON válido
 - Solo incluye campos que encuentres claramente en los documentos
 - Incluye "extraction_confidence" (0-100) indicando confianza general
+- Incluye "field_confidence": objeto con la confianza (0-100) de cada campo extraído
 - Para RUC Ecuador, debe tener 13 dígitos
 """
 
-        user_message = f"""Analiza los siguientes documentos comerciales y extrae la información para Shipping Instructions:
-
-DOCUMENTOS ({len(document_contents)} archivos):
-{json.dumps(document_contents, indent=2, ensure_ascii=False)}
-
-CONTEXTO DE LA COTIZACIÓN:
-- Empresa: {quote_submission.company_name or 'No especificada'}
-- Contacto: {quote_submission.contact_name or 'No especificado'}
-- Email: {quote_submission.contact_email or 'No especificado'}
-- Origen: {quote_submission.origin or 'No especificado'}
-- Destino: {quote_submission.destination or 'No especificado'}
-- Descripción carga: {quote_submission.cargo_description or quote_submission.product_description or 'No especificada'}
-- Peso: {quote_submission.cargo_weight_kg or 'No especificado'} kg
-- Volumen: {quote_submission.cargo_volume_cbm or 'No especificado'} CBM
-
-Extrae y estructura la información encontrada. Responde SOLO con JSON."""
-
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=[
-                types.Content(role="user", parts=[types.Part(text=user_message)])
-            ],
-            config=types.GenerateContentConfig(
-                system_instruction=system_prompt,
-                response_mime_type="application/json",
-            ),
-        )
+        # La extracción se hace por documento, sin el contexto de la cotización,
+        # para que el resultado dependa solo del contenido y pueda reutilizarse
+        instructions = "Analiza el siguiente documento comercial y extrae la información para Shipping Instructions. Responde SOLO con JSON."
+        resultado = extraer_documentos(fuentes, QUOTE_DOCUMENTS_SCOPE, _document_extractor(system_prompt, instructions))
         
-        if response.text:
-            try:
-                extracted_data = json.loads(response.text)
-                logger.info(f"Successfully extracted data from quote {quote_submission_id} documents: {list(extracted_data.keys())}")
-                return extracted_data
-            except json.JSONDecodeError as e:
-                logger.error(f"JSON decode error in quote document extraction: {e}")
-                return {}
+        # Packing lists y facturas con texto se leen localmente; los totales del
+        # packing list (confianza 100) prevalecen sobre los de la IA al combinar
+        if resultado.datos:
+            logger.info(
+                f"Successfully extracted data from quote {quote_submission_id} documents: "
+                f"{list(resultado.datos.keys())} ({resultado.stats()})"
+            )
+            return dict(resultado.datos)
         
         return {}
     
@@ -1468,22 +1649,19 @@ Extrae y estructura la información encontrada. Responde SOLO con JSON."""
 
 def extract_shipping_data_from_documents(shipping_instruction_id: int) -> dict:
     """
-    Extrae datos de Shipping Instructions desde documentos subidos usando Gemini AI.
+    Extrae datos de Shipping Instructions desde documentos subidos (extracción
+    local primero, Gemini AI para escaneados o ilegibles).
     Soporta facturas comerciales, packing lists, booking confirmations, etc.
     
     Args:
         shipping_instruction_id: ID del ShippingInstruction
     
     Returns:
-        Dict con datos extraídos o vacío si no hay datos
+        Dict con datos extraídos (con field_confidence por campo) o vacío si no hay datos
     """
-    if not GEMINI_AVAILABLE:
-        logger.warning("Gemini AI not available for document extraction")
-        return {}
-    
     try:
         from .models import ShippingInstruction, ShippingInstructionDocument
-        import base64
+        from .document_extraction import DocumentoFuente, extraer_documentos
         
         shipping_instruction = ShippingInstruction.objects.get(id=shipping_instruction_id)
         documents = shipping_instruction.documents.filter(ai_processed=False)
@@ -1491,25 +1669,19 @@ def extract_shipping_data_from_documents(shipping_instruction_id: int) -> dict:
         if not documents.exists():
             return {}
         
-        document_contents = []
+        fuentes = []
         for doc in documents:
-            doc_info = {
-                'type': doc.document_type,
-                'filename': doc.original_filename
-            }
-            
-            if doc.file and doc.file.name:
-                try:
-                    ext = doc.original_filename.lower().split('.')[-1] if doc.original_filename else ''
-                    if ext in ['txt', 'csv']:
-                        with doc.file.open('r') as f:
-                            doc_info['content'] = f.read()[:5000]
-                    else:
-                        doc_info['note'] = f"Archivo {ext.upper()} subido - extraer datos del nombre: {doc.original_filename}"
-                except Exception as e:
-                    doc_info['note'] = f"Error leyendo archivo: {str(e)}"
-            
-            document_contents.append(doc_info)
+            if not (doc.file and doc.file.name):
+                continue
+            file_name = (
+                getattr(doc, 'original_filename', None) or doc.file_name
+                or doc.file.name.rsplit('/', 1)[-1]
+            )
+            fuentes.append(DocumentoFuente(
+                storage_name=doc.file.name,
+                file_name=file_name,
+                document_type=doc.document_type or '',
+            ))
         
         system_prompt = """Eres un experto en documentación de comercio internacional y logística de carga.
 Tu tarea es extraer información estructurada de documentos de embarque para completar un formulario de Shipping Instructions.
@@ -1558,43 +1730,20 @@ CAMPOS A EXTRAER:
 
 RESPONDE EN JSON con solo los campos que puedas extraer con confianza.
 Si no puedes extraer un campo, no lo incluyas en la respuesta.
-Incluye un campo "extraction_confidence" (0-100) indicando tu nivel de confianza general."""
+Incluye un campo "extraction_confidence" (0-100) indicando tu nivel de confianza general
+y "field_confidence": objeto con la confianza (0-100) de cada campo extraído."""
 
-        user_message = f"""Extrae la información de Shipping Instructions de los siguientes documentos:
-
-DOCUMENTOS DISPONIBLES:
-{json.dumps(document_contents, indent=2, ensure_ascii=False)}
-
-CONTEXTO ACTUAL (datos ya conocidos):
-- Origen actual: {shipping_instruction.origin_port or 'No especificado'}
-- Destino: {shipping_instruction.destination_port or 'No especificado'}
-- Descripción carga: {shipping_instruction.cargo_description or 'No especificada'}
-- Shipper actual: {shipping_instruction.shipper_name or 'No especificado'}
-- Consignee actual: {shipping_instruction.consignee_name or 'No especificado'}
-
-Extrae y estructura la información encontrada en los documentos. 
+        instructions = """Extrae la información de Shipping Instructions del siguiente documento.
 Prioriza datos concretos sobre estimaciones.
 Responde SOLO con el JSON estructurado."""
-
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=[
-                types.Content(role="user", parts=[types.Part(text=user_message)])
-            ],
-            config=types.GenerateContentConfig(
-                system_instruction=system_prompt,
-                response_mime_type="application/json",
-            ),
+        resultado = extraer_documentos(
+            fuentes, SHIPPING_DOCUMENTS_SCOPE, _document_extractor(system_prompt, instructions),
+            alias_locales=SHIPPING_LOCAL_FIELD_ALIASES,
         )
         
-        if response.text:
-            try:
-                extracted_data = json.loads(response.text)
-                logger.info(f"Successfully extracted shipping data for SI {shipping_instruction_id}")
-                return extracted_data
-            except json.JSONDecodeError as e:
-                logger.error(f"JSON decode error in document extraction: {e}")
-                return {}
+        if resultado.datos:
+            logger.info(f"Successfully extracted shipping data for SI {shipping_instruction_id} ({resultado.stats()})")
+            return dict(resultado.datos)
         
         return {}
     
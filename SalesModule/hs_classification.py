@@ -0,0 +1,223 @@
+"""
+Batch HS Classification for ImportaYa.ia
+Clasificación arancelaria de muchos productos en una sola solicitud.
+
+Una factura de 200 SKUs llamaba 200 veces a suggest_hs_code, una ida y vuelta
+a Gemini por producto. Aquí:
+1. Las descripciones se normalizan y se deduplican (la misma descripción en
+   varias líneas se clasifica una vez).
+2. Cada descripción única pasa por el diccionario de palabras clave
+   (_fallback_hs_suggestion); las coincidencias con confianza suficiente
+   se resuelven sin IA.
+3. El resto se envía a Gemini en pocos prompts empaquetados (HS_BATCH_AI_CHUNK
+   productos por prompt) con concurrencia acotada (HS_BATCH_AI_CONCURRENCY),
+   a través del gateway.
+4. Si Gemini falla u omite un producto se conserva el resultado local.
+
+Cada línea devuelve su origen (keyword, ai, fallback) y confianza.
+"""
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MAX_PRODUCTOS = 500
+
+# Valores por defecto; se pueden sobrescribir en settings
+HS_BATCH_AI_CHUNK = 25
+HS_BATCH_AI_CONCURRENCY = 3
+# Las coincidencias locales por debajo de esta confianza se envían a la IA
+HS_BATCH_MIN_LOCAL_CONFIDENCE = 70
+
+ORIGEN_POR_ESTADO = {
+    'fallback_keyword': 'keyword',
+    'success': 'ai',
+}
+
+
+class ClasificacionLoteError(ValueError):
+    """Solicitud de clasificación por lote inválida"""
+    pass
+
+
+def _config(nombre: str, defecto):
+    from django.conf import settings
+    return getattr(settings, nombre, defecto)
+
+
+def normalizar_descripcion(descripcion: str) -> str:
+    from .gemini_service import _normalize_text
+    return ' '.join(_normalize_text(descripcion or '').split())
+
+
+@dataclass
+class ProductoUnico:
+    """Descripción única del lote y las líneas que la comparten."""
+    clave: str
+    descripcion: str
+    origin_country: str = ''
+    lineas: List[int] = field(default_factory=list)
+    resultado: Optional[Dict] = None
+    origen: str = 'fallback'
+
+    def asignar(self, resultado: Dict) -> None:
+        self.resultado = resultado
+        self.origen = ORIGEN_POR_ESTADO.get(resultado.get('ai_status'), 'fallback')
+
+
+def _prompt_lote(productos: List[ProductoUnico]) -> str:
+    lineas = [
+        f"{i}. {p.descripcion}" + (f" (origen: {p.origin_country})" if p.origin_country else '')
+        for i, p in enumerate(productos, start=1)
+    ]
+    return f"""Clasifica los siguientes {len(productos)} productos a importar a Ecuador.
+
+PRODUCTOS:
+{chr(10).join(lineas)}
+
+Responde SOLO en formato JSON con una clasificacion por producto, usando el numero del producto como "id":
+{{"items": [{{"id": 1, "hs_code": "XXXX.XX.XX", "confidence": 85, "reasoning": "...", "category": "...", "ad_valorem_rate": 0.15, "requires_permit": false, "permit_info": null, "special_taxes": [], "notes": ""}}]}}"""
+
+
+def _clasificar_lote_ia(productos: List[ProductoUnico]) -> Dict[int, Dict]:
+    """Una llamada a Gemini para un paquete de productos; id (1..n) -> clasificación."""
+    from google.genai import types
+    from . import gemini_gateway
+    from .gemini_service import HS_CLASSIFICATION_PROMPT, _hs_result_from_ai, client
+
+    response = gemini_gateway.generate_content(
+        client,
+        model="gemini-2.5-flash",
+        contents=[types.Content(role="user", parts=[types.Part(text=_prompt_lote(productos))])],
+        config=types.GenerateContentConfig(
+            system_instruction=HS_CLASSIFICATION_PROMPT,
+            response_mime_type="application/json",
+        ),
+    )
+    data = json.loads(response.text or '{}')
+    items = data.get('items', []) if isinstance(data, dict) else data
+    resultados = {}
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        try:
+            indice = int(item.get('id'))
+        except (TypeError, ValueError):
+            continue
+        if 1 <= indice <= len(productos):
+            resultados[indice] = _hs_result_from_ai(item)
+    return resultados
+
+
+def _ia_disponible() -> bool:
+    from . import gemini_gateway
+    from .gemini_service import GEMINI_AVAILABLE, client
+    return GEMINI_AVAILABLE and client is not None and gemini_gateway.disponible(client)
+
+
+def _resolver_con_ia(pendientes: List[ProductoUnico], resumen: Dict) -> None:
+    tamano = max(1, int(_config('HS_BATCH_AI_CHUNK', HS_BATCH_AI_CHUNK)))
+    concurrencia = max(1, int(_config('HS_BATCH_AI_CONCURRENCY', HS_BATCH_AI_CONCURRENCY)))
+    paquetes = [pendientes[i:i + tamano] for i in range(0, len(pendientes), tamano)]
+    resumen['lotes_ia'] = len(paquetes)
+
+    # Solo las llamadas a Gemini van a los hilos; la base de datos se consultó antes
+    with ThreadPoolExecutor(max_workers=min(concurrencia, len(paquetes)), thread_name_prefix='hs-batch') as pool:
+        futuros = [(paquete, pool.submit(_clasificar_lote_ia, paquete)) for paquete in paquetes]
+        for paquete, futuro in futuros:
+            try:
+                resultados = futuro.result()
+                estado_faltante = 'fallback_missing'
+            except Exception as e:
+                logger.warning(f"Gemini batch HS classification failed for {len(paquete)} products: {e}")
+                resultados = {}
+                estado_faltante = 'fallback_error'
+                resumen['lotes_ia_fallidos'] += 1
+            for indice, producto in enumerate(paquete, start=1):
+                if indice in resultados:
+                    producto.asignar(resultados[indice])
+                elif producto.origen == 'fallback':
+                    producto.resultado['ai_status'] = estado_faltante
+
+
+def clasificar_productos(productos: List) -> Dict:
+    """
+    Clasifica una lista de productos.
+
+    Args:
+        productos: Lista de descripciones (str) o dicts con description y
+            origin_country opcional
+
+    Returns:
+        Dict con results (uno por línea, en el orden recibido) y summary
+
+    Raises:
+        ClasificacionLoteError: Lista vacía o con más de MAX_PRODUCTOS productos
+    """
+    from .gemini_service import _fallback_hs_suggestion
+
+    if not isinstance(productos, list) or not productos:
+        raise ClasificacionLoteError("Se requiere una lista de productos")
+    if len(productos) > MAX_PRODUCTOS:
+        raise ClasificacionLoteError(f"Máximo {MAX_PRODUCTOS} productos por solicitud")
+
+    inicio = time.monotonic()
+    unicos: Dict[str, ProductoUnico] = {}
+    lineas: List[Optional[str]] = []
+    for numero, producto in enumerate(productos, start=1):
+        if isinstance(producto, dict):
+            descripcion = str(producto.get('description') or '').strip()
+            origen = str(producto.get('origin_country') or '').strip()
+        else:
+            descripcion, origen = str(producto or '').strip(), ''
+        clave = normalizar_descripcion(descripcion)
+        if not clave:
+            lineas.append(None)
+            continue
+        unico = unicos.setdefault(clave, ProductoUnico(clave=clave, descripcion=descripcion, origin_country=origen))
+        unico.lineas.append(numero)
+        lineas.append(clave)
+
+    minimo = _config('HS_BATCH_MIN_LOCAL_CONFIDENCE', HS_BATCH_MIN_LOCAL_CONFIDENCE)
+    pendientes = []
+    for unico in unicos.values():
+        unico.asignar(_fallback_hs_suggestion(unico.descripcion))
+        if unico.origen == 'fallback' or unico.resultado['confidence'] < minimo:
+            pendientes.append(unico)
+
+    resumen = {
+        'lineas': len(productos),
+        'descripciones_unicas': len(unicos),
+        'resueltas_localmente': len(unicos) - len(pendientes),
+        'enviadas_ia': 0,
+        'lotes_ia': 0,
+        'lotes_ia_fallidos': 0,
+    }
+    if pendientes and _ia_disponible():
+        resumen['enviadas_ia'] = len(pendientes)
+        _resolver_con_ia(pendientes, resumen)
+
+    resultados = []
+    for numero, clave in enumerate(lineas, start=1):
+        if clave is None:
+            resultados.append({'line': numero, 'error': 'Se requiere la descripción del producto'})
+            continue
+        unico = unicos[clave]
+        resultados.append({
+            'line': numero,
+            'description': unico.descripcion,
+            'source': unico.origen,
+            'confidence': unico.resultado.get('confidence', 0),
+            'classification': unico.resultado,
+        })
+
+    resumen['por_origen'] = {}
+    for unico in unicos.values():
+        resumen['por_origen'][unico.origen] = resumen['por_origen'].get(unico.origen, 0) + 1
+    resumen['ms'] = round((time.monotonic() - inicio) * 1000, 1)
+    logger.info(f"Batch HS classification: {resumen}")
+    return {'results': resultados, 'summary': resumen}
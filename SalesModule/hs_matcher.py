@@ -0,0 +1,165 @@
+"""
+HS Keyword Matcher for ImportaYa.ia
+Búsqueda compilada de palabras clave arancelarias.
+
+_fallback_hs_suggestion recorría HS_KEYWORD_MAPPING completo en cada
+solicitud (normalizando el texto carácter por carácter y probando cada
+palabra clave como subcadena).
+
+El matcher se construye una vez por proceso con las palabras clave del
+diccionario:
+- Una palabra clave sin espacios ni signos solo puede aparecer dentro de un
+  token alfanumérico del texto, así que el texto se parte por espacios
+  (una pasada) y cada fragmento distinto se normaliza y se resuelve contra
+  el índice de subcadenas de sus tokens. El resultado por fragmento se
+  memoriza, de modo que las descripciones largas o repetidas cuestan una
+  búsqueda en dict por palabra.
+- Las frases (p. ej. "aire acondicionado") se indexan por sus piezas; solo
+  cuando todas aparecen se normaliza el texto completo para confirmarlas.
+
+Se conserva la semántica anterior (subcadena sin acentos ni mayúsculas, y
+gana la primera palabra clave en el orden de HS_KEYWORD_MAPPING). Solo se
+indexa el diccionario: HSCodeEntry se eliminó en la migración 0051, así que
+no hay palabras clave en la base ni nada que invalidar en caliente.
+
+El tiempo por descripción se mide con el comando benchmark_hs_matcher.
+"""
+import logging
+import re
+import threading
+import unicodedata
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Fragmentos distintos memorizados antes de vaciar el memo
+MAX_MEMO_FRAGMENTOS = 50_000
+
+_RE_TOKEN = re.compile(r'[^\W_]+')
+# Bloques de diacríticos combinables (los que deja NFKD en texto latino)
+_RE_DIACRITICOS = re.compile('[\u0300-\u036f\u1ab0-\u1aff\u1dc0-\u1dff\u20d0-\u20ff\ufe20-\ufe2f]')
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas sin acentos, como gemini_service._normalize_text pero sin recorrer carácter por carácter."""
+    texto = (texto or '').lower()
+    if texto.isascii():
+        return texto
+    return _RE_DIACRITICOS.sub('', unicodedata.normalize('NFKD', texto))
+
+
+class PalabraClave(NamedTuple):
+    """Palabra clave compilada con su destino."""
+    texto: str
+    ref: str  # clave de HS_KEYWORD_MAPPING
+    hs_code: str
+    prioridad: int
+    confianza: int
+
+
+class HSMatcher:
+    """Índice de palabras clave del proceso."""
+
+    def __init__(self, palabras: List[PalabraClave]):
+        self.palabras = palabras
+        # Texto de palabra clave simple -> ids; las frases se indexan por sus piezas
+        self._simples: Dict[str, List[int]] = {}
+        self._compuestas: List[Tuple[str, FrozenSet[str], int]] = []
+        piezas = set()
+        for i, palabra in enumerate(palabras):
+            if _RE_TOKEN.fullmatch(palabra.texto):
+                self._simples.setdefault(palabra.texto, []).append(i)
+            else:
+                propias = frozenset(_RE_TOKEN.findall(palabra.texto))
+                piezas.update(propias)
+                self._compuestas.append((palabra.texto, propias, i))
+        self._indexadas = set(self._simples) | piezas
+        self._largos = sorted({len(t) for t in self._indexadas})
+        # Fragmento entre espacios (sin normalizar) -> textos indexados que contiene
+        self._memo: Dict[str, FrozenSet[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self.palabras)
+
+    def _en_token(self, token: str) -> List[str]:
+        # Subcadenas del token con los largos que existen en el índice
+        encontrados = []
+        indexadas = self._indexadas
+        for largo in self._largos:
+            if largo > len(token):
+                break
+            for inicio in range(len(token) - largo + 1):
+                subcadena = token[inicio:inicio + largo]
+                if subcadena in indexadas:
+                    encontrados.append(subcadena)
+        return encontrados
+
+    def _en_fragmento(self, fragmento: str) -> FrozenSet[str]:
+        encontrados = self._memo.get(fragmento)
+        if encontrados is None:
+            textos = []
+            for token in _RE_TOKEN.findall(normalizar(fragmento)):
+                textos.extend(self._en_token(token))
+            encontrados = frozenset(textos)
+            if len(self._memo) >= MAX_MEMO_FRAGMENTOS:
+                self._memo.clear()
+            self._memo[fragmento] = encontrados
+        return encontrados
+
+    def coincidencias(self, texto: str) -> List[PalabraClave]:
+        """Palabras clave contenidas en el texto, en orden de prioridad."""
+        minusculas = (texto or '').lower()
+        encontrados = set()
+        for fragmento in set(minusculas.split()):
+            encontrados.update(self._en_fragmento(fragmento))
+
+        ids = []
+        for texto_clave in encontrados:
+            ids.extend(self._simples.get(texto_clave, ()))
+        # Una frase solo puede estar en el texto si todas sus piezas aparecen;
+        # únicamente entonces se normaliza el texto completo para confirmarla
+        normalizado = None
+        for frase, piezas, i in self._compuestas:
+            if piezas <= encontrados:
+                if normalizado is None:
+                    normalizado = normalizar(minusculas)
+                if frase in normalizado:
+                    ids.append(i)
+        return [self.palabras[i] for i in sorted(set(ids), key=lambda i: self.palabras[i].prioridad)]
+
+    def mejor(self, texto: str) -> Optional[PalabraClave]:
+        """Primera palabra clave del diccionario contenida en el texto, o None."""
+        coincidencias = self.coincidencias(texto)
+        return coincidencias[0] if coincidencias else None
+
+
+def _palabras_diccionario() -> List[PalabraClave]:
+    from .gemini_service import HS_KEYWORD_MAPPING
+
+    return [
+        PalabraClave(
+            texto=normalizar(keyword), ref=keyword,
+            hs_code=datos[0], prioridad=prioridad, confianza=datos[1],
+        )
+        for prioridad, (keyword, datos) in enumerate(HS_KEYWORD_MAPPING.items())
+    ]
+
+
+def construir_matcher() -> HSMatcher:
+    matcher = HSMatcher(_palabras_diccionario())
+    logger.info(f"HS matcher compiled: {len(matcher)} keywords")
+    return matcher
+
+
+_matcher: Optional[HSMatcher] = None
+_matcher_lock = threading.Lock()
+
+
+def obtener_matcher() -> HSMatcher:
+    """Matcher del proceso (se construye en el primer uso)."""
+    global _matcher
+    if _matcher is None:
+        with _matcher_lock:
+            if _matcher is None:
+                _matcher = construir_matcher()
+    return _matcher
@@ -0,0 +1,522 @@
+"""
+Landed Cost Simulator for ImportaYa.ia
+Simulador "what-if" del costo total puesto en destino (landed cost).
+
+En lugar de evaluar una combinación por llamada, recibe rangos de opciones
+(transporte × tipo de contenedor × ciudad destino × incoterm × ISD × seguridad)
+y calcula la grilla completa en una sola llamada.
+
+Cada dato de precios se obtiene una sola vez por simulación:
+- Flete + márgenes + gastos locales + IVA: generar_cotizacion_automatica
+  por cada par (transporte, contenedor), que además usa el caché de quote_cache.
+- Seguro: calcular_seguro una vez (depende solo del valor de la mercancía).
+- Seguridad FCL: calcular_servicios_seguridad una vez por (ciudad, opción).
+- Transporte interno: InlandFCLTariff / InlandTransportQuoteRate desde las
+  tablas compiladas de reference_tables (sin consultas por celda).
+
+El resto de la grilla (tributos SENAE, ISD, reparto según incoterm) es
+aritmética en memoria.
+
+Un par (transporte, contenedor) que no se pudo cotizar queda marcado como
+cotizado=False: sus celdas se ordenan al final y nunca son `mejor` ni
+`mejor_por_transporte` (un flete de 0 no es el escenario más barato).
+"""
+import itertools
+import logging
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from .duty_engine import ISD_RATE
+from .money import Money, MoneyError
+
+logger = logging.getLogger(__name__)
+
+# Quién paga el flete internacional y el seguro según el incoterm.
+# En CFR/CPT y CIF/CIP esos rubros ya vienen en el valor de la factura.
+INCOTERMS_FLETE_IMPORTADOR = ('EXW', 'FCA', 'FOB')
+INCOTERMS_SEGURO_IMPORTADOR = ('EXW', 'FCA', 'FOB', 'CFR', 'CPT')
+INCOTERMS_SOPORTADOS = ('EXW', 'FCA', 'FOB', 'CFR', 'CPT', 'CIF', 'CIP')
+
+TRANSPORTES_SOPORTADOS = ('FCL', 'LCL', 'AEREO')
+
+# Opciones de seguridad (solo FCL): (custodia armada, candado satelital)
+OPCIONES_SEGURIDAD = {
+    'NINGUNA': (False, False),
+    'CUSTODIA_ARMADA': (True, False),
+    'CANDADO_SATELITAL': (False, True),
+    'COMPLETA': (True, True),
+}
+
+MAX_ESCENARIOS = 2000
+
+
+def _a_bool(valor) -> bool:
+    if isinstance(valor, str):
+        return valor.strip().lower() in ('1', 'true', 'si', 'sí', 'yes')
+    return bool(valor)
+
+
+def _normalizar_lista(valores: Union[str, Iterable, None], default: Tuple) -> List:
+    if valores is None:
+        return list(default)
+    if isinstance(valores, (str, bool)):
+        valores = [valores]
+    vistos = []
+    for valor in valores:
+        if isinstance(valor, str):
+            valor = valor.strip()
+        if valor not in vistos and valor != '':
+            vistos.append(valor)
+    return vistos
+
+
+@dataclass
+class EscenarioLandedCost:
+    """Una celda de la grilla de simulación"""
+    transport_type: str
+    container_type: Optional[str]
+    destination_city: str
+    incoterm: str
+    aplica_isd: bool
+    seguridad: str
+    flete_usd: Money
+    gastos_locales_usd: Money
+    iva_gastos_locales_usd: Money
+    seguro_usd: Money
+    seguridad_usd: Money
+    transporte_interno_usd: Money
+    valor_cif_usd: Money
+    ad_valorem_usd: Money
+    fodinfa_usd: Money
+    iva_importacion_usd: Money
+    isd_usd: Money
+    valor_mercancia_usd: Money
+    carrier: Optional[str] = None
+    transit_time: Optional[str] = None
+    advertencias: List[str] = field(default_factory=list)
+    cotizado: bool = True
+
+    @property
+    def logistica_usd(self) -> Money:
+        return (
+            self.flete_usd + self.gastos_locales_usd + self.iva_gastos_locales_usd
+            + self.seguro_usd + self.seguridad_usd + self.transporte_interno_usd
+        )
+
+    @property
+    def tributos_usd(self) -> Money:
+        return self.ad_valorem_usd + self.fodinfa_usd + self.iva_importacion_usd + self.isd_usd
+
+    @property
+    def total_landed_usd(self) -> Money:
+        return self.valor_mercancia_usd + self.logistica_usd + self.tributos_usd
+
+    def to_dict(self) -> Dict:
+        return {
+            "transport_type": self.transport_type,
+            "container_type": self.container_type,
+            "destination_city": self.destination_city,
+            "incoterm": self.incoterm,
+            "isd": self.aplica_isd,
+            "seguridad": self.seguridad,
+            "carrier": self.carrier,
+            "transit_time": self.transit_time,
+            "cotizado": self.cotizado,
+            "desglose": {
+                "valor_mercancia_usd": self.valor_mercancia_usd.to_float(),
+                "flete_usd": self.flete_usd.to_float(),
+                "gastos_locales_usd": self.gastos_locales_usd.to_float(),
+                "iva_gastos_locales_usd": self.iva_gastos_locales_usd.to_float(),
+                "seguro_usd": self.seguro_usd.to_float(),
+                "seguridad_usd": self.seguridad_usd.to_float(),
+                "transporte_interno_usd": self.transporte_interno_usd.to_float(),
+                "valor_cif_usd": self.valor_cif_usd.to_float(),
+                "ad_valorem_usd": self.ad_valorem_usd.to_float(),
+                "fodinfa_usd": self.fodinfa_usd.to_float(),
+                "iva_importacion_usd": self.iva_importacion_usd.to_float(),
+                "isd_usd": self.isd_usd.to_float(),
+            },
+            "logistica_usd": self.logistica_usd.to_float(),
+            "tributos_usd": self.tributos_usd.to_float(),
+            "total_landed_usd": self.total_landed_usd.to_float(),
+            "advertencias": self.advertencias,
+        }
+
+
+@dataclass
+class ResultadoSimulacion:
+    """Grilla completa ordenada por costo total"""
+    escenarios: List[EscenarioLandedCost]
+    parametros: Dict
+    consultas_precios: int = 0
+
+    @property
+    def mejor(self) -> Optional[EscenarioLandedCost]:
+        return next((e for e in self.escenarios if e.cotizado), None)
+
+    def mejor_por_transporte(self) -> Dict[str, EscenarioLandedCost]:
+        mejores: Dict[str, EscenarioLandedCost] = {}
+        for escenario in self.escenarios:
+            if escenario.cotizado:
+                mejores.setdefault(escenario.transport_type, escenario)
+        return mejores
+
+    def to_dict(self) -> Dict:
+        return {
+            "parametros": self.parametros,
+            "total_escenarios": len(self.escenarios),
+            "escenarios_sin_tarifa": sum(1 for e in self.escenarios if not e.cotizado),
+            "consultas_precios": self.consultas_precios,
+            "mejor": self.mejor.to_dict() if self.mejor else None,
+            "mejor_por_transporte": {
+                transporte: escenario.to_dict()
+                for transporte, escenario in self.mejor_por_transporte().items()
+            },
+            "escenarios": [escenario.to_dict() for escenario in self.escenarios],
+        }
+
+
+class ContextoSimulacion:
+    """
+    Datos de precios de una simulación, cargados una sola vez y
+    reutilizados por todas las celdas de la grilla.
+    """
+
+    def __init__(
+        self,
+        pol: str,
+        pod: str,
+        valor_mercancia_usd: Money,
+        peso_kg: Optional[Decimal],
+        volumen_cbm: Optional[Decimal],
+        destination_port: str = 'GYE',
+        cantidad: int = 1,
+        apply_margins: bool = True,
+    ):
+        self.pol = pol
+        self.pod = pod
+        self.valor_mercancia_usd = valor_mercancia_usd
+        self.peso_kg = peso_kg
+        self.volumen_cbm = volumen_cbm
+        self.destination_port = destination_port
+        self.cantidad = cantidad
+        self.apply_margins = apply_margins
+        self.consultas = 0
+        self._logistica: Dict[Tuple, Dict] = {}
+        self._seguridad: Dict[Tuple, Dict] = {}
+        self._seguro: Optional[Dict] = None
+
+    def logistica(self, transport_type: str, container_type: Optional[str]) -> Dict:
+        """Flete + gastos locales + IVA con márgenes, por (transporte, contenedor)."""
+        clave = (transport_type, container_type)
+        if clave not in self._logistica:
+            from .quotation_engine import generar_cotizacion_automatica
+
+            self.consultas += 1
+            try:
+                cotizacion = generar_cotizacion_automatica(
+                    pol=self.pol,
+                    pod=self.pod,
+                    transport_type=transport_type,
+                    container_type=container_type or '20GP',
+                    quantity=self.cantidad if transport_type == 'FCL' else 1,
+                    weight_kg=self.peso_kg,
+                    volume_cbm=self.volumen_cbm,
+                    destination_port=self.destination_port,
+                    apply_margins=self.apply_margins,
+                )
+                totales = cotizacion.get('totales', {})
+                metadata = cotizacion.get('metadata', {})
+                flete = Money.of(totales.get('fletes'))
+                self._logistica[clave] = {
+                    'cotizado': flete > 0,
+                    'flete': flete,
+                    'gastos_locales': Money.of(totales.get('gastos_locales')),
+                    'iva': Money.of(totales.get('iva')),
+                    'carrier': metadata.get('carrier'),
+                    'transit_time': metadata.get('transit_time'),
+                    'advertencias': list(cotizacion.get('errors', [])) + list(cotizacion.get('warnings', [])),
+                }
+                if not flete > 0:
+                    self._logistica[clave]['advertencias'].append(
+                        f"Sin flete cotizado para {transport_type} {container_type or ''}".strip()
+                    )
+            except Exception as e:
+                logger.warning(f"No se pudo cotizar {transport_type} {container_type or ''} {self.pol} → {self.pod}: {e}")
+                self._logistica[clave] = {
+                    'cotizado': False,
+                    'flete': Money.zero(),
+                    'gastos_locales': Money.zero(),
+                    'iva': Money.zero(),
+                    'carrier': None,
+                    'transit_time': None,
+                    'advertencias': [f"Sin tarifas para {transport_type} {container_type or ''}".strip()],
+                }
+        return self._logistica[clave]
+
+    def seguro(self) -> Dict:
+        if self._seguro is None:
+            from .quotation_engine import calcular_seguro
+
+            self.consultas += 1
+            # Sin tarifa activa calcular_seguro devuelve tramo_encontrado=False;
+            # cualquier otro error es un defecto y no se oculta como seguro 0
+            self._seguro = calcular_seguro(self.valor_mercancia_usd)
+        return self._seguro
+
+    def seguridad(self, destination_city: str, opcion: str) -> Dict:
+        custodia, candado = OPCIONES_SEGURIDAD[opcion]
+        clave = (destination_city.lower(), custodia, candado)
+        if clave not in self._seguridad:
+            from .quotation_engine import calcular_servicios_seguridad
+
+            if custodia or candado:
+                self.consultas += 1
+            try:
+                self._seguridad[clave] = calcular_servicios_seguridad(
+                    destination_city,
+                    wants_armed_custody=custodia,
+                    wants_satellite_lock=candado,
+                )
+            except Exception as e:
+                logger.warning(f"No se pudo calcular seguridad {opcion} para {destination_city}: {e}")
+                self._seguridad[clave] = {'items': [], 'total': 0.0, 'has_security': False}
+        return self._seguridad[clave]
+
+    def transporte_interno(self, transport_type: str, container_type: Optional[str], destination_city: str) -> Optional[Money]:
+        """
+        Tarifa de transporte interno hasta la ciudad destino, o None si no hay.
+        FCL: por contenedor (InlandFCLTariff); LCL/AÉREO: la más económica de
+        InlandTransportQuoteRate. Ambas desde las tablas compiladas en memoria.
+        """
+        from .reference_tables import obtener_tablas_referencia
+
+        tablas = obtener_tablas_referencia()
+        if transport_type == 'FCL':
+            candidatas = [t.tarifa for t in tablas.transporte_fcl.buscar(destination_city, container_type or '')]
+            if not candidatas:
+                return None
+            return min(candidatas) * self.cantidad
+
+        candidatas = [t.tarifa for t in tablas.transporte_carga_suelta.buscar(destination_city)]
+        return min(candidatas) if candidatas else None
+
+
+def _tributos(valor_cif: Money, ad_valorem_pct: Decimal) -> Tuple[Money, Money, Money]:
+    """Ad-Valorem y FODINFA sobre CIF; IVA sobre CIF + Ad-Valorem + FODINFA."""
+    from .gemini_service import SENAE_TRIBUTOS_2025
+
+    ad_valorem = valor_cif.porcentaje(ad_valorem_pct)
+    fodinfa = valor_cif * SENAE_TRIBUTOS_2025['fodinfa_rate']
+    iva = (valor_cif + ad_valorem + fodinfa) * SENAE_TRIBUTOS_2025['iva_rate']
+    return ad_valorem, fodinfa, iva
+
+
+def _combinaciones(
+    transportes: List[str],
+    contenedores: List[str],
+    ciudades: List[str],
+    incoterms: List[str],
+    opciones_isd: List[bool],
+    opciones_seguridad: List[str],
+):
+    """Producto cartesiano; contenedor y seguridad solo varían en FCL."""
+    for transporte in transportes:
+        tipos = contenedores if transporte == 'FCL' else [None]
+        seguridades = opciones_seguridad if transporte == 'FCL' else ['NINGUNA']
+        yield from itertools.product([transporte], tipos, ciudades, incoterms, opciones_isd, seguridades)
+
+
+def simular_costos_importacion(
+    pol: str,
+    pod: str,
+    valor_mercancia_usd: Union[int, float, Decimal],
+    peso_kg: Optional[Union[int, float, Decimal]] = None,
+    volumen_cbm: Optional[Union[int, float, Decimal]] = None,
+    transportes: Union[str, Iterable[str], None] = None,
+    contenedores: Union[str, Iterable[str], None] = None,
+    ciudades: Union[str, Iterable[str], None] = None,
+    incoterms: Union[str, Iterable[str], None] = None,
+    isd: Union[bool, Iterable[bool], None] = None,
+    seguridad: Union[str, Iterable[str], None] = None,
+    ad_valorem_pct: Optional[Union[int, float, Decimal]] = None,
+    destination_port: str = 'GYE',
+    cantidad: int = 1,
+    apply_margins: bool = True,
+) -> ResultadoSimulacion:
+    """
+    Calcula la grilla de costo puesto en destino para todas las combinaciones.
+
+    Args:
+        pol / pod: Puertos de origen y destino
+        valor_mercancia_usd: Valor de la factura comercial bajo cada incoterm
+        peso_kg / volumen_cbm: Datos de la carga
+        transportes: 'FCL', 'LCL', 'AEREO' (default: los tres)
+        contenedores: Tipos FCL (default: 20GP, 40GP, 40HC)
+        ciudades: Ciudades destino del transporte interno (default: Guayaquil)
+        incoterms: EXW, FCA, FOB, CFR, CPT, CIF, CIP (default: FOB)
+        isd: Valores de ISD a comparar, p.ej. [False, True] (default: [True])
+        seguridad: NINGUNA, CUSTODIA_ARMADA, CANDADO_SATELITAL, COMPLETA (solo FCL)
+        ad_valorem_pct: Ad-Valorem de la partida (default SENAE 10%)
+        destination_port: Puerto de Ecuador para gastos locales
+        cantidad: Contenedores por escenario FCL
+        apply_margins: Si se aplican márgenes de ganancia
+
+    Returns:
+        ResultadoSimulacion con los escenarios cotizados ordenados por
+        total_landed_usd, seguidos de los que no tienen tarifa
+
+    Raises:
+        ValueError: si alguna opción no es válida o la grilla es demasiado grande
+    """
+    from .gemini_service import SENAE_TRIBUTOS_2025
+
+    valor = Money.of(valor_mercancia_usd)
+    if valor <= 0:
+        raise ValueError("valor_mercancia_usd debe ser mayor que cero")
+    if cantidad < 1:
+        raise ValueError("cantidad debe ser al menos 1")
+
+    transportes = [t.upper() for t in _normalizar_lista(transportes, TRANSPORTES_SOPORTADOS)]
+    contenedores = [c.upper().replace(' ', '') for c in _normalizar_lista(contenedores, ('20GP', '40GP', '40HC'))]
+    ciudades = _normalizar_lista(ciudades, ('Guayaquil',))
+    incoterms = [i.upper() for i in _normalizar_lista(incoterms, ('FOB',))]
+    opciones_isd = list(dict.fromkeys(_a_bool(v) for v in _normalizar_lista(isd, (True,))))
+    opciones_seguridad = [s.upper() for s in _normalizar_lista(seguridad, ('NINGUNA',))]
+
+    for nombre, valores, permitidos in (
+        ('transportes', transportes, TRANSPORTES_SOPORTADOS),
+        ('incoterms', incoterms, INCOTERMS_SOPORTADOS),
+        ('seguridad', opciones_seguridad, tuple(OPCIONES_SEGURIDAD)),
+    ):
+        invalidos = [v for v in valores if v not in permitidos]
+        if invalidos:
+            raise ValueError(f"{nombre} no soportados: {', '.join(invalidos)}. Opciones: {', '.join(permitidos)}")
+    if not (transportes and ciudades and incoterms and opciones_isd and opciones_seguridad):
+        raise ValueError("Cada rango de la simulación debe tener al menos una opción")
+    if 'FCL' in transportes and not contenedores:
+        raise ValueError("Se requiere al menos un tipo de contenedor para FCL")
+
+    combinaciones = list(_combinaciones(
+        transportes, contenedores, ciudades, incoterms, opciones_isd, opciones_seguridad
+    ))
+    if len(combinaciones) > MAX_ESCENARIOS:
+        raise ValueError(f"La simulación genera {len(combinaciones)} escenarios (máximo {MAX_ESCENARIOS})")
+
+    if ad_valorem_pct is None:
+        ad_valorem = SENAE_TRIBUTOS_2025['ad_valorem_default'] * Decimal('100')
+    else:
+        ad_valorem = Decimal(str(ad_valorem_pct))
+
+    contexto = ContextoSimulacion(
+        pol=pol,
+        pod=pod,
+        valor_mercancia_usd=valor,
+        peso_kg=Decimal(str(peso_kg)) if peso_kg is not None else None,
+        volumen_cbm=Decimal(str(volumen_cbm)) if volumen_cbm is not None else None,
+        destination_port=destination_port,
+        cantidad=cantidad,
+        apply_margins=apply_margins,
+    )
+
+    tributos_por_cif: Dict[Money, Tuple[Money, Money, Money]] = {}
+    escenarios: List[EscenarioLandedCost] = []
+
+    for transporte, contenedor, ciudad, incoterm, aplica_isd, opcion_seguridad in combinaciones:
+        logistica = contexto.logistica(transporte, contenedor)
+        advertencias = list(logistica['advertencias'])
+
+        paga_flete = incoterm in INCOTERMS_FLETE_IMPORTADOR
+        paga_seguro = incoterm in INCOTERMS_SEGURO_IMPORTADOR
+        flete = logistica['flete'] if paga_flete else Money.zero()
+
+        seguro = Money.zero()
+        if paga_seguro:
+            datos_seguro = contexto.seguro()
+            seguro = Money.of(datos_seguro.get('total'))
+            if not datos_seguro.get('tramo_encontrado', True):
+                advertencias.append(datos_seguro.get('error', 'Sin tarifa de seguro'))
+
+        costo_seguridad = Money.zero()
+        if opcion_seguridad != 'NINGUNA':
+            datos_seguridad = contexto.seguridad(ciudad, opcion_seguridad)
+            costo_seguridad = Money.of(datos_seguridad.get('total'))
+            if not datos_seguridad.get('has_security'):
+                advertencias.append(f"Sin tarifa de seguridad {opcion_seguridad} para {ciudad}")
+
+        interno = contexto.transporte_interno(transporte, contenedor, ciudad)
+        if interno is None:
+            advertencias.append(f"Sin tarifa de transporte interno a {ciudad}")
+            interno = Money.zero()
+
+        if incoterm == 'EXW':
+            advertencias.append("EXW: gastos de origen no incluidos en la simulación")
+
+        valor_cif = valor + flete + seguro
+        if valor_cif not in tributos_por_cif:
+            tributos_por_cif[valor_cif] = _tributos(valor_cif, ad_valorem)
+        ad_valorem_usd, fodinfa_usd, iva_importacion = tributos_por_cif[valor_cif]
+
+        escenarios.append(EscenarioLandedCost(
+            transport_type=transporte,
+            container_type=contenedor,
+            destination_city=ciudad,
+            incoterm=incoterm,
+            aplica_isd=aplica_isd,
+            seguridad=opcion_seguridad,
+            flete_usd=flete,
+            gastos_locales_usd=logistica['gastos_locales'],
+            iva_gastos_locales_usd=logistica['iva'],
+            seguro_usd=seguro,
+            seguridad_usd=costo_seguridad,
+            transporte_interno_usd=interno,
+            valor_cif_usd=valor_cif,
+            ad_valorem_usd=ad_valorem_usd,
+            fodinfa_usd=fodinfa_usd,
+            iva_importacion_usd=iva_importacion,
+            isd_usd=valor * ISD_RATE if aplica_isd else Money.zero(),
+            valor_mercancia_usd=valor,
+            carrier=logistica['carrier'],
+            transit_time=logistica['transit_time'],
+            advertencias=advertencias,
+            cotizado=logistica['cotizado'],
+        ))
+
+    # Los escenarios sin tarifa van al final: su total omite flete y gastos locales
+    escenarios.sort(key=lambda e: (not e.cotizado, e.total_landed_usd))
+
+    logger.info(
+        f"Simulación landed cost {pol} → {pod}: {len(escenarios)} escenarios, "
+        f"{contexto.consultas} consultas de precios"
+    )
+
+    return ResultadoSimulacion(
+        escenarios=escenarios,
+        parametros={
+            'pol': pol,
+            'pod': pod,
+            'valor_mercancia_usd': valor.to_float(),
+            'peso_kg': float(peso_kg) if peso_kg is not None else None,
+            'volumen_cbm': float(volumen_cbm) if volumen_cbm is not None else None,
+            'transportes': transportes,
+            'contenedores': contenedores if 'FCL' in transportes else [],
+            'ciudades': ciudades,
+            'incoterms': incoterms,
+            'isd': opciones_isd,
+            'seguridad': opciones_seguridad,
+            'ad_valorem_pct': float(ad_valorem),
+            'destination_port': destination_port,
+            'cantidad': cantidad,
+        },
+        consultas_precios=contexto.consultas,
+    )
+
+
+def simular_costos_importacion_json(**kwargs) -> Dict:
+    """Versión JSON de simular_costos_importacion."""
+    try:
+        resultado = simular_costos_importacion(**kwargs)
+    except (ValueError, TypeError, InvalidOperation, MoneyError) as e:
+        return {"exito": False, "error": str(e) or "Parámetros numéricos inválidos"}
+    return {"exito": True, **resultado.to_dict()}
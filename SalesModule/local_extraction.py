@@ -0,0 +1,374 @@
+"""
+Local Document Extraction for ImportaYa.ia
+Extracción determinística (sin IA) de facturas y packing lists con texto.
+
+Nivel previo a Gemini en document_extraction: la mayoría de facturas
+comerciales y packing lists llegan como PDF generado por software o como
+XLSX, y sus datos clave están escritos junto a etiquetas conocidas
+("GROSS WEIGHT: 1,250.00 KGS", "INCOTERM: FOB", "HS CODE 8471.30"...).
+
+- PDF: capa de texto con pypdf (opcional). Si casi no hay texto por página
+  el PDF se considera escaneado y se deja para la IA.
+- XLSX / CSV: primero la tabla de packing list (packing_list.py, totales
+  exactos); luego las celdas de cada fila se leen como una línea de texto.
+- TXT: líneas de texto.
+
+Cada campo se devuelve con su confianza (0-100) según cómo se encontró:
+etiqueta específica en la misma línea, etiqueta genérica, valor en la línea
+siguiente... La interfaz usa field_confidence para marcar los valores a
+revisar. Si se encuentran menos de MIN_CAMPOS campos el documento pasa a la IA.
+"""
+import logging
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from .packing_list import PackingListError, _parsear_numero
+
+logger = logging.getLogger(__name__)
+
+try:
+    from pypdf import PdfReader
+    PYPDF_AVAILABLE = True
+except ImportError:
+    PYPDF_AVAILABLE = False
+
+# Campos mínimos para no llamar a la IA
+MIN_CAMPOS = 3
+
+# Por debajo de este promedio de caracteres por página el PDF se trata como escaneado
+MIN_CARACTERES_POR_PAGINA = 40
+
+MAX_PAGINAS = 20
+MAX_LINEAS = 5000
+
+CONFIANZA_ETIQUETA = 90
+CONFIANZA_GENERICA = 60
+# Valor en la línea siguiente a la etiqueta o antes de ella ("12.5 CBM")
+PENALIZACION_POSICION = 15
+BONO_TOTAL = 5
+
+# (etiqueta, específica); las palabras se separan por espacio
+ETIQUETAS = {
+    'gross_weight_kg': [
+        ('TOTAL GROSS WEIGHT', True), ('GROSS WEIGHT', True), ('GROSS WT', True), ('G W', True),
+        ('GW', True), ('PESO BRUTO', True), ('P BRUTO', True),
+    ],
+    'net_weight_kg': [
+        ('TOTAL NET WEIGHT', True), ('NET WEIGHT', True), ('NET WT', True), ('N W', True),
+        ('NW', True), ('PESO NETO', True),
+    ],
+    'volume_cbm': [
+        ('TOTAL CBM', True), ('TOTAL VOLUME', True), ('MEASUREMENT', True), ('VOLUMEN', True),
+        ('VOLUME', True), ('CBM', True), ('MEAS', False), ('M3', False),
+    ],
+    'packages_count': [
+        ('TOTAL PACKAGES', True), ('TOTAL CARTONS', True), ('TOTAL CTNS', True), ('NO OF PACKAGES', True),
+        ('NUMBER OF PACKAGES', True), ('TOTAL BULTOS', True), ('PACKAGES', False), ('CARTONS', False),
+        ('CTNS', False), ('PKGS', False), ('BULTOS', False),
+    ],
+    'invoice_value_usd': [
+        ('TOTAL AMOUNT', True), ('INVOICE TOTAL', True), ('INVOICE VALUE', True), ('TOTAL VALUE', True),
+        ('GRAND TOTAL', True), ('TOTAL USD', True), ('TOTAL FOB', True), ('VALOR TOTAL', True),
+        ('AMOUNT', False), ('TOTAL', False),
+    ],
+    'invoice_number': [
+        ('COMMERCIAL INVOICE NO', True), ('INVOICE NUMBER', True), ('INVOICE NO', True), ('INV NO', True),
+        ('NUMERO DE FACTURA', True), ('FACTURA NO', True), ('NO FACTURA', True), ('INVOICE', False),
+    ],
+}
+
+CAMPOS_NUMERICOS = ('gross_weight_kg', 'net_weight_kg', 'volume_cbm', 'packages_count', 'invoice_value_usd')
+# Etiquetas que también se escriben como unidad después del número
+CAMPOS_UNIDAD = ('volume_cbm', 'packages_count')
+
+INCOTERMS = ('EXW', 'FCA', 'FAS', 'FOB', 'CFR', 'CIF', 'CPT', 'CIP', 'DAP', 'DPU', 'DDP')
+ETIQUETAS_INCOTERM = ('INCOTERM', 'TERMS OF DELIVERY', 'DELIVERY TERMS', 'TRADE TERMS', 'PRICE TERMS', 'TERMINO')
+ETIQUETAS_HS = ('HS CODE', 'H S CODE', 'HTS', 'HS NO', 'PARTIDA', 'TARIFF CODE', 'HS')
+
+
+def _patron_etiqueta(etiqueta: str) -> re.Pattern:
+    """Etiqueta sobre la línea en mayúsculas: entre palabras acepta signos ('G.W.', 'INVOICE NO.:')."""
+    partes = [re.escape(p) for p in etiqueta.split(' ')]
+    return re.compile(r'(?<![A-Z0-9])' + r'[^A-Z0-9]{0,3}'.join(partes) + r'(?![A-Z0-9])\.?')
+
+
+_PATRONES: Dict[str, List[Tuple[re.Pattern, bool]]] = {
+    campo: [(_patron_etiqueta(etiqueta), especifica) for etiqueta, especifica in etiquetas]
+    for campo, etiquetas in ETIQUETAS.items()
+}
+_PATRONES_HS = [_patron_etiqueta(e) for e in ETIQUETAS_HS]
+_PATRONES_INCOTERM = [_patron_etiqueta(e) for e in ETIQUETAS_INCOTERM]
+
+_RE_INCOTERM = re.compile(r'\b(' + '|'.join(INCOTERMS) + r')\b')
+# Con etiqueta se aceptan 6-10 dígitos; sin etiqueta solo el formato completo con puntos (8471.30.00)
+_RE_HS_ETIQUETA = re.compile(r'(?<![\d.,])(\d{4}\.?\d{2}(?:\.?\d{2}){0,2})(?![\d,]|\.\d)')
+_RE_HS_PUNTOS = re.compile(r'(?<![\d.,])(\d{4}\.\d{2}\.\d{2}(?:\.\d{2})?)(?![\d,]|\.\d)')
+_RE_NUMERO = re.compile(r'\d[\d.,]*')
+_RE_CODIGO = re.compile(r'[A-Z0-9][A-Z0-9\-/]{2,}')
+_RE_FECHA = re.compile(r'^\d{1,4}[-/]\d{1,2}[-/]\d{1,4}$')
+_RE_MONEDA = re.compile(r'USD|US\$|\$')
+_RE_LIBRAS = re.compile(r'^\s*(LBS?|POUNDS?)\b')
+_RE_SOLO_ETIQUETA = re.compile(r'^[\s:#.\-]*$')
+# Etiqueta seguida de separador: el valor va después ("CBM: 12.5")
+_RE_SEPARADOR_VALOR = re.compile(r'^\s*[:#=]')
+# Valor en la línea siguiente: solo si la línea empieza con el número (o su moneda)
+_RE_INICIA_NUMERO = re.compile(r'^\s*(?:USD|US\$|\$)?\s*\d')
+
+EXTENSIONES_TABLA = ('xlsx', 'xlsm', 'csv')
+
+
+@dataclass
+class ExtraccionLocal:
+    """Campos encontrados localmente con su confianza."""
+    fuente: str
+    datos: Dict = field(default_factory=dict)
+    confianza: Dict[str, int] = field(default_factory=dict)
+
+    def agregar(self, campo: str, valor, confianza: int, reemplazar: bool = False) -> None:
+        if valor in (None, '', []):
+            return
+        actual = self.confianza.get(campo)
+        if actual is None or confianza > actual or (reemplazar and confianza == actual):
+            self.datos[campo] = valor
+            self.confianza[campo] = min(confianza, 100)
+
+    @property
+    def campos(self) -> int:
+        return len(self.datos)
+
+    @property
+    def suficiente(self) -> bool:
+        return self.campos >= MIN_CAMPOS
+
+    def to_dict(self) -> Dict:
+        data = dict(self.datos)
+        data['field_confidence'] = dict(self.confianza)
+        if self.confianza:
+            data['extraction_confidence'] = round(sum(self.confianza.values()) / len(self.confianza))
+        data['extraction_source'] = self.fuente
+        return data
+
+
+# --- Fuentes de texto ---
+
+def _texto_pdf(archivo) -> Optional[List[str]]:
+    """Líneas de la capa de texto; None si no hay pypdf o el PDF es escaneado."""
+    if not PYPDF_AVAILABLE:
+        return None
+    lector = PdfReader(archivo)
+    paginas = lector.pages[:MAX_PAGINAS]
+    if not paginas:
+        return None
+    textos = [pagina.extract_text() or '' for pagina in paginas]
+    if sum(len(t.strip()) for t in textos) / len(paginas) < MIN_CARACTERES_POR_PAGINA:
+        return None
+    return [linea for texto in textos for linea in texto.splitlines()][:MAX_LINEAS]
+
+
+def _lineas_tabla(archivo, extension: str) -> List[str]:
+    """Cada fila de la hoja/CSV como una línea con sus celdas separadas por espacios."""
+    from .packing_list import _filas_csv, _filas_xlsx
+
+    hojas = _filas_xlsx(archivo) if extension in ('xlsx', 'xlsm') else _filas_csv(archivo)
+    lineas = []
+    for filas in hojas:
+        for fila in filas:
+            celdas = [str(c).strip() for c in fila if c not in (None, '')]
+            if celdas:
+                lineas.append('  '.join(celdas))
+                if len(lineas) >= MAX_LINEAS:
+                    return lineas
+    return lineas
+
+
+def _lineas_texto(archivo) -> List[str]:
+    contenido = archivo.read(MAX_LINEAS * 200)
+    if isinstance(contenido, bytes):
+        try:
+            contenido = contenido.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            contenido = contenido.decode('latin-1')
+    return contenido.splitlines()[:MAX_LINEAS]
+
+
+# --- Búsqueda por etiquetas ---
+
+def _sin_acentos(texto: str) -> str:
+    return unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii').upper()
+
+
+def _numero(texto: str) -> Optional[Tuple[float, str]]:
+    """Primer número del texto y lo que le sigue (unidad)."""
+    coincidencia = _RE_NUMERO.search(texto)
+    if not coincidencia:
+        return None
+    valor = _parsear_numero(coincidencia.group(0))
+    if valor is None:
+        return None
+    return valor, texto[coincidencia.end():]
+
+
+def _codigo(texto: str) -> Optional[str]:
+    for coincidencia in _RE_CODIGO.finditer(texto):
+        codigo = coincidencia.group(0)
+        if any(c.isdigit() for c in codigo) and not _RE_FECHA.match(codigo):
+            return codigo
+    return None
+
+
+def _convertir(campo: str, valor: float, unidad: str) -> Optional[float]:
+    if valor <= 0:
+        return None
+    if campo in ('gross_weight_kg', 'net_weight_kg'):
+        if _RE_LIBRAS.match(unidad):
+            from .calculator import normalizar_peso
+            return float(normalizar_peso(valor, 'LBR'))
+        return round(valor, 3)
+    if campo == 'packages_count':
+        return int(valor) if float(valor).is_integer() else None
+    if campo == 'volume_cbm':
+        return round(valor, 4)
+    return round(valor, 2)
+
+
+def _valor_campo(campo: str, linea: str, siguiente: str, inicio: int, fin: int) -> Optional[Tuple[object, int]]:
+    """
+    Valor de `campo` para la etiqueta en linea[inicio:fin]: en la misma
+    línea, o en la siguiente si la etiqueta está sola. Devuelve
+    (valor, penalización de confianza).
+    """
+    resto = linea[fin:]
+    sola = bool(_RE_SOLO_ETIQUETA.match(resto))
+
+    if campo == 'invoice_number':
+        codigo = _codigo(resto)
+        if codigo is None and sola:
+            codigo = _codigo(siguiente)
+            return (codigo, PENALIZACION_POSICION) if codigo else None
+        return (codigo, 0) if codigo else None
+
+    encontrado, penalizacion = _numero(resto), 0
+    if campo in CAMPOS_UNIDAD and (encontrado is None or not _RE_SEPARADOR_VALOR.match(resto)):
+        # "12.50 CBM", "45 CARTONS": el número va antes de la etiqueta. En una línea de
+        # totales ("45 CTNS  1,250.00 KGS  12.50 CBM") el número que sigue es de otro campo;
+        # solo "CTNS: 45" se lee hacia adelante.
+        previo = re.search(r'(\d[\d.,]*)\s*$', linea[:inicio])
+        valor = _parsear_numero(previo.group(1)) if previo else None
+        if valor is not None:
+            encontrado, penalizacion = (valor, ''), PENALIZACION_POSICION
+    if encontrado is None and sola and _RE_INICIA_NUMERO.match(siguiente):
+        encontrado, penalizacion = _numero(siguiente), PENALIZACION_POSICION
+    if encontrado is None:
+        return None
+    valor = _convertir(campo, encontrado[0], encontrado[1])
+    return (valor, penalizacion) if valor is not None else None
+
+
+def _codigos_hs(linea: str, siguiente: str) -> List[Tuple[str, int]]:
+    for patron in _PATRONES_HS:
+        etiqueta = patron.search(linea)
+        if etiqueta:
+            resto = linea[etiqueta.end():]
+            codigo = _RE_HS_ETIQUETA.search(resto)
+            if codigo:
+                return [(codigo.group(1), CONFIANZA_ETIQUETA)]
+            if _RE_SOLO_ETIQUETA.match(resto):
+                codigo = _RE_HS_ETIQUETA.search(siguiente)
+                if codigo:
+                    return [(codigo.group(1), CONFIANZA_ETIQUETA - PENALIZACION_POSICION)]
+            break
+    return [(codigo, CONFIANZA_GENERICA) for codigo in _RE_HS_PUNTOS.findall(linea)]
+
+
+def _buscar_etiquetas(lineas: List[str], extraccion: ExtraccionLocal) -> None:
+    codigos_hs: Dict[str, int] = {}
+
+    for i, linea in enumerate(lineas):
+        linea = _sin_acentos(linea)
+        if not linea.strip():
+            continue
+        siguiente = _sin_acentos(lineas[i + 1]) if i + 1 < len(lineas) else ''
+        es_total = 'TOTAL' in linea
+
+        for campo, patrones in _PATRONES.items():
+            for patron, especifica in patrones:
+                etiqueta = patron.search(linea)
+                if etiqueta is None:
+                    continue
+                # 'TOTAL' / 'AMOUNT' solos solo cuentan como valor de factura con moneda
+                if campo == 'invoice_value_usd' and not especifica and not _RE_MONEDA.search(linea):
+                    continue
+                encontrado = _valor_campo(campo, linea, siguiente, etiqueta.start(), etiqueta.end())
+                if encontrado is None:
+                    continue
+                valor, penalizacion = encontrado
+                confianza = (CONFIANZA_ETIQUETA if especifica else CONFIANZA_GENERICA) - penalizacion
+                if campo in CAMPOS_NUMERICOS and es_total:
+                    confianza += BONO_TOTAL
+                # En los numéricos el total suele estar al final: a igual confianza gana la última línea
+                extraccion.agregar(campo, valor, confianza, reemplazar=campo in CAMPOS_NUMERICOS)
+                break
+
+        incoterm = _RE_INCOTERM.search(linea)
+        if incoterm:
+            con_etiqueta = any(p.search(linea) for p in _PATRONES_INCOTERM)
+            extraccion.agregar('incoterm', incoterm.group(1), CONFIANZA_ETIQUETA if con_etiqueta else CONFIANZA_GENERICA + 10)
+
+        for codigo, confianza in _codigos_hs(linea, siguiente):
+            codigos_hs[codigo] = max(codigos_hs.get(codigo, 0), confianza)
+
+    if codigos_hs:
+        codigos = list(codigos_hs)[:10]
+        extraccion.agregar('hs_codes', ', '.join(codigos), min(codigos_hs[c] for c in codigos))
+
+
+# --- Entrada principal ---
+
+def extraer_local(archivo, nombre_archivo: str) -> Optional[ExtraccionLocal]:
+    """
+    Extrae los campos de un documento sin IA.
+
+    Args:
+        archivo: Archivo binario abierto (con seek)
+        nombre_archivo: Nombre original (para el formato)
+
+    Returns:
+        ExtraccionLocal, o None si el formato no se lee localmente o el PDF es escaneado
+    """
+    extension = nombre_archivo.lower().rsplit('.', 1)[-1] if '.' in nombre_archivo else ''
+    extraccion = ExtraccionLocal(fuente=f'local_{extension}')
+
+    if extension == 'pdf':
+        lineas = _texto_pdf(archivo)
+        if lineas is None:
+            return None
+    elif extension in EXTENSIONES_TABLA:
+        from .packing_list import procesar_packing_list
+        try:
+            resumen = procesar_packing_list(archivo, nombre_archivo, optimizar=False)
+        except PackingListError:
+            resumen = None
+        if resumen is not None and resumen.filas_validas:
+            datos = resumen.to_shipping_data()
+            confianza = datos.pop('extraction_confidence')
+            datos.pop('extraction_source', None)
+            for campo, valor in datos.items():
+                extraccion.agregar(campo, valor, confianza)
+            extraccion.fuente = 'packing_list'
+        archivo.seek(0)
+        lineas = _lineas_tabla(archivo, extension)
+    elif extension == 'txt':
+        lineas = _lineas_texto(archivo)
+    else:
+        return None
+
+    _buscar_etiquetas(lineas, extraccion)
+    if not extraccion.campos:
+        return None
+    logger.info(
+        f"Local extraction {nombre_archivo}: {extraccion.campos} fields "
+        f"({', '.join(f'{c}={v}' for c, v in extraccion.confianza.items())})"
+    )
+    return extraccion
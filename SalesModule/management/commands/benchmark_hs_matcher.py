@@ -0,0 +1,58 @@
+"""
+Management command to benchmark the compiled HS keyword matcher.
+Times the matcher against the legacy substring loop over HS_KEYWORD_MAPPING
+for a long (~2000 character) invoice description and a short one.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from SalesModule.gemini_service import HS_KEYWORD_MAPPING, _normalize_text
+from SalesModule.hs_matcher import construir_matcher
+
+DESCRIPCIONES = [
+    'Zapatos de cuero para dama',
+    'LAPTOP Dell Inspiron 15',
+    'Equipo de aire acondicionado split 12000 BTU',
+    'Camiseta de algodón estampada',
+    'Máquina de café espresso',
+    'repuestos varios sin clasificar',
+]
+
+
+def _legacy(descripcion):
+    texto = _normalize_text(descripcion)
+    for keyword in HS_KEYWORD_MAPPING:
+        if keyword in texto:
+            return keyword
+    return None
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the compiled HS keyword matcher against the legacy substring loop'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, default=500, help='Lookups per description')
+
+    def _medir(self, funcion, texto, vueltas):
+        funcion(texto)
+        inicio = time.perf_counter()
+        for _ in range(vueltas):
+            funcion(texto)
+        return (time.perf_counter() - inicio) / vueltas
+
+    def handle(self, *args, **options):
+        vueltas = options['rounds']
+        matcher = construir_matcher()
+        textos = (
+            ('larga', ' '.join(DESCRIPCIONES * 60)[:2000]),
+            ('corta', DESCRIPCIONES[0]),
+        )
+        self.stdout.write(f'{len(matcher)} palabras clave, {vueltas} búsquedas por descripción')
+        for etiqueta, texto in textos:
+            compilado = self._medir(matcher.coincidencias, texto, vueltas)
+            anterior = self._medir(_legacy, texto, vueltas)
+            self.stdout.write(
+                f'  {etiqueta:<6} ({len(texto):>4} car.)  matcher {compilado * 1e6:8.1f} µs  '
+                f'recorrido anterior {anterior * 1e6:8.1f} µs  x{anterior / compilado:.1f}'
+            )
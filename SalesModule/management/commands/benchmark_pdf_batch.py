@@ -0,0 +1,62 @@
+"""
+Management command to benchmark batch quote PDF rendering.
+Renders the same generated quotes in-process and with the process pool and
+reports PDFs per second for each.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from SalesModule.management.commands.generate_test_data import TEST_QUOTE_DOMAIN, sample_quote_submissions
+from SalesModule.models import QuoteSubmission
+from SalesModule.reports import batch_render
+
+
+class Command(BaseCommand):
+    help = 'Benchmark batch quote PDF rendering (in-process vs process pool)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=60, help='Number of quote PDFs per run')
+        parser.add_argument('--workers', type=int, default=None, help='Pool size (default: PDF_BATCH_WORKERS or one per core)')
+        parser.add_argument(
+            '--from-db',
+            action='store_true',
+            help='Use quote submissions created by generate_test_data --quote-submissions instead of unsaved samples',
+        )
+
+    def handle(self, *args, **options):
+        count = options['count']
+        if options['from_db']:
+            quotes = [
+                (quote, None) for quote in
+                QuoteSubmission.objects.filter(contact_email__endswith=f'@{TEST_QUOTE_DOMAIN}').order_by('id')[:count]
+            ]
+        else:
+            quotes = sample_quote_submissions(count)
+        if not quotes:
+            self.stdout.write(self.style.WARNING('No hay cotizaciones de prueba: ejecute generate_test_data --quote-submissions N'))
+            return
+
+        items = batch_render.prepare_batch(quotes)
+        workers = options['workers'] or batch_render.batch_workers()
+        self.stdout.write(f'Renderizando {len(items)} PDFs (pool de {workers} procesos)...')
+
+        results = {}
+        for label, pool_size in (('en proceso', 1), ('pool', workers)):
+            with override_settings(PDF_BATCH_WORKERS=pool_size):
+                if pool_size > 1:
+                    # Arranque y calentamiento del pool fuera de la medición, como en un proceso ya en servicio
+                    batch_render.PdfBatchJob(items[:pool_size * 2]).render_zip()
+                inicio = time.perf_counter()
+                job = batch_render.PdfBatchJob(items)
+                size = len(job.render_zip())
+                elapsed = time.perf_counter() - inicio
+            results[label] = elapsed
+            self.stdout.write(
+                f'  {label:<11} {elapsed:7.2f} s  {len(items) / elapsed:7.1f} PDF/s  '
+                f'ZIP {size / 1024:.0f} KB  fallidos {job.failed}'
+            )
+        batch_render.shutdown_pool()
+
+        self.stdout.write(self.style.SUCCESS(f"✓ Aceleración: x{results['en proceso'] / results['pool']:.2f}"))
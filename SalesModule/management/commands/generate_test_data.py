@@ -12,12 +12,68 @@ import random
 from SalesModule.models import (
     LeadCotizacion, QuoteScenario, QuoteLineItem,
     FreightRate, InsuranceRate, CustomsDutyRate, InlandTransportQuoteRate,
-    CustomsBrokerageRate, Shipment, ShipmentTracking, PreLiquidation
+    CustomsBrokerageRate, Shipment, ShipmentTracking, PreLiquidation, QuoteSubmission
 )
 from accounts.models import LeadProfile
 
 User = get_user_model()
 
+TEST_QUOTE_DOMAIN = 'test.importaya.ia'
+
+# Plantillas de cotización para PDFs (QuoteSubmission + escenario), una por tipo de transporte
+SAMPLE_QUOTE_SUBMISSIONS = [
+    {
+        'transport_type': 'FCL', 'origin': 'Shanghai',
+        'cargo_weight_kg': Decimal('18000'), 'cargo_volume_cbm': Decimal('60'),
+        'scenario': {'flete': 2850, 'dias_transito': '32', 'dias_libres': 21, 'validez': '30 días'},
+    },
+    {
+        'transport_type': 'LCL', 'origin': 'Ningbo',
+        'cargo_weight_kg': Decimal('1200'), 'cargo_volume_cbm': Decimal('5.0'),
+        'scenario': {'tarifa_cbm': 65, 'tarifa_ton': 65, 'dias_transito': '38', 'validez': '15 días'},
+    },
+    {
+        'transport_type': 'AEREO', 'origin': 'Miami',
+        'cargo_weight_kg': Decimal('150'), 'cargo_volume_cbm': Decimal('0.8'),
+        'scenario': {'tarifa_kg': Decimal('4.35'), 'dias_transito': '3', 'validez': '7 días'},
+    },
+]
+
+SAMPLE_QUOTE_CLIENTS = [
+    ('Importaciones del Pacífico S.A.', 'Carlos Méndez', 'Guayaquil'),
+    ('Comercial Andina Cía. Ltda.', 'María Torres', 'Quito'),
+    ('Distribuidora Austral', 'Jorge Palacios', 'Cuenca'),
+]
+
+
+def sample_quote_submissions(count, save=False):
+    """
+    count cotizaciones de prueba como pares (QuoteSubmission, escenario), alternando
+    FCL, LCL y aéreo. Sin save no se escriben en la base (benchmark_pdf_batch).
+    """
+    quotes = []
+    for i in range(count):
+        template = dict(SAMPLE_QUOTE_SUBMISSIONS[i % len(SAMPLE_QUOTE_SUBMISSIONS)])
+        scenario = dict(template.pop('scenario'))
+        company_name, contact_name, city = SAMPLE_QUOTE_CLIENTS[i % len(SAMPLE_QUOTE_CLIENTS)]
+        quote = QuoteSubmission(
+            submission_number=f"QS-TEST{i + 1:05d}",
+            company_name=company_name,
+            contact_name=contact_name,
+            contact_email=f"cotizacion{i + 1}@{TEST_QUOTE_DOMAIN}",
+            contact_phone='+593 99 000 0000',
+            city=city,
+            destination='Guayaquil',
+            cargo_description='Carga general de prueba',
+            **template
+        )
+        if save:
+            quote.save()
+        elif quote.id is None:
+            quote.id = i + 1
+        quotes.append((quote, scenario))
+    return quotes
+
 
 class Command(BaseCommand):
     help = 'Generate realistic test data for QA validation'
@@ -28,6 +84,12 @@ class Command(BaseCommand):
             action='store_true',
             help='Clear existing test data before generating new data',
         )
+        parser.add_argument(
+            '--quote-submissions',
+            type=int,
+            default=0,
+            help='Also create N quote submissions for PDF tests (see benchmark_pdf_batch)',
+        )
 
     def handle(self, *args, **options):
         self.stdout.write('Generando datos de prueba para ImportaYa.ia...\n')
@@ -45,6 +107,8 @@ class Command(BaseCommand):
         cotizaciones = self.create_cotizaciones(users)
         shipments = self.create_shipments(users, cotizaciones)
         self.create_pre_liquidations(cotizaciones)
+        if options['quote_submissions']:
+            self.create_quote_submissions(options['quote_submissions'])
         
         self.stdout.write(self.style.SUCCESS('\n✓ Datos de prueba generados exitosamente!'))
         self.print_summary()
@@ -57,6 +121,7 @@ class Command(BaseCommand):
         QuoteLineItem.objects.all().delete()
         QuoteScenario.objects.all().delete()
         LeadCotizacion.objects.all().delete()
+        QuoteSubmission.objects.filter(contact_email__endswith=f'@{TEST_QUOTE_DOMAIN}').delete()
         FreightRate.objects.all().delete()
         InsuranceRate.objects.all().delete()
         CustomsDutyRate.objects.all().delete()
@@ -370,6 +435,10 @@ class Command(BaseCommand):
         
         return cotizaciones
 
+    def create_quote_submissions(self, count):
+        self.stdout.write(f'Creando {count} solicitudes de cotización de prueba...')
+        return [quote for quote, _ in sample_quote_submissions(count, save=True)]
+
     def create_shipments(self, users, cotizaciones):
         self.stdout.write('Creando embarques de prueba...')
         shipments = []
@@ -480,6 +549,7 @@ class Command(BaseCommand):
         self.stdout.write(f'  Transporte interno: {InlandTransportQuoteRate.objects.count()}')
         self.stdout.write(f'  Agenciamiento: {CustomsBrokerageRate.objects.count()}')
         self.stdout.write(f'  Cotizaciones: {LeadCotizacion.objects.count()}')
+        self.stdout.write(f'  Solicitudes de cotización: {QuoteSubmission.objects.filter(contact_email__endswith=f"@{TEST_QUOTE_DOMAIN}").count()}')
         self.stdout.write(f'  Embarques: {Shipment.objects.count()}')
         self.stdout.write(f'  Pre-liquidaciones: {PreLiquidation.objects.count()}')
         self.stdout.write('='*60)
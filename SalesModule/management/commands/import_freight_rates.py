@@ -0,0 +1,95 @@
+"""
+import_freight_rates.py - Comando de Django para importar tarifarios de flete
+
+Uso:
+    python manage.py import_freight_rates archivo.csv --format fcl
+    python manage.py import_freight_rates archivo.csv --format air --mode replace
+    python manage.py import_freight_rates archivo.xlsx --format lcl --dry-run
+
+Formatos disponibles: ver SalesModule/rate_import.py (FORMATS).
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from SalesModule.rate_import import (
+    FORMATS, DEFAULT_CHUNK_SIZE, RateImportError, importar_tarifas,
+)
+
+
+class Command(BaseCommand):
+    help = 'Importa un tarifario de fletes (FCL, LCL, aéreo) con upsert por clave natural'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Ruta al archivo CSV (separador ;) o Excel')
+        parser.add_argument(
+            '--format',
+            required=True,
+            choices=sorted(FORMATS.keys()),
+            help='Formato del archivo',
+        )
+        parser.add_argument(
+            '--mode',
+            default='upsert',
+            choices=['upsert', 'replace'],
+            help='upsert: crea/actualiza tarifas. replace: el archivo reemplaza todo el tarifario del tipo',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Solo muestra el reporte de diferencias, sin escribir en la base de datos',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help='Tamaño de bloque para bulk_create / bulk_update',
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Imprime el reporte completo en JSON',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            resultado = importar_tarifas(
+                options['path'],
+                options['format'],
+                mode=options['mode'],
+                dry_run=options['dry_run'],
+                chunk_size=options['chunk_size'],
+            )
+        except (RateImportError, FileNotFoundError) as e:
+            raise CommandError(str(e))
+
+        if options['json']:
+            self.stdout.write(json.dumps(resultado.to_dict(max_changes=len(resultado.changes)), indent=2, ensure_ascii=False))
+            return
+
+        titulo = 'Simulación (dry-run)' if resultado.dry_run else 'Importación completada'
+        self.stdout.write(self.style.SUCCESS(f'✓ {titulo}: {resultado.scope} ({resultado.format}, modo {resultado.mode})'))
+        self.stdout.write(f'  - Filas leídas: {resultado.total_rows}')
+        self.stdout.write(f'  - Filas válidas: {resultado.valid_rows}')
+        self.stdout.write(f'  - Creadas: {resultado.created}')
+        self.stdout.write(f'  - Actualizadas: {resultado.updated}')
+        self.stdout.write(f'  - Sin cambios: {resultado.unchanged}')
+        if resultado.mode == 'replace':
+            self.stdout.write(f'  - Eliminadas: {resultado.deleted}')
+        if resultado.duplicates:
+            self.stdout.write(self.style.WARNING(f'  - Duplicadas en archivo: {resultado.duplicates}'))
+        if resultado.errors:
+            self.stdout.write(self.style.WARNING(f'  - Filas con errores: {len(resultado.errors)}'))
+            for error in resultado.errors[:10]:
+                self.stdout.write(f'      {error}')
+        if resultado.snapshot_id:
+            self.stdout.write(self.style.SUCCESS(f'  - Snapshot activo: {resultado.snapshot_id}'))
+
+        if resultado.dry_run and resultado.changes:
+            self.stdout.write('')
+            self.stdout.write('Cambios (primeros 20):')
+            for cambio in resultado.changes[:20]:
+                linea = f"  [{cambio['action']}] {cambio['key']}"
+                if cambio.get('fields'):
+                    linea += ' ' + ', '.join(f"{k}: {v[0]} → {v[1]}" for k, v in cambio['fields'].items())
+                self.stdout.write(linea)
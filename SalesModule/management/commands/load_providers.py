@@ -4,7 +4,7 @@ Usage: python manage.py load_providers
 """
 from django.core.management.base import BaseCommand
 from SalesModule.models import LogisticsProvider
-import re
+from SalesModule.provider_codes import generar_codigo_proveedor
 
 
 class Command(BaseCommand):
@@ -43,27 +43,6 @@ class Command(BaseCommand):
         'KLM', 'IBERIA', 'ATLAS AIR INC', 'AEROMEXICO', 'PRIME AIR S.A.'
     ]
 
-    def generate_code(self, name, transport_type, existing_codes):
-        name_clean = re.sub(r'[^A-Za-z0-9\s]', '', name.upper())
-        words = name_clean.split()
-        
-        if len(words) == 1:
-            code = words[0][:6]
-        elif len(words) == 2:
-            code = words[0][:3] + words[1][:3]
-        else:
-            code = ''.join([w[0] for w in words[:4]])
-        
-        code = code[:8]
-        
-        base_code = code
-        counter = 1
-        while code in existing_codes:
-            code = f"{base_code[:6]}{counter}"
-            counter += 1
-        
-        return code
-
     def handle(self, *args, **options):
         self.stdout.write('Loading logistics providers...')
         
@@ -72,7 +51,7 @@ class Command(BaseCommand):
         updated_count = 0
         
         for idx, name in enumerate(self.FCL_PROVIDERS):
-            code = self.generate_code(name, 'FCL', existing_codes)
+            code = generar_codigo_proveedor(name, 'FCL', existing_codes)
             provider, created = LogisticsProvider.objects.update_or_create(
                 code=code,
                 defaults={
@@ -91,7 +70,7 @@ class Command(BaseCommand):
         
         for idx, (name, code) in enumerate(self.LCL_PROVIDERS):
             if code in existing_codes:
-                code = self.generate_code(name, 'LCL', existing_codes)
+                code = generar_codigo_proveedor(name, 'LCL', existing_codes)
             provider, created = LogisticsProvider.objects.update_or_create(
                 code=code,
                 defaults={
@@ -109,7 +88,7 @@ class Command(BaseCommand):
                 updated_count += 1
         
         for idx, name in enumerate(self.AEREO_PROVIDERS):
-            code = self.generate_code(name, 'AEREO', existing_codes)
+            code = generar_codigo_proveedor(name, 'AEREO', existing_codes)
             provider, created = LogisticsProvider.objects.update_or_create(
                 code=code,
                 defaults={
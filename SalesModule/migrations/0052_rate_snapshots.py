@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:06
+
+from django.conf import settings
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('SalesModule', '0051_container_delete_carriercontract_delete_exchangerate_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(db_index=True, max_length=30)),
+                ('status', models.CharField(choices=[('staged', 'En Staging'), ('active', 'Activo'), ('archived', 'Archivado'), ('rolled_back', 'Revertido')], db_index=True, default='staged', max_length=20)),
+                ('label', models.CharField(blank=True, max_length=255)),
+                ('source_file', models.CharField(blank=True, max_length=500)),
+                ('rows', models.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('row_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('activated_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('previous', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='SalesModule.ratesnapshot')),
+            ],
+            options={
+                'verbose_name': 'Snapshot de Tarifas',
+                'verbose_name_plural': 'Snapshots de Tarifas',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='quotesubmission',
+            name='rate_snapshot',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='quote_submissions', to='SalesModule.ratesnapshot'),
+        ),
+    ]
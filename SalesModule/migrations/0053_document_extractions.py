@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:21
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SalesModule', '0052_rate_snapshots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentExtraction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64)),
+                ('scope', models.CharField(max_length=30)),
+                ('kind', models.CharField(choices=[('file', 'Archivo'), ('page', 'Página PDF')], default='file', max_length=10)),
+                ('file_name', models.CharField(blank=True, max_length=255)),
+                ('mime_type', models.CharField(blank=True, max_length=100)),
+                ('size_bytes', models.BigIntegerField(default=0)),
+                ('result', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('hits', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Extracción de Documento',
+                'verbose_name_plural': 'Extracciones de Documentos',
+                'unique_together': {('content_hash', 'scope', 'kind')},
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:48
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SalesModule', '0053_document_extractions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ValidatedAddress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('address_key', models.CharField(max_length=64, unique=True)),
+                ('address', models.TextField()),
+                ('city', models.CharField(blank=True, max_length=100)),
+                ('source', models.CharField(choices=[('ai', 'Gemini AI'), ('gazetteer', 'Nomenclátor local')], default='ai', max_length=20)),
+                ('result', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('hits', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Dirección Validada',
+                'verbose_name_plural': 'Direcciones Validadas',
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:52
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('SalesModule', '0054_validated_addresses'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssistantChatSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_key', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('turns', models.JSONField(default=list)),
+                ('turn_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='assistant_chat_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Sesión de Chat del Asistente',
+                'verbose_name_plural': 'Sesiones de Chat del Asistente',
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:59
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('SalesModule', '0055_assistant_chat_sessions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIUsageCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_key', models.CharField(db_index=True, max_length=40)),
+                ('day', models.DateField()),
+                ('operation', models.CharField(max_length=40)),
+                ('tier', models.CharField(blank=True, max_length=30)),
+                ('requests', models.IntegerField(default=0)),
+                ('rejected', models.IntegerField(default=0)),
+                ('units', models.FloatField(default=0)),
+                ('last_used_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ai_usage_counters', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Contador de Uso de IA',
+                'verbose_name_plural': 'Contadores de Uso de IA',
+                'indexes': [models.Index(fields=['day'], name='SalesModule_day_e9213f_idx')],
+                'unique_together': {('user_key', 'day', 'operation')},
+            },
+        ),
+    ]
@@ -3,6 +3,7 @@ from django.utils.translation import gettext_lazy as _
 from django.core.validators import MinValueValidator
 from decimal import Decimal, ROUND_HALF_UP
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 import uuid
 
 # --- MODELOS PRINCIPALES DEL CRM ---
@@ -186,6 +187,7 @@ class QuoteSubmission(models.Model):
     # Resultado Económico
     final_price = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
     profit_markup = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('100.00'))
+    rate_snapshot = models.ForeignKey('RateSnapshot', on_delete=models.SET_NULL, null=True, blank=True, related_name='quote_submissions')
     
     status = models.CharField(max_length=30, choices=STATUS_CHOICES, default='recibida')
     submission_number = models.CharField(max_length=30, unique=True, null=True, blank=True)
@@ -209,6 +211,9 @@ class QuoteSubmission(models.Model):
     def save(self, *args, **kwargs):
         if not self.submission_number:
             self.submission_number = f"QS-{uuid.uuid4().hex[:8].upper()}"
+        if self.rate_snapshot_id is None and self.transport_type:
+            from .rate_snapshots import obtener_snapshot_activo_id
+            self.rate_snapshot_id = obtener_snapshot_activo_id(self.transport_type)
         super().save(*args, **kwargs)
         
     def calculate_final_price(self):
@@ -305,6 +310,125 @@ class InlandSecurityTariff(models.Model):
     def get_rates_for_city(cls, city):
         return cls.objects.filter(destination_city__icontains=city, is_active=True)
 
+class RateSnapshot(models.Model):
+    """Versión de un tarifario de fletes (FCL, LCL o aéreo) cargada en staging y activada de forma atómica"""
+    STATUS_CHOICES = [
+        ('staged', _('En Staging')),
+        ('active', _('Activo')),
+        ('archived', _('Archivado')),
+        ('rolled_back', _('Revertido')),
+    ]
+
+    scope = models.CharField(max_length=30, db_index=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='staged', db_index=True)
+    label = models.CharField(max_length=255, blank=True)
+    source_file = models.CharField(max_length=500, blank=True)
+    rows = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+    row_count = models.IntegerField(default=0)
+    previous = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    activated_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = _('Snapshot de Tarifas')
+        verbose_name_plural = _('Snapshots de Tarifas')
+
+    def __str__(self):
+        return f"{self.scope} #{self.pk} ({self.status})"
+
+    @classmethod
+    def get_active(cls, scope):
+        return cls.objects.filter(scope=scope, status='active').first()
+
+
+class DocumentExtraction(models.Model):
+    """Resultado de extracción de IA de un archivo o página PDF, indexado por el SHA-256 de su contenido"""
+    KIND_CHOICES = [
+        ('file', _('Archivo')),
+        ('page', _('Página PDF')),
+    ]
+
+    content_hash = models.CharField(max_length=64)
+    scope = models.CharField(max_length=30)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default='file')
+    file_name = models.CharField(max_length=255, blank=True)
+    mime_type = models.CharField(max_length=100, blank=True)
+    size_bytes = models.BigIntegerField(default=0)
+    result = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    hits = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = [('content_hash', 'scope', 'kind')]
+        verbose_name = _('Extracción de Documento')
+        verbose_name_plural = _('Extracciones de Documentos')
+
+    def __str__(self):
+        return f"{self.scope}:{self.kind}:{self.content_hash[:12]}"
+
+class ValidatedAddress(models.Model):
+    """Dirección de entrega ya geocodificada, indexada por dirección y ciudad normalizadas"""
+    SOURCE_CHOICES = [
+        ('ai', _('Gemini AI')),
+        ('gazetteer', _('Nomenclátor local')),
+    ]
+
+    address_key = models.CharField(max_length=64, unique=True)
+    address = models.TextField()
+    city = models.CharField(max_length=100, blank=True)
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES, default='ai')
+    result = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    hits = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _('Dirección Validada')
+        verbose_name_plural = _('Direcciones Validadas')
+
+    def __str__(self):
+        return f"{self.city}: {self.address[:60]}"
+
+class AssistantChatSession(models.Model):
+    """Contexto compacto de una conversación con el asistente de IA (últimos turnos recortados)"""
+    session_key = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='assistant_chat_sessions')
+    turns = models.JSONField(default=list)
+    turn_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _('Sesión de Chat del Asistente')
+        verbose_name_plural = _('Sesiones de Chat del Asistente')
+
+    def __str__(self):
+        return f"{self.user_id}:{self.session_key}"
+
+class AIUsageCounter(models.Model):
+    """Solicitudes de IA por usuario, día y operación (atendidas y rechazadas por cuota)"""
+    user_key = models.CharField(max_length=40, db_index=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name='ai_usage_counters')
+    day = models.DateField()
+    operation = models.CharField(max_length=40)
+    tier = models.CharField(max_length=30, blank=True)
+    requests = models.IntegerField(default=0)
+    rejected = models.IntegerField(default=0)
+    units = models.FloatField(default=0)
+    last_used_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = _('Contador de Uso de IA')
+        verbose_name_plural = _('Contadores de Uso de IA')
+        unique_together = ['user_key', 'day', 'operation']
+        indexes = [models.Index(fields=['day'])]
+
+    def __str__(self):
+        return f"{self.user_key} {self.day} {self.operation}: {self.requests}"
+
 # --- COTIZACIONES DE USUARIO LEAD (FRONTEND) ---
 
 class LeadCotizacion(models.Model):
@@ -642,11 +766,23 @@ class Port(models.Model):
     @classmethod
     def search_by_name(cls, query, limit=20):
         from django.db.models import Q
+        from .resolvers import resolve_port
+        locode = resolve_port(query)
+        if locode:
+            exact = cls.objects.filter(un_locode=locode, is_active=True)
+            if exact.exists():
+                return exact[:limit]
         return cls.objects.filter(
             Q(name__icontains=query) | Q(un_locode__icontains=query),
             is_active=True
         )[:limit]
     
+    @classmethod
+    def resolve(cls, query):
+        from .resolvers import resolve_port
+        locode = resolve_port(query)
+        return cls.objects.filter(un_locode=locode).first() if locode else None
+    
     @classmethod
     def get_by_region(cls, region):
         return cls.objects.filter(region=region, is_active=True)
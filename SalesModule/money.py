@@ -0,0 +1,206 @@
+"""
+Money Type for ImportaYa.ia
+Montos monetarios en unidades menores enteras (centavos) + moneda.
+
+El motor de cotización trabajaba con float -> str -> Decimal -> float en cada
+paso (Decimal(str(tarifa['monto'])), float(precio_final)...) y re-cuantizaba
+a 0.01 en cada cálculo. Money guarda el monto como int de centavos:
+- suma/resta exactas y baratas (aritmética de enteros, sin contexto Decimal)
+- multiplicación por factores (tasas, márgenes, CBM) con un único redondeo
+  ROUND_HALF_UP a centavos, igual que quantize(Decimal('0.01'))
+- frontera explícita: Money.of() para entrar, to_decimal()/to_float()/
+  to_json() para salir hacia modelos y respuestas JSON
+
+Es inmutable y usa __slots__ para no crear un __dict__ por instancia.
+"""
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from typing import Iterable, Union
+
+CENTAVOS_POR_UNIDAD = 100
+
+IVA_PCT = Decimal('15')
+
+Numero = Union[int, float, str, Decimal]
+
+
+class MoneyError(ValueError):
+    """Operación monetaria inválida (monedas distintas, valor no numérico)"""
+    pass
+
+
+def _redondear(valor: Decimal) -> int:
+    return int(valor.to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def _a_decimal(valor: Numero) -> Decimal:
+    if isinstance(valor, Decimal):
+        return valor
+    if isinstance(valor, int):
+        return Decimal(valor)
+    try:
+        # str() para floats: 0.1 -> Decimal('0.1'), igual que Decimal(str(x))
+        return Decimal(str(valor).strip() or '0')
+    except InvalidOperation:
+        raise MoneyError(f"Valor numérico inválido: {valor!r}")
+
+
+class Money:
+    """Monto inmutable en centavos enteros."""
+
+    __slots__ = ('cents', 'currency')
+
+    def __init__(self, cents: int = 0, currency: str = 'USD'):
+        object.__setattr__(self, 'cents', int(cents))
+        object.__setattr__(self, 'currency', currency)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Money es inmutable")
+
+    def __reduce__(self):
+        return (Money, (self.cents, self.currency))
+
+    # --- Frontera de entrada ---
+
+    @classmethod
+    def of(cls, valor: Union['Money', Numero, None], currency: str = 'USD') -> 'Money':
+        """Money desde Money, int, float, str o Decimal (unidades mayores)."""
+        if isinstance(valor, Money):
+            return valor
+        if valor is None:
+            return cls(0, currency)
+        if isinstance(valor, int) and not isinstance(valor, bool):
+            return cls(valor * CENTAVOS_POR_UNIDAD, currency)
+        return cls(_redondear(_a_decimal(valor) * CENTAVOS_POR_UNIDAD), currency)
+
+    @classmethod
+    def zero(cls, currency: str = 'USD') -> 'Money':
+        return cls(0, currency)
+
+    # --- Frontera de salida ---
+
+    def to_decimal(self) -> Decimal:
+        return Decimal(self.cents).scaleb(-2)
+
+    def to_float(self) -> float:
+        return self.cents / CENTAVOS_POR_UNIDAD
+
+    def to_json(self) -> float:
+        return self.to_float()
+
+    def __float__(self) -> float:
+        return self.to_float()
+
+    # --- Aritmética ---
+
+    def _misma_moneda(self, otro: 'Money') -> None:
+        if self.currency != otro.currency:
+            raise MoneyError(f"No se pueden combinar {self.currency} y {otro.currency}")
+
+    def __add__(self, otro):
+        if isinstance(otro, Money):
+            self._misma_moneda(otro)
+            return Money(self.cents + otro.cents, self.currency)
+        if otro == 0:
+            return self
+        return NotImplemented
+
+    def __radd__(self, otro):
+        # Permite sum(montos) con el 0 inicial
+        if otro == 0:
+            return self
+        return self.__add__(otro)
+
+    def __sub__(self, otro):
+        if isinstance(otro, Money):
+            self._misma_moneda(otro)
+            return Money(self.cents - otro.cents, self.currency)
+        if otro == 0:
+            return self
+        return NotImplemented
+
+    def __neg__(self):
+        return Money(-self.cents, self.currency)
+
+    def __mul__(self, factor):
+        if isinstance(factor, Money):
+            return NotImplemented
+        if isinstance(factor, int) and not isinstance(factor, bool):
+            return Money(self.cents * factor, self.currency)
+        return Money(_redondear(self.cents * _a_decimal(factor)), self.currency)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, divisor):
+        if isinstance(divisor, Money):
+            self._misma_moneda(divisor)
+            return Decimal(self.cents) / Decimal(divisor.cents)
+        return Money(_redondear(Decimal(self.cents) / _a_decimal(divisor)), self.currency)
+
+    def porcentaje(self, pct: Numero) -> 'Money':
+        """pct% del monto, redondeado a centavos (porcentaje(15) -> 15%)."""
+        return Money(_redondear(self.cents * _a_decimal(pct) / 100), self.currency)
+
+    def iva(self, pct: Numero = IVA_PCT) -> 'Money':
+        """IVA sobre este monto (15% por defecto)."""
+        return self.porcentaje(pct)
+
+    def con_iva(self, pct: Numero = IVA_PCT) -> 'Money':
+        return self + self.iva(pct)
+
+    def margen(self, pct: Numero, minimo: Union['Money', Numero, None] = None) -> 'Money':
+        """Margen porcentual con mínimo opcional."""
+        margen = self.porcentaje(pct)
+        if minimo is not None:
+            margen = max(margen, Money.of(minimo, self.currency))
+        return margen
+
+    # --- Comparación ---
+
+    def _comparable(self, otro) -> int:
+        if isinstance(otro, Money):
+            self._misma_moneda(otro)
+            return otro.cents
+        if otro == 0:
+            return 0
+        raise TypeError(f"No se puede comparar Money con {type(otro).__name__}")
+
+    def __eq__(self, otro):
+        if isinstance(otro, Money):
+            return self.cents == otro.cents and self.currency == otro.currency
+        if otro == 0 and not isinstance(otro, bool):
+            return self.cents == 0
+        return NotImplemented
+
+    def __hash__(self):
+        return hash((self.cents, self.currency))
+
+    def __lt__(self, otro):
+        return self.cents < self._comparable(otro)
+
+    def __le__(self, otro):
+        return self.cents <= self._comparable(otro)
+
+    def __gt__(self, otro):
+        return self.cents > self._comparable(otro)
+
+    def __ge__(self, otro):
+        return self.cents >= self._comparable(otro)
+
+    def __bool__(self):
+        return self.cents != 0
+
+    def __repr__(self):
+        return f"Money('{self.to_decimal()}', '{self.currency}')"
+
+    def __str__(self):
+        return f"{self.currency} {self.to_decimal():,.2f}"
+
+
+def sumar(montos: Iterable[Money], currency: str = 'USD') -> Money:
+    """Suma de montos de la misma moneda (Money.zero si está vacío)."""
+    total = 0
+    for monto in montos:
+        if monto.currency != currency:
+            raise MoneyError(f"No se pueden combinar {currency} y {monto.currency}")
+        total += monto.cents
+    return Money(total, currency)
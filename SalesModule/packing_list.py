@@ -0,0 +1,574 @@
+"""
+Packing List Ingestion for ImportaYa.ia
+Lectura determinística (sin IA) de packing lists XLSX / CSV.
+
+El archivo se recorre fila por fila (openpyxl en modo read_only / csv), se
+detecta la fila de encabezados por sinónimos comunes (CTNS, G.W., MEAS,
+L x W x H...), se infieren las unidades desde el encabezado o, si no hay,
+desde la magnitud de los valores, y las filas se envían en bloques a
+batch_calculator.calcular_peso_cobrable_lote. Solo se conservan los totales
+acumulados, así que la memoria es constante sin importar el tamaño del archivo.
+
+El calculador trabaja por pieza, pero el peso bruto total se acumula con el
+peso declarado de cada línea (no peso/piezas redondeado × piezas), así que
+coincide con el total del packing list. Sin unidad en el encabezado, la unidad
+de dimensiones se infiere del primer bloque (unidad_dimensiones_origen =
+'inferida') y se advierte si un bloque posterior sugiere otra.
+
+Con los totales se consulta el optimizador de contenedores (container_logic).
+"""
+import codecs
+import csv
+import logging
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1000
+
+# Filas revisadas al inicio de cada hoja buscando los encabezados
+MAX_FILAS_ENCABEZADO = 30
+
+MAX_ERRORES = 50
+
+EXTENSIONES_SOPORTADAS = ('.xlsx', '.xlsm', '.csv', '.txt')
+
+# Sinónimos de encabezado (normalizados: sin acentos, mayúsculas, solo A-Z0-9 y espacios)
+SINONIMOS = {
+    'largo': ['LARGO', 'LENGTH', 'LONG', 'L'],
+    'ancho': ['ANCHO', 'WIDTH', 'W'],
+    'alto': ['ALTO', 'HEIGHT', 'H', 'ALTURA'],
+    'dimensiones': ['DIMENSIONES', 'DIMENSIONS', 'DIMENSION', 'DIM', 'MEDIDAS', 'CARTON SIZE',
+                    'CTN SIZE', 'SIZE', 'L W H', 'LXWXH', 'L X W X H'],
+    'peso_bruto': ['PESO BRUTO', 'GROSS WEIGHT', 'G W', 'GW', 'GROSS WT', 'GROSS', 'PESO'],
+    'peso_neto': ['PESO NETO', 'NET WEIGHT', 'N W', 'NW', 'NET WT'],
+    'piezas': ['CTNS', 'CTN', 'CARTONS', 'CARTON', 'BULTOS', 'CAJAS', 'PKGS', 'PACKAGES',
+               'PIEZAS', 'PCS', 'QTY', 'CANTIDAD', 'NO OF CTNS', 'NO OF PKGS', 'QUANTITY'],
+    'volumen': ['CBM', 'VOLUMEN', 'VOLUME', 'MEAS', 'MEASUREMENT', 'M3', 'TOTAL CBM'],
+    'descripcion': ['DESCRIPCION', 'DESCRIPTION', 'PRODUCTO', 'PRODUCT', 'ITEM', 'GOODS',
+                    'DESCRIPTION OF GOODS', 'MERCANCIA'],
+}
+
+# Indicadores de que el peso / volumen de la columna es por pieza y no total de la línea
+MARCAS_POR_PIEZA = ('PER CTN', 'PER CARTON', 'CTN', 'EACH', 'UNIT', 'C U', 'POR CAJA', 'UNITARIO', 'PER PC')
+MARCAS_TOTAL = ('TOTAL',)
+
+UNIDADES_LONGITUD = {'CM': 'CMT', 'CMS': 'CMT', 'MM': 'MM', 'M': 'MTR', 'MTS': 'MTR', 'MT': 'MTR',
+                     'IN': 'INH', 'INCH': 'INH', 'INCHES': 'INH', 'PULG': 'INH'}
+UNIDADES_PESO = {'KG': 'KGM', 'KGS': 'KGM', 'LB': 'LBR', 'LBS': 'LBR', 'TON': 'TNE', 'TNS': 'TNE'}
+
+_RE_DIMENSIONES = re.compile(r'(\d+(?:[.,]\d+)?)\s*[xX*×]\s*(\d+(?:[.,]\d+)?)\s*[xX*×]\s*(\d+(?:[.,]\d+)?)')
+_RE_NUMERO = re.compile(r'-?\d[\d.,]*')
+
+
+class PackingListError(Exception):
+    """Error al leer un packing list"""
+    pass
+
+
+def _normalizar(texto) -> str:
+    texto = unicodedata.normalize('NFKD', str(texto or '')).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(re.sub(r'[^A-Z0-9]+', ' ', texto.upper()).split())
+
+
+def _parsear_numero(valor) -> Optional[float]:
+    """Acepta números o texto como '1,234.5', '1.234,5', '12 kg'."""
+    if valor is None or isinstance(valor, bool):
+        return None
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    coincidencia = _RE_NUMERO.search(str(valor))
+    if not coincidencia:
+        return None
+    numero = coincidencia.group(0).rstrip('.,')
+    if ',' in numero and '.' in numero:
+        if numero.rfind(',') > numero.rfind('.'):
+            numero = numero.replace('.', '').replace(',', '.')
+        else:
+            numero = numero.replace(',', '')
+    elif ',' in numero:
+        entero, _, decimales = numero.rpartition(',')
+        numero = numero.replace(',', '') if len(decimales) == 3 and entero else numero.replace(',', '.')
+    try:
+        return float(numero)
+    except ValueError:
+        return None
+
+
+def _unidad_en_encabezado(encabezado: str, tabla: Dict[str, str]) -> Optional[str]:
+    for token in reversed(encabezado.split()):
+        if token in tabla:
+            return tabla[token]
+    return None
+
+
+@dataclass
+class ColumnasPackingList:
+    """Índices de las columnas detectadas y unidades inferidas del encabezado"""
+    indices: Dict[str, int]
+    encabezados: Dict[str, str]
+    unidad_dimensiones: Optional[str] = None
+    unidad_peso: Optional[str] = None
+    peso_por_pieza: bool = False
+    volumen_por_pieza: bool = False
+
+    @property
+    def tiene_dimensiones(self) -> bool:
+        return 'dimensiones' in self.indices or all(c in self.indices for c in ('largo', 'ancho', 'alto'))
+
+
+def _clasificar_celda(texto: str) -> Tuple[Optional[str], int]:
+    """
+    Campo canónico de un encabezado (la coincidencia más larga gana) y su
+    prioridad: posición del sinónimo en SINONIMOS (CTNS antes que QTY).
+    """
+    if not texto:
+        return None, 0
+    mejor, largo_mejor, prioridad = None, 0, 0
+    for campo, sinonimos in SINONIMOS.items():
+        for posicion, sinonimo in enumerate(sinonimos):
+            if texto == sinonimo or texto.startswith(sinonimo + ' ') or (len(sinonimo) > 2 and f' {sinonimo} ' in f' {texto} '):
+                if len(sinonimo) > largo_mejor:
+                    mejor, largo_mejor, prioridad = campo, len(sinonimo), posicion
+    return mejor, prioridad
+
+
+def detectar_encabezados(fila: Tuple) -> Optional[ColumnasPackingList]:
+    """
+    Devuelve las columnas si la fila parece un encabezado de packing list
+    (al menos peso o volumen/dimensiones y otra columna reconocida).
+    """
+    indices: Dict[str, int] = {}
+    encabezados: Dict[str, str] = {}
+    prioridades: Dict[str, int] = {}
+    for i, celda in enumerate(fila):
+        if isinstance(celda, (int, float)):
+            continue
+        texto = _normalizar(celda)
+        campo, prioridad = _clasificar_celda(texto)
+        if campo and prioridad < prioridades.get(campo, len(SINONIMOS[campo])):
+            indices[campo] = i
+            encabezados[campo] = texto
+            prioridades[campo] = prioridad
+
+    tiene_medida = 'peso_bruto' in indices or 'volumen' in indices or 'dimensiones' in indices or 'largo' in indices
+    if not tiene_medida or len(indices) < 2:
+        return None
+
+    columnas = ColumnasPackingList(indices=indices, encabezados=encabezados)
+
+    texto_dim = encabezados.get('dimensiones') or encabezados.get('largo') or ''
+    columnas.unidad_dimensiones = _unidad_en_encabezado(texto_dim, UNIDADES_LONGITUD)
+    columnas.unidad_peso = _unidad_en_encabezado(encabezados.get('peso_bruto', ''), UNIDADES_PESO)
+
+    texto_peso = f" {encabezados.get('peso_bruto', '')} "
+    columnas.peso_por_pieza = any(f' {m} ' in texto_peso for m in MARCAS_POR_PIEZA) and not any(
+        f' {m} ' in texto_peso for m in MARCAS_TOTAL
+    )
+    texto_volumen = f" {encabezados.get('volumen', '')} "
+    columnas.volumen_por_pieza = any(f' {m} ' in texto_volumen for m in MARCAS_POR_PIEZA) and not any(
+        f' {m} ' in texto_volumen for m in MARCAS_TOTAL
+    )
+    return columnas
+
+
+# --- LECTORES EN STREAMING ---
+
+def _filas_xlsx(archivo) -> Iterator[Iterator[Tuple]]:
+    """Una secuencia de filas por hoja (openpyxl read_only: no carga el libro completo)."""
+    from openpyxl import load_workbook
+
+    libro = load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        for hoja in libro.worksheets:
+            yield hoja.iter_rows(values_only=True)
+    finally:
+        libro.close()
+
+
+def _filas_csv(archivo) -> Iterator[Iterator[Tuple]]:
+    """Filas de un CSV (binario o texto), detectando separador y codificación."""
+    if isinstance(archivo, (str, bytes)) or hasattr(archivo, '__fspath__'):
+        with open(archivo, 'rb') as f:
+            yield from _filas_csv(f)
+        return
+
+    muestra = archivo.read(8192)
+    if isinstance(muestra, bytes):
+        encoding = 'utf-8-sig'
+        try:
+            muestra.decode('utf-8-sig')
+        except UnicodeDecodeError as e:
+            # Un corte a mitad de un carácter multibyte no indica latin-1
+            if e.start < len(muestra) - 3:
+                encoding = 'latin-1'
+        texto_muestra = muestra.decode(encoding, errors='ignore')
+        archivo.seek(0)
+        lector = codecs.getreader(encoding)(archivo, errors='replace')
+    else:
+        texto_muestra = muestra
+        archivo.seek(0)
+        lector = archivo
+
+    try:
+        dialecto = csv.Sniffer().sniff(texto_muestra, delimiters=',;\t|')
+    except csv.Error:
+        dialecto = csv.excel
+    yield (tuple(fila) for fila in csv.reader(lector, dialecto))
+
+
+def _filas_archivo(archivo, nombre: str) -> Iterator[Iterator[Tuple]]:
+    nombre = nombre.lower()
+    if nombre.endswith(('.xlsx', '.xlsm')):
+        return _filas_xlsx(archivo)
+    if nombre.endswith(('.csv', '.txt')):
+        return _filas_csv(archivo)
+    raise PackingListError(f"Formato no soportado para packing list: {nombre}")
+
+
+# --- ACUMULADOR ---
+
+@dataclass
+class ResumenPackingList:
+    """Totales del packing list y recomendación de contenedor"""
+    archivo: str
+    tipo_transporte: str
+    hoja: int = 0
+    columnas: Dict[str, str] = field(default_factory=dict)
+    unidad_dimensiones: Optional[str] = None
+    unidad_dimensiones_origen: Optional[str] = None  # 'encabezado' o 'inferida'
+    unidad_peso: Optional[str] = None
+    filas: int = 0
+    filas_validas: int = 0
+    piezas: int = 0
+    peso_bruto_g: int = 0
+    peso_volumetrico_g: int = 0
+    volumen_cbm4: int = 0
+    peso_neto_kg: float = 0.0
+    descripciones: List[str] = field(default_factory=list)
+    errores: List[Dict] = field(default_factory=list)
+    advertencias: List[str] = field(default_factory=list)
+    contenedor: Optional[Dict] = None
+    planes_contenedor: Optional[Dict] = None
+
+    @property
+    def peso_bruto_kg(self) -> float:
+        return self.peso_bruto_g / 1_000
+
+    @property
+    def volumen_cbm(self) -> float:
+        return self.volumen_cbm4 / 10_000
+
+    def to_dict(self) -> Dict:
+        from .batch_calculator import peso_cobrable_agregado
+        peso_cobrable, unidad, base = peso_cobrable_agregado(
+            self.tipo_transporte, self.peso_bruto_g, self.peso_volumetrico_g, self.volumen_cbm4
+        )
+        return {
+            'archivo': self.archivo,
+            'tipo_transporte': self.tipo_transporte,
+            'columnas_detectadas': self.columnas,
+            'unidad_dimensiones': self.unidad_dimensiones,
+            'unidad_dimensiones_origen': self.unidad_dimensiones_origen,
+            'unidad_peso': self.unidad_peso,
+            'filas': self.filas,
+            'filas_validas': self.filas_validas,
+            'piezas': self.piezas,
+            'peso_bruto_kg': self.peso_bruto_kg,
+            'peso_neto_kg': round(self.peso_neto_kg, 3),
+            'peso_volumetrico_kg': self.peso_volumetrico_g / 1_000,
+            'volumen_cbm': self.volumen_cbm,
+            'peso_cobrable': peso_cobrable,
+            'unidad_cobrable': unidad,
+            'base_cobro': base,
+            'descripciones': self.descripciones,
+            'errores': self.errores,
+            'advertencias': self.advertencias,
+            'contenedor': self.contenedor,
+            'planes_contenedor': self.planes_contenedor,
+        }
+
+    def to_shipping_data(self) -> Dict:
+        """Campos en el formato de extract_shipping_data_from_quote_documents."""
+        data = {
+            'gross_weight_kg': self.peso_bruto_kg,
+            'volume_cbm': self.volumen_cbm,
+            'packages_count': self.piezas,
+            'extraction_confidence': 100 if not self.errores else 90,
+            'extraction_source': 'packing_list',
+        }
+        if self.peso_neto_kg:
+            data['net_weight_kg'] = round(self.peso_neto_kg, 3)
+        if self.descripciones:
+            data['cargo_description'] = ', '.join(self.descripciones)
+        return data
+
+    def _error(self, fila: int, mensaje: str):
+        if len(self.errores) < MAX_ERRORES:
+            self.errores.append({'fila': fila, 'error': mensaje})
+
+
+class _Bloque:
+    """Columnas de un bloque de filas listo para el calculador por lotes."""
+
+    def __init__(self):
+        self.filas: List[int] = []
+        self.largo: List[float] = []
+        self.ancho: List[float] = []
+        self.alto: List[float] = []
+        self.peso: List[float] = []
+        self.piezas: List[int] = []
+        # Peso declarado de la línea completa (el total no se reconstruye desde el peso por pieza)
+        self.peso_linea: List[float] = []
+        # (fila, volumen total de la línea, peso total de la línea, piezas)
+        self.volumen_directo: List[Tuple[int, float, float, int]] = []
+
+    def __len__(self):
+        return len(self.filas) + len(self.volumen_directo)
+
+
+def _inferir_unidad_dimensiones(bloque: _Bloque) -> str:
+    """Sin unidad en el encabezado: medidas < 5 se asumen en metros, si no en cm."""
+    valores = sorted(bloque.largo + bloque.ancho + bloque.alto)
+    if not valores:
+        return 'CMT'
+    mediana = valores[len(valores) // 2]
+    return 'MTR' if mediana < 5 else 'CMT'
+
+
+def _procesar_bloque(bloque: _Bloque, resumen: ResumenPackingList, columnas: ColumnasPackingList):
+    from .batch_calculator import calcular_peso_cobrable_lote
+
+    if resumen.unidad_dimensiones is None and bloque.filas:
+        resumen.unidad_dimensiones = _inferir_unidad_dimensiones(bloque)
+        resumen.unidad_dimensiones_origen = 'inferida'
+    elif resumen.unidad_dimensiones_origen == 'inferida' and bloque.filas:
+        sugerida = _inferir_unidad_dimensiones(bloque)
+        if sugerida != resumen.unidad_dimensiones and not resumen.advertencias:
+            resumen.advertencias.append(
+                f"Las medidas desde la fila {bloque.filas[0]} parecen estar en {sugerida}; "
+                f"se usó {resumen.unidad_dimensiones}, inferida de las primeras filas"
+            )
+
+    if bloque.filas:
+        unidad_dim = resumen.unidad_dimensiones
+        largo, ancho, alto = bloque.largo, bloque.ancho, bloque.alto
+        if unidad_dim == 'MM':
+            largo, ancho, alto = ([v / 10 for v in col] for col in (largo, ancho, alto))
+            unidad_dim = 'CMT'
+
+        lote = calcular_peso_cobrable_lote(
+            largo, ancho, alto, bloque.peso, resumen.tipo_transporte,
+            unidad_dimensiones=unidad_dim,
+            unidad_peso=resumen.unidad_peso or 'KGM',
+            piezas=bloque.piezas,
+        )
+        sumas = lote.sumas()
+        resumen.filas_validas += int(lote.validos.sum())
+        resumen.piezas += sumas['piezas']
+        resumen.peso_bruto_g += _peso_lineas_g(bloque, lote.validos, resumen.unidad_peso or 'KGM')
+        resumen.peso_volumetrico_g += sumas['peso_volumetrico_g']
+        resumen.volumen_cbm4 += sumas['volumen_cbm4']
+        for error in lote.errores:
+            resumen._error(bloque.filas[error['linea']], error['error'])
+
+    # Filas sin dimensiones: se usa el CBM declarado de la línea
+    from .calculator import normalizar_peso, CalculatorError
+    for fila, volumen, peso, piezas in bloque.volumen_directo:
+        try:
+            peso_g = int(normalizar_peso(peso, resumen.unidad_peso or 'KGM').scaleb(3))
+        except CalculatorError as e:
+            resumen._error(fila, str(e))
+            continue
+        cbm4 = round(volumen * 10_000)
+        resumen.filas_validas += 1
+        resumen.piezas += piezas
+        resumen.peso_bruto_g += peso_g
+        resumen.volumen_cbm4 += cbm4
+        # 1 CBM = 166.67 kg volumétricos (6000 cm³/kg)
+        resumen.peso_volumetrico_g += round(cbm4 * 100 / 6)
+
+
+def _peso_lineas_g(bloque: _Bloque, validos, unidad_peso: str) -> int:
+    """Suma exacta (en gramos) del peso declarado de las líneas válidas del bloque."""
+    from .calculator import normalizar_peso
+
+    return sum(
+        int(normalizar_peso(peso, unidad_peso).scaleb(3))
+        for peso, valido in zip(bloque.peso_linea, validos) if valido
+    )
+
+
+def _tipo_transporte(texto: str) -> str:
+    """AEREO / LCL / FCL desde cualquier variante ('maritimo lcl', 'aereo', 'FCL'...)."""
+    from .calculator import _parse_tipo_transporte, UnidadDesconocidaError
+    from .rate_snapshots import normalizar_scope, SCOPE_FCL, SCOPE_AEREO
+
+    try:
+        return _parse_tipo_transporte(texto or '').value
+    except UnidadDesconocidaError:
+        scope = normalizar_scope(texto)
+        return {SCOPE_FCL: 'FCL', SCOPE_AEREO: 'AEREO'}.get(scope, 'LCL')
+
+
+def _valor(fila: Tuple, columnas: ColumnasPackingList, campo: str):
+    i = columnas.indices.get(campo)
+    return fila[i] if i is not None and i < len(fila) else None
+
+
+def _es_fila_total(fila: Tuple) -> bool:
+    for celda in fila[:4]:
+        if isinstance(celda, str) and _normalizar(celda).startswith(('TOTAL', 'SUBTOTAL', 'GRAND TOTAL')):
+            return True
+    return False
+
+
+def _agregar_fila(numero: int, fila: Tuple, columnas: ColumnasPackingList,
+                  bloque: _Bloque, resumen: ResumenPackingList):
+    piezas_raw = _parsear_numero(_valor(fila, columnas, 'piezas'))
+    piezas = int(piezas_raw) if piezas_raw and piezas_raw > 0 else 1
+
+    peso = _parsear_numero(_valor(fila, columnas, 'peso_bruto'))
+    volumen = _parsear_numero(_valor(fila, columnas, 'volumen'))
+
+    if columnas.tiene_dimensiones:
+        if 'dimensiones' in columnas.indices:
+            coincidencia = _RE_DIMENSIONES.search(str(_valor(fila, columnas, 'dimensiones') or ''))
+            dims = [_parsear_numero(g) for g in coincidencia.groups()] if coincidencia else [None] * 3
+        else:
+            dims = [_parsear_numero(_valor(fila, columnas, c)) for c in ('largo', 'ancho', 'alto')]
+    else:
+        dims = [None] * 3
+
+    if peso is None and volumen is None and all(d is None for d in dims):
+        return  # fila vacía o de texto
+
+    resumen.filas += 1
+
+    if peso is None:
+        resumen._error(numero, "Fila sin peso bruto")
+        return
+
+    # Los packing lists suelen traer el peso total de la línea; el calculador trabaja por pieza
+    peso_pieza = peso if columnas.peso_por_pieza else round(peso / piezas, 3)
+
+    neto = _parsear_numero(_valor(fila, columnas, 'peso_neto'))
+    if neto:
+        resumen.peso_neto_kg += neto * piezas if columnas.peso_por_pieza else neto
+
+    descripcion = _valor(fila, columnas, 'descripcion')
+    if descripcion and len(resumen.descripciones) < 10:
+        texto = str(descripcion).strip()
+        if texto and texto not in resumen.descripciones:
+            resumen.descripciones.append(texto)
+
+    if all(d is not None for d in dims):
+        bloque.filas.append(numero)
+        bloque.largo.append(dims[0])
+        bloque.ancho.append(dims[1])
+        bloque.alto.append(dims[2])
+        bloque.peso.append(peso_pieza)
+        bloque.piezas.append(piezas)
+        bloque.peso_linea.append(peso * piezas if columnas.peso_por_pieza else peso)
+    elif volumen is not None:
+        volumen_linea = volumen * piezas if columnas.volumen_por_pieza else volumen
+        peso_linea = peso * piezas if columnas.peso_por_pieza else peso
+        bloque.volumen_directo.append((numero, volumen_linea, peso_linea, piezas))
+    else:
+        resumen._error(numero, "Fila sin dimensiones ni volumen")
+
+
+def procesar_packing_list(
+    archivo,
+    nombre_archivo: str = '',
+    tipo_transporte: str = 'LCL',
+    chunk_size: int = CHUNK_SIZE,
+    pol: Optional[str] = None,
+    pod: Optional[str] = None,
+    optimizar: bool = True
+) -> ResumenPackingList:
+    """
+    Lee un packing list XLSX/CSV y calcula sus totales sin usar IA.
+
+    Args:
+        archivo: Ruta o archivo (file-like binario)
+        nombre_archivo: Nombre original (para detectar el formato)
+        tipo_transporte: AEREO, LCL o FCL (regla de peso cobrable)
+        chunk_size: Filas por bloque enviado al calculador
+        pol / pod: Ruta para costear las mezclas de contenedores
+        optimizar: Si True, agrega la recomendación de contenedor
+
+    Returns:
+        ResumenPackingList
+
+    Raises:
+        PackingListError: Formato no soportado o sin encabezados reconocibles
+    """
+    nombre = nombre_archivo or getattr(archivo, 'name', '') or str(archivo)
+    tipo = _tipo_transporte(tipo_transporte)
+    resumen = ResumenPackingList(archivo=nombre.rsplit('/', 1)[-1], tipo_transporte=tipo)
+
+    columnas = None
+    for numero_hoja, filas in enumerate(_filas_archivo(archivo, nombre)):
+        numero = 0
+        for numero, fila in enumerate(filas, start=1):
+            if columnas is None:
+                if numero > MAX_FILAS_ENCABEZADO:
+                    break
+                columnas = detectar_encabezados(fila)
+                if columnas:
+                    resumen.hoja = numero_hoja
+                    resumen.columnas = columnas.encabezados
+                    resumen.unidad_dimensiones = columnas.unidad_dimensiones
+                    if columnas.unidad_dimensiones:
+                        resumen.unidad_dimensiones_origen = 'encabezado'
+                    resumen.unidad_peso = columnas.unidad_peso
+                    bloque = _Bloque()
+                continue
+
+            if not any(c not in (None, '') for c in fila) or _es_fila_total(fila):
+                continue
+
+            _agregar_fila(numero, fila, columnas, bloque, resumen)
+            if len(bloque) >= chunk_size:
+                _procesar_bloque(bloque, resumen, columnas)
+                bloque = _Bloque()
+
+        if columnas is not None:
+            _procesar_bloque(bloque, resumen, columnas)
+            break
+
+    if columnas is None:
+        raise PackingListError(f"No se encontraron encabezados de packing list en {resumen.archivo}")
+
+    if optimizar and resumen.volumen_cbm4 > 0 and resumen.peso_bruto_g > 0 and tipo != 'AEREO':
+        _recomendar_contenedor(resumen, pol, pod)
+
+    logger.info(
+        f"Packing list {resumen.archivo}: {resumen.filas_validas}/{resumen.filas} filas, "
+        f"{resumen.piezas} piezas, {resumen.peso_bruto_kg} kg, {resumen.volumen_cbm} CBM"
+    )
+    return resumen
+
+
+def _recomendar_contenedor(resumen: ResumenPackingList, pol: Optional[str], pod: Optional[str]):
+    from .container_logic import optimizar_contenedor_json, optimizar_mezcla_contenedores_json
+
+    try:
+        resumen.contenedor = optimizar_contenedor_json(resumen.volumen_cbm, resumen.peso_bruto_kg)
+    except ValueError as e:
+        logger.warning(f"No se pudo optimizar contenedor para {resumen.archivo}: {e}")
+        return
+
+    if not resumen.contenedor.get('es_lcl'):
+        resumen.planes_contenedor = optimizar_mezcla_contenedores_json(
+            resumen.volumen_cbm, resumen.peso_bruto_kg, pol=pol, pod=pod
+        )
+
+
+def es_packing_list_estructurado(nombre_archivo: str) -> bool:
+    """True si el archivo se puede leer sin IA."""
+    return (nombre_archivo or '').lower().endswith(EXTENSIONES_SOPORTADAS)
@@ -17,3 +17,12 @@ class IsAdminUser(permissions.BasePermission):
         if not request.user or not request.user.is_authenticated:
             return False
         return getattr(request.user, 'role', None) == 'admin'
+
+
+class IsStaffUser(permissions.BasePermission):
+    """Permission class for app staff (role STAFF or ADMIN, or Django staff)"""
+    
+    def has_permission(self, request, view):
+        if not request.user or not request.user.is_authenticated:
+            return False
+        return request.user.is_staff or getattr(request.user, 'role', None) in ('staff', 'admin')
@@ -0,0 +1,35 @@
+"""
+Códigos de LogisticsProvider generados a partir del nombre del proveedor.
+
+Lo usan el comando load_providers y la importación de tarifarios (rate_import)
+cuando una naviera o aerolínea del archivo no existe todavía.
+"""
+import re
+from typing import Set
+
+
+def generar_codigo_proveedor(nombre: str, transport_type: str, existentes: Set[str]) -> str:
+    """
+    Código corto (máx. 8 caracteres) para un proveedor: la palabra única, las
+    tres primeras letras de dos palabras o las iniciales de hasta cuatro.
+    Si el código ya está en `existentes` se le agrega un contador.
+    """
+    limpio = re.sub(r'[^A-Za-z0-9\s]', '', nombre.upper())
+    palabras = limpio.split()
+
+    if len(palabras) == 1:
+        codigo = palabras[0][:6]
+    elif len(palabras) == 2:
+        codigo = palabras[0][:3] + palabras[1][:3]
+    else:
+        codigo = ''.join([p[0] for p in palabras[:4]])
+
+    codigo = codigo[:8]
+
+    base = codigo
+    contador = 1
+    while codigo in existentes:
+        codigo = f"{base[:6]}{contador}"
+        contador += 1
+
+    return codigo
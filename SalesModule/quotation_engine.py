@@ -1,14 +1,27 @@
 """
 Quotation Engine for ImportaYa.ia
 Handles currency conversion and IVA calculation with special exemptions.
+
+Amounts are Money (integer cents). Freight is rounded to cents once, when the
+rate is looked up (monto_flete: tarifa × CBM / kg cobrables, ROUND_HALF_UP),
+and margins are computed on that rounded cost (desglose_margen). Before Money,
+LCL and air freight carried sub-cent amounts into the margin, so a price can
+differ by one cent from quotes made before that change, e.g. 45.5 × 12.345
+CBM = 561.6975: freight 561.70 + 15% margin 84.26 = 645.96, where the old
+pipeline gave 561.6975 + 84.25 = 645.9475.
 """
 import logging
-from decimal import Decimal, ROUND_HALF_UP
+from decimal import Decimal
 from typing import Dict, List, Optional, Tuple
 
+from .money import Money
+from .quote_cache import cachear_cotizacion
+from .rate_snapshots import obtener_snapshot_activo_id
+
 logger = logging.getLogger(__name__)
 
 IVA_RATE = Decimal('0.15')
+IVA_PCT = IVA_RATE * 100
 
 DTHC_CODES = ['DTHC', 'THC_DESTINO', 'DESTINATION_THC', 'THC_GYE', 'THC_PSJ']
 
@@ -41,10 +54,7 @@ def convertir_a_usd(monto: Decimal, moneda: str) -> Tuple[Decimal, Dict]:
     tasa_info = obtener_tasa_app(moneda, 'USD')
     tasa = Decimal(str(tasa_info['tasa_conversion']))
     
-    if moneda in ['EUR', 'GBP']:
-        monto_usd = (monto / tasa).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-    else:
-        monto_usd = (monto / tasa).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    monto_usd = Money.of(Decimal(str(monto)) / tasa).to_decimal()
     
     return (monto_usd, {
         'monto_original': float(monto),
@@ -132,57 +142,74 @@ def get_carrier_code_from_name(carrier_name: str) -> Optional[str]:
     if not carrier_name:
         return None
     
-    name_upper = carrier_name.upper().strip()
-    
-    if name_upper in CARRIER_NAME_TO_CODE:
-        return CARRIER_NAME_TO_CODE[name_upper]
-    
-    for key, code in CARRIER_NAME_TO_CODE.items():
-        if key in name_upper or name_upper in key:
-            return code
-    
-    for key, code in CARRIER_NAME_TO_CODE.items():
-        if any(word in name_upper for word in key.split() if len(word) > 3):
-            return code
+    from .resolvers import resolve_carrier
+    code = resolve_carrier(carrier_name)
+    if code:
+        return code
     
     logger.warning(f"No se encontró código de naviera para: {carrier_name}")
     return None
 
 
-def calcular_iva_gastos_locales(
+def _filtrar_ruta(queryset, pol: str, pod: str):
+    """
+    Filtra tarifas (ProviderRate) por ruta: el destino por su código (GYE,
+    PSJ...) y el origen por sus escrituras canónicas (IN exacto); solo recurre
+    a icontains en el origen si no hay coincidencias.
+    """
+    from .resolvers import codigo_destino, filtro_puerto
+    
+    queryset = queryset.filter(destination=codigo_destino(pod) or (pod or '').strip().upper())
+    canonico = queryset.filter(filtro_puerto('origin_port', pol))
+    if canonico.exists():
+        return canonico
+    return queryset.filter(origin_port__icontains=pol)
+
+
+def tarifas_vigentes(transport_type: str):
+    """
+    ProviderRate vigentes hoy de proveedores activos del tipo de transporte,
+    de la más barata a la más cara (a igual precio, primero el proveedor de
+    mayor prioridad: el número más bajo).
+    """
+    from django.utils import timezone
+    from .models import ProviderRate
+    
+    hoy = timezone.now().date()
+    return ProviderRate.objects.select_related('provider').filter(
+        provider__transport_type=transport_type.upper(),
+        provider__is_active=True,
+        is_active=True,
+        valid_from__lte=hoy,
+        valid_to__gte=hoy
+    ).order_by('rate_usd', 'provider__priority')
+
+
+def _iva_gastos_locales(
     gastos_locales: List[Dict],
     transport_type: str
 ) -> Dict:
     """
-    Calculate IVA on local costs with FCL DTHC exemption.
-    
-    CRITICAL BUSINESS RULE:
-    - Aéreo/LCL: 15% IVA on ALL local costs
-    - Marítimo FCL: 15% IVA on all local costs EXCEPT DTHC (which is EXEMPT)
-    
-    Args:
-        gastos_locales: List of local cost items with format:
-            [{'codigo': 'DTHC', 'descripcion': '...', 'monto': 150.00, 'moneda': 'USD'}]
-        transport_type: 'FCL', 'LCL', or 'AEREO'
-        
-    Returns:
-        Dict with IVA calculation breakdown
+    Núcleo de calcular_iva_gastos_locales: devuelve los totales como Money
+    para que calcular_cotizacion_completa no tenga que reconvertir floats.
     """
     transport_type = transport_type.upper()
     
-    total_gravable = Decimal('0.0')
-    total_exento = Decimal('0.0')
+    total_gravable = Money.zero()
+    total_exento = Money.zero()
     items_gravables = []
     items_exentos = []
     
     for item in gastos_locales:
         codigo = item.get('codigo', '')
         descripcion = item.get('descripcion', '')
-        monto = Decimal(str(item.get('monto', 0)))
         moneda = item.get('moneda', 'USD')
         
         if moneda != 'USD':
-            monto, _ = convertir_a_usd(monto, moneda)
+            monto_usd, _ = convertir_a_usd(Decimal(str(item.get('monto', 0))), moneda)
+            monto = Money.of(monto_usd)
+        else:
+            monto = Money.of(item.get('monto', 0))
         
         is_exempt = False
         exemption_reason = None
@@ -197,8 +224,8 @@ def calcular_iva_gastos_locales(
         item_detail = {
             'codigo': codigo,
             'descripcion': descripcion,
-            'monto_usd': float(monto),
-            'moneda_original': item.get('moneda', 'USD'),
+            'monto_usd': monto.to_float(),
+            'moneda_original': moneda,
             'gravable': not is_exempt,
             'exemption_reason': exemption_reason
         }
@@ -210,18 +237,54 @@ def calcular_iva_gastos_locales(
             total_gravable += monto
             items_gravables.append(item_detail)
     
-    iva_calculado = (total_gravable * IVA_RATE).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-    
     return {
         'transport_type': transport_type,
-        'total_gastos_locales': float(total_gravable + total_exento),
-        'base_gravable': float(total_gravable),
-        'base_exenta': float(total_exento),
-        'iva_rate': float(IVA_RATE),
-        'iva_calculado': float(iva_calculado),
+        'total': total_gravable + total_exento,
+        'gravable': total_gravable,
+        'exento': total_exento,
+        'iva': total_gravable.iva(IVA_PCT),
         'items_gravables': items_gravables,
         'items_exentos': items_exentos,
-        'formula_aplicada': f"({float(total_gravable):.2f} × {float(IVA_RATE)*100:.0f}%) = {float(iva_calculado):.2f}" if transport_type == 'FCL' and total_exento > 0 else f"Total Locales × {float(IVA_RATE)*100:.0f}%"
+    }
+
+
+def _formula_iva(resultado: Dict) -> str:
+    if resultado['transport_type'] == 'FCL' and resultado['exento'] > 0:
+        return f"({resultado['gravable'].to_float():.2f} × {float(IVA_RATE)*100:.0f}%) = {resultado['iva'].to_float():.2f}"
+    return f"Total Locales × {float(IVA_RATE)*100:.0f}%"
+
+
+def calcular_iva_gastos_locales(
+    gastos_locales: List[Dict],
+    transport_type: str
+) -> Dict:
+    """
+    Calculate IVA on local costs with FCL DTHC exemption.
+    
+    CRITICAL BUSINESS RULE:
+    - Aéreo/LCL: 15% IVA on ALL local costs
+    - Marítimo FCL: 15% IVA on all local costs EXCEPT DTHC (which is EXEMPT)
+    
+    Args:
+        gastos_locales: List of local cost items with format:
+            [{'codigo': 'DTHC', 'descripcion': '...', 'monto': 150.00, 'moneda': 'USD'}]
+        transport_type: 'FCL', 'LCL', or 'AEREO'
+        
+    Returns:
+        Dict with IVA calculation breakdown
+    """
+    resultado = _iva_gastos_locales(gastos_locales, transport_type)
+    
+    return {
+        'transport_type': resultado['transport_type'],
+        'total_gastos_locales': resultado['total'].to_float(),
+        'base_gravable': resultado['gravable'].to_float(),
+        'base_exenta': resultado['exento'].to_float(),
+        'iva_rate': float(IVA_RATE),
+        'iva_calculado': resultado['iva'].to_float(),
+        'items_gravables': resultado['items_gravables'],
+        'items_exentos': resultado['items_exentos'],
+        'formula_aplicada': _formula_iva(resultado)
     }
 
 
@@ -245,36 +308,37 @@ def calcular_cotizacion_completa(
     Returns:
         Complete quotation breakdown
     """
-    total_fletes = Decimal('0.0')
+    total_fletes = Money.zero()
     fletes_detalle = []
     
     for flete in fletes:
-        monto = Decimal(str(flete.get('monto', 0)))
         moneda = flete.get('moneda', 'USD')
         
         if moneda != 'USD':
+            monto = Decimal(str(flete.get('monto', 0)))
             monto_usd, conversion = convertir_a_usd(monto, moneda)
+            monto_usd = Money.of(monto_usd)
             flete_detail = {
                 **flete,
                 'monto_original': float(monto),
                 'moneda_original': moneda,
-                'monto_usd': float(monto_usd),
+                'monto_usd': monto_usd.to_float(),
                 'conversion_details': conversion
             }
         else:
-            monto_usd = monto
+            monto_usd = Money.of(flete.get('monto', 0))
             flete_detail = {
                 **flete,
-                'monto_usd': float(monto_usd)
+                'monto_usd': monto_usd.to_float()
             }
         
         total_fletes += monto_usd
         fletes_detalle.append(flete_detail)
     
-    iva_result = calcular_iva_gastos_locales(gastos_locales, transport_type)
+    iva_result = _iva_gastos_locales(gastos_locales, transport_type)
     
-    total_locales = Decimal(str(iva_result['total_gastos_locales']))
-    iva_total = Decimal(str(iva_result['iva_calculado']))
+    total_locales = iva_result['total']
+    iva_total = iva_result['iva']
     
     grand_total = total_fletes + total_locales + iva_total
     
@@ -282,26 +346,26 @@ def calcular_cotizacion_completa(
         'transport_type': transport_type,
         'fletes': {
             'items': fletes_detalle,
-            'subtotal_usd': float(total_fletes)
+            'subtotal_usd': total_fletes.to_float()
         },
         'gastos_locales': {
             'items': iva_result['items_gravables'] + iva_result['items_exentos'],
-            'subtotal_usd': float(total_locales),
-            'base_gravable': iva_result['base_gravable'],
-            'base_exenta': iva_result['base_exenta']
+            'subtotal_usd': total_locales.to_float(),
+            'base_gravable': iva_result['gravable'].to_float(),
+            'base_exenta': iva_result['exento'].to_float()
         },
         'iva': {
             'rate': float(IVA_RATE),
-            'base': iva_result['base_gravable'],
-            'monto': float(iva_total),
-            'formula': iva_result['formula_aplicada'],
+            'base': iva_result['gravable'].to_float(),
+            'monto': iva_total.to_float(),
+            'formula': _formula_iva(iva_result),
             'exemptions': iva_result['items_exentos']
         },
         'totales': {
-            'fletes': float(total_fletes),
-            'gastos_locales': float(total_locales),
-            'iva': float(iva_total),
-            'grand_total_usd': float(grand_total)
+            'fletes': total_fletes.to_float(),
+            'gastos_locales': total_locales.to_float(),
+            'iva': iva_total.to_float(),
+            'grand_total_usd': grand_total.to_float()
         },
         'moneda': 'USD'
     }
@@ -337,6 +401,53 @@ def generar_resumen_cotizacion(cotizacion: Dict) -> str:
     return "\n".join(lines)
 
 
+def monto_flete(tarifa, cantidad=None) -> Money:
+    """
+    Flete = tarifa × cantidad cobrable (CBM o kg), redondeado una sola vez a
+    centavos (ROUND_HALF_UP). Los márgenes se aplican sobre este monto.
+    """
+    if cantidad is None:
+        return Money.of(tarifa)
+    return Money.of(Decimal(str(tarifa)) * Decimal(str(cantidad)))
+
+
+def _codigo_contenedor(container_type: str) -> str:
+    """'1x40HC', '40 hc' -> '40HC' (ProviderRate.container_type)."""
+    return (container_type or '').upper().replace(' ', '').replace('1X', '')
+
+
+def _escala_aerea(unit: str) -> Optional[Decimal]:
+    """Peso desde el que aplica una tarifa aérea ('KG+100' -> 100), o None."""
+    prefijo, _, kilos = (unit or '').upper().partition('+')
+    if prefijo != 'KG' or not kilos.isdigit():
+        return None
+    return Decimal(kilos)
+
+
+def tiempo_transito(rate) -> str:
+    """Tránsito de una ProviderRate como texto: '30-35 días' o '30 días'."""
+    if rate.transit_days_min == rate.transit_days_max:
+        return f'{rate.transit_days_min} días'
+    return f'{rate.transit_days_min}-{rate.transit_days_max} días'
+
+
+def _datos_tarifa(rate) -> Dict:
+    """Datos de proveedor, ruta y vigencia de una ProviderRate para el flete."""
+    return {
+        'moneda': 'USD',
+        'carrier': rate.provider.name,
+        'carrier_code': rate.provider.code,
+        'pol': rate.origin_port,
+        'pod': rate.destination,
+        'transit_time': tiempo_transito(rate),
+        'transit_days_min': rate.transit_days_min,
+        'validity': str(rate.valid_to),
+        'free_days': rate.free_days,
+        'thc_destination': float(rate.thc_destination_usd),
+        'rate_id': rate.id
+    }
+
+
 def obtener_tarifa_flete(
     pol: str,
     pod: str,
@@ -346,166 +457,106 @@ def obtener_tarifa_flete(
     volume_cbm: Optional[Decimal] = None
 ) -> Optional[Dict]:
     """
-    Obtiene la mejor tarifa de flete desde la base de datos.
+    Obtiene la mejor tarifa de flete vigente (ProviderRate).
+    
+    FCL usa la tarifa por contenedor del tipo pedido, LCL la tarifa por CBM y
+    AÉREO la escala por kg (KG+45, KG+100...) más alta que alcanza el peso
+    cobrable; si el peso no llega a ninguna, la escala más baja.
     
     Args:
         pol: Puerto de origen (nombre o código)
         pod: Puerto de destino (nombre o código)
         transport_type: 'FCL', 'LCL', o 'AEREO'
-        container_type: Tipo de contenedor para FCL (20GP, 40GP, 40HC, etc.)
+        container_type: Tipo de contenedor para FCL (20GP, 40GP, 40HC, 40NOR)
         weight_kg: Peso en kg (para LCL/AEREO)
         volume_cbm: Volumen en CBM (para LCL)
         
     Returns:
         Dict con tarifa de flete y detalles, o None si no hay tarifa
     """
-    from .models import FreightRateFCL
-    
     transport_type = transport_type.upper()
+    tarifas = _filtrar_ruta(tarifas_vigentes(transport_type), pol, pod)
     
     if transport_type == 'FCL':
-        rate = FreightRateFCL.get_best_rate(pol, pod, container_type)
+        rate = tarifas.filter(container_type=_codigo_contenedor(container_type), unit='CONTAINER').first()
         if not rate:
             logger.warning(f"No hay tarifa FCL para {pol} → {pod} ({container_type})")
             return None
         
-        container_field_map = {
-            '20GP': 'cost_20gp',
-            '40GP': 'cost_40gp',
-            '40HC': 'cost_40hc',
-            '40NOR': 'cost_40nor',
-            '20REEFER': 'cost_20reefer',
-            '40REEFER': 'cost_40reefer',
-        }
-        
-        container_key = container_type.upper().replace(' ', '').replace('1X', '')
-        cost_field = container_field_map.get(container_key)
-        
-        if not cost_field:
-            logger.error(f"Tipo de contenedor no soportado: {container_type}")
-            return None
-        
-        costo_raw = getattr(rate, cost_field, None)
-        if costo_raw is None:
-            logger.error(f"No hay tarifa disponible para {container_type} en ruta {pol} → {pod}")
-            return None
-        
-        costo = Decimal(str(costo_raw))
-        
         return {
             'tipo': 'FLETE_INTERNACIONAL',
             'descripcion': f'Flete Marítimo FCL {container_type}',
             'codigo': f'FLETE_FCL_{container_type}',
-            'monto': float(costo),
-            'moneda': 'USD',
-            'carrier': rate.carrier_name,
-            'pol': rate.pol_name,
-            'pod': rate.pod_name,
-            'transit_time': rate.transit_time,
-            'validity': str(rate.validity_date) if rate.validity_date else None,
-            'rate_id': rate.id
+            'monto': monto_flete(rate.rate_usd).to_float(),
+            **_datos_tarifa(rate)
         }
     
     elif transport_type == 'LCL':
-        from django.utils import timezone
-        today = timezone.now().date()
-        
-        rate = FreightRateFCL.objects.filter(
-            pol_name__icontains=pol,
-            pod_name__icontains=pod,
-            transport_type='LCL',
-            is_active=True,
-            validity_date__gte=today
-        ).order_by('lcl_rate_per_cbm').first()
-        
+        rate = tarifas.filter(unit='CBM').first()
         if not rate:
             logger.warning(f"No hay tarifa LCL para {pol} → {pod}")
             return None
         
-        rate_per_cbm = Decimal(str(rate.lcl_rate_per_cbm)) if rate.lcl_rate_per_cbm else Decimal('0')
+        rate_per_cbm = rate.rate_usd
         
         if volume_cbm is not None and weight_kg is not None:
             peso_volumetrico = volume_cbm * Decimal('1000')
             chargeable_weight = max(peso_volumetrico, weight_kg)
             cbm_cobrable = chargeable_weight / Decimal('1000')
-            monto = rate_per_cbm * cbm_cobrable
+            monto = monto_flete(rate_per_cbm, cbm_cobrable)
         elif volume_cbm is not None:
-            monto = rate_per_cbm * volume_cbm
+            monto = monto_flete(rate_per_cbm, volume_cbm)
         else:
-            monto = rate_per_cbm
+            monto = monto_flete(rate_per_cbm)
         
         return {
             'tipo': 'FLETE_INTERNACIONAL',
             'descripcion': 'Flete Marítimo LCL',
             'codigo': 'FLETE_LCL',
-            'monto': float(monto),
-            'moneda': 'USD',
-            'carrier': rate.carrier_name,
-            'pol': rate.pol_name,
-            'pod': rate.pod_name,
-            'transit_time': rate.transit_time,
-            'validity': str(rate.validity_date) if rate.validity_date else None,
+            'monto': monto.to_float(),
             'rate_per_cbm': float(rate_per_cbm),
             'volume_cbm': float(volume_cbm) if volume_cbm is not None else None,
-            'rate_id': rate.id
+            **_datos_tarifa(rate)
         }
     
     elif transport_type == 'AEREO':
-        from django.utils import timezone
-        today = timezone.now().date()
-        
-        rate = FreightRateFCL.objects.filter(
-            pol_name__icontains=pol,
-            pod_name__icontains=pod,
-            transport_type='AEREO',
-            is_active=True,
-            validity_date__gte=today
-        ).order_by('air_rate_min').first()
+        escalas = [(rate, _escala_aerea(rate.unit)) for rate in tarifas.filter(unit__istartswith='KG')]
+        escalas = [(rate, desde) for rate, desde in escalas if desde is not None]
         
-        if not rate:
+        if not escalas:
             logger.warning(f"No hay tarifa AÉREA para {pol} → {pod}")
             return None
         
         chargeable_weight = Decimal('0')
-        
         if weight_kg is not None:
-            if weight_kg <= 45:
-                tarifa = Decimal(str(rate.air_rate_min or 0))
-            elif weight_kg <= 100:
-                tarifa = Decimal(str(rate.air_rate_45 or rate.air_rate_min or 0))
-            elif weight_kg <= 300:
-                tarifa = Decimal(str(rate.air_rate_100 or rate.air_rate_45 or 0))
-            elif weight_kg <= 500:
-                tarifa = Decimal(str(rate.air_rate_300 or rate.air_rate_100 or 0))
-            elif weight_kg <= 1000:
-                tarifa = Decimal(str(rate.air_rate_500 or rate.air_rate_300 or 0))
-            else:
-                tarifa = Decimal(str(rate.air_rate_1000 or rate.air_rate_500 or 0))
-            
             if volume_cbm is not None:
                 peso_volumetrico = volume_cbm * Decimal('167')
                 chargeable_weight = max(peso_volumetrico, weight_kg)
             else:
                 chargeable_weight = weight_kg
-            
-            monto = tarifa * chargeable_weight
+        
+        aplicables = [(rate, desde) for rate, desde in escalas if desde <= chargeable_weight]
+        if not aplicables:
+            minima = min(desde for _, desde in escalas)
+            aplicables = [(rate, desde) for rate, desde in escalas if desde == minima]
+        # escalas conserva el orden por precio de tarifas_vigentes
+        rate = aplicables[0][0]
+        
+        if weight_kg is not None:
+            monto = monto_flete(rate.rate_usd, chargeable_weight)
         else:
-            monto = Decimal(str(rate.air_rate_min or 0))
+            monto = monto_flete(rate.rate_usd)
         
         return {
             'tipo': 'FLETE_INTERNACIONAL',
             'descripcion': 'Flete Aéreo',
             'codigo': 'FLETE_AEREO',
-            'monto': float(monto),
-            'moneda': 'USD',
-            'carrier': rate.carrier_name,
-            'pol': rate.pol_name,
-            'pod': rate.pod_name,
-            'transit_time': rate.transit_time,
-            'validity': str(rate.validity_date) if rate.validity_date else None,
+            'monto': monto.to_float(),
+            'rate_per_kg': float(rate.rate_usd),
+            'weight_break': rate.unit,
             'weight_kg': float(weight_kg) if weight_kg is not None else None,
             'chargeable_weight': float(chargeable_weight),
-            'rate_id': rate.id
+            **_datos_tarifa(rate)
         }
     
     return None
@@ -517,57 +568,55 @@ def aplicar_margen_ganancia(
     item_type: str = 'FLETE'
 ) -> Dict:
     """
-    Aplica el margen de ganancia configurado al costo base.
-    Siempre aplica un margen mínimo del 15% si no hay configuración.
+    Aplica el margen de ganancia al costo base: 15% para todos los rubros.
+    La configuración de márgenes por transporte y rubro (ProfitMarginConfig)
+    se eliminó; transport_type e item_type quedan solo para el log.
     
     Args:
-        costo_base: Costo base sin margen
-        transport_type: 'FCL', 'LCL', o 'AEREO' (se convierte a MARITIMO_FCL, etc.)
-        item_type: Tipo de rubro (FLETE, THC_ORIGEN, HANDLING, etc.)
+        costo_base: Costo base sin margen (Decimal, float o Money)
+        transport_type: 'FCL', 'LCL', o 'AEREO'
+        item_type: Tipo de rubro (FLETE, THC_DESTINO, etc.)
         
     Returns:
         Dict con costo base, margen aplicado, y precio final
     """
-    from .models import ProfitMarginConfig
-    
-    transport_mapping = {
-        'FCL': 'MARITIMO_FCL',
-        'LCL': 'MARITIMO_LCL',
-        'AEREO': 'AEREO',
-        'TERRESTRE': 'TERRESTRE'
-    }
-    
-    transport_key = transport_mapping.get(transport_type.upper(), 'ALL')
-    
-    config = ProfitMarginConfig.get_margin_for_item(transport_key, item_type)
+    logger.debug(f"Margen por defecto 15% para {item_type} ({transport_type})")
+    return desglose_margen(costo_base)
+
+
+def desglose_margen(costo_base, config=None) -> Dict:
+    """
+    Costo, margen y precio final de un rubro.
+
+    El costo se redondea a centavos antes de calcular el margen, y el margen
+    (de la configuración o 15% por defecto) se redondea por separado, así que
+    precio_final = costo_base + margen_aplicado exacto en centavos.
     
-    costo_base = Decimal(str(costo_base))
+    Args:
+        costo_base: Costo sin margen (Decimal, float o Money)
+        config: Configuración de margen del rubro (name, margin_type,
+            calculate_margin...), o None para el 15% por defecto
+    """
+    costo = Money.of(costo_base)
     
     if config:
-        margen = config.calculate_margin(costo_base)
-        precio_final = costo_base + margen
-        
-        margin_value_decimal = Decimal(str(config.margin_value)) if config.margin_value else Decimal('0')
-        min_margin_decimal = Decimal(str(config.minimum_margin)) if config.minimum_margin else None
+        margen = Money.of(config.calculate_margin(costo.to_decimal()))
         
         return {
-            'costo_base': float(costo_base),
-            'margen_aplicado': float(margen),
-            'precio_final': float(precio_final),
+            'costo_base': costo.to_float(),
+            'margen_aplicado': margen.to_float(),
+            'precio_final': (costo + margen).to_float(),
             'config_name': config.name,
             'margin_type': config.margin_type,
-            'margin_value': float(margin_value_decimal),
-            'minimum_margin': float(min_margin_decimal) if min_margin_decimal else None
+            'margin_value': float(config.margin_value) if config.margin_value else 0.0,
+            'minimum_margin': float(config.minimum_margin) if config.minimum_margin else None
         }
     
-    margen_default = (costo_base * Decimal('0.15')).quantize(
-        Decimal('0.01'), rounding=ROUND_HALF_UP
-    )
-    logger.info(f"Usando margen por defecto 15% para {item_type} ({transport_type})")
+    margen_default = costo.margen(15)
     return {
-        'costo_base': float(costo_base),
-        'margen_aplicado': float(margen_default),
-        'precio_final': float(costo_base + margen_default),
+        'costo_base': costo.to_float(),
+        'margen_aplicado': margen_default.to_float(),
+        'precio_final': (costo + margen_default).to_float(),
         'config_name': 'DEFAULT_15%',
         'margin_type': 'PERCENTAGE',
         'margin_value': 15.0,
@@ -585,41 +634,64 @@ def obtener_gastos_locales_db(
     carrier_code: Optional[str] = None
 ) -> Dict:
     """
-    Obtiene los gastos locales desde la base de datos.
+    Obtiene los gastos locales de destino a partir de las tarifas vigentes.
+    
+    El único gasto de destino que guardan las tarifas (ProviderRate) es el THC
+    por contenedor de FCL, así que para FCL devuelve THC_DESTINO × cantidad de
+    la tarifa de la naviera (o de la más barata si no se indica naviera) y
+    para LCL/AÉREO una lista vacía: la tabla de gastos locales por puerto
+    (LocalDestinationCost) se eliminó.
     
     Args:
         transport_type: 'FCL', 'LCL', o 'AEREO'
-        port: Puerto de destino (GYE, PSJ, MEC, etc.)
+        port: Puerto de destino (GYE, PSJ, etc.)
         container_type: Tipo de contenedor (20GP, 40GP, etc.)
         quantity: Cantidad de contenedores
         cbm: Volumen en CBM (para LCL)
         weight_kg: Peso en kg (para AEREO)
-        carrier_code: Código de naviera (ONE, MSK, CMA, etc.) - Solo para FCL
+        carrier_code: Código del proveedor (LogisticsProvider.code) - Solo para FCL
         
     Returns:
         Dict con items de gastos locales y totales
     """
-    from .models import LocalDestinationCost
+    from .resolvers import codigo_destino
     
-    transport_mapping = {
-        'FCL': 'MARITIMO_FCL',
-        'LCL': 'MARITIMO_LCL',
-        'AEREO': 'AEREO'
+    transport_type = transport_type.upper()
+    destino = codigo_destino(port) or (port or '').strip().upper()
+    resultado = {
+        'items': [],
+        'total': 0.0,
+        'port': destino,
+        'transport_type': transport_type,
+        'quantity': quantity
     }
     
-    transport_key = transport_mapping.get(transport_type.upper(), transport_type.upper())
-    
-    result = LocalDestinationCost.calculate_total_local_costs(
-        transport_type=transport_key,
-        port=port,
-        container_type=container_type,
-        quantity=quantity,
-        cbm=cbm,
-        weight_kg=weight_kg,
-        carrier_code=carrier_code
-    )
-    
-    return result
+    if transport_type != 'FCL':
+        return resultado
+    
+    tarifas = tarifas_vigentes('FCL').filter(destination=destino, unit='CONTAINER')
+    if container_type:
+        tarifas = tarifas.filter(container_type=_codigo_contenedor(container_type))
+    if carrier_code:
+        tarifas = tarifas.filter(provider__code=carrier_code)
+    rate = tarifas.first()
+    
+    if not rate:
+        logger.warning(f"No hay tarifa FCL con THC de destino en {destino} ({container_type or 'todos'})")
+        return resultado
+    
+    thc = Money.of(rate.thc_destination_usd) * quantity
+    resultado['items'].append({
+        'tipo': 'GASTO_LOCAL',
+        'codigo': 'THC_DESTINO',
+        'descripcion': f'THC Destino {destino} ({rate.provider.name})',
+        'monto': thc.to_float(),
+        'moneda': 'USD',
+        'unitario': float(rate.thc_destination_usd),
+        'cantidad': quantity
+    })
+    resultado['total'] = thc.to_float()
+    return resultado
 
 
 def calcular_seguro(
@@ -628,64 +700,58 @@ def calcular_seguro(
 ) -> Dict:
     """
     Calcula la prima de seguro basada en el valor de la mercancía.
-    Utiliza la tabla de tramos (InsuranceBracket) para determinar el costo.
+    Utiliza la tarifa de seguro activa (InsuranceRate: % del valor con prima
+    mínima), compilada en memoria por reference_tables.
     
     Args:
-        goods_value: Valor de la mercancía en USD (según Commercial Invoice)
+        goods_value: Valor de la mercancía en USD (según Commercial Invoice),
+            Decimal, float o Money
         include_iva: Si incluir el cálculo de IVA (default: True)
         
     Returns:
         Dict con:
-            - prima_base: Prima fija del tramo
+            - prima_base: max(valor × rate_percentage %, prima mínima)
             - iva_percentage: Porcentaje de IVA
             - iva_monto: Monto del IVA
             - total: Prima total con IVA
-            - tramo_min: Valor mínimo del tramo aplicado
-            - tramo_max: Valor máximo del tramo aplicado
-            - rate_percentage: Tasa porcentual de referencia
-            - error: Mensaje de error si no hay tramo aplicable
+            - rate_percentage: Tasa porcentual aplicada
+            - min_premium: Prima mínima de la tarifa
+            - tramo_encontrado: False si no hay tarifa de seguro activa
+            - error: Mensaje de error si no hay tarifa aplicable
     """
-    from .models import InsuranceBracket
+    from .reference_tables import obtener_tablas_referencia
     
-    goods_value = Decimal(str(goods_value))
+    valor = Money.of(goods_value)
     
-    bracket = InsuranceBracket.get_bracket_for_value(goods_value)
+    tarifa = obtener_tablas_referencia().seguros.vigente()
     
-    if not bracket:
-        logger.warning(f"No hay tramo de seguro para valor USD {goods_value}")
+    if not tarifa:
+        logger.warning(f"No hay tarifa de seguro activa para valor USD {valor.to_decimal()}")
         return {
             'prima_base': 0.0,
-            'iva_percentage': 15.0,
+            'iva_percentage': float(IVA_PCT),
             'iva_monto': 0.0,
             'total': 0.0,
-            'goods_value': float(goods_value),
+            'goods_value': valor.to_float(),
             'tramo_encontrado': False,
-            'error': f'No hay tramo de seguro configurado para el valor USD {goods_value:,.2f}'
+            'error': 'No hay tarifa de seguro activa configurada (InsuranceRate)'
         }
     
-    prima_base = bracket.fixed_fee
-    iva_percentage = bracket.iva_percentage
+    prima_base = tarifa.prima(valor)
     
-    if include_iva:
-        iva_monto = (prima_base * iva_percentage / Decimal('100')).quantize(
-            Decimal('0.01'), rounding=ROUND_HALF_UP
-        )
-        total = prima_base + iva_monto
-    else:
-        iva_monto = Decimal('0.00')
-        total = prima_base
+    iva_monto = prima_base.iva(IVA_PCT) if include_iva else Money.zero()
+    total = prima_base + iva_monto
     
     return {
-        'prima_base': float(prima_base),
-        'iva_percentage': float(iva_percentage),
-        'iva_monto': float(iva_monto),
-        'total': float(total),
-        'goods_value': float(goods_value),
-        'tramo_min': float(bracket.min_value),
-        'tramo_max': float(bracket.max_value),
-        'rate_percentage': float(bracket.rate_percentage),
-        'currency': bracket.currency,
-        'description': bracket.description,
+        'prima_base': prima_base.to_float(),
+        'iva_percentage': float(IVA_PCT),
+        'iva_monto': iva_monto.to_float(),
+        'total': total.to_float(),
+        'goods_value': valor.to_float(),
+        'rate_percentage': float(tarifa.rate_percentage),
+        'min_premium': float(tarifa.min_premium_usd),
+        'currency': 'USD',
+        'description': tarifa.name,
         'tramo_encontrado': True
     }
 
@@ -711,11 +777,11 @@ def calcular_servicios_seguridad(
             - total: Total con IVA
             - has_security: Si tiene servicios de seguridad
     """
-    from .models import InlandSecurityTariff
+    from .reference_tables import obtener_tablas_referencia
     
     items = []
-    subtotal = Decimal('0.00')
-    iva_total = Decimal('0.00')
+    subtotal = Money.zero()
+    iva_total = Money.zero()
     
     if not (wants_armed_custody or wants_satellite_lock):
         return {
@@ -726,22 +792,22 @@ def calcular_servicios_seguridad(
             'has_security': False
         }
     
-    security_rates = InlandSecurityTariff.get_rates_for_city(destination_city)
+    security_rates = obtener_tablas_referencia().seguridad.buscar(destination_city)
     
     if wants_armed_custody:
-        custodia = security_rates.filter(service_type='CUSTODIA_ARMADA').first()
+        custodia = security_rates.get('CUSTODIA_ARMADA')
         if custodia:
-            base = custodia.base_rate_usd
-            iva = (base * custodia.iva_rate / Decimal('100')).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+            base = Money.of(custodia.base_rate_usd)
+            iva = base.iva(custodia.iva_rate)
             total_item = base + iva if custodia.iva_applies else base
             
             items.append({
                 'tipo': 'SEGURIDAD',
                 'codigo': 'CUSTODIA_ARMADA',
                 'descripcion': f'Custodia Armada ({custodia.route_name})',
-                'monto_base': float(base),
-                'iva': float(iva) if custodia.iva_applies else 0.0,
-                'monto': float(total_item),
+                'monto_base': base.to_float(),
+                'iva': iva.to_float() if custodia.iva_applies else 0.0,
+                'monto': total_item.to_float(),
                 'moneda': 'USD',
                 'iva_exempt': not custodia.iva_applies
             })
@@ -752,19 +818,19 @@ def calcular_servicios_seguridad(
             logger.warning(f"No se encontró tarifa de custodia armada para {destination_city}")
     
     if wants_satellite_lock:
-        candado = security_rates.filter(service_type='CANDADO_SATELITAL').first()
+        candado = security_rates.get('CANDADO_SATELITAL')
         if candado:
-            base = candado.base_rate_usd
-            iva = (base * candado.iva_rate / Decimal('100')).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+            base = Money.of(candado.base_rate_usd)
+            iva = base.iva(candado.iva_rate)
             total_item = base + iva if candado.iva_applies else base
             
             items.append({
                 'tipo': 'SEGURIDAD',
                 'codigo': 'CANDADO_SATELITAL',
                 'descripcion': f'Candado Satelital GPS ({candado.route_name})',
-                'monto_base': float(base),
-                'iva': float(iva) if candado.iva_applies else 0.0,
-                'monto': float(total_item),
+                'monto_base': base.to_float(),
+                'iva': iva.to_float() if candado.iva_applies else 0.0,
+                'monto': total_item.to_float(),
                 'moneda': 'USD',
                 'iva_exempt': not candado.iva_applies
             })
@@ -776,13 +842,14 @@ def calcular_servicios_seguridad(
     
     return {
         'items': items,
-        'subtotal_antes_iva': float(subtotal),
-        'iva_monto': float(iva_total),
-        'total': float(subtotal + iva_total),
+        'subtotal_antes_iva': subtotal.to_float(),
+        'iva_monto': iva_total.to_float(),
+        'total': (subtotal + iva_total).to_float(),
         'has_security': len(items) > 0
     }
 
 
+@cachear_cotizacion('automatica')
 def generar_cotizacion_automatica(
     pol: str,
     pod: str,
@@ -798,9 +865,9 @@ def generar_cotizacion_automatica(
     Genera una cotización completa automáticamente usando las tarifas de la base de datos.
     
     Proceso:
-    1. Obtiene tarifa de flete desde FreightRateFCL
-    2. Aplica márgenes de ganancia desde ProfitMarginConfig
-    3. Obtiene gastos locales desde LocalDestinationCost
+    1. Obtiene la tarifa de flete vigente (ProviderRate)
+    2. Aplica el margen de ganancia (15%)
+    3. Obtiene los gastos locales (THC de destino de la naviera del flete)
     4. Calcula IVA con exenciones
     5. Genera totales
     
@@ -842,7 +909,7 @@ def generar_cotizacion_automatica(
     
     if apply_margins and tarifa_flete['monto'] > 0:
         margin_result = aplicar_margen_ganancia(
-            costo_base=Decimal(str(tarifa_flete['monto'])),
+            costo_base=Money.of(tarifa_flete['monto']),
             transport_type=transport_type,
             item_type='FLETE'
         )
@@ -859,7 +926,8 @@ def generar_cotizacion_automatica(
         container_type=container_type if transport_type == 'FCL' else None,
         quantity=quantity,
         cbm=volume_cbm,
-        weight_kg=weight_kg
+        weight_kg=weight_kg,
+        carrier_code=tarifa_flete.get('carrier_code')
     )
     
     gastos_locales = gastos_db.get('items', [])
@@ -868,7 +936,7 @@ def generar_cotizacion_automatica(
         for gasto in gastos_locales:
             if gasto['monto'] > 0:
                 margin_result = aplicar_margen_ganancia(
-                    costo_base=Decimal(str(gasto['monto'])),
+                    costo_base=Money.of(gasto['monto']),
                     transport_type=transport_type,
                     item_type=gasto.get('codigo', 'OTROS')
                 )
@@ -892,7 +960,8 @@ def generar_cotizacion_automatica(
         'volume_cbm': float(volume_cbm) if volume_cbm else None,
         'destination_port': destination_port,
         'margins_applied': apply_margins,
-        'rate_source': 'database'
+        'rate_source': 'database',
+        'rate_snapshot_id': obtener_snapshot_activo_id(transport_type)
     }
     
     if tarifa_flete.get('carrier'):
@@ -916,7 +985,10 @@ def buscar_mejores_tarifas(
     limit: int = 5
 ) -> List[Dict]:
     """
-    Busca las mejores tarifas disponibles para una ruta.
+    Busca las mejores tarifas vigentes (ProviderRate) para una ruta.
+    
+    Para AÉREO se toma de cada aerolínea su escala más baja (KG+45), la que
+    aplica a cualquier peso, para comparar aerolíneas entre sí.
     
     Args:
         pol: Puerto de origen
@@ -926,65 +998,34 @@ def buscar_mejores_tarifas(
         limit: Número máximo de resultados
         
     Returns:
-        Lista de tarifas ordenadas por precio
+        Lista de tarifas ordenadas por precio ('costo' por contenedor, CBM o kg
+        según 'unit')
     """
-    from .models import FreightRateFCL
-    from django.utils import timezone
-    
-    today = timezone.now().date()
     transport_type = transport_type.upper()
-    
-    base_query = FreightRateFCL.objects.filter(
-        pol_name__icontains=pol,
-        pod_name__icontains=pod,
-        validity_date__gte=today,
-        is_active=True
-    )
+    tarifas = _filtrar_ruta(tarifas_vigentes(transport_type), pol, pod)
     
     if transport_type == 'FCL':
-        cost_field = f'cost_{container_type.lower().replace(" ", "")}'
-        rates = base_query.filter(transport_type='FCL').order_by(cost_field)[:limit]
-        
-        return [{
-            'carrier': r.carrier_name,
-            'pol': r.pol_name,
-            'pod': r.pod_name,
-            'costo': float(getattr(r, cost_field, 0) or 0),
-            'container_type': container_type,
-            'transit_time': r.transit_time,
-            'validity': str(r.validity_date),
-            'rate_id': r.id
-        } for r in rates]
-    
+        rates = list(tarifas.filter(container_type=_codigo_contenedor(container_type), unit='CONTAINER')[:limit])
     elif transport_type == 'LCL':
-        rates = base_query.filter(transport_type='LCL').order_by('lcl_rate_per_cbm')[:limit]
-        
-        return [{
-            'carrier': r.carrier_name,
-            'pol': r.pol_name,
-            'pod': r.pod_name,
-            'costo_per_cbm': float(r.lcl_rate_per_cbm or 0),
-            'transit_time': r.transit_time,
-            'validity': str(r.validity_date),
-            'rate_id': r.id
-        } for r in rates]
-    
+        rates = list(tarifas.filter(unit='CBM')[:limit])
     elif transport_type == 'AEREO':
-        rates = base_query.filter(transport_type='AEREO').order_by('air_rate_min')[:limit]
-        
-        return [{
-            'carrier': r.carrier_name,
-            'pol': r.pol_name,
-            'pod': r.pod_name,
-            'rate_min': float(r.air_rate_min or 0),
-            'rate_45': float(r.air_rate_45 or 0),
-            'rate_100': float(r.air_rate_100 or 0),
-            'transit_time': r.transit_time,
-            'validity': str(r.validity_date),
-            'rate_id': r.id
-        } for r in rates]
-    
-    return []
+        por_proveedor = {}
+        for rate in tarifas.filter(unit__istartswith='KG'):
+            desde = _escala_aerea(rate.unit)
+            actual = por_proveedor.get(rate.provider_id)
+            if desde is not None and (actual is None or desde < actual[1]):
+                por_proveedor[rate.provider_id] = (rate, desde)
+        rates = sorted((rate for rate, _ in por_proveedor.values()),
+                       key=lambda r: (r.rate_usd, r.provider.priority))[:limit]
+    else:
+        return []
+    
+    return [{
+        **_datos_tarifa(r),
+        'costo': float(r.rate_usd),
+        'unit': r.unit,
+        'container_type': r.container_type or None
+    } for r in rates]
 
 
 def _crear_escenario_desde_tarifa(
@@ -999,35 +1040,27 @@ def _crear_escenario_desde_tarifa(
     descripcion: str
 ) -> Dict:
     """
-    Crea un escenario de cotización usando una tarifa específica.
+    Crea un escenario de cotización usando una tarifa específica (ProviderRate).
     """
-    from .models import FreightRateFCL
+    from .models import ProviderRate
     
     rate_id = rate_info.get('rate_id')
     if not rate_id:
         return None
     
-    try:
-        rate = FreightRateFCL.objects.get(id=rate_id)
-    except FreightRateFCL.DoesNotExist:
+    rate = ProviderRate.objects.select_related('provider').filter(id=rate_id).first()
+    if rate is None:
         return None
     
-    carrier_code = get_carrier_code_from_name(rate.carrier_name)
-    logger.info(f"Naviera identificada: {rate.carrier_name} -> Código: {carrier_code}")
+    carrier = rate.provider.name
+    carrier_code = rate.provider.code
     
-    if transport_type.upper() == 'FCL':
-        container_field_map = {
-            '20GP': 'cost_20gp', '40GP': 'cost_40gp', '40HC': 'cost_40hc',
-            '40NOR': 'cost_40nor', '20REEFER': 'cost_20reefer', '40REEFER': 'cost_40reefer',
-        }
-        container_key = container_type.upper().replace(' ', '').replace('1X', '')
-        cost_field = container_field_map.get(container_key, 'cost_20gp')
-        costo = Decimal(str(getattr(rate, cost_field, 0) or 0))
-    elif transport_type.upper() == 'LCL':
-        rate_per_cbm = Decimal(str(rate.lcl_rate_per_cbm or 0))
-        costo = rate_per_cbm * (volume_cbm or Decimal('1'))
+    if transport_type.upper() == 'LCL':
+        costo = monto_flete(rate.rate_usd, volume_cbm or Decimal('1'))
+    elif transport_type.upper() == 'AEREO' and weight_kg is not None:
+        costo = monto_flete(rate.rate_usd, weight_kg)
     else:
-        costo = Decimal(str(rate.air_rate_min or 0))
+        costo = monto_flete(rate.rate_usd)
     
     margin_result = aplicar_margen_ganancia(costo, transport_type, 'FLETE')
     
@@ -1046,18 +1079,18 @@ def _crear_escenario_desde_tarifa(
     for gasto in gastos_locales:
         if gasto['monto'] > 0:
             gasto_margin = aplicar_margen_ganancia(
-                Decimal(str(gasto['monto'])), transport_type, gasto.get('codigo', 'OTROS')
+                Money.of(gasto['monto']), transport_type, gasto.get('codigo', 'OTROS')
             )
             gasto['monto'] = gasto_margin['precio_final']
     
     flete = {
         'tipo': 'FLETE_INTERNACIONAL',
-        'descripcion': f'Flete {transport_type} ({rate.carrier_name})',
+        'descripcion': f'Flete {transport_type} ({carrier})',
         'codigo': f'FLETE_{transport_type}',
         'monto': margin_result['precio_final'],
         'moneda': 'USD',
-        'carrier': rate.carrier_name,
-        'transit_time': rate.transit_time
+        'carrier': carrier,
+        'transit_time': tiempo_transito(rate)
     }
     
     cotizacion = calcular_cotizacion_completa([flete], gastos_locales, transport_type)
@@ -1065,16 +1098,17 @@ def _crear_escenario_desde_tarifa(
     cotizacion['escenario'] = escenario_tipo
     cotizacion['descripcion'] = descripcion
     cotizacion['metadata'] = {
-        'carrier': rate.carrier_name,
+        'carrier': carrier,
         'carrier_code': carrier_code,
-        'transit_time': rate.transit_time,
-        'validity': str(rate.validity_date) if rate.validity_date else None,
+        'transit_time': tiempo_transito(rate),
+        'validity': str(rate.valid_to),
         'rate_id': rate.id
     }
     
     return cotizacion
 
 
+@cachear_cotizacion('escenarios')
 def generar_escenarios_cotizacion(
     pol: str,
     pod: str,
@@ -1135,21 +1169,9 @@ def generar_escenarios_cotizacion(
         if estandar:
             escenarios.append(estandar)
     
-    express_rate = None
-    for rate in mejores_tarifas:
-        if rate.get('transit_time'):
-            try:
-                tt = int(str(rate['transit_time']).split()[0])
-                if express_rate is None:
-                    express_rate = rate
-                else:
-                    curr_tt = int(str(express_rate.get('transit_time', '999')).split()[0])
-                    if tt < curr_tt:
-                        express_rate = rate
-            except (ValueError, IndexError):
-                pass
-    
-    if express_rate and express_rate.get('rate_id') != mejores_tarifas[0].get('rate_id'):
+    express_rate = min(mejores_tarifas, key=lambda rate: rate['transit_days_min'])
+    
+    if express_rate.get('rate_id') != mejores_tarifas[0].get('rate_id'):
         express = _crear_escenario_desde_tarifa(
             rate_info=express_rate,
             transport_type=transport_type,
@@ -1168,11 +1190,13 @@ def generar_escenarios_cotizacion(
         'pol': pol,
         'pod': pod,
         'transport_type': transport_type,
+        'rate_snapshot_id': obtener_snapshot_activo_id(transport_type),
         'total_tarifas_encontradas': len(mejores_tarifas),
         'escenarios': escenarios
     }
 
 
+@cachear_cotizacion('multipuerto')
 def generar_cotizacion_multipuerto(
     origin_ports: List[str],
     destination_ports: List[str],
@@ -1204,8 +1228,6 @@ def generar_cotizacion_multipuerto(
             - gastos_locales: Dict con gastos locales por puerto destino
             - resumen: Resumen de la cotización
     """
-    from .models import FreightRateFCL
-    
     is_multi_port = len(origin_ports) > 1 or len(destination_ports) > 1
     
     tarifas = []
@@ -1213,11 +1235,9 @@ def generar_cotizacion_multipuerto(
     
     # Obtener gastos locales para cada puerto destino (solo una vez por puerto)
     for pod in destination_ports:
-        port_code = pod.upper()[:3] if len(pod) >= 3 else pod.upper()
-        
         gastos = obtener_gastos_locales_db(
             transport_type=transport_type,
-            port=port_code,
+            port=pod,
             container_type=container_type if transport_type == 'FCL' else None,
             quantity=quantity,
             cbm=volume_cbm,
@@ -1241,13 +1261,13 @@ def generar_cotizacion_multipuerto(
             if tarifa:
                 # Aplicar margen de ganancia
                 margen_info = aplicar_margen_ganancia(
-                    costo_base=Decimal(str(tarifa['monto'])),
+                    costo_base=Money.of(tarifa['monto']),
                     transport_type=transport_type,
                     item_type='FLETE'
                 )
                 
                 precio_unitario = margen_info['precio_final']
-                precio_total = precio_unitario * quantity if transport_type.upper() == 'FCL' else precio_unitario
+                precio_total = (Money.of(precio_unitario) * quantity).to_float() if transport_type.upper() == 'FCL' else precio_unitario
                 
                 tarifa_entry = {
                     'pol': pol,
@@ -1291,6 +1311,7 @@ def generar_cotizacion_multipuerto(
     return {
         'is_multi_port': is_multi_port,
         'transport_type': transport_type,
+        'rate_snapshot_id': obtener_snapshot_activo_id(transport_type),
         'container_type': container_type if transport_type == 'FCL' else None,
         'quantity': quantity,
         'origin_ports': origin_ports,
@@ -1324,69 +1345,26 @@ def obtener_tarifas_tabla(
     Returns:
         Lista de tarifas con detalles de carrier, transit time, etc.
     """
-    from .models import FreightRateFCL
-    from django.utils import timezone
-    
-    transport_type = transport_type.upper()
-    today = timezone.now().date()
-    
-    # Buscar tarifas activas para la ruta
-    rates_qs = FreightRateFCL.objects.filter(
-        pol_name__icontains=pol,
-        pod_name__icontains=pod,
-        transport_type=transport_type,
-        is_active=True,
-        validity_date__gte=today
-    )
-    
-    # Mapeo de campo de costo según tipo de contenedor
-    container_field_map = {
-        '20GP': 'cost_20gp',
-        '40GP': 'cost_40gp',
-        '40HC': 'cost_40hc',
-        '40NOR': 'cost_40nor',
-        '20REEFER': 'cost_20reefer',
-        '40REEFER': 'cost_40reefer',
-    }
-    
-    if transport_type == 'FCL':
-        cost_field = container_field_map.get(container_type.upper(), 'cost_40hc')
-        rates_qs = rates_qs.exclude(**{f'{cost_field}__isnull': True}).order_by(cost_field)
-    elif transport_type == 'LCL':
-        rates_qs = rates_qs.exclude(lcl_rate_per_cbm__isnull=True).order_by('lcl_rate_per_cbm')
-    else:  # AEREO
-        rates_qs = rates_qs.exclude(air_rate_min__isnull=True).order_by('air_rate_min')
-    
-    rates = list(rates_qs[:limit])
-    
     result = []
-    for rate in rates:
-        if transport_type == 'FCL':
-            costo = getattr(rate, container_field_map.get(container_type.upper(), 'cost_40hc'), None)
-        elif transport_type == 'LCL':
-            costo = rate.lcl_rate_per_cbm
-        else:
-            costo = rate.air_rate_min
+    for tarifa in buscar_mejores_tarifas(pol, pod, transport_type, container_type, limit=limit):
+        margen_info = aplicar_margen_ganancia(
+            costo_base=Money.of(tarifa['costo']),
+            transport_type=transport_type,
+            item_type='FLETE'
+        )
         
-        if costo is not None:
-            # Aplicar margen
-            margen_info = aplicar_margen_ganancia(
-                costo_base=Decimal(str(costo)),
-                transport_type=transport_type,
-                item_type='FLETE'
-            )
-            
-            result.append({
-                'rate_id': rate.id,
-                'pol': rate.pol_name,
-                'pod': rate.pod_name,
-                'carrier': rate.carrier_name,
-                'transit_time': rate.transit_time,
-                'validity': str(rate.validity_date) if rate.validity_date else None,
-                'free_days': rate.free_days,
-                'costo_base': float(costo),
-                'precio_final': margen_info['precio_final'],
-                'moneda': 'USD'
-            })
+        result.append({
+            'rate_id': tarifa['rate_id'],
+            'pol': tarifa['pol'],
+            'pod': tarifa['pod'],
+            'carrier': tarifa['carrier'],
+            'transit_time': tarifa['transit_time'],
+            'validity': tarifa['validity'],
+            'free_days': tarifa['free_days'],
+            'unit': tarifa['unit'],
+            'costo_base': tarifa['costo'],
+            'precio_final': margen_info['precio_final'],
+            'moneda': 'USD'
+        })
     
     return result
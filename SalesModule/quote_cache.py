@@ -0,0 +1,303 @@
+"""
+Quote Result Cache for ImportaYa.ia
+Caché LRU en memoria para los resultados del motor de cotización.
+
+Las funciones generar_cotizacion_automatica, generar_escenarios_cotizacion y
+generar_cotizacion_multipuerto consultan las tarifas vigentes (ProviderRate)
+por cada llamada. Para una misma ruta y carga el resultado solo cambia cuando
+cambian las tarifas o los proveedores, así que se guarda en memoria usando
+una clave normalizada + la versión de los datos de precios.
+
+La versión vive en el caché compartido de Django (CACHES en settings,
+visible para todos los workers; ver shared_versions.py) y signals.py la
+incrementa cada vez que se guarda o borra una fila de PRICING_MODELS. Los
+tarifarios de flete cargados por snapshot (rate_snapshots.py) entran en la
+clave por su ID activo.
+"""
+import contextlib
+import copy
+import functools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal, InvalidOperation
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAXSIZE = 512
+
+PRICING_VERSION_KEY = 'quote_cache:pricing_version'
+
+# Modelos cuyos cambios invalidan las cotizaciones cacheadas. Deben existir:
+# signals.py falla al arrancar si alguno no está (FreightRateFCL,
+# ProfitMarginConfig, LocalDestinationCost y ExchangeRate se eliminaron en la
+# migración 0051; las tarifas vivas son ProviderRate, ver rate_snapshots.py).
+PRICING_MODELS = [
+    'ProviderRate',
+    'LogisticsProvider',
+    'FreightForwarderConfig',
+]
+
+
+class QuoteLRUCache:
+    """
+    Caché LRU thread-safe con contadores de hits/misses.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self._data: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return True, self._data[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def _get_maxsize() -> int:
+    try:
+        from django.conf import settings
+        return int(getattr(settings, 'QUOTE_CACHE_MAXSIZE', DEFAULT_MAXSIZE))
+    except Exception:
+        return DEFAULT_MAXSIZE
+
+
+_cache = QuoteLRUCache(maxsize=_get_maxsize())
+_local_version = 0
+_version_lock = threading.Lock()
+_thread_state = threading.local()
+_snapshots_lock = threading.Lock()
+_snapshots_memo: Optional[Tuple[Tuple, float]] = None
+
+
+def normalizar_puerto(valor: Optional[str]) -> str:
+    """Normaliza un nombre/código de puerto para usarlo en la clave."""
+    if valor is None:
+        return ''
+    return ' '.join(str(valor).split()).upper()
+
+
+def normalizar_numero(valor: Any) -> Optional[str]:
+    """
+    Normaliza cantidades numéricas (peso, volumen, cantidad) para que
+    100, 100.0, '100.00' y Decimal('100') generen la misma clave.
+    """
+    if valor is None or valor == '':
+        return None
+    try:
+        numero = Decimal(str(valor))
+    except (InvalidOperation, ValueError):
+        return str(valor)
+    if numero == 0:
+        return '0'
+    return format(numero.normalize(), 'f')
+
+
+def obtener_version_precios() -> int:
+    """
+    Versión actual de los datos de precios (tarifas, márgenes, gastos locales).
+    """
+    from .shared_versions import leer_version
+    return leer_version(PRICING_VERSION_KEY, defecto=_local_version)
+
+
+def invalidar_cache_cotizaciones(motivo: str = '') -> int:
+    """
+    Incrementa la versión de precios y vacía el caché local.
+    Las entradas de otros workers quedan obsoletas porque su clave
+    incluye la versión anterior.
+
+    Returns:
+        Nueva versión de precios
+    """
+    global _local_version
+
+    with _version_lock:
+        _local_version += 1
+        nueva_version = _local_version
+        try:
+            from .shared_versions import incrementar_version
+            nueva_version = incrementar_version(PRICING_VERSION_KEY)
+        except Exception as e:
+            logger.debug(f"No se pudo incrementar versión en cache de Django: {e}")
+
+    _cache.clear()
+    _olvidar_snapshots()
+    logger.info(f"Caché de cotizaciones invalidado (versión {nueva_version}) {motivo}".strip())
+    return nueva_version
+
+
+@contextlib.contextmanager
+def suspender_invalidacion():
+    """
+    Ignora las señales de invalidación en el hilo actual (cargas masivas que
+    ya publican su propia versión, p.ej. la activación de un snapshot).
+    """
+    anterior = getattr(_thread_state, 'suspendido', False)
+    _thread_state.suspendido = True
+    try:
+        yield
+    finally:
+        _thread_state.suspendido = anterior
+
+
+def invalidacion_suspendida() -> bool:
+    return getattr(_thread_state, 'suspendido', False)
+
+
+def _snapshots_activos() -> Tuple:
+    """
+    Snapshots activos (alcance, ID) para la clave. Como las versiones de
+    shared_versions, se memorizan SHARED_VERSION_CHECK_S segundos: leerlos
+    cuesta una consulta al caché compartido en cada cotización. Este proceso
+    los relee de inmediato tras limpiar o invalidar el caché.
+    """
+    global _snapshots_memo
+    from .rate_snapshots import obtener_snapshots_activos
+    from .shared_versions import intervalo_verificacion
+
+    ahora = time.monotonic()
+    memo = _snapshots_memo
+    if memo is not None and ahora - memo[1] < intervalo_verificacion():
+        return memo[0]
+    snapshots = tuple(sorted(obtener_snapshots_activos().items()))
+    with _snapshots_lock:
+        _snapshots_memo = (snapshots, ahora)
+    return snapshots
+
+
+def _olvidar_snapshots() -> None:
+    global _snapshots_memo
+    with _snapshots_lock:
+        _snapshots_memo = None
+
+
+def construir_clave(nombre: str, *partes: Any) -> Tuple:
+    """
+    Clave del caché: función + partes normalizadas + versión de precios +
+    snapshots de tarifas activos + fecha.
+    La fecha se incluye porque las tarifas se filtran por vigencia (valid_from
+    <= hoy <= valid_to).
+    """
+    from django.utils import timezone
+
+    return (nombre, obtener_version_precios(), _snapshots_activos(), timezone.now().date().isoformat()) + tuple(partes)
+
+
+def _clave_cotizacion(pol, pod, transport_type, container_type='20GP', quantity=1,
+                      weight_kg=None, volume_cbm=None, destination_port='GYE',
+                      apply_margins=True) -> Tuple:
+    return (
+        normalizar_puerto(pol),
+        normalizar_puerto(pod),
+        normalizar_puerto(transport_type),
+        normalizar_puerto(container_type),
+        normalizar_numero(quantity),
+        normalizar_numero(weight_kg),
+        normalizar_numero(volume_cbm),
+        normalizar_puerto(destination_port),
+        bool(apply_margins),
+    )
+
+
+def _clave_multipuerto(origin_ports, destination_ports, transport_type,
+                       container_type='40HC', quantity=1, weight_kg=None,
+                       volume_cbm=None) -> Tuple:
+    return (
+        tuple(normalizar_puerto(p) for p in (origin_ports or [])),
+        tuple(normalizar_puerto(p) for p in (destination_ports or [])),
+        normalizar_puerto(transport_type),
+        normalizar_puerto(container_type),
+        normalizar_numero(quantity),
+        normalizar_numero(weight_kg),
+        normalizar_numero(volume_cbm),
+    )
+
+
+CLAVES = {
+    'automatica': _clave_cotizacion,
+    'escenarios': _clave_cotizacion,
+    'multipuerto': _clave_multipuerto,
+}
+
+
+def cachear_cotizacion(nombre: str) -> Callable:
+    """
+    Decorador para las funciones generar_* del motor de cotización.
+    Devuelve siempre una copia profunda para que el llamador pueda
+    modificar el resultado sin afectar al caché.
+
+    Acepta use_cache=False en la llamada para forzar el cálculo.
+    """
+    construir_partes = CLAVES[nombre]
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, use_cache: bool = True, **kwargs):
+            if not use_cache:
+                return func(*args, **kwargs)
+
+            try:
+                clave = construir_clave(nombre, *construir_partes(*args, **kwargs))
+            except TypeError:
+                return func(*args, **kwargs)
+
+            encontrado, valor = _cache.get(clave)
+            if encontrado:
+                return copy.deepcopy(valor)
+
+            resultado = func(*args, **kwargs)
+            _cache.set(clave, copy.deepcopy(resultado))
+            return resultado
+
+        wrapper.uncached = func
+        return wrapper
+
+    return decorator
+
+
+def obtener_estadisticas_cache() -> Dict:
+    """Estadísticas del caché de cotizaciones (para monitoreo)."""
+    stats = _cache.stats()
+    stats['pricing_version'] = obtener_version_precios()
+    return stats
+
+
+def limpiar_cache_cotizaciones() -> None:
+    """Vacía el caché local sin cambiar la versión de precios."""
+    _cache.clear()
+    _olvidar_snapshots()
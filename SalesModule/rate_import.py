@@ -0,0 +1,747 @@
+"""
+Freight Rate Import Engine for ImportaYa.ia
+Motor único de importación de tarifarios (FCL, LCL, aéreo) hacia ProviderRate.
+
+Cada formato de archivo se describe con un RateImportFormat (mapeo de columnas
+y tipo de limpieza por campo). La limpieza de precios, fechas y monedas se hace
+por columna completa con pandas.
+
+Los registros del archivo siguen el formato de tarifario (naviera, POL, POD,
+vigencia y una columna por equipo o rango de peso). FreightRateFCL se eliminó
+en la migración 0051, así que cada registro se escribe como filas de
+ProviderRate, la tabla que lee el motor de cotización: una por costo no nulo
+(20GP, 40GP, 40HC, 40NOR, CBM, KG+45...), con el proveedor buscado por nombre
+en LogisticsProvider (o creado si no existe) y el destino como código (GYE,
+PSJ, UIO). La escritura es un upsert por clave natural (proveedor, origen,
+destino, equipo, unidad, vigencia) con bulk_create / bulk_update en bloques.
+Solo se importan tarifas en USD.
+
+Modos:
+- 'upsert': crea las tarifas nuevas y actualiza las existentes
+- 'replace': el archivo reemplaza todo el tarifario del alcance (vía snapshot)
+
+Con dry_run=True solo se calcula el reporte de diferencias.
+"""
+import logging
+from dataclasses import dataclass, field
+from datetime import date
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from .rate_snapshots import SCOPE_FCL, SCOPE_LCL, SCOPE_AEREO
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 500
+
+DEFAULT_AIR_VALIDITY_DATE = date(2025, 12, 31)
+
+NATURAL_KEY = ('carrier_name', 'pol_name', 'pod_name', 'validity_date')
+
+NULL_TOKENS = ['', '/', '-', 'nan', 'NaN', 'None']
+
+CURRENCY_ALIASES = {
+    'DOLAR': 'USD', 'DOLLAR': 'USD', 'USD': 'USD', 'US$': 'USD',
+    'EURO': 'EUR', 'EUROS': 'EUR', 'EUR': 'EUR', '€': 'EUR',
+}
+
+# Tipos de limpieza por campo
+TEXT = 'text'
+UPPER = 'upper'
+PRICE = 'price'                  # "1,920.00" -> 1920.00 (coma de miles)
+DECIMAL_COMMA = 'decimal_comma'  # "12,50" -> 12.50 (coma decimal)
+DATE = 'date'
+CURRENCY = 'currency'
+INTEGER = 'integer'
+
+
+class RateImportError(Exception):
+    """Error de lectura o formato en la importación de tarifas"""
+    pass
+
+
+@dataclass
+class RateImportFormat:
+    """Descripción de un formato de tarifario."""
+    name: str
+    scope: str
+    label: str
+    columns: Dict[str, Tuple[str, str]]
+    fill_values: Dict[str, Any] = field(default_factory=dict)
+    defaults: Dict[str, Any] = field(default_factory=dict)
+    required: List[str] = field(default_factory=list)
+    ffill_columns: List[str] = field(default_factory=list)
+    zero_as_null: List[str] = field(default_factory=list)
+
+
+@dataclass
+class ResultadoImportacion:
+    """Resultado (o reporte dry-run) de una importación."""
+    format: str
+    scope: str
+    mode: str
+    dry_run: bool
+    total_rows: int = 0
+    valid_rows: int = 0
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    deleted: int = 0
+    duplicates: int = 0
+    errors: List[str] = field(default_factory=list)
+    changes: List[Dict] = field(default_factory=list)
+    snapshot_id: Optional[int] = None
+
+    @property
+    def imported(self) -> int:
+        return self.created + self.updated
+
+    def to_dict(self, max_changes: int = 50) -> Dict:
+        return {
+            'format': self.format,
+            'scope': self.scope,
+            'mode': self.mode,
+            'dry_run': self.dry_run,
+            'total_rows': self.total_rows,
+            'valid_rows': self.valid_rows,
+            'created': self.created,
+            'updated': self.updated,
+            'unchanged': self.unchanged,
+            'deleted': self.deleted,
+            'duplicates': self.duplicates,
+            'errors': self.errors[:max_changes],
+            'total_errors': len(self.errors),
+            'changes': self.changes[:max_changes],
+            'snapshot_id': self.snapshot_id,
+        }
+
+
+FORMATS: Dict[str, RateImportFormat] = {}
+
+
+def registrar_formato(formato: RateImportFormat) -> RateImportFormat:
+    """Registra un formato de archivo para el motor de importación."""
+    FORMATS[formato.name] = formato
+    return formato
+
+
+registrar_formato(RateImportFormat(
+    name='fcl',
+    scope=SCOPE_FCL,
+    label='Tarifas Marítimas FCL',
+    columns={
+        'POL o Puerto de origen': ('pol_name', UPPER),
+        'POD o Puerto de destino': ('pod_name', UPPER),
+        'NAVIERA FCL': ('carrier_name', TEXT),
+        'VIGENCIA HASTA': ('validity_date', DATE),
+        'TIEMPO DE TRANSITO': ('transit_time', TEXT),
+        'DIAS LIBRES': ('free_days', INTEGER),
+        '20 GP': ('cost_20gp', PRICE),
+        '40 GP': ('cost_40gp', PRICE),
+        '40 HC': ('cost_40hc', PRICE),
+        '40 NOR': ('cost_nor', PRICE),
+        'AGENTE': ('agent_name', TEXT),
+        'CONTRATO': ('contract_number', TEXT),
+    },
+    fill_values={
+        'free_days': 21,
+        'cost_20gp': Decimal('0.00'),
+        'cost_40gp': Decimal('0.00'),
+        'cost_40hc': Decimal('0.00'),
+    },
+    defaults={'currency': 'USD', 'includes_thc': False, 'is_active': True},
+    required=['pol_name', 'pod_name', 'carrier_name', 'validity_date'],
+    zero_as_null=['cost_nor'],
+))
+
+registrar_formato(RateImportFormat(
+    name='lcl',
+    scope=SCOPE_LCL,
+    label='Tarifas Marítimas LCL',
+    columns={
+        'ORIGEN': ('pol_name', UPPER),
+        'DESTINO': ('pod_name', UPPER),
+        'NAVIERA LCL': ('carrier_name', TEXT),
+        'VIGENCIA HASTA': ('validity_date', DATE),
+        'TIEMPO DE TRANSITO': ('transit_time', TEXT),
+        'MONEDA': ('currency', CURRENCY),
+        'FLETE MARITIMO LCL': ('cost_lcl', PRICE),
+    },
+    fill_values={'cost_lcl': Decimal('0.00')},
+    defaults={
+        'free_days': 0,
+        'cost_20gp': Decimal('0.00'),
+        'cost_40gp': Decimal('0.00'),
+        'cost_40hc': Decimal('0.00'),
+        'cost_nor': None,
+        'includes_thc': False,
+        'is_active': True,
+    },
+    required=['pol_name', 'pod_name', 'carrier_name', 'validity_date'],
+))
+
+registrar_formato(RateImportFormat(
+    name='air',
+    scope=SCOPE_AEREO,
+    label='Tarifas Aéreas por Rango de Peso',
+    columns={
+        'airport of origin': ('pol_name', UPPER),
+        'Airport of destination': ('pod_name', UPPER),
+        'CARRIER': ('carrier_name', UPPER),
+        'ROUTING': ('routing', TEXT),
+        'Transit time': ('transit_time', TEXT),
+        'Flight schedule': ('frequency', TEXT),
+        'PACKAGING ACCEPTED': ('packaging_type', TEXT),
+        '+45KGS': ('cost_45', PRICE),
+        '+100KGS': ('cost_100', PRICE),
+        '+300KGS': ('cost_300', PRICE),
+        '+500KGS': ('cost_500', PRICE),
+        '+1000KGS': ('cost_1000', PRICE),
+    },
+    defaults={
+        'validity_date': DEFAULT_AIR_VALIDITY_DATE,
+        'free_days': 0,
+        'currency': 'USD',
+        'cost_20gp': Decimal('0.00'),
+        'cost_40gp': Decimal('0.00'),
+        'cost_40hc': Decimal('0.00'),
+        'is_active': True,
+    },
+    required=['pol_name', 'pod_name', 'carrier_name'],
+    ffill_columns=['Airport of destination', 'airport of origin'],
+))
+
+registrar_formato(RateImportFormat(
+    name='air_simple',
+    scope=SCOPE_AEREO,
+    label='Tarifas Aéreas Formato Simple',
+    columns={
+        'ORIGEN': ('pol_name', UPPER),
+        'DESTINO': ('pod_name', UPPER),
+        'LINEA': ('carrier_name', TEXT),
+        'VIGENCIA HASTA': ('validity_date', DATE),
+        'Tiempo de transito': ('transit_time', TEXT),
+        'MONEDA': ('currency', CURRENCY),
+        'AGENTE': ('agent_name', TEXT),
+        'FLETE AEREO': ('cost_45', DECIMAL_COMMA),
+    },
+    defaults={
+        'cost_20gp': Decimal('0.00'),
+        'cost_40gp': Decimal('0.00'),
+        'cost_40hc': Decimal('0.00'),
+        'is_active': True,
+    },
+    required=['pol_name', 'pod_name', 'carrier_name', 'cost_45'],
+))
+
+
+# --- LIMPIEZA VECTORIZADA ---
+
+def _como_texto(serie: pd.Series) -> pd.Series:
+    texto = serie.astype('string').str.strip()
+    return texto.mask(texto.isin(NULL_TOKENS))
+
+
+def limpiar_precios(serie: pd.Series, decimal_comma: bool = False) -> pd.Series:
+    """
+    Limpia una columna de precios completa.
+    Coma de miles ("1,920.00") por defecto, o coma decimal ("12,50").
+    Valores vacíos, '/', '-' o no numéricos quedan como NaN.
+    """
+    texto = _como_texto(serie)
+    if decimal_comma:
+        texto = texto.str.replace(',', '.', regex=False)
+    else:
+        texto = texto.str.replace(',', '', regex=False)
+    return pd.to_numeric(texto, errors='coerce')
+
+
+def parsear_fechas(serie: pd.Series) -> pd.Series:
+    """Parsea una columna de fechas dd/mm/yyyy (o yyyy-mm-dd como respaldo)."""
+    texto = _como_texto(serie)
+    fechas = pd.to_datetime(texto, format='%d/%m/%Y', errors='coerce')
+    faltantes = fechas.isna() & texto.notna()
+    if faltantes.any():
+        respaldo = pd.to_datetime(texto.where(faltantes), format='%Y-%m-%d', errors='coerce')
+        fechas = fechas.fillna(respaldo)
+    return fechas
+
+
+def normalizar_monedas(serie: pd.Series) -> pd.Series:
+    """Normaliza monedas a ISO 4217 (DOLAR -> USD, EUROS -> EUR). Default USD."""
+    texto = _como_texto(serie).str.upper()
+    return texto.map(CURRENCY_ALIASES).fillna('USD')
+
+
+def _a_decimal(valor) -> Optional[Decimal]:
+    if valor is None or pd.isna(valor):
+        return None
+    return Decimal(str(round(float(valor), 4)))
+
+
+def _a_fecha(valor) -> Optional[date]:
+    if valor is None or pd.isna(valor):
+        return None
+    return valor.date()
+
+
+def transformar_dataframe(df: pd.DataFrame, formato: RateImportFormat) -> Tuple[List[Dict], List[str], int]:
+    """
+    Aplica el mapeo del formato al DataFrame leído.
+
+    Returns:
+        Tupla (registros válidos, errores, duplicados eliminados)
+    """
+    df = df.copy()
+    df.columns = [str(c).strip() for c in df.columns]
+
+    for columna in formato.ffill_columns:
+        if columna in df.columns:
+            df[columna] = df[columna].ffill()
+
+    faltantes = [c for c, (campo, _) in formato.columns.items()
+                 if c not in df.columns and campo in formato.required]
+    if faltantes:
+        raise RateImportError(f"Columnas requeridas no encontradas: {', '.join(faltantes)}")
+
+    salida = pd.DataFrame(index=df.index)
+    convertidores = {}
+
+    for columna, (campo, tipo) in formato.columns.items():
+        serie = df[columna] if columna in df.columns else pd.Series(pd.NA, index=df.index, dtype='object')
+
+        if tipo in (TEXT, UPPER):
+            valores = _como_texto(serie).fillna('')
+            if tipo == UPPER:
+                valores = valores.str.upper()
+            salida[campo] = valores.astype(object)
+        elif tipo in (PRICE, DECIMAL_COMMA):
+            valores = limpiar_precios(serie, decimal_comma=(tipo == DECIMAL_COMMA))
+            if campo in formato.zero_as_null:
+                valores = valores.mask(valores == 0)
+            salida[campo] = valores
+            convertidores[campo] = _a_decimal
+        elif tipo == DATE:
+            salida[campo] = parsear_fechas(serie)
+            convertidores[campo] = _a_fecha
+        elif tipo == CURRENCY:
+            salida[campo] = normalizar_monedas(serie)
+        elif tipo == INTEGER:
+            salida[campo] = pd.to_numeric(_como_texto(serie), errors='coerce')
+            convertidores[campo] = lambda v: None if pd.isna(v) else int(v)
+
+    for campo in formato.required:
+        if campo not in salida.columns:
+            continue
+        columna = salida[campo]
+        invalidos = columna.eq('') if columna.dtype == object else columna.isna()
+        salida = salida[~invalidos]
+
+    filas_validas = set(salida.index)
+    errores = [
+        f"Fila {idx + 2}: datos incompletos o inválidos"
+        for idx in df.index if idx not in filas_validas
+    ]
+
+    registros = []
+    for fila in salida.to_dict('records'):
+        registro = dict(formato.defaults)
+        for campo, valor in fila.items():
+            convertidor = convertidores.get(campo)
+            valor = convertidor(valor) if convertidor else valor
+            if valor is None and campo in formato.fill_values:
+                valor = formato.fill_values[campo]
+            registro[campo] = valor
+        registro['transport_type'] = formato.scope
+        registros.append(registro)
+
+    # Deduplicar por clave natural (gana la última fila del archivo)
+    unicos = {}
+    for registro in registros:
+        unicos[clave_natural(registro)] = registro
+    duplicados = len(registros) - len(unicos)
+
+    return list(unicos.values()), errores, duplicados
+
+
+def clave_natural(registro) -> Tuple:
+    """Clave natural de una tarifa: (naviera, POL, POD, vigencia)."""
+    if isinstance(registro, dict):
+        valores = [registro.get(campo) for campo in NATURAL_KEY]
+    else:
+        valores = [getattr(registro, campo) for campo in NATURAL_KEY]
+    carrier, pol, pod, validity = valores
+    return (
+        str(carrier or '').strip().upper(),
+        str(pol or '').strip().upper(),
+        str(pod or '').strip().upper(),
+        validity,
+    )
+
+
+def leer_archivo(archivo, nombre: str = '') -> pd.DataFrame:
+    """
+    Lee un tarifario CSV (separador ';') o Excel.
+    Acepta una ruta o un archivo subido (file-like).
+    """
+    nombre = (nombre or getattr(archivo, 'name', '') or str(archivo)).lower()
+
+    if nombre.endswith(('.xlsx', '.xls')):
+        return pd.read_excel(archivo)
+
+    for encoding in ('utf-8-sig', 'latin-1'):
+        try:
+            if hasattr(archivo, 'seek'):
+                archivo.seek(0)
+            return pd.read_csv(archivo, delimiter=';', encoding=encoding, dtype=str)
+        except UnicodeDecodeError:
+            continue
+    raise RateImportError(f"No se pudo leer el archivo {nombre}")
+
+
+# --- FILAS DE ProviderRate ---
+
+# Columnas de costo de cada alcance -> (container_type, unit) de ProviderRate
+COST_COLUMNS = {
+    SCOPE_FCL: [
+        ('cost_20gp', '20GP', 'CONTAINER'),
+        ('cost_40gp', '40GP', 'CONTAINER'),
+        ('cost_40hc', '40HC', 'CONTAINER'),
+        ('cost_nor', '40NOR', 'CONTAINER'),
+    ],
+    SCOPE_LCL: [
+        ('cost_lcl', '', 'CBM'),
+    ],
+    SCOPE_AEREO: [
+        ('cost_45', '', 'KG+45'),
+        ('cost_100', '', 'KG+100'),
+        ('cost_300', '', 'KG+300'),
+        ('cost_500', '', 'KG+500'),
+        ('cost_1000', '', 'KG+1000'),
+    ],
+}
+
+RATE_KEY = ('provider_id', 'origin_port', 'destination', 'container_type', 'unit', 'valid_to')
+
+# Campos que el upsert no actualiza en tarifas existentes
+CREATE_ONLY_FIELDS = {'valid_from'}
+
+
+def _proveedores_por_nombre(spec: RateImportFormat, registros: List[Dict], crear: bool) -> Dict[str, Any]:
+    """
+    LogisticsProvider de cada naviera / aerolínea del archivo, por nombre normalizado.
+    Los que no existen se crean (con código generado) solo si `crear` es True.
+    """
+    from .models import LogisticsProvider
+    from .rate_snapshots import PROVIDER_TRANSPORT_TYPES
+    from .resolvers import normalizar_texto
+
+    transport_type = PROVIDER_TRANSPORT_TYPES[spec.scope]
+    proveedores = {}
+    for provider in LogisticsProvider.objects.filter(transport_type=transport_type):
+        proveedores.setdefault(normalizar_texto(provider.name), provider)
+        proveedores.setdefault(normalizar_texto(provider.code), provider)
+
+    faltantes = {}
+    for registro in registros:
+        clave = normalizar_texto(registro['carrier_name'])
+        if clave not in proveedores:
+            faltantes.setdefault(clave, registro['carrier_name'].strip().upper())
+
+    if faltantes and crear:
+        from .provider_codes import generar_codigo_proveedor
+
+        codigos = set(LogisticsProvider.objects.values_list('code', flat=True))
+        for clave, nombre in faltantes.items():
+            codigo = generar_codigo_proveedor(nombre, transport_type, codigos)
+            codigos.add(codigo)
+            proveedores[clave] = LogisticsProvider.objects.create(
+                name=nombre, code=codigo, transport_type=transport_type
+            )
+            logger.info(f"Proveedor {nombre} ({transport_type}) creado con código {codigo}")
+    return proveedores
+
+
+def _codigo_destino(texto: str, aeropuertos: Dict[str, str]) -> Optional[str]:
+    """Código de destino de ProviderRate (GYE, PSJ, UIO...) o None si no se reconoce."""
+    from .resolvers import normalizar_texto, resolve_port
+
+    locode = resolve_port(texto)
+    if locode and locode.startswith('EC'):
+        return locode[2:]
+    normalizado = normalizar_texto(texto)
+    if normalizado in aeropuertos:
+        return aeropuertos[normalizado]
+    return normalizado if len(normalizado) == 3 else None
+
+
+def _aeropuertos_ecuador() -> Dict[str, str]:
+    from .models import Airport
+    from .resolvers import normalizar_texto
+
+    return {
+        normalizar_texto(ciudad): iata
+        for ciudad, iata in Airport.objects.filter(country__iexact='Ecuador', is_active=True)
+        .values_list('ciudad_exacta', 'iata_code')
+    }
+
+
+def _dias_transito(texto) -> Dict[str, int]:
+    """'25-30 DIAS' -> min 25 / max 30; '3 DAYS' -> 3 / 3; sin números -> defaults del modelo."""
+    import re
+
+    numeros = [int(n) for n in re.findall(r'\d+', str(texto or ''))]
+    if not numeros:
+        return {}
+    return {'transit_days_min': min(numeros), 'transit_days_max': max(numeros)}
+
+
+def construir_tarifas(
+    registros: List[Dict],
+    spec: RateImportFormat,
+    proveedores: Dict[str, Any],
+    hoy: Optional[date] = None
+) -> Tuple[List[Dict], List[str], int]:
+    """
+    Convierte los registros del tarifario en filas de ProviderRate:
+    una fila por costo no nulo (20GP / 40GP / 40HC / 40NOR, CBM, KG+45...).
+
+    Returns:
+        Tupla (filas, errores, duplicados eliminados)
+    """
+    from .resolvers import normalizar_texto, resolve_port
+
+    hoy = hoy or date.today()
+    aeropuertos = _aeropuertos_ecuador() if spec.scope == SCOPE_AEREO else {}
+    filas, errores = [], []
+
+    for registro in registros:
+        legible = _clave_legible(registro)
+        moneda = registro.get('currency') or 'USD'
+        if moneda != 'USD':
+            errores.append(f"{legible}: moneda {moneda} no soportada (las tarifas se guardan en USD)")
+            continue
+        destino = _codigo_destino(registro['pod_name'], aeropuertos)
+        if not destino:
+            errores.append(f"{legible}: destino {registro['pod_name']} no reconocido")
+            continue
+
+        provider = proveedores.get(normalizar_texto(registro['carrier_name']))
+        valid_to = registro.get('validity_date') or DEFAULT_AIR_VALIDITY_DATE
+        base = {
+            'provider_id': provider.pk if provider else None,
+            'origin_port': registro['pol_name'],
+            'origin_country': (resolve_port(registro['pol_name']) or '')[:2],
+            'destination': destino,
+            'valid_from': min(hoy, valid_to),
+            'valid_to': valid_to,
+            'is_active': True,
+            '_proveedor': provider.name if provider else registro['carrier_name'].strip().upper(),
+        }
+        base.update(_dias_transito(registro.get('transit_time')))
+        if registro.get('free_days') is not None:
+            base['free_days'] = registro['free_days']
+
+        for campo, container_type, unit in COST_COLUMNS[spec.scope]:
+            costo = registro.get(campo)
+            if not costo:
+                continue
+            filas.append(dict(base, container_type=container_type, unit=unit,
+                              rate_usd=costo.quantize(Decimal('0.01'))))
+
+    # Dos escrituras del mismo puerto dan la misma tarifa (gana la última)
+    unicas = {}
+    for fila in filas:
+        unicas[clave_tarifa(fila)] = fila
+    return list(unicas.values()), errores, len(filas) - len(unicas)
+
+
+def clave_tarifa(tarifa) -> Tuple:
+    """Clave natural de una fila de ProviderRate: (proveedor, origen, destino, equipo, unidad, vigencia)."""
+    if isinstance(tarifa, dict):
+        valores = [tarifa.get(campo) for campo in RATE_KEY]
+    else:
+        valores = [getattr(tarifa, campo) for campo in RATE_KEY]
+    provider_id, origen, destino, container_type, unit, valid_to = valores
+    return (
+        provider_id,
+        str(origen or '').strip().upper(),
+        str(destino or '').strip().upper(),
+        str(container_type or '').strip().upper(),
+        str(unit or '').strip().upper(),
+        valid_to,
+    )
+
+
+# --- UPSERT ---
+
+def _valores_distintos(field_obj, actual, nuevo) -> bool:
+    try:
+        nuevo = field_obj.to_python(nuevo)
+    except Exception:
+        pass
+    if actual in (None, '') and nuevo in (None, ''):
+        return False
+    return actual != nuevo
+
+
+def _calcular_diferencias(model, filas: List[Dict], existentes: Dict, resultado: ResultadoImportacion):
+    campos_modelo = {f.attname: f for f in model._meta.concrete_fields if not f.primary_key}
+    crear, actualizar = [], []
+    campos_actualizados = set()
+
+    for fila in filas:
+        legible = _tarifa_legible(fila)
+        fila = {k: v for k, v in fila.items() if k in campos_modelo}
+        # Un proveedor nuevo (sin PK en dry-run) no tiene tarifas vivas
+        obj = existentes.get(clave_tarifa(fila)) if fila.get('provider_id') else None
+
+        if obj is None:
+            crear.append(model(**fila))
+            resultado.created += 1
+            if len(resultado.changes) < 200:
+                resultado.changes.append({'action': 'create', 'key': legible})
+            continue
+
+        cambios = {}
+        for campo, valor in fila.items():
+            if campo in CREATE_ONLY_FIELDS:
+                continue
+            actual = getattr(obj, campo)
+            if _valores_distintos(campos_modelo[campo], actual, valor):
+                cambios[campo] = [_serializable(actual), _serializable(valor)]
+                setattr(obj, campo, valor)
+
+        if cambios:
+            actualizar.append(obj)
+            campos_actualizados.update(cambios.keys())
+            resultado.updated += 1
+            if len(resultado.changes) < 200:
+                resultado.changes.append({'action': 'update', 'key': legible, 'fields': cambios})
+        else:
+            resultado.unchanged += 1
+
+    return crear, actualizar, sorted(campos_actualizados)
+
+
+def _clave_legible(registro: Dict) -> str:
+    carrier, pol, pod, validity = clave_natural(registro)
+    return f"{carrier} | {pol} → {pod} | {validity or 'sin vigencia'}"
+
+
+def _tarifa_legible(fila: Dict) -> str:
+    equipo = fila.get('container_type') or fila.get('unit')
+    return f"{fila.get('_proveedor')} | {fila['origin_port']} → {fila['destination']} | {equipo} | {fila['valid_to']}"
+
+
+def _serializable(valor):
+    if isinstance(valor, (Decimal, date)):
+        return str(valor)
+    return valor
+
+
+def importar_tarifas(
+    archivo,
+    formato: str,
+    mode: str = 'upsert',
+    dry_run: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    created_by=None,
+    nombre_archivo: str = ''
+) -> ResultadoImportacion:
+    """
+    Importa un tarifario con el formato indicado.
+
+    Args:
+        archivo: Ruta o archivo subido (CSV ';' o Excel)
+        formato: Nombre del formato registrado ('fcl', 'lcl', 'air', 'air_simple')
+        mode: 'upsert' o 'replace'
+        dry_run: Si True, solo calcula el reporte de diferencias (no crea proveedores ni tarifas)
+        chunk_size: Tamaño de bloque para bulk_create / bulk_update
+        created_by: Usuario que realiza la carga
+        nombre_archivo: Nombre del archivo (para archivos subidos)
+
+    Returns:
+        ResultadoImportacion
+    """
+    from django.db import transaction
+    from .models import ProviderRate
+    from .quote_cache import suspender_invalidacion
+    from .rate_snapshots import publicar_tarifas, registrar_snapshot_activo, tarifas_vivas
+
+    if formato not in FORMATS:
+        raise RateImportError(f"Formato no soportado: {formato}. Use: {', '.join(FORMATS)}")
+    if mode not in ('upsert', 'replace'):
+        raise RateImportError(f"Modo no soportado: {mode}")
+
+    spec = FORMATS[formato]
+    nombre_archivo = nombre_archivo or getattr(archivo, 'name', '') or str(archivo)
+
+    df = leer_archivo(archivo, nombre_archivo)
+    registros, errores, duplicados = transformar_dataframe(df, spec)
+
+    resultado = ResultadoImportacion(
+        format=spec.name,
+        scope=spec.scope,
+        mode=mode,
+        dry_run=dry_run,
+        total_rows=len(df),
+        valid_rows=len(registros),
+        duplicates=duplicados,
+        errors=errores,
+    )
+
+    with transaction.atomic():
+        proveedores = _proveedores_por_nombre(spec, registros, crear=not dry_run)
+        filas, errores_filas, duplicados_filas = construir_tarifas(registros, spec, proveedores)
+        resultado.errors.extend(errores_filas)
+        resultado.duplicates += duplicados_filas
+
+        existentes = {clave_tarifa(rate): rate for rate in tarifas_vivas(spec.scope)}
+        crear, actualizar, campos = _calcular_diferencias(ProviderRate, filas, existentes, resultado)
+
+        if mode == 'replace':
+            claves_archivo = {clave_tarifa(f) for f in filas}
+            resultado.deleted = sum(1 for k in existentes if k not in claves_archivo)
+
+        if dry_run:
+            return resultado
+
+        if mode == 'replace':
+            snapshot = publicar_tarifas(
+                spec.scope, [{k: v for k, v in f.items() if k != '_proveedor'} for f in filas],
+                label=spec.label, source_file=nombre_archivo, created_by=created_by, replace=True
+            )
+        else:
+            with suspender_invalidacion():
+                ProviderRate.objects.bulk_create(crear, batch_size=chunk_size)
+                if actualizar and campos:
+                    ProviderRate.objects.bulk_update(actualizar, campos, batch_size=chunk_size)
+            snapshot = registrar_snapshot_activo(
+                spec.scope, label=spec.label,
+                source_file=nombre_archivo, created_by=created_by
+            )
+
+    resultado.snapshot_id = snapshot.pk
+    logger.info(
+        f"Importación {spec.name} ({mode}): {resultado.created} creadas, "
+        f"{resultado.updated} actualizadas, {resultado.deleted} eliminadas, "
+        f"{len(resultado.errors)} errores - snapshot {snapshot.pk}"
+    )
+    return resultado
+
+
+def imprimir_resumen(resultado: ResultadoImportacion) -> None:
+    """Resumen en consola para los scripts de importación."""
+    print(f"\n{'='*50}")
+    accion = 'Simulación' if resultado.dry_run else 'Proceso completado'
+    print(f"{accion}: {resultado.scope} ({resultado.format}, modo {resultado.mode})")
+    print(f"Filas leídas: {resultado.total_rows} | Válidas: {resultado.valid_rows} | Duplicadas: {resultado.duplicates}")
+    print(f"Creadas: {resultado.created} | Actualizadas: {resultado.updated} | "
+          f"Sin cambios: {resultado.unchanged} | Eliminadas: {resultado.deleted}")
+    print(f"Errores: {len(resultado.errors)}")
+    if resultado.snapshot_id:
+        print(f"Snapshot activo: {resultado.snapshot_id}")
+    print(f"{'='*50}")
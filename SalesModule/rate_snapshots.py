@@ -0,0 +1,353 @@
+"""
+Rate Snapshots for ImportaYa.ia
+Versionado de tarifarios de flete con activación atómica y rollback.
+
+Flujo:
+1. crear_snapshot(): guarda las filas del tarifario en un RateSnapshot 'staged'
+   (no toca las tarifas vivas, el motor de cotización sigue usando las actuales)
+2. activar_snapshot(): en una sola transacción reemplaza las filas vivas de
+   ProviderRate del alcance (FCL / LCL / AEREO) y archiva el snapshot anterior
+3. rollback_snapshot(): reactiva el snapshot anterior al activo
+
+Las tarifas vivas son ProviderRate (FreightRateFCL se eliminó en la migración
+0051). ProviderRate no tiene tipo de transporte propio: el alcance de una
+tarifa es el transport_type de su LogisticsProvider, y las filas de un
+snapshot solo pueden referir proveedores de su alcance.
+
+Los cachés (quote_cache) usan el ID del snapshot activo en su clave, así que
+no necesitan consultar las tablas para detectar cambios.
+"""
+import logging
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SCOPE_FCL = 'MARITIMO FCL'
+SCOPE_LCL = 'MARITIMO LCL'
+SCOPE_AEREO = 'AEREO'
+
+SCOPES = [SCOPE_FCL, SCOPE_LCL, SCOPE_AEREO]
+
+# Snapshots archivados que se conservan por alcance para rollback
+SNAPSHOT_RETENTION = 5
+
+ACTIVE_SNAPSHOTS_CACHE_KEY = 'rate_snapshots:active'
+
+BULK_BATCH_SIZE = 500
+
+# LogisticsProvider.transport_type de cada alcance
+PROVIDER_TRANSPORT_TYPES = {
+    SCOPE_FCL: 'FCL',
+    SCOPE_LCL: 'LCL',
+    SCOPE_AEREO: 'AEREO',
+}
+
+
+class RateSnapshotError(Exception):
+    """Error en la gestión de snapshots de tarifas"""
+    pass
+
+
+def normalizar_scope(transport_type: str) -> Optional[str]:
+    """
+    Mapea cualquier variante de tipo de transporte al alcance del snapshot.
+    Ej: 'FCL', 'fcl', 'MARITIMO FCL', 'maritimo_fcl' -> 'MARITIMO FCL'
+    """
+    if not transport_type:
+        return None
+    valor = str(transport_type).upper().replace('_', ' ')
+    if 'LCL' in valor:
+        return SCOPE_LCL
+    if 'FCL' in valor or 'MARITIMO' in valor:
+        return SCOPE_FCL
+    if 'AERE' in valor or 'AIR' in valor:
+        return SCOPE_AEREO
+    return None
+
+
+def tarifas_vivas(scope: str):
+    """QuerySet de las tarifas vivas (ProviderRate) de un alcance."""
+    from .models import ProviderRate
+    return ProviderRate.objects.filter(provider__transport_type=PROVIDER_TRANSPORT_TYPES[scope])
+
+
+def _validar_proveedores(scope: str, filas: List[Dict]) -> None:
+    """Todas las filas deben referir proveedores existentes del alcance."""
+    from .models import LogisticsProvider
+
+    ids = {fila.get('provider_id') for fila in filas}
+    validos = set(
+        LogisticsProvider.objects.filter(pk__in=[i for i in ids if i is not None],
+                                         transport_type=PROVIDER_TRANSPORT_TYPES[scope])
+        .values_list('pk', flat=True)
+    )
+    invalidos = ids - validos
+    if invalidos:
+        raise RateSnapshotError(
+            f"Proveedores inexistentes o de otro tipo de transporte para {scope}: "
+            f"{', '.join(str(i) for i in sorted(invalidos, key=str))}"
+        )
+
+
+def _serializar_tarifa(rate) -> Dict:
+    """Convierte una fila de ProviderRate en dict (sin PK) para el snapshot."""
+    return {
+        field.attname: getattr(rate, field.attname)
+        for field in rate._meta.concrete_fields
+        if not field.primary_key
+    }
+
+
+def _construir_tarifas(model, rows: Iterable[Dict]) -> List:
+    """Reconstruye instancias del modelo a partir de las filas JSON del snapshot."""
+    fields = {f.attname: f for f in model._meta.concrete_fields if not f.primary_key}
+    instancias = []
+    for row in rows:
+        valores = {
+            attname: fields[attname].to_python(valor)
+            for attname, valor in row.items()
+            if attname in fields
+        }
+        instancias.append(model(**valores))
+    return instancias
+
+
+def crear_snapshot(
+    scope: str,
+    rows: List[Dict],
+    label: str = '',
+    source_file: str = '',
+    created_by=None,
+    replace: bool = True
+):
+    """
+    Crea un snapshot en staging con las filas del tarifario.
+
+    Args:
+        scope: Tipo de transporte (se normaliza con normalizar_scope)
+        rows: Lista de dicts con los campos de ProviderRate (provider_id incluido)
+        label: Descripción libre
+        source_file: Archivo de origen
+        created_by: Usuario que realiza la carga
+        replace: Si False, las filas nuevas se agregan a las tarifas vivas actuales
+
+    Returns:
+        RateSnapshot en estado 'staged'
+    """
+    from .models import RateSnapshot
+
+    scope_normalizado = normalizar_scope(scope)
+    if not scope_normalizado:
+        raise RateSnapshotError(f"Tipo de transporte no soportado para snapshot: {scope}")
+
+    filas = [dict(fila) for fila in rows]
+    _validar_proveedores(scope_normalizado, filas)
+    if not replace:
+        filas = [_serializar_tarifa(r) for r in tarifas_vivas(scope_normalizado)] + filas
+
+    snapshot = RateSnapshot.objects.create(
+        scope=scope_normalizado,
+        status='staged',
+        label=label,
+        source_file=source_file,
+        rows=filas,
+        row_count=len(filas),
+        created_by=created_by,
+    )
+    logger.info(f"Snapshot {snapshot.pk} ({scope_normalizado}) creado con {len(filas)} tarifas")
+    return snapshot
+
+
+def activar_snapshot(snapshot):
+    """
+    Activa un snapshot reemplazando las tarifas vivas en una sola transacción.
+    Las cotizaciones concurrentes ven el tarifario anterior completo o el nuevo
+    completo, nunca una tabla vacía o parcial.
+    """
+    from django.db import transaction
+    from django.utils import timezone
+    from .models import RateSnapshot, ProviderRate
+    from .quote_cache import suspender_invalidacion
+
+    with transaction.atomic():
+        snapshot = RateSnapshot.objects.select_for_update().get(pk=snapshot.pk)
+        if snapshot.status == 'active':
+            return snapshot
+
+        anterior = (
+            RateSnapshot.objects.select_for_update()
+            .filter(scope=snapshot.scope, status='active')
+            .exclude(pk=snapshot.pk)
+            .first()
+        )
+
+        # Un proveedor del snapshot pudo eliminarse después de crearlo (p. ej. al revertir)
+        _validar_proveedores(snapshot.scope, snapshot.rows)
+
+        with suspender_invalidacion():
+            tarifas_vivas(snapshot.scope).delete()
+            ProviderRate.objects.bulk_create(
+                _construir_tarifas(ProviderRate, snapshot.rows),
+                batch_size=BULK_BATCH_SIZE
+            )
+
+        if anterior:
+            anterior.status = 'archived'
+            anterior.save(update_fields=['status'])
+            if snapshot.status == 'staged':
+                snapshot.previous = anterior
+
+        snapshot.status = 'active'
+        snapshot.activated_at = timezone.now()
+        snapshot.save(update_fields=['status', 'activated_at', 'previous'])
+
+        _podar_snapshots(snapshot.scope)
+        transaction.on_commit(_publicar_snapshots_activos)
+
+    logger.info(f"Snapshot {snapshot.pk} activado para {snapshot.scope} ({snapshot.row_count} tarifas)")
+    return snapshot
+
+
+def publicar_tarifas(
+    scope: str,
+    rows: List[Dict],
+    label: str = '',
+    source_file: str = '',
+    created_by=None,
+    replace: bool = True
+):
+    """Atajo para los importadores: crea el snapshot y lo activa."""
+    snapshot = crear_snapshot(scope, rows, label=label, source_file=source_file,
+                              created_by=created_by, replace=replace)
+    return activar_snapshot(snapshot)
+
+
+def registrar_snapshot_activo(
+    scope: str,
+    label: str = '',
+    source_file: str = '',
+    created_by=None
+):
+    """
+    Registra como snapshot activo el estado actual de las tarifas vivas.
+    Se usa después de cargas incrementales (upsert) para que también
+    tengan un punto de rollback. Debe llamarse dentro de la misma
+    transacción que modificó las tarifas.
+    """
+    from django.db import transaction
+    from django.utils import timezone
+    from .models import RateSnapshot
+
+    scope_normalizado = normalizar_scope(scope)
+
+    with transaction.atomic():
+        anterior = RateSnapshot.objects.select_for_update().filter(
+            scope=scope_normalizado, status='active'
+        ).first()
+
+        filas = [_serializar_tarifa(r) for r in tarifas_vivas(scope_normalizado)]
+        snapshot = RateSnapshot.objects.create(
+            scope=scope_normalizado,
+            status='active',
+            label=label,
+            source_file=source_file,
+            rows=filas,
+            row_count=len(filas),
+            previous=anterior,
+            created_by=created_by,
+            activated_at=timezone.now(),
+        )
+
+        if anterior:
+            anterior.status = 'archived'
+            anterior.save(update_fields=['status'])
+
+        _podar_snapshots(scope_normalizado)
+        transaction.on_commit(_publicar_snapshots_activos)
+
+    return snapshot
+
+
+def rollback_snapshot(scope: str):
+    """
+    Reactiva el snapshot anterior al activo para el alcance indicado.
+
+    Returns:
+        RateSnapshot reactivado
+    """
+    from django.db import transaction
+    from .models import RateSnapshot
+
+    scope_normalizado = normalizar_scope(scope)
+
+    with transaction.atomic():
+        actual = RateSnapshot.objects.select_for_update().filter(
+            scope=scope_normalizado, status='active'
+        ).first()
+        if not actual or not actual.previous_id:
+            raise RateSnapshotError(f"No hay snapshot anterior para {scope_normalizado}")
+
+        anterior = actual.previous
+        restaurado = activar_snapshot(anterior)
+
+        actual.status = 'rolled_back'
+        actual.save(update_fields=['status'])
+
+    logger.warning(f"Rollback de tarifas {scope_normalizado}: snapshot {actual.pk} -> {restaurado.pk}")
+    return restaurado
+
+
+def _podar_snapshots(scope: str):
+    """
+    Elimina snapshots archivados antiguos (se conservan SNAPSHOT_RETENTION).
+    Los que alguna QuoteSubmission registra como tarifario de su cotización
+    no se eliminan: son la única copia de las tarifas con que se cotizó.
+    """
+    from .models import RateSnapshot
+
+    antiguos = list(
+        RateSnapshot.objects.filter(scope=scope, status__in=['archived', 'rolled_back'])
+        .order_by('-activated_at', '-created_at')
+        .values_list('pk', flat=True)[SNAPSHOT_RETENTION:]
+    )
+    if antiguos:
+        RateSnapshot.objects.filter(pk__in=antiguos, quote_submissions__isnull=True).delete()
+
+
+def _cargar_snapshots_activos() -> Dict[str, int]:
+    from .models import RateSnapshot
+    return dict(
+        RateSnapshot.objects.filter(status='active').values_list('scope', 'pk')
+    )
+
+
+def _publicar_snapshots_activos():
+    """Publica los IDs activos en el caché compartido y vacía el caché de cotizaciones."""
+    from django.core.cache import cache
+    from .quote_cache import limpiar_cache_cotizaciones
+
+    cache.set(ACTIVE_SNAPSHOTS_CACHE_KEY, _cargar_snapshots_activos(), timeout=None)
+    limpiar_cache_cotizaciones()
+
+
+def obtener_snapshots_activos() -> Dict[str, int]:
+    """
+    IDs de los snapshots activos por alcance, leídos del caché de Django.
+    Solo consulta la base de datos si el caché está vacío.
+    """
+    from django.core.cache import cache
+
+    activos = cache.get(ACTIVE_SNAPSHOTS_CACHE_KEY)
+    if activos is None:
+        try:
+            activos = _cargar_snapshots_activos()
+        except Exception as e:
+            logger.debug(f"No se pudieron cargar snapshots activos: {e}")
+            return {}
+        cache.set(ACTIVE_SNAPSHOTS_CACHE_KEY, activos, timeout=None)
+    return activos
+
+
+def obtener_snapshot_activo_id(transport_type: str) -> Optional[int]:
+    """ID del snapshot activo para un tipo de transporte (o None)."""
+    return obtener_snapshots_activos().get(normalizar_scope(transport_type))
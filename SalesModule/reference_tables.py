@@ -0,0 +1,275 @@
+"""
+Reference Tables for ImportaYa.ia
+Tablas de referencia pequeñas compiladas en memoria.
+
+La tarifa de seguro (InsuranceRate), las tarifas de seguridad
+(InlandSecurityTariff) y las de transporte interno (InlandFCLTariff,
+InlandTransportQuoteRate) tienen pocas filas y cambian muy poco, pero se
+consultaban en cada cotización:
+- seguridad: get_rates_for_city + un .filter().first() por servicio
+- transporte interno: get_rate_for_city / una consulta por tabla
+
+Se cargan una vez por proceso y se compilan en estructuras de búsqueda:
+- tarifas de seguro activas por id (rige la primera: % del valor con prima
+  mínima). Los tramos de InsuranceBracket se eliminaron en la migración 0051.
+- ciudad -> {servicio: tarifa} para seguridad
+- ciudad -> [tarifas] para transporte interno
+
+La búsqueda por ciudad conserva la semántica icontains de los métodos del
+modelo (subcadena sin distinguir mayúsculas, primera fila por id) y
+memoriza cada ciudad consultada. Las ciudades sin filas propias se buscan
+por su nombre canónico y su zona tarifaria en el nomenclátor (gazetteer.py).
+
+Los cambios en cualquiera de las tablas incrementan su versión compartida
+(signals.py, shared_versions.py) y cada worker recompila las tablas en su
+siguiente consulta tras ver la versión nueva (a más tardar en
+SHARED_VERSION_CHECK_S), igual que el índice de autocompletado. Un modelo
+de REFERENCE_MODELS que no existe es un error de configuración, no una
+tabla vacía.
+"""
+import logging
+import threading
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+from .money import Money
+
+logger = logging.getLogger(__name__)
+
+TABLES_VERSION_KEY = 'reference_tables:version'
+
+REFERENCE_MODELS = [
+    'InsuranceRate',
+    'InlandSecurityTariff',
+    'InlandFCLTariff',
+    'InlandTransportQuoteRate',
+]
+
+
+def _clave_ciudad(ciudad: Optional[str]) -> str:
+    return (ciudad or '').strip().lower()
+
+
+@dataclass(frozen=True)
+class TarifaSeguro:
+    """Fila de InsuranceRate."""
+    id: int
+    name: str
+    rate_percentage: Decimal
+    min_premium_usd: Decimal
+
+    def prima(self, valor) -> Money:
+        """rate_percentage % del valor de la mercancía, al menos min_premium_usd."""
+        return max(Money.of(valor).porcentaje(self.rate_percentage), Money.of(self.min_premium_usd))
+
+
+@dataclass(frozen=True)
+class TarifaSeguridad:
+    """Fila de InlandSecurityTariff."""
+    id: int
+    destination_city: str
+    service_type: str
+    base_rate_usd: Decimal
+    iva_rate: Decimal
+    iva_applies: bool
+    route_name: str
+
+
+@dataclass(frozen=True)
+class TarifaInterna:
+    """Fila de InlandFCLTariff (tipo = contenedor) o InlandTransportQuoteRate (tipo = vehículo)."""
+    id: int
+    destination_city: str
+    tipo: str
+    tarifa: Money
+
+
+class TablaSeguros:
+    """Tarifas de seguro activas en orden de id; rige la primera."""
+
+    def __init__(self, tarifas: List[TarifaSeguro]):
+        self.tarifas = sorted(tarifas, key=lambda t: t.id)
+
+    def __len__(self) -> int:
+        return len(self.tarifas)
+
+    def vigente(self) -> Optional[TarifaSeguro]:
+        return self.tarifas[0] if self.tarifas else None
+
+
+class _TablaPorCiudad:
+    """Filas por ciudad con búsqueda icontains memorizada."""
+
+    def __init__(self, filas: List):
+        self.filas = sorted(filas, key=lambda f: f.id)
+        self._por_ciudad: Dict[str, List] = {}
+        for fila in self.filas:
+            self._por_ciudad.setdefault(_clave_ciudad(fila.destination_city), []).append(fila)
+        self._memo: Dict[str, List] = {}
+
+    def __len__(self) -> int:
+        return len(self.filas)
+
+    def _buscar_icontains(self, clave: str) -> List:
+        # Recorrido de las ciudades distintas (pocas); el resultado se memoriza
+        return sorted(
+            (fila for destino, grupo in self._por_ciudad.items() if clave in destino for fila in grupo),
+            key=lambda f: f.id,
+        )
+
+    def filas_para(self, ciudad: str) -> List:
+        """
+        Filas cuya ciudad contiene `ciudad` (icontains), en orden de id. Si no
+        hay ninguna, se prueba con el nombre y la zona de la ciudad en el
+        nomenclátor local.
+        """
+        clave = _clave_ciudad(ciudad)
+        filas = self._memo.get(clave)
+        if filas is None:
+            filas = self._buscar_icontains(clave)
+            if not filas and clave:
+                # "GYE", "Guayaquil" -> "PERIMETRO URBANO": nombre canónico y zona del nomenclátor
+                from .gazetteer import obtener_gazetteer
+                for nombre in obtener_gazetteer().zonas_tarifarias(clave):
+                    filas = self._buscar_icontains(_clave_ciudad(nombre))
+                    if filas:
+                        break
+            self._memo[clave] = filas
+        return filas
+
+
+class TablaSeguridad(_TablaPorCiudad):
+
+    def buscar(self, ciudad: str) -> Dict[str, TarifaSeguridad]:
+        """servicio -> primera tarifa activa para la ciudad."""
+        servicios: Dict[str, TarifaSeguridad] = {}
+        for fila in self.filas_para(ciudad):
+            servicios.setdefault(fila.service_type, fila)
+        return servicios
+
+
+class TablaTransporteInterno(_TablaPorCiudad):
+
+    def buscar(self, ciudad: str, tipo: Optional[str] = None) -> List[TarifaInterna]:
+        """Tarifas para la ciudad; opcionalmente solo las de un contenedor/vehículo."""
+        filas = self.filas_para(ciudad)
+        if tipo is None:
+            return list(filas)
+        tipo = tipo.upper().replace(' ', '')
+        return [fila for fila in filas if fila.tipo.upper().replace(' ', '') == tipo]
+
+
+class TablasReferencia:
+    """Tablas compiladas del proceso con su versión."""
+
+    def __init__(self, version: int):
+        self.version = version
+        self.seguros = TablaSeguros(_cargar_tarifas_seguro())
+        self.seguridad = TablaSeguridad(_cargar_tarifas_seguridad())
+        self.transporte_fcl = TablaTransporteInterno(_cargar_tarifas_fcl())
+        self.transporte_carga_suelta = TablaTransporteInterno(_cargar_tarifas_carga_suelta())
+
+    def resumen(self) -> Dict[str, int]:
+        return {
+            'version': self.version,
+            'tarifas_seguro': len(self.seguros),
+            'tarifas_seguridad': len(self.seguridad),
+            'tarifas_fcl': len(self.transporte_fcl),
+            'tarifas_carga_suelta': len(self.transporte_carga_suelta),
+        }
+
+
+def _cargar_tarifas_seguro() -> List[TarifaSeguro]:
+    from .models import InsuranceRate
+
+    return [
+        TarifaSeguro(
+            id=fila['id'],
+            name=fila['name'],
+            rate_percentage=fila['rate_percentage'],
+            min_premium_usd=fila['min_premium_usd'],
+        )
+        for fila in InsuranceRate.objects.filter(is_active=True).values(
+            'id', 'name', 'rate_percentage', 'min_premium_usd'
+        )
+    ]
+
+
+def _cargar_tarifas_seguridad() -> List[TarifaSeguridad]:
+    from .models import InlandSecurityTariff
+
+    return [
+        TarifaSeguridad(
+            id=tarifa.pk,
+            destination_city=tarifa.destination_city,
+            service_type=tarifa.service_type,
+            base_rate_usd=tarifa.base_rate_usd,
+            iva_rate=getattr(tarifa, 'iva_rate', Decimal('15.00')),
+            iva_applies=getattr(tarifa, 'iva_applies', True),
+            route_name=getattr(tarifa, 'route_name', '') or tarifa.destination_city,
+        )
+        for tarifa in InlandSecurityTariff.objects.filter(is_active=True)
+    ]
+
+
+def _cargar_tarifas_fcl() -> List[TarifaInterna]:
+    from .models import InlandFCLTariff
+
+    return [
+        TarifaInterna(
+            id=fila['id'],
+            destination_city=fila['destination_city'],
+            tipo=fila['container_type'] or '',
+            tarifa=Money.of(fila['rate_usd']),
+        )
+        for fila in InlandFCLTariff.objects.filter(is_active=True).values(
+            'id', 'destination_city', 'container_type', 'rate_usd'
+        )
+    ]
+
+
+def _cargar_tarifas_carga_suelta() -> List[TarifaInterna]:
+    from .models import InlandTransportQuoteRate
+
+    return [
+        TarifaInterna(
+            id=fila['id'],
+            destination_city=fila['destination_city'],
+            tipo=fila['vehicle_type'] or '',
+            tarifa=Money.of(fila['rate_usd']),
+        )
+        for fila in InlandTransportQuoteRate.objects.filter(is_active=True).values(
+            'id', 'destination_city', 'vehicle_type', 'rate_usd'
+        )
+    ]
+
+
+_tablas: Optional[TablasReferencia] = None
+_tablas_lock = threading.Lock()
+
+
+def obtener_version_tablas() -> int:
+    from .shared_versions import leer_version
+    return leer_version(TABLES_VERSION_KEY)
+
+
+def invalidar_tablas() -> None:
+    """Marca las tablas como desactualizadas en todos los workers."""
+    from .shared_versions import incrementar_version
+    incrementar_version(TABLES_VERSION_KEY)
+
+
+def obtener_tablas_referencia() -> TablasReferencia:
+    """
+    Tablas del proceso; se recompilan si otro proceso las invalidó.
+    Solo la recompilación consulta la base de datos.
+    """
+    global _tablas
+    version = obtener_version_tablas()
+    if _tablas is None or _tablas.version != version:
+        with _tablas_lock:
+            if _tablas is None or _tablas.version != version:
+                _tablas = TablasReferencia(version)
+                logger.info(f"Tablas de referencia compiladas: {_tablas.resumen()}")
+    return _tablas
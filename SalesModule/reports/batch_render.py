@@ -0,0 +1,301 @@
+"""
+Batch Quote PDF Renderer for ImportaYa.ia
+Renders many quote PDFs at once and streams them back as a ZIP.
+
+ReportLab rendering is CPU-bound: a bulk download (every scenario of a
+campaign) rendered one PDF after another in the request thread. Here:
+
+- The parent process assembles every QuotePdfData first (quote_data.py);
+  view models are plain data, so the workers never touch the ORM.
+- Rendering runs in a process pool sized to the cores (PDF_BATCH_WORKERS).
+  Workers are spawned, not forked, so they inherit no database connection
+  or held lock. Each worker sets up Django once, warms the render_assets
+  cache with a sample of every layout and keeps it for later batches.
+- PDFs go into the ZIP as they complete and the archive leaves in chunks,
+  never held whole in memory. Quotes that fail are listed in ERRORES.txt.
+- Progress (done/failed/total) goes to an optional callback and to the
+  shared cache (CACHES in settings: the database cache table or Redis)
+  under pdf_batch:<job_id>, so the status endpoint answers from whichever
+  gunicorn worker receives the poll, not only the one streaming the ZIP.
+
+With a single worker, a single PDF or a pool that cannot start, the batch
+is rendered in-process with the same output.
+"""
+import logging
+import os
+import re
+import threading
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from SalesModule.reports.quote_data import QuotePdfData
+
+logger = logging.getLogger(__name__)
+
+# Defaults; override in settings
+PDF_BATCH_MAX_ITEMS = 200
+PDF_BATCH_STATUS_TTL_S = 3600
+
+STATUS_KEY = 'pdf_batch:{job_id}'
+FAILURES_NAME = 'ERRORES.txt'
+JOB_ID_RE = re.compile(r'^[0-9a-f]{8,32}$')
+
+STATUS_RUNNING = 'running'
+STATUS_COMPLETED = 'completed'
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _config(name: str, default):
+    from django.conf import settings
+    return getattr(settings, name, default)
+
+
+def batch_workers() -> int:
+    """Render processes: PDF_BATCH_WORKERS, or one per core"""
+    return max(1, int(_config('PDF_BATCH_WORKERS', None) or os.cpu_count() or 1))
+
+
+# --- Worker processes ---
+
+def warm_render_assets() -> None:
+    """Render one sample per layout so styles and fixed blocks are cached before the first real PDF"""
+    from SalesModule.reports.quote_pdf_generator import render_quote_pdf
+
+    for transport_type in ('FCL', 'LCL', 'AEREO'):
+        render_quote_pdf(QuotePdfData(
+            quote_number='IYA-00000', company_name='', contact_name='', city='',
+            transport_type=transport_type, container_type='1x40HC', incoterm='FOB',
+            destination='Guayaquil', origin='SHANGHAI', weight_kg=100.0, volume_cbm=1.0, quantity=1,
+        ))
+
+
+def _init_worker(ports: List[Dict]) -> None:
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+    from SalesModule.resolvers import instalar_port_resolver
+
+    # The tarifario tables resolve port names; give the worker the parent's ports instead of a DB connection
+    instalar_port_resolver(ports)
+    try:
+        warm_render_assets()
+    except Exception as e:
+        logger.warning(f"PDF batch worker warm-up failed: {e}")
+
+
+def _render(data: QuotePdfData) -> bytes:
+    from SalesModule.reports.quote_pdf_generator import render_quote_pdf
+    return render_quote_pdf(data).getvalue()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Process pool shared by every batch of this process, started on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                import multiprocessing
+                from SalesModule.resolvers import _cargar_puertos
+
+                _pool = ProcessPoolExecutor(
+                    max_workers=batch_workers(),
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=(_cargar_puertos(),),
+                )
+    return _pool
+
+
+def shutdown_pool(wait: bool = True) -> None:
+    """Stop the worker processes; the next batch starts a new pool"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=wait, cancel_futures=True)
+
+
+# --- Batches ---
+
+@dataclass(frozen=True)
+class BatchItem:
+    """One PDF of a batch: its file name in the ZIP and its view model (None if it could not be assembled)"""
+    name: str
+    data: Optional[QuotePdfData]
+    error: str = ''
+
+
+def prepare_batch(quotes: Iterable[Tuple[object, Optional[Dict]]]) -> List[BatchItem]:
+    """
+    Assemble the view model of every (quote_submission, scenario_data) pair.
+    Runs in the caller's process, with database access; a quote that fails
+    is kept as a failed item instead of aborting the batch.
+    """
+    from SalesModule.reports.quote_data import assemble_quote_pdf_data
+
+    items = []
+    used = set()
+    for quote_submission, scenario_data in quotes:
+        base = quote_submission.submission_number or f"IYA-{quote_submission.id:05d}"
+        name = f"{base}.pdf"
+        suffix = 2
+        while name in used:
+            name = f"{base}-{suffix}.pdf"
+            suffix += 1
+        used.add(name)
+        try:
+            items.append(BatchItem(name, assemble_quote_pdf_data(quote_submission, scenario_data)))
+        except Exception as e:
+            logger.error(f"Could not assemble quote PDF {base}: {e}")
+            items.append(BatchItem(name, None, str(e)))
+    return items
+
+
+class _ZipSink:
+    """Write-only target for ZipFile. Without tell/seek, zipfile writes each entry's sizes after its data."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def get_batch_status(job_id: str) -> Optional[Dict]:
+    from django.core.cache import cache
+    return cache.get(STATUS_KEY.format(job_id=job_id))
+
+
+class PdfBatchJob:
+    """
+    Renders prepared BatchItems. results() yields (item, pdf, error) as each
+    PDF completes; stream_zip() packs them into a ZIP streamed in chunks.
+    """
+
+    def __init__(self, items: List[BatchItem], job_id: Optional[str] = None, owner_id=None,
+                 progress: Optional[Callable[[int, int, str], None]] = None):
+        self.items = list(items)
+        self.job_id = job_id or uuid.uuid4().hex
+        self.owner_id = owner_id
+        self.progress = progress
+        self.done = 0
+        self.failed = 0
+        self._publish(STATUS_RUNNING if self.items else STATUS_COMPLETED)
+
+    @property
+    def total(self) -> int:
+        return len(self.items)
+
+    def status(self, state: str = STATUS_RUNNING) -> Dict:
+        return {
+            'job_id': self.job_id,
+            'owner_id': self.owner_id,
+            'status': state,
+            'total': self.total,
+            'done': self.done,
+            'failed': self.failed,
+        }
+
+    def _publish(self, state: str) -> None:
+        from django.core.cache import cache
+        cache.set(STATUS_KEY.format(job_id=self.job_id), self.status(state),
+                  timeout=_config('PDF_BATCH_STATUS_TTL_S', PDF_BATCH_STATUS_TTL_S))
+
+    def _advance(self, item: BatchItem, error: str) -> None:
+        self.done += 1
+        if error:
+            self.failed += 1
+        self._publish(STATUS_COMPLETED if self.done == self.total else STATUS_RUNNING)
+        if self.progress:
+            self.progress(self.done, self.total, item.name)
+
+    def _render_in_pool(self, pending: List[BatchItem]) -> Iterator[Tuple[BatchItem, Optional[bytes], str]]:
+        futures = {}
+        try:
+            pool = _get_pool()
+            for item in pending:
+                futures[pool.submit(_render, item.data)] = item
+        except (BrokenProcessPool, OSError, RuntimeError) as e:
+            logger.warning(f"PDF batch pool unavailable, rendering in-process: {e}")
+            for future in futures:
+                future.cancel()
+            shutdown_pool(wait=False)
+            yield from self._render_here(pending)
+            return
+
+        try:
+            for future in as_completed(futures):
+                item = futures[future]
+                try:
+                    yield item, future.result(), ''
+                except BrokenProcessPool as e:
+                    shutdown_pool(wait=False)
+                    yield item, None, f"render process died: {e}"
+                except Exception as e:
+                    logger.error(f"Quote PDF {item.name} failed to render: {e}")
+                    yield item, None, str(e)
+        finally:
+            # Client gone or consumer stopped: drop what has not started yet
+            for future in futures:
+                future.cancel()
+
+    def _render_here(self, pending: List[BatchItem]) -> Iterator[Tuple[BatchItem, Optional[bytes], str]]:
+        for item in pending:
+            try:
+                yield item, _render(item.data), ''
+            except Exception as e:
+                logger.error(f"Quote PDF {item.name} failed to render: {e}")
+                yield item, None, str(e)
+
+    def results(self) -> Iterator[Tuple[BatchItem, Optional[bytes], str]]:
+        pending = []
+        for item in self.items:
+            if item.data is None:
+                self._advance(item, item.error)
+                yield item, None, item.error
+            else:
+                pending.append(item)
+
+        if batch_workers() > 1 and len(pending) > 1:
+            rendered = self._render_in_pool(pending)
+        else:
+            rendered = self._render_here(pending)
+        for item, pdf, error in rendered:
+            self._advance(item, error)
+            yield item, pdf, error
+
+    def stream_zip(self) -> Iterator[bytes]:
+        sink = _ZipSink()
+        failures = []
+        with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for item, pdf, error in self.results():
+                if pdf is None:
+                    failures.append(f"{item.name}: {error}")
+                else:
+                    archive.writestr(item.name, pdf)
+                chunk = sink.drain()
+                if chunk:
+                    yield chunk
+            if failures:
+                archive.writestr(FAILURES_NAME, '\n'.join(failures) + '\n')
+        yield sink.drain()
+
+    def render_zip(self) -> bytes:
+        return b''.join(self.stream_zip())
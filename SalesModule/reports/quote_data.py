@@ -0,0 +1,347 @@
+"""
+Quote PDF Data Assembler for ImportaYa.ia
+Gathers everything a quote PDF needs into a view model before rendering.
+
+Rates come from the live ProviderRate rows (see
+quotation_engine.tarifas_vigentes), and a document costs at most two
+set-based queries:
+
+- Freight rates: one query for every origin port variation of the quote.
+  The per-container FCL rows are pivoted into one 20GP/40GP/40HC row per
+  carrier and port. The per-port choice (exact name before partial match,
+  cheapest first) is made in memory.
+- Local costs: one query for the destination THC of the carriers on the
+  quote. The carrier's cost for the port, or the highest across carriers
+  for multi-port quotes, is picked in memory.
+
+The renderer (quote_pdf_generator.render_quote_pdf) only reads the
+QuotePdfData it is given and never touches the ORM.
+"""
+import json
+import logging
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DESTINATION_PORT = 'GYE'
+LOCAL_COSTS_PORT = 'GYE'
+FCL_CONTAINERS = {'20GP': 'cost_20gp', '40GP': 'cost_40gp', '40HC': 'cost_40hc'}
+
+# Local cost concept -> key of the local costs table. ProviderRate only
+# carries the destination THC; the PDF fills the other concepts from the
+# scenario or its defaults
+LOCAL_COST_CODES = {
+    'VISTO_BUENO': 'visto_bueno',
+    'THC_DESTINO': 'thc',
+    'LOCALES_CNTR': 'locales_cntr',
+    'HANDLING': 'handling',
+    'LOCALES_MBL': 'locales_mbl',
+}
+
+
+@dataclass(frozen=True)
+class QuotePdfData:
+    """Everything generate_quote_pdf renders, resolved up front"""
+    quote_number: str
+    company_name: str
+    contact_name: str
+    city: str
+    transport_type: str
+    container_type: str
+    incoterm: str
+    destination: str
+    origin: str
+    weight_kg: float
+    volume_cbm: float
+    quantity: int
+    scenario: Dict = field(default_factory=dict)
+    origin_ports: Tuple[str, ...] = ()
+    ports: Tuple[Dict, ...] = ()
+    carriers: Tuple[str, ...] = ()
+    local_costs: Optional[Dict] = None
+
+    @property
+    def is_multiport(self) -> bool:
+        return len(self.origin_ports) > 1
+
+    @property
+    def uses_highest_local_costs(self) -> bool:
+        """Multi-port FCL with carriers: local costs are the maxima across them, scenario values ignored"""
+        return self.is_multiport and bool(self.carriers)
+
+
+def parse_scenario(scenario_data) -> Dict:
+    if not scenario_data:
+        return {}
+    if isinstance(scenario_data, str):
+        try:
+            return json.loads(scenario_data)
+        except (TypeError, ValueError):
+            return {}
+    return scenario_data
+
+
+def fcl_port_variations(pol: str) -> List[str]:
+    """Names a POL may be stored under, in lookup order"""
+    from .quote_pdf_generator import get_equivalent_ports
+
+    variations = list(get_equivalent_ports(pol))
+    if '-' in pol:
+        for part in pol.split('-'):
+            if part.strip() not in variations:
+                variations.append(part.strip())
+    return [v.strip() for v in variations]
+
+
+def pick_fcl_rate(pol: str, rates: Sequence[Dict]) -> Optional[Dict]:
+    """
+    Rate for one POL out of rates sorted by cost_40hc: an exact name match
+    on any variation first, then a partial match, in variation order.
+    """
+    variations = [v.lower() for v in fcl_port_variations(pol)]
+    for variation in variations:
+        for rate in rates:
+            if (rate['pol_name'] or '').lower() == variation:
+                return rate
+    for variation in variations:
+        for rate in rates:
+            if variation in (rate['pol_name'] or '').lower():
+                return rate
+    return None
+
+
+def pick_lcl_rate(pol: str, rates: Sequence[Dict]) -> Optional[Dict]:
+    """Cheapest LCL rate (rates sorted by lcl_rate_per_cbm) whose POL contains the port name"""
+    needle = pol.lower()
+    for rate in rates:
+        if needle in (rate['pol_name'] or '').lower():
+            return rate
+    return None
+
+
+def fcl_ports_data(origin_ports: Iterable[str], rates: Sequence[Dict]) -> Tuple[List[Dict], List[str]]:
+    """Tarifario rows for create_fcl_multiport_tarifario_table and the carriers they use"""
+    ports_data = []
+    carriers = []
+    for pol in origin_ports:
+        pol_clean = pol.strip()
+        rate = pick_fcl_rate(pol_clean, rates)
+        if rate:
+            display_pol = pol_clean
+            if pol_clean.upper() == 'GUANGZHOU' and (rate['pol_name'] or '').upper() == 'HUANGPU':
+                display_pol = 'HUANGPU-GUANGZHOU'
+            ports_data.append({
+                'pol': display_pol,
+                'validity': rate['validity_date'],
+                'free_days': rate['free_days'],
+                'transit_time': rate['transit_time'] or 'N/A',
+                'cost_20gp': rate['cost_20gp'],
+                'cost_40gp': rate['cost_40gp'],
+                'cost_40hc': rate['cost_40hc'],
+                'carrier': rate['carrier_name'],
+            })
+            if rate['carrier_name'] and rate['carrier_name'] not in carriers:
+                carriers.append(rate['carrier_name'])
+        else:
+            ports_data.append({
+                'pol': pol_clean,
+                'validity': 'Consultar',
+                'free_days': 21,
+                'transit_time': 'N/A',
+                'cost_20gp': Decimal('0'),
+                'cost_40gp': Decimal('0'),
+                'cost_40hc': Decimal('0'),
+                'carrier': None,
+            })
+    return ports_data, carriers
+
+
+def lcl_ports_data(origin_ports: Iterable[str], rates: Sequence[Dict]) -> List[Dict]:
+    """Tarifario rows for create_lcl_multiport_tarifario_table"""
+    ports_data = []
+    for pol in origin_ports:
+        pol_clean = pol.strip()
+        rate = pick_lcl_rate(pol_clean, rates)
+        if rate:
+            ports_data.append({
+                'pol': pol_clean,
+                'validity': rate['validity_date'],
+                'free_days': rate['free_days'],
+                'transit_time': rate['transit_time'] or 'N/A',
+                'rate_per_cbm': rate['lcl_rate_per_cbm'] or Decimal('0'),
+                'min_charge': rate['lcl_min_charge'] or Decimal('0'),
+            })
+        else:
+            ports_data.append({
+                'pol': pol_clean,
+                'validity': 'Consultar',
+                'free_days': 21,
+                'transit_time': 'N/A',
+                'rate_per_cbm': Decimal('0'),
+                'min_charge': Decimal('0'),
+            })
+    return ports_data
+
+
+def local_cost_carrier_code(carrier_name: str) -> str:
+    from .quote_pdf_generator import get_carrier_abbreviation
+    return get_carrier_abbreviation(carrier_name)
+
+
+def carrier_local_costs(rows: Sequence[Dict], carrier_code: str, port: str = LOCAL_COSTS_PORT) -> Optional[Dict]:
+    """Local costs of one carrier at the port (first record per concept)"""
+    costs = {}
+    for row in rows:
+        key = LOCAL_COST_CODES.get(row['code'])
+        if key and key not in costs and row['carrier_code'] == carrier_code and row['port'] == port:
+            costs[key] = row['cost_usd']
+    return costs or None
+
+
+def highest_local_costs(rows: Sequence[Dict], carrier_codes: Iterable[str]) -> Optional[Dict]:
+    """Highest cost per concept across the carriers, so a multi-port quote covers any of them"""
+    carrier_codes = set(carrier_codes)
+    costs = {}
+    for row in rows:
+        key = LOCAL_COST_CODES.get(row['code'])
+        if key and row['carrier_code'] in carrier_codes and row['cost_usd']:
+            if key not in costs or row['cost_usd'] > costs[key]:
+                costs[key] = row['cost_usd']
+    return costs or None
+
+
+# --- Set-based queries ---
+
+def fetch_fcl_rates(origin_ports: Iterable[str]) -> List[Dict]:
+    """
+    Live FCL rates to Guayaquil matching any variation of the origin ports,
+    one row per carrier and port with its 20GP/40GP/40HC costs, cheapest 40HC first
+    """
+    from django.db.models import Q
+    from SalesModule.quotation_engine import tarifas_vigentes, tiempo_transito
+
+    match = Q()
+    for pol in origin_ports:
+        for variation in fcl_port_variations(pol.strip()):
+            match |= Q(origin_port__icontains=variation)
+    if not match:
+        return []
+
+    rows: Dict[Tuple[int, str], Dict] = {}
+    for rate in tarifas_vigentes('FCL').filter(
+        match, destination=DESTINATION_PORT, unit='CONTAINER', container_type__in=list(FCL_CONTAINERS),
+    ):
+        row = rows.setdefault((rate.provider_id, rate.origin_port), {
+            'pol_name': rate.origin_port, 'carrier_name': rate.provider.name, 'validity_date': rate.valid_to,
+            'free_days': rate.free_days, 'transit_time': tiempo_transito(rate),
+            'cost_20gp': None, 'cost_40gp': None, 'cost_40hc': None,
+        })
+        field_name = FCL_CONTAINERS[rate.container_type]
+        # Rows arrive cheapest first: keep the cheapest rate per container
+        if row[field_name] is None:
+            row[field_name] = rate.rate_usd
+            row['validity_date'] = min(row['validity_date'], rate.valid_to)
+            if rate.container_type == '40HC':
+                row['free_days'], row['transit_time'] = rate.free_days, tiempo_transito(rate)
+    return sorted((row for row in rows.values() if row['cost_40hc']), key=lambda row: row['cost_40hc'])
+
+
+def fetch_lcl_rates(origin_ports: Iterable[str]) -> List[Dict]:
+    """Live LCL rates to Guayaquil for the origin ports, cheapest per CBM first"""
+    from django.db.models import Q
+    from SalesModule.quotation_engine import tarifas_vigentes, tiempo_transito
+
+    match = Q()
+    for pol in origin_ports:
+        match |= Q(origin_port__icontains=pol.strip())
+    if not match:
+        return []
+    return [
+        {
+            'pol_name': rate.origin_port, 'validity_date': rate.valid_to, 'free_days': rate.free_days,
+            'transit_time': tiempo_transito(rate), 'lcl_rate_per_cbm': rate.rate_usd,
+            # ProviderRate has no minimum charge; the tarifario shows 0
+            'lcl_min_charge': None,
+        }
+        for rate in tarifas_vigentes('LCL').filter(match, destination=DESTINATION_PORT, unit='CBM')
+    ]
+
+
+def fetch_local_costs(carrier_codes: Iterable[str]) -> List[Dict]:
+    """
+    Destination THC of the carriers' live FCL rates, per port, highest first.
+    Carriers are matched by the abbreviation of the provider name, the code
+    the PDF uses for them.
+    """
+    from SalesModule.quotation_engine import tarifas_vigentes
+
+    carrier_codes = set(carrier_codes)
+    if not carrier_codes:
+        return []
+    rows = []
+    for name, port, thc in (
+        tarifas_vigentes('FCL').filter(unit='CONTAINER')
+        .order_by('-thc_destination_usd')
+        .values_list('provider__name', 'destination', 'thc_destination_usd')
+        .distinct()
+    ):
+        code = local_cost_carrier_code(name)
+        if code in carrier_codes:
+            rows.append({'code': 'THC_DESTINO', 'carrier_code': code, 'port': port, 'cost_usd': thc})
+    return rows
+
+
+def assemble_quote_pdf_data(quote_submission, scenario_data=None) -> QuotePdfData:
+    """
+    View model for generate_quote_pdf: quote fields plus the rates and local
+    costs the document shows, fetched in at most two queries.
+    """
+    from SalesModule.resolvers import get_port_resolver
+
+    scenario = parse_scenario(scenario_data)
+    transport_type = quote_submission.transport_type
+    origin = quote_submission.origin or 'QINGDAO'
+    origin_ports = tuple(origin.split(' | ')) if ' | ' in origin else (origin,)
+    is_multiport = len(origin_ports) > 1
+
+    ports: List[Dict] = []
+    carriers: List[str] = []
+    local_costs = None
+    if transport_type == 'FCL':
+        if is_multiport:
+            ports, carriers = fcl_ports_data(origin_ports, fetch_fcl_rates(origin_ports))
+        carrier_name = scenario.get('carrier_name', scenario.get('naviera', None))
+        if carriers:
+            codes = [local_cost_carrier_code(c) for c in carriers]
+            local_costs = highest_local_costs(fetch_local_costs(codes), codes)
+        elif carrier_name:
+            code = local_cost_carrier_code(carrier_name)
+            local_costs = carrier_local_costs(fetch_local_costs([code]), code)
+    elif transport_type == 'LCL' and is_multiport:
+        ports = lcl_ports_data(origin_ports, fetch_lcl_rates(origin_ports))
+
+    # The tarifario tables consolidate port names through the process port resolver; load it here
+    if ports:
+        get_port_resolver()
+
+    return QuotePdfData(
+        quote_number=quote_submission.submission_number or f"IYA-{quote_submission.id:05d}",
+        company_name=quote_submission.company_name,
+        contact_name=quote_submission.contact_name,
+        city=quote_submission.city,
+        transport_type=transport_type,
+        container_type=getattr(quote_submission, 'container_type', None) or '1x40HC',
+        incoterm=getattr(quote_submission, 'incoterm', None) or 'FOB',
+        destination=quote_submission.destination or 'Guayaquil',
+        origin=origin,
+        weight_kg=float(quote_submission.cargo_weight_kg or 100),
+        volume_cbm=float(quote_submission.cargo_volume_cbm or 1),
+        quantity=getattr(quote_submission, 'quantity', None) or 1,
+        scenario=scenario,
+        origin_ports=origin_ports,
+        ports=tuple(ports),
+        carriers=tuple(carriers),
+        local_costs=local_costs,
+    )
@@ -21,6 +21,9 @@ from decimal import Decimal
 import io
 import json
 
+from SalesModule.money import Money
+from SalesModule.reports import render_assets
+
 
 DEEP_OCEAN_BLUE = colors.HexColor('#0A2540')
 AQUA_FLOW = colors.HexColor('#00C9B7')
@@ -101,9 +104,26 @@ def get_port_transit_time(port_name):
             return f"{info['transit_min']}-{info['transit_max']}"
     return "35-45"
 
+def _port_lookup_key(port_name):
+    """Normalized key for the port tables: 'Xingang, CN' -> 'XINGANG'"""
+    from SalesModule.resolvers import get_port_resolver, normalizar_texto
+    port_upper = port_name.upper().strip()
+    if port_upper in CONSOLIDATED_PORT_NAMES or port_upper in EQUIVALENT_PORTS:
+        return port_upper
+    normalized = normalizar_texto(port_name).replace(' ', '-')
+    if normalized in CONSOLIDATED_PORT_NAMES or normalized in EQUIVALENT_PORTS:
+        return normalized
+    resolver = get_port_resolver()
+    locode = resolver.resolve(port_name)
+    if locode:
+        canonical = normalizar_texto(resolver.canonical_name(locode) or '')
+        if canonical in CONSOLIDATED_PORT_NAMES or canonical in EQUIVALENT_PORTS:
+            return canonical
+    return port_upper
+
 def get_consolidated_port_name(port_name):
     """Get the consolidated display name for a port"""
-    port_upper = port_name.upper().strip()
+    port_upper = _port_lookup_key(port_name)
     if port_upper in CONSOLIDATED_PORT_NAMES:
         return CONSOLIDATED_PORT_NAMES[port_upper]
     return port_name.upper()
@@ -135,7 +155,7 @@ def get_carrier_abbreviation(carrier_name):
 
 def get_equivalent_ports(port_name):
     """Get list of equivalent ports for a given port name"""
-    port_upper = port_name.upper().strip()
+    port_upper = _port_lookup_key(port_name)
     if port_upper in EQUIVALENT_PORTS:
         return EQUIVALENT_PORTS[port_upper]
     for key, equivalents in EQUIVALENT_PORTS.items():
@@ -185,7 +205,11 @@ def _detect_non_usd_currency(scenario_data):
     return False
 
 
-def get_custom_styles():
+LOGO_MARKUP = '<font color="#00C9B7"><b>Importa</b></font><font color="#A4FF00"><b>Ya.ia</b></font>'
+SLOGAN_MARKUP = '<i>La logística de carga integral, ahora es Inteligente!</i>'
+
+
+def _build_custom_styles():
     """Create custom paragraph styles with ImportaYa.ia branding"""
     styles = getSampleStyleSheet()
     
@@ -277,9 +301,94 @@ def get_custom_styles():
         fontName='Helvetica-BoldOblique'
     ))
     
+    styles.add(ParagraphStyle(
+        name='GradientLogo',
+        fontSize=24,
+        fontName='Helvetica-Bold',
+        alignment=TA_LEFT
+    ))
+    
+    styles.add(ParagraphStyle(
+        name='QuoteNum',
+        fontSize=12,
+        textColor=DEEP_OCEAN_BLUE,
+        alignment=TA_RIGHT,
+        fontName='Helvetica-Bold'
+    ))
+    
+    styles.add(ParagraphStyle(
+        name='SloganStyle',
+        fontSize=9,
+        textColor=AQUA_FLOW,
+        fontName='Helvetica-Oblique'
+    ))
+    
+    styles.add(ParagraphStyle(
+        name='DateStyle',
+        fontSize=10,
+        textColor=DARK_TEXT,
+        alignment=TA_RIGHT,
+        fontName='Helvetica'
+    ))
+    
+    styles.add(ParagraphStyle(
+        name='ValidityNote',
+        fontSize=10,
+        textColor=DEEP_OCEAN_BLUE,
+        fontName='Helvetica-Bold',
+        alignment=TA_LEFT,
+        spaceAfter=8,
+        leftIndent=10
+    ))
+    
+    styles.add(ParagraphStyle(
+        name='CarrierNote',
+        fontSize=9,
+        textColor=AQUA_FLOW,
+        fontName='Helvetica-Bold',
+        alignment=TA_LEFT,
+        spaceAfter=6,
+        leftIndent=10,
+        backColor=colors.HexColor('#F0FFFE')
+    ))
+    
+    styles.add(ParagraphStyle(
+        name='EmcWarning',
+        fontSize=8,
+        textColor=colors.HexColor('#CC0000'),
+        fontName='Helvetica-Bold',
+        alignment=TA_LEFT,
+        spaceAfter=6,
+        leftIndent=10,
+        borderColor=colors.HexColor('#CC0000'),
+        borderWidth=1,
+        borderPadding=5
+    ))
+    
+    styles.add(ParagraphStyle(
+        name='ScenarioHeader',
+        fontSize=10,
+        textColor=WHITE,
+        fontName='Helvetica-Bold',
+        alignment=TA_CENTER
+    ))
+    
+    styles.add(ParagraphStyle(
+        name='ScenarioCell',
+        fontSize=10,
+        textColor=DARK_TEXT,
+        fontName='Helvetica',
+        alignment=TA_CENTER
+    ))
+    
     return styles
 
 
+def get_custom_styles():
+    """Branded stylesheet, built once per process. Shared: treat it as read-only."""
+    return render_assets.asset('custom_styles', _build_custom_styles)
+
+
 def format_currency(value):
     """Format decimal value as USD currency"""
     if value is None:
@@ -310,72 +419,43 @@ def get_transport_description(transport_type, container_type=None, incoterm="FOB
 
 def create_branded_logo():
     """Create branded logo with gradient-style text (Aqua Flow to Velocity Green)"""
+    styles = get_custom_styles()
     logo_table_data = [
-        [
-            Paragraph('<font color="#00C9B7"><b>Importa</b></font><font color="#A4FF00"><b>Ya.ia</b></font>', 
-                      ParagraphStyle(
-                          name='GradientLogo',
-                          fontSize=24,
-                          fontName='Helvetica-Bold',
-                          alignment=TA_LEFT
-                      ))
-        ]
+        [render_assets.paragraph(LOGO_MARKUP, styles['GradientLogo'])]
     ]
     
     logo_table = Table(logo_table_data, colWidths=[3*inch])
-    logo_table.setStyle(TableStyle([
+    logo_table.setStyle(render_assets.asset('logo_table_style', lambda: TableStyle([
         ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
         ('LEFTPADDING', (0, 0), (-1, -1), 0),
-    ]))
+    ])))
     
     return logo_table
 
 
 def create_header_table(quote_number, date_str):
     """Create the header with branded logo, quote number and date"""
+    styles = get_custom_styles()
     header_data = [
         [
-            Paragraph('<font color="#00C9B7"><b>Importa</b></font><font color="#A4FF00"><b>Ya.ia</b></font>', 
-                      ParagraphStyle(
-                          name='GradientLogo',
-                          fontSize=24,
-                          fontName='Helvetica-Bold',
-                          alignment=TA_LEFT
-                      )),
+            render_assets.paragraph(LOGO_MARKUP, styles['GradientLogo']),
             '',
-            Paragraph(f'<b>Cotización No: {quote_number}</b>', ParagraphStyle(
-                name='QuoteNum',
-                fontSize=12,
-                textColor=DEEP_OCEAN_BLUE,
-                alignment=TA_RIGHT,
-                fontName='Helvetica-Bold'
-            ))
+            Paragraph(f'<b>Cotización No: {quote_number}</b>', styles['QuoteNum'])
         ],
         [
-            Paragraph('<i>La logística de carga integral, ahora es Inteligente!</i>', ParagraphStyle(
-                name='SloganStyle',
-                fontSize=9,
-                textColor=AQUA_FLOW,
-                fontName='Helvetica-Oblique'
-            )),
+            render_assets.paragraph(SLOGAN_MARKUP, styles['SloganStyle']),
             '',
-            Paragraph(f'Guayaquil, {date_str}', ParagraphStyle(
-                name='DateStyle',
-                fontSize=10,
-                textColor=DARK_TEXT,
-                alignment=TA_RIGHT,
-                fontName='Helvetica'
-            ))
+            Paragraph(f'Guayaquil, {date_str}', styles['DateStyle'])
         ]
     ]
     
     header_table = Table(header_data, colWidths=[3*inch, 1*inch, 3*inch])
-    header_table.setStyle(TableStyle([
+    header_table.setStyle(render_assets.asset('header_table_style', lambda: TableStyle([
         ('VALIGN', (0, 0), (-1, -1), 'TOP'),
         ('ALIGN', (0, 0), (0, -1), 'LEFT'),
         ('ALIGN', (-1, 0), (-1, -1), 'RIGHT'),
         ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
-    ]))
+    ])))
     
     return header_table
 
@@ -386,13 +466,13 @@ def create_client_section(client_name, contact_name, city):
     
     elements = [
         Spacer(1, 20),
-        Paragraph("Señores", styles['ClientInfo']),
+        render_assets.paragraph("Señores", styles['ClientInfo']),
         Paragraph(f"<b>{client_name}</b>", styles['ClientInfo']),
         Paragraph(f"{city}.-", styles['ClientInfo']),
         Spacer(1, 10),
         Paragraph(f"Atención: <b>{contact_name}</b>", styles['ClientInfo']),
         Spacer(1, 10),
-        Paragraph("De mis consideraciones:", styles['ClientInfo']),
+        render_assets.paragraph("De mis consideraciones:", styles['ClientInfo']),
         Spacer(1, 10),
     ]
     
@@ -929,30 +1009,8 @@ def get_fcl_local_costs_from_db(carrier_code=None, port='GYE'):
     Fetch FCL local costs from database for a specific carrier.
     Returns dict with cost values or None if not found.
     """
-    from SalesModule.models import LocalDestinationCost
-    
-    costs = {}
-    code_mapping = {
-        'VISTO_BUENO': 'visto_bueno',
-        'THC_DESTINO': 'thc',
-        'LOCALES_CNTR': 'locales_cntr',
-        'HANDLING': 'handling',
-        'LOCALES_MBL': 'locales_mbl',
-    }
-    
-    for db_code, key in code_mapping.items():
-        record = LocalDestinationCost.objects.filter(
-            transport_type='MARITIMO_FCL',
-            code=db_code,
-            carrier_code=carrier_code,
-            port=port,
-            is_active=True
-        ).first()
-        
-        if record:
-            costs[key] = record.cost_usd
-    
-    return costs if costs else None
+    from SalesModule.reports.quote_data import carrier_local_costs, fetch_local_costs
+    return carrier_local_costs(fetch_local_costs([carrier_code]), carrier_code, port)
 
 
 def get_highest_fcl_local_costs(carriers, port='GYE'):
@@ -960,66 +1018,21 @@ def get_highest_fcl_local_costs(carriers, port='GYE'):
     For multi-port quotations, get the highest local costs across all carriers.
     This ensures the quote covers all possible scenarios.
     """
-    from SalesModule.models import LocalDestinationCost
-    from django.db.models import Max
-    
-    carrier_abbrev_to_code = {
-        'EMC': 'EMC',
-        'COSCO': 'COSCO',
-        'OOCL': 'OOCL',
-        'MSC': 'MSC',
-        'ONE': 'ONE',
-        'HPG': 'HPG',
-        'MAERSK': 'MAERSK',
-        'CMA': 'CMA',
-        'HMM': 'HMM',
-        'WHL': 'WHL',
-        'SBM': 'SBM',
-        'PIL': 'PIL',
-        'MARFRET': 'MARFRET',
-        'ZIM': 'ZIM',
-        'YML': 'YML',
-    }
-    
-    carrier_codes = []
-    for c in carriers:
-        abbrev = get_carrier_abbreviation(c)
-        code = carrier_abbrev_to_code.get(abbrev, abbrev)
-        carrier_codes.append(code)
-    
-    costs = {}
-    code_mapping = {
-        'VISTO_BUENO': 'visto_bueno',
-        'THC_DESTINO': 'thc',
-        'LOCALES_CNTR': 'locales_cntr',
-        'HANDLING': 'handling',
-        'LOCALES_MBL': 'locales_mbl',
-    }
-    
-    for db_code, key in code_mapping.items():
-        max_cost = LocalDestinationCost.objects.filter(
-            transport_type='MARITIMO_FCL',
-            code=db_code,
-            carrier_code__in=carrier_codes,
-            is_active=True
-        ).aggregate(max_val=Max('cost_usd'))['max_val']
-        
-        if max_cost:
-            costs[key] = max_cost
-    
-    return costs if costs else None
+    from SalesModule.reports.quote_data import fetch_local_costs, highest_local_costs, local_cost_carrier_code
+    carrier_codes = [local_cost_carrier_code(c) for c in carriers]
+    return highest_local_costs(fetch_local_costs(carrier_codes), carrier_codes)
 
 
-def create_local_costs_table_fcl(costs, quantity=1, carrier_code=None, carriers_list=None, is_multiport=False):
+def create_local_costs_table_fcl(costs, quantity=1, db_costs=None, highest_costs=False):
     """
     Create local costs table for FCL with 3 consolidated concepts:
     - THC Destino (EXENTO IVA, unidad CONTENEDOR)
     - Locales Destino por BL (aplica IVA, unidad BL) = Visto Bueno + Locales MBL consolidados
     - Locales Destino por Contenedor (aplica IVA, unidad CONTENEDOR) = Locales CNTR + Handling consolidados
     
-    If carrier_code provided, fetches from DB for that carrier.
-    If carriers_list provided (multi-port), uses highest costs across carriers.
-    For multi-port quotes: quantity is forced to 1, DB costs take priority over scenario costs.
+    db_costs: carrier local costs resolved by the quote data assembler (see quote_data.py).
+    highest_costs: db_costs are the highest across the carriers of a multi-port quote;
+    they then take priority over scenario costs (quantity is forced to 1 by the caller).
     """
     header_style = ParagraphStyle(
         name='TableHeader',
@@ -1069,18 +1082,11 @@ def create_local_costs_table_fcl(costs, quantity=1, carrier_code=None, carriers_
         'locales_mbl': Decimal('100.00'),
     }
     
-    db_costs = None
-    if carriers_list:
-        db_costs = get_highest_fcl_local_costs(carriers_list)
-    elif carrier_code:
-        abbrev = get_carrier_abbreviation(carrier_code)
-        db_costs = get_fcl_local_costs_from_db(abbrev)
-    
     if db_costs:
         for key, value in db_costs.items():
             default_costs[key] = value
     
-    if not carriers_list:
+    if not highest_costs:
         for key in default_costs:
             if key in costs:
                 default_costs[key] = Decimal(str(costs[key]))
@@ -1149,11 +1155,9 @@ def calculate_collect_fee_lcl(total_freight, origin_costs=Decimal('0'), min_fee=
     Calculate LCL collect fee (ISD) = 6% of (freight + origin costs) or minimum, whichever is greater.
     Returns tuple: (base_fee, iva_amount, total_with_iva)
     """
-    base_for_calc = Decimal(str(total_freight)) + Decimal(str(origin_costs))
-    calculated_fee = base_for_calc * Decimal('0.06')
-    base_fee = max(calculated_fee, min_fee)
-    iva_amount = base_fee * Decimal('0.15')
-    return base_fee, iva_amount, base_fee + iva_amount
+    base_fee = max((Money.of(total_freight) + Money.of(origin_costs)).porcentaje(6), Money.of(min_fee))
+    iva_amount = base_fee.iva()
+    return base_fee.to_decimal(), iva_amount.to_decimal(), (base_fee + iva_amount).to_decimal()
 
 
 def create_local_costs_table_lcl(costs, quantity=1, total_freight=Decimal('0'), origin_costs=Decimal('0'), cbm=Decimal('1')):
@@ -1286,11 +1290,9 @@ def calculate_collect_fee_aereo(total_freight, origin_costs=Decimal('0'), min_fe
     Calculate AEREO collect fee (ISD) = 6% of (freight + origin costs) or minimum $25, whichever is greater.
     Returns tuple: (base_fee, iva_amount, total_with_iva)
     """
-    base_for_calc = Decimal(str(total_freight)) + Decimal(str(origin_costs))
-    calculated_fee = base_for_calc * Decimal('0.06')
-    base_fee = max(calculated_fee, min_fee)
-    iva_amount = base_fee * Decimal('0.15')
-    return base_fee, iva_amount, base_fee + iva_amount
+    base_fee = max((Money.of(total_freight) + Money.of(origin_costs)).porcentaje(6), Money.of(min_fee))
+    iva_amount = base_fee.iva()
+    return base_fee.to_decimal(), iva_amount.to_decimal(), (base_fee + iva_amount).to_decimal()
 
 
 def create_local_costs_table_aereo(costs, quantity=1, total_freight=Decimal('0'), origin_costs=Decimal('0')):
@@ -1492,44 +1494,17 @@ def create_totals_section_lcl(freight_total, local_costs_no_iva, local_costs_iva
     return totals_table, total_oferta
 
 
+def _note_paragraph(note, styles, fixed=True):
+    """Bullet note; fixed texts come from the render-asset cache, quote values are parsed per quote"""
+    if fixed:
+        return render_assets.paragraph(f"• {note}", styles['Note'])
+    return Paragraph(f"• {note}", styles['Note'])
+
+
 def create_notes_section_fcl(transit_days, free_days, carrier_name=None, validity_date=None, is_multiport=False, has_emc=False, has_non_usd_currency=False):
     """Create additional notes section for FCL"""
     styles = get_custom_styles()
     
-    validity_note_style = ParagraphStyle(
-        name='ValidityNote',
-        fontSize=10,
-        textColor=DEEP_OCEAN_BLUE,
-        fontName='Helvetica-Bold',
-        alignment=TA_LEFT,
-        spaceAfter=8,
-        leftIndent=10
-    )
-    
-    carrier_note_style = ParagraphStyle(
-        name='CarrierNote',
-        fontSize=9,
-        textColor=AQUA_FLOW,
-        fontName='Helvetica-Bold',
-        alignment=TA_LEFT,
-        spaceAfter=6,
-        leftIndent=10,
-        backColor=colors.HexColor('#F0FFFE')
-    )
-    
-    emc_warning_style = ParagraphStyle(
-        name='EmcWarning',
-        fontSize=8,
-        textColor=colors.HexColor('#CC0000'),
-        fontName='Helvetica-Bold',
-        alignment=TA_LEFT,
-        spaceAfter=6,
-        leftIndent=10,
-        borderColor=colors.HexColor('#CC0000'),
-        borderWidth=1,
-        borderPadding=5
-    )
-    
     notes = []
     
     if validity_date and not is_multiport:
@@ -1545,9 +1520,13 @@ def create_notes_section_fcl(transit_days, free_days, carrier_name=None, validit
         "Salida semanal.",
     ])
     
+    per_quote = []
     if not is_multiport:
-        notes.append(f"{free_days} días libres de demoraje en destino POD Guayaquil.")
-        notes.append(f"Tránsito estimado {transit_days} días aprox. (Podría variar por parte de la naviera).")
+        per_quote = [
+            f"{free_days} días libres de demoraje en destino POD Guayaquil.",
+            f"Tránsito estimado {transit_days} días aprox. (Podría variar por parte de la naviera).",
+        ]
+        notes.extend(per_quote)
     else:
         notes.append("Días libres y tiempo de tránsito varían según puerto de origen (ver tabla).")
     
@@ -1562,9 +1541,9 @@ def create_notes_section_fcl(transit_days, free_days, carrier_name=None, validit
     elements = []
     for i, note in enumerate(notes):
         if i == 0 and validity_date and not is_multiport:
-            elements.append(Paragraph(f"<b>{note}</b>", validity_note_style))
+            elements.append(Paragraph(f"<b>{note}</b>", styles['ValidityNote']))
         else:
-            elements.append(Paragraph(f"• {note}", styles['Note']))
+            elements.append(_note_paragraph(note, styles, fixed=note not in per_quote))
     
     if carrier_name:
         elements.append(Spacer(1, 10))
@@ -1572,7 +1551,7 @@ def create_notes_section_fcl(transit_days, free_days, carrier_name=None, validit
             carrier_text = f"<b>NAVIERAS UTILIZADAS EN TARIFARIO IA:</b> {carrier_name}"
         else:
             carrier_text = f"<b>NAVIERA SELECCIONADA:</b> {carrier_name} + Servicio Inteligente de Carga = IMPORTAYA.IA"
-        elements.append(Paragraph(carrier_text, carrier_note_style))
+        elements.append(Paragraph(carrier_text, styles['CarrierNote']))
     
     if has_emc:
         elements.append(Spacer(1, 10))
@@ -1582,7 +1561,7 @@ def create_notes_section_fcl(transit_days, free_days, carrier_name=None, validit
             "contenedor vacío, un Handling de aprox. USD $95.00 más IVA 15% por cada contenedor. "
             "Dicho costo NO está incluido en nuestra cotización y corre por cuenta del CNEE/importador."
         )
-        elements.append(Paragraph(emc_note, emc_warning_style))
+        elements.append(render_assets.paragraph(emc_note, styles['EmcWarning']))
     
     return elements
 
@@ -1591,6 +1570,7 @@ def create_notes_section_lcl(transit_days):
     """Create additional notes section for LCL"""
     styles = get_custom_styles()
     
+    transit_note = f"Tránsito estimado {transit_days} días aprox."
     notes = [
         "Tarifas all in para carga consolidada.",
         "Peso tasable: Mayor entre CBM y TON (peso/volumen).",
@@ -1598,23 +1578,20 @@ def create_notes_section_lcl(transit_days):
         "Tarifas válidas para carga general, no peligrosa.",
         "Notificaciones de tracking vía APP y email.",
         "Acceso a nuestra APP ImportaYa.ia para monitorear sus cargas 24/7.",
-        f"Tránsito estimado {transit_days} días aprox.",
+        transit_note,
         "Locales en destino sujetos a IVA local del 15%.",
         "Tarifas cotizadas NO aplican para cargas BONDED, no domésticas, cargas peligrosas DG Cargo o IMO cargo, cargas con sobredimensión o sobrepeso, tampoco aplican para cargas NO APILABLES. En esos casos favor ingresar comentarios e información al solicitar cotización para recibir una cotización manual en 24 horas o menos vía nuestra APP: ImportaYAia.com",
         "Nuestra APP cuenta con COBERTURA todo riesgo desde la bodega del FABRICANTE en origen hasta la puerta de su bodega o sitio final de entrega en destino, indistinto del INCOTERM de la IMPORTACIÓN y no aplica ningún DEDUCIBLE en caso de siniestros de sus cargas e inversiones. *Aplican términos legales y condiciones del servicio y cobertura contratada vía APP*",
     ]
     
-    elements = []
-    for note in notes:
-        elements.append(Paragraph(f"• {note}", styles['Note']))
-    
-    return elements
+    return [_note_paragraph(note, styles, fixed=note != transit_note) for note in notes]
 
 
 def create_notes_section_aereo(transit_days):
     """Create additional notes section for Aéreo"""
     styles = get_custom_styles()
     
+    transit_note = f"Tránsito estimado {transit_days} días aprox."
     notes = [
         "Tarifas por kilogramo, mínimo $85.00 USD por embarque.",
         "Peso tasable: Mayor entre peso real y peso volumétrico (L×A×H/6000).",
@@ -1622,17 +1599,13 @@ def create_notes_section_aereo(transit_days):
         "Tracking en tiempo real disponible.",
         "Documentación electrónica (AWB, factura comercial).",
         "Acceso a nuestra APP ImportaYa.ia para monitorear sus cargas 24/7.",
-        f"Tránsito estimado {transit_days} días aprox.",
+        transit_note,
         "Locales en destino sujetos a IVA local del 15%.",
         "Tarifas cotizadas NO aplican para cargas BONDED, no domésticas, cargas peligrosas DG Cargo o IMO cargo, cargas con sobredimensión o sobrepeso. En esos casos favor ingresar comentarios e información al solicitar cotización para recibir una cotización manual en 24 horas o menos vía nuestra APP: ImportaYAia.com",
         "Nuestra APP cuenta con COBERTURA todo riesgo desde la bodega del FABRICANTE en origen hasta la puerta de su bodega o sitio final de entrega en destino, indistinto del INCOTERM de la IMPORTACIÓN y no aplica ningún DEDUCIBLE en caso de siniestros de sus cargas e inversiones. *Aplican términos legales y condiciones del servicio y cobertura contratada vía APP*",
     ]
     
-    elements = []
-    for note in notes:
-        elements.append(Paragraph(f"• {note}", styles['Note']))
-    
-    return elements
+    return [_note_paragraph(note, styles, fixed=note != transit_note) for note in notes]
 
 
 def create_footer_section(valid_until):
@@ -1645,15 +1618,15 @@ def create_footer_section(valid_until):
         Spacer(1, 10),
         Paragraph(f"Tarifa válida hasta {valid_until}.", styles['Footer']),
         Spacer(1, 5),
-        Paragraph("Agradezco la atención brindada, esperando nuestra propuesta sea de su total agrado.", styles['BodyText']),
-        Paragraph("Quedamos atentos a sus futuras instrucciones.", styles['BodyText']),
+        render_assets.paragraph("Agradezco la atención brindada, esperando nuestra propuesta sea de su total agrado.", styles['BodyText']),
+        render_assets.paragraph("Quedamos atentos a sus futuras instrucciones.", styles['BodyText']),
         Spacer(1, 20),
-        Paragraph("Atentamente,", styles['ClientInfo']),
+        render_assets.paragraph("Atentamente,", styles['ClientInfo']),
         Spacer(1, 30),
-        Paragraph("<b>ImportaYa.ia</b>", styles['QuoteSubtitle']),
-        Paragraph("<i>La logística de carga integral, ahora es Inteligente!</i>", styles['Slogan']),
+        render_assets.paragraph("<b>ImportaYa.ia</b>", styles['QuoteSubtitle']),
+        render_assets.paragraph(SLOGAN_MARKUP, styles['Slogan']),
         Spacer(1, 10),
-        Paragraph("contacto@importaya.ia | www.importaya.ia | +593 99 999 9999", styles['Footer']),
+        render_assets.paragraph("contacto@importaya.ia | www.importaya.ia | +593 99 999 9999", styles['Footer']),
     ]
     
     return elements
@@ -1667,6 +1640,18 @@ def generate_quote_pdf(quote_submission, scenario_data=None):
         quote_submission: QuoteSubmission model instance
         scenario_data: Optional dict with scenario details from AI response
         
+    Returns:
+        BytesIO buffer containing the PDF
+    """
+    from SalesModule.reports.quote_data import assemble_quote_pdf_data
+    return render_quote_pdf(assemble_quote_pdf_data(quote_submission, scenario_data))
+
+
+def render_quote_pdf(data):
+    """
+    Render a quote PDF from an assembled QuotePdfData (see quote_data.py).
+    Reads only the view model; no database access.
+    
     Returns:
         BytesIO buffer containing the PDF
     """
@@ -1683,7 +1668,7 @@ def generate_quote_pdf(quote_submission, scenario_data=None):
     elements = []
     styles = get_custom_styles()
     
-    quote_number = quote_submission.submission_number or f"IYA-{quote_submission.id:05d}"
+    quote_number = data.quote_number
     date_str = timezone.now().strftime("%d de %B de %Y").replace(
         "January", "enero").replace("February", "febrero").replace("March", "marzo"
     ).replace("April", "abril").replace("May", "mayo").replace("June", "junio"
@@ -1693,36 +1678,29 @@ def generate_quote_pdf(quote_submission, scenario_data=None):
     elements.append(create_header_table(quote_number, date_str))
     
     elements.extend(create_client_section(
-        quote_submission.company_name,
-        quote_submission.contact_name,
-        quote_submission.city
+        data.company_name,
+        data.contact_name,
+        data.city
     ))
     
-    transport_type = quote_submission.transport_type
-    container_type = getattr(quote_submission, 'container_type', None) or '1x40HC'
-    incoterm = quote_submission.incoterm or 'FOB'
-    destination = quote_submission.destination or 'Guayaquil'
-    origin = quote_submission.origin or 'QINGDAO'
+    transport_type = data.transport_type
+    container_type = data.container_type
+    incoterm = data.incoterm
+    destination = data.destination
+    origin = data.origin
     
     is_multiport_asia = ' | ' in origin
     elements.append(create_intro_paragraph(transport_type, incoterm, destination, container_type, is_multiport_asia))
     elements.append(Spacer(1, 15))
     
-    if scenario_data:
-        try:
-            if isinstance(scenario_data, str):
-                scenario_data = json.loads(scenario_data)
-        except:
-            scenario_data = {}
-    else:
-        scenario_data = {}
+    scenario_data = data.scenario
     
-    weight_kg = float(quote_submission.cargo_weight_kg or 100)
-    volume_cbm = float(quote_submission.cargo_volume_cbm or 1)
-    quantity = quote_submission.quantity or 1
+    weight_kg = data.weight_kg
+    volume_cbm = data.volume_cbm
+    quantity = data.quantity
     
     freight_label = "FLETE MARÍTIMO:" if transport_type in ['FCL', 'LCL'] else "FLETE AÉREO:"
-    elements.append(Paragraph(f"<b>{freight_label}</b>", styles['SectionHeader']))
+    elements.append(render_assets.paragraph(f"<b>{freight_label}</b>", styles['SectionHeader']))
     elements.append(Spacer(1, 10))
     
     if transport_type in ['LCL', 'AEREO']:
@@ -1731,81 +1709,14 @@ def generate_quote_pdf(quote_submission, scenario_data=None):
         elements.append(Spacer(1, 15))
     
     if transport_type == 'FCL':
-        origin_ports = origin.split(' | ') if ' | ' in origin else [origin]
-        is_multiport = len(origin_ports) > 1
+        is_multiport = data.is_multiport
         multiport_carriers = []
         
         if is_multiport:
-            from SalesModule.models import FreightRateFCL
-            from django.utils import timezone as dj_timezone
-            from django.db.models import Q
-            
-            ports_data = []
-            carriers_used = set()
-            for pol in origin_ports:
-                pol_clean = pol.strip()
-                pol_variations = get_equivalent_ports(pol_clean)
-                if '-' in pol_clean:
-                    for part in pol_clean.split('-'):
-                        if part.strip() not in pol_variations:
-                            pol_variations.append(part.strip())
-                
-                rate = None
-                for pol_var in pol_variations:
-                    rate = FreightRateFCL.objects.filter(
-                        pol_name__iexact=pol_var.strip(),
-                        pod_name__icontains='Guayaquil',
-                        is_active=True,
-                        validity_date__gte=dj_timezone.now().date(),
-                        cost_40hc__gt=0
-                    ).order_by('cost_40hc').first()
-                    if rate:
-                        break
-                
-                if not rate:
-                    for pol_var in pol_variations:
-                        rate = FreightRateFCL.objects.filter(
-                            pol_name__icontains=pol_var.strip(),
-                            pod_name__icontains='Guayaquil',
-                            is_active=True,
-                            validity_date__gte=dj_timezone.now().date(),
-                            cost_40hc__gt=0
-                        ).order_by('cost_40hc').first()
-                        if rate:
-                            break
-                
-                if rate:
-                    display_pol = pol_clean
-                    if pol_clean.upper() == 'GUANGZHOU' and rate.pol_name.upper() == 'HUANGPU':
-                        display_pol = 'HUANGPU-GUANGZHOU'
-                    ports_data.append({
-                        'pol': display_pol,
-                        'validity': rate.validity_date,
-                        'free_days': rate.free_days,
-                        'transit_time': rate.transit_time or 'N/A',
-                        'cost_20gp': rate.cost_20gp,
-                        'cost_40gp': rate.cost_40gp,
-                        'cost_40hc': rate.cost_40hc,
-                        'carrier': rate.carrier_name,
-                    })
-                    if rate.carrier_name:
-                        carriers_used.add(rate.carrier_name)
-                else:
-                    ports_data.append({
-                        'pol': pol_clean,
-                        'validity': 'Consultar',
-                        'free_days': 21,
-                        'transit_time': 'N/A',
-                        'cost_20gp': Decimal('0'),
-                        'cost_40gp': Decimal('0'),
-                        'cost_40hc': Decimal('0'),
-                        'carrier': None,
-                    })
-            
-            freight_table = create_fcl_multiport_tarifario_table(ports_data, destination)
+            freight_table = create_fcl_multiport_tarifario_table(list(data.ports), destination)
             elements.append(freight_table)
             freight_total = Decimal('0')
-            multiport_carriers = list(carriers_used)
+            multiport_carriers = list(data.carriers)
         else:
             freight_rate = scenario_data.get('flete_base', 1600)
             rates_by_container = scenario_data.get('rates_by_container', None)
@@ -1818,26 +1729,20 @@ def generate_quote_pdf(quote_submission, scenario_data=None):
         
         local_costs = scenario_data.get('costos_locales', {})
         local_quantity = 1 if is_multiport else quantity
-        carrier_name_raw = scenario_data.get('carrier_name', scenario_data.get('naviera', None))
         
-        if is_multiport and multiport_carriers:
-            local_table, local_iva, thc_total = create_local_costs_table_fcl(
-                local_costs, local_quantity, carrier_code=None, carriers_list=list(multiport_carriers)
-            )
-        else:
-            local_table, local_iva, thc_total = create_local_costs_table_fcl(
-                local_costs, local_quantity, carrier_code=carrier_name_raw, carriers_list=None
-            )
+        local_table, local_iva, thc_total = create_local_costs_table_fcl(
+            local_costs, local_quantity, db_costs=data.local_costs, highest_costs=data.uses_highest_local_costs
+        )
         
         local_section_elements = [
-            Paragraph("<b>GASTOS LOCALES EN DESTINO:</b>", styles['SectionHeader']),
+            render_assets.paragraph("<b>GASTOS LOCALES EN DESTINO:</b>", styles['SectionHeader']),
             Spacer(1, 10),
             local_table
         ]
         
         if is_multiport:
             local_section_elements.append(Spacer(1, 8))
-            multiport_note = Paragraph(
+            multiport_note = render_assets.paragraph(
                 '<i><font size="8" color="#666666">* Tarifario comparativo: Gastos locales mostrados por 1 contenedor. '
                 'Para cotización con múltiples contenedores, solicite cotización individual por ruta.</font></i>',
                 styles['Normal']
@@ -1852,7 +1757,7 @@ def generate_quote_pdf(quote_submission, scenario_data=None):
             elements.append(totals_table)
         
         elements.append(Spacer(1, 20))
-        elements.append(Paragraph("<b>NOTAS ADICIONALES:</b>", styles['SectionHeader']))
+        elements.append(render_assets.paragraph("<b>NOTAS ADICIONALES:</b>", styles['SectionHeader']))
         elements.append(Spacer(1, 10))
         
         transit_days = scenario_data.get('dias_transito', None)
@@ -1883,44 +1788,10 @@ def generate_quote_pdf(quote_submission, scenario_data=None):
         elements.extend(create_notes_section_fcl(transit_days, free_days, carrier_name, validity_date, is_multiport, has_emc, has_non_usd_currency))
         
     elif transport_type == 'LCL':
-        origin_ports = origin.split(' | ') if ' | ' in origin else [origin]
-        is_multiport = len(origin_ports) > 1
+        is_multiport = data.is_multiport
         
         if is_multiport:
-            from SalesModule.models import FreightRateFCL
-            from django.utils import timezone as dj_timezone
-            
-            ports_data = []
-            for pol in origin_ports:
-                pol_clean = pol.strip()
-                rate = FreightRateFCL.objects.filter(
-                    pol_name__icontains=pol_clean,
-                    pod_name__icontains='Guayaquil',
-                    transport_type__icontains='LCL',
-                    is_active=True,
-                    validity_date__gte=dj_timezone.now().date()
-                ).order_by('lcl_rate_per_cbm').first()
-                
-                if rate:
-                    ports_data.append({
-                        'pol': pol_clean,
-                        'validity': rate.validity_date,
-                        'free_days': rate.free_days,
-                        'transit_time': rate.transit_time or 'N/A',
-                        'rate_per_cbm': rate.lcl_rate_per_cbm or Decimal('0'),
-                        'min_charge': rate.lcl_min_charge or Decimal('0'),
-                    })
-                else:
-                    ports_data.append({
-                        'pol': pol_clean,
-                        'validity': 'Consultar',
-                        'free_days': 21,
-                        'transit_time': 'N/A',
-                        'rate_per_cbm': Decimal('0'),
-                        'min_charge': Decimal('0'),
-                    })
-            
-            freight_table = create_lcl_multiport_tarifario_table(ports_data, destination)
+            freight_table = create_lcl_multiport_tarifario_table(list(data.ports), destination)
             elements.append(freight_table)
             freight_total = Decimal('0')
         else:
@@ -1932,7 +1803,7 @@ def generate_quote_pdf(quote_submission, scenario_data=None):
             elements.append(freight_table)
         
         elements.append(Spacer(1, 15))
-        elements.append(Paragraph("<b>GASTOS LOCALES EN DESTINO:</b>", styles['SectionHeader']))
+        elements.append(render_assets.paragraph("<b>GASTOS LOCALES EN DESTINO:</b>", styles['SectionHeader']))
         elements.append(Spacer(1, 10))
         
         local_costs = scenario_data.get('costos_locales', {})
@@ -1948,7 +1819,7 @@ def generate_quote_pdf(quote_submission, scenario_data=None):
             elements.append(totals_table)
         
         elements.append(Spacer(1, 20))
-        elements.append(Paragraph("<b>NOTAS ADICIONALES:</b>", styles['SectionHeader']))
+        elements.append(render_assets.paragraph("<b>NOTAS ADICIONALES:</b>", styles['SectionHeader']))
         elements.append(Spacer(1, 10))
         
         transit_days = scenario_data.get('dias_transito', None)
@@ -1964,7 +1835,7 @@ def generate_quote_pdf(quote_submission, scenario_data=None):
         elements.append(freight_table)
         
         elements.append(Spacer(1, 15))
-        elements.append(Paragraph("<b>GASTOS LOCALES EN DESTINO:</b>", styles['SectionHeader']))
+        elements.append(render_assets.paragraph("<b>GASTOS LOCALES EN DESTINO:</b>", styles['SectionHeader']))
         elements.append(Spacer(1, 10))
         
         local_costs = scenario_data.get('costos_locales', {})
@@ -1979,7 +1850,7 @@ def generate_quote_pdf(quote_submission, scenario_data=None):
         elements.append(totals_table)
         
         elements.append(Spacer(1, 20))
-        elements.append(Paragraph("<b>NOTAS ADICIONALES:</b>", styles['SectionHeader']))
+        elements.append(render_assets.paragraph("<b>NOTAS ADICIONALES:</b>", styles['SectionHeader']))
         elements.append(Spacer(1, 10))
         
         transit_days = scenario_data.get('dias_transito', '3-5')
@@ -2040,31 +1911,18 @@ def generate_multi_scenario_pdf(quote_submission, scenarios):
     elements.append(create_intro_paragraph(transport_type, incoterm, destination, container_type))
     elements.append(Spacer(1, 15))
     
-    elements.append(Paragraph("<b>OPCIONES DE COTIZACIÓN:</b>", styles['SectionHeader']))
+    elements.append(render_assets.paragraph("<b>OPCIONES DE COTIZACIÓN:</b>", styles['SectionHeader']))
     elements.append(Spacer(1, 10))
     
-    header_style = ParagraphStyle(
-        name='ScenarioHeader',
-        fontSize=10,
-        textColor=WHITE,
-        fontName='Helvetica-Bold',
-        alignment=TA_CENTER
-    )
-    
-    cell_style = ParagraphStyle(
-        name='ScenarioCell',
-        fontSize=10,
-        textColor=DARK_TEXT,
-        fontName='Helvetica',
-        alignment=TA_CENTER
-    )
+    header_style = styles['ScenarioHeader']
+    cell_style = styles['ScenarioCell']
     
     scenario_data = [
         [
-            Paragraph('<b>Opción</b>', header_style),
-            Paragraph('<b>Servicio</b>', header_style),
-            Paragraph('<b>Tránsito</b>', header_style),
-            Paragraph('<b>Total USD</b>', header_style),
+            render_assets.paragraph('<b>Opción</b>', header_style),
+            render_assets.paragraph('<b>Servicio</b>', header_style),
+            render_assets.paragraph('<b>Tránsito</b>', header_style),
+            render_assets.paragraph('<b>Total USD</b>', header_style),
         ]
     ]
     
@@ -2081,7 +1939,7 @@ def generate_multi_scenario_pdf(quote_submission, scenarios):
         ])
     
     scenario_table = Table(scenario_data, colWidths=[0.8*inch, 2.5*inch, 1.5*inch, 1.5*inch])
-    scenario_table.setStyle(TableStyle([
+    scenario_table.setStyle(render_assets.asset('scenario_table_style', lambda: TableStyle([
         ('BACKGROUND', (0, 0), (-1, 0), DEEP_OCEAN_BLUE),
         ('TEXTCOLOR', (0, 0), (-1, 0), WHITE),
         ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
@@ -2091,7 +1949,7 @@ def generate_multi_scenario_pdf(quote_submission, scenarios):
         ('ROWBACKGROUNDS', (0, 1), (-1, -1), [WHITE, LIGHT_GRAY]),
         ('TOPPADDING', (0, 0), (-1, -1), 10),
         ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
-    ]))
+    ])))
     
     elements.append(scenario_table)
     
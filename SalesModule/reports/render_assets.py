@@ -0,0 +1,69 @@
+"""
+Render Assets for ImportaYa.ia quote PDFs
+Process-level cache of the immutable pieces of a quote PDF.
+
+Styles, the branded logo and the fixed text blocks (notes, legal terms,
+footer) are the same in every quote, yet each PDF rebuilt the stylesheet
+once per section and re-parsed every fixed paragraph. Here they are built
+once per process and reused:
+
+- asset(key, builder): read-only objects (stylesheet, TableStyle), built on
+  first use.
+- paragraph(text, style): fixed paragraphs are parsed once; every call
+  returns a shallow copy, because ReportLab keeps layout state (wrap, split)
+  on the flowable itself and two builds must never share one.
+
+Quote-specific tables and paragraphs are still created per request.
+"""
+import copy
+import threading
+
+from reportlab.platypus import Paragraph
+
+# Upper bound for cached paragraphs; only fixed texts should reach the cache
+MAX_PARAGRAPHS = 512
+
+_lock = threading.Lock()
+_assets = {}
+_paragraphs = {}
+_stats = {'asset_builds': 0, 'paragraph_builds': 0, 'paragraph_hits': 0}
+
+
+def asset(key, builder):
+    """Shared read-only object for `key`, built once with builder()"""
+    try:
+        return _assets[key]
+    except KeyError:
+        pass
+    with _lock:
+        if key not in _assets:
+            _assets[key] = builder()
+            _stats['asset_builds'] += 1
+        return _assets[key]
+
+
+def paragraph(text, style):
+    """Fresh copy of a fixed paragraph, parsed only the first time"""
+    key = (text, style.name)
+    cached = _paragraphs.get(key)
+    if cached is None or cached[0] is not style:
+        prototype = Paragraph(text, style)
+        with _lock:
+            _stats['paragraph_builds'] += 1
+            if len(_paragraphs) < MAX_PARAGRAPHS or key in _paragraphs:
+                _paragraphs[key] = (style, prototype)
+        return copy.copy(prototype)
+    _stats['paragraph_hits'] += 1
+    return copy.copy(cached[1])
+
+
+def clear():
+    """Drop every cached asset (the next PDF rebuilds them)"""
+    with _lock:
+        _assets.clear()
+        _paragraphs.clear()
+
+
+def stats():
+    with _lock:
+        return dict(_stats, assets=len(_assets), paragraphs=len(_paragraphs))
@@ -0,0 +1,368 @@
+"""
+Port & Carrier Resolver for ImportaYa.ia
+Normalización canónica de puertos (UN/LOCODE) y navieras (código).
+
+Cualquier escritura de un puerto ("SHANGHAI", "Shanghai, CN", "Shanghái",
+"CNSHA") se resuelve al mismo UN/LOCODE usando una tabla de alias
+precalculada a partir de los datos de load_ports, la tabla Port y alias
+comerciales conocidos. Las navieras se resuelven a su código canónico
+(MSC, CMA, HPG, ...) con la tabla CARRIER_NAME_TO_CODE del motor.
+
+La normalización de texto y las resoluciones se memorizan en cachés LRU
+acotados (la entrada es texto libre del usuario). El resolver de puertos se
+reconstruye cuando cambia la tabla Port: signals.py incrementa una versión
+compartida (shared_versions) y cada worker lo reconstruye al verla.
+"""
+import functools
+import logging
+import re
+import threading
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Puertos operados que no están en el catálogo de load_ports
+EXTRA_PUERTOS = [
+    {"locode": "ECPSJ", "name": "Posorja", "country": "Ecuador", "region": "Latinoamérica"},
+    {"locode": "ECMEC", "name": "Manta", "country": "Ecuador", "region": "Latinoamérica"},
+    {"locode": "ECPBO", "name": "Puerto Bolívar", "country": "Ecuador", "region": "Latinoamérica"},
+    {"locode": "ECESM", "name": "Esmeraldas", "country": "Ecuador", "region": "Latinoamérica"},
+    {"locode": "CNSHK", "name": "Shekou", "country": "China", "region": "Asia"},
+    {"locode": "CNYTN", "name": "Yantian", "country": "China", "region": "Asia"},
+    {"locode": "TWKEL", "name": "Keelung", "country": "Taiwán", "region": "Asia"},
+]
+
+# Alias comerciales / nombres en inglés usados por navieras y tarifarios
+PORT_ALIASES = {
+    'GYE': 'ECGYE',
+    'PSJ': 'ECPSJ',
+    'DP WORLD POSORJA': 'ECPSJ',
+    'MEC': 'ECMEC',
+    'PBO': 'ECPBO',
+    'XINGANG': 'CNTSN',
+    'TIANJIN-XINGANG': 'CNTSN',
+    'HUANGPU': 'CNGGZ',
+    'HUANGPU-GUANGZHOU': 'CNGGZ',
+    'NANSHA': 'CNGGZ',
+    'HONGKONG': 'HKHKG',
+    'PUSAN': 'KRPUS',
+    'TOKYO': 'JPTYO',
+    'SINGAPORE': 'SGSIN',
+    'ANTWERP': 'BEANR',
+    'ANTWERPEN': 'BEANR',
+    'HAMBURG': 'DEHAM',
+    'GENOA': 'ITGOA',
+    'GENOVA': 'ITGOA',
+    'PIRAEUS': 'GRPIR',
+    'MARSEILLE': 'FRMRS',
+    'ALEXANDRIA': 'EGALY',
+    'CAPE TOWN': 'ZACPT',
+    'SYDNEY': 'AUSYD',
+    'HO CHI MINH': 'VNSGN',
+    'HCMC': 'VNSGN',
+    'CAT LAI': 'VNSGN',
+    'JNPT': 'INNSA',
+    'NEW YORK': 'USNYC',
+    'NEW JERSEY': 'USNYC',
+}
+
+# Países y códigos ISO que suelen acompañar al nombre del puerto ("Shanghai, CN")
+COUNTRY_SUFFIXES = {
+    'CN', 'CHINA', 'EC', 'ECUADOR', 'US', 'USA', 'ESTADOS UNIDOS', 'HK', 'KR', 'KOREA',
+    'COREA DEL SUR', 'JP', 'JAPAN', 'JAPON', 'TW', 'TAIWAN', 'SG', 'SINGAPUR', 'VN', 'VIETNAM',
+    'IN', 'INDIA', 'DE', 'GERMANY', 'ALEMANIA', 'NL', 'PAISES BAJOS', 'NETHERLANDS', 'BE',
+    'BELGICA', 'BELGIUM', 'ES', 'SPAIN', 'ESPANA', 'IT', 'ITALY', 'ITALIA', 'PA', 'PANAMA',
+    'CO', 'COLOMBIA', 'PE', 'PERU', 'CL', 'CHILE', 'BR', 'BRASIL', 'BRAZIL', 'MX', 'MEXICO',
+}
+
+# Palabras que no distinguen a una naviera ("LINES", "CO. LTD.", ...)
+CARRIER_NOISE_WORDS = {
+    'CO', 'LTD', 'LIMITED', 'PTE', 'INC', 'SA', 'AS', 'AG', 'LLC', 'CORP',
+    'CORPORATION', 'COMPANY', 'LINE', 'LINES', 'SHIPPING', 'THE',
+}
+
+_PUNTUACION = re.compile(r'[^A-Z0-9]+')
+
+RESOLVERS_VERSION_KEY = 'resolvers:version'
+
+# Resoluciones distintas memorizadas por resolver (LRU)
+MAX_MEMO_RESOLUCIONES = 10_000
+
+
+@functools.lru_cache(maxsize=8192)
+def normalizar_texto(texto: str) -> str:
+    """
+    Normaliza texto para comparación: sin acentos, mayúsculas,
+    puntuación reemplazada por espacios.
+    Ej: "Shanghái, CN" -> "SHANGHAI CN"
+    """
+    if not texto:
+        return ''
+    sin_acentos = unicodedata.normalize('NFKD', str(texto))
+    sin_acentos = ''.join(c for c in sin_acentos if not unicodedata.combining(c))
+    return _PUNTUACION.sub(' ', sin_acentos.upper()).strip()
+
+
+def _variantes_nombre(nombre: str) -> Set[str]:
+    """Alias derivados de un nombre: completo, sin paréntesis, contenido del paréntesis, partes."""
+    variantes = {nombre}
+    base = nombre.split('(')[0]
+    variantes.add(base)
+    if '(' in nombre:
+        variantes.add(nombre.split('(', 1)[1].rstrip(')'))
+    for separador in ('-', '/'):
+        if separador in base:
+            variantes.update(base.split(separador))
+    return {normalizar_texto(v) for v in variantes if normalizar_texto(v)}
+
+
+class PortResolver:
+    """
+    Resuelve cualquier escritura de un puerto a su UN/LOCODE.
+    """
+
+    def __init__(self, puertos: Iterable[Dict], aliases: Optional[Dict[str, str]] = None,
+                 version: Optional[int] = None):
+        self.version = version
+        self._alias_a_locode: Dict[str, str] = {}
+        self._nombres: Dict[str, str] = {}
+        self._spellings: Dict[str, Set[str]] = {}
+        self._memo = functools.lru_cache(maxsize=MAX_MEMO_RESOLUCIONES)(self._resolver)
+
+        for puerto in puertos:
+            self.agregar_puerto(puerto['locode'], puerto['name'])
+
+        for alias, locode in (aliases or {}).items():
+            self.agregar_alias(alias, locode)
+
+    def agregar_puerto(self, locode: str, nombre: str) -> None:
+        locode = locode.upper().strip()
+        self._nombres.setdefault(locode, nombre)
+        self._alias_a_locode[locode] = locode
+        variantes = _variantes_nombre(nombre)
+        for variante in variantes:
+            self._alias_a_locode.setdefault(variante, locode)
+        spellings = self._spellings.setdefault(locode, set())
+        spellings.add(nombre.upper().strip())
+        spellings.update(variantes)
+
+    def agregar_alias(self, alias: str, locode: str) -> None:
+        clave = normalizar_texto(alias)
+        self._alias_a_locode[clave] = locode
+        self._spellings.setdefault(locode, set()).update({alias.upper().strip(), clave})
+
+    def resolve(self, texto: str) -> Optional[str]:
+        """
+        UN/LOCODE para el texto dado, o None si no se reconoce.
+        Ej: resolve('Shanghai, CN') -> 'CNSHA', resolve('GYE') -> 'ECGYE'
+        """
+        if not texto:
+            return None
+        return self._memo(texto)
+
+    def _resolver(self, texto: str) -> Optional[str]:
+        normalizado = normalizar_texto(texto)
+        if normalizado in self._alias_a_locode:
+            return self._alias_a_locode[normalizado]
+
+        # "Shanghai, CN" / "Guayaquil - Ecuador": probar el primer segmento
+        primer_segmento = normalizar_texto(re.split(r'[,(]| - ', str(texto))[0])
+        if primer_segmento in self._alias_a_locode:
+            return self._alias_a_locode[primer_segmento]
+
+        # "SHANGHAI CHINA": quitar sufijos de país
+        tokens = normalizado.split()
+        while len(tokens) > 1 and tokens[-1] in COUNTRY_SUFFIXES:
+            tokens = tokens[:-1]
+            candidato = ' '.join(tokens)
+            if candidato in self._alias_a_locode:
+                return self._alias_a_locode[candidato]
+
+        # "ECGYE" pegado sin espacio en otros textos
+        compacto = normalizado.replace(' ', '')
+        if len(compacto) == 5 and compacto in self._alias_a_locode:
+            return self._alias_a_locode[compacto]
+
+        return None
+
+    def canonical_name(self, locode: str) -> Optional[str]:
+        return self._nombres.get((locode or '').upper())
+
+    def search_variants(self, texto: str) -> List[str]:
+        """
+        Escrituras conocidas (en mayúsculas) del puerto resuelto, para
+        consultas exactas `campo__in=...` en lugar de `icontains`.
+        """
+        locode = self.resolve(texto)
+        if not locode:
+            return []
+        return sorted(self._spellings.get(locode, set()) | {locode})
+
+    def __len__(self) -> int:
+        return len(self._alias_a_locode)
+
+
+class CarrierResolver:
+    """
+    Resuelve nombres de navieras a su código canónico.
+    """
+
+    def __init__(self, aliases: Dict[str, str]):
+        self._exactos: Dict[str, str] = {}
+        self._compactos: Dict[str, str] = {}
+        self._memo = functools.lru_cache(maxsize=MAX_MEMO_RESOLUCIONES)(self._resolver)
+        for alias, code in aliases.items():
+            self.agregar_alias(alias, code)
+
+    @staticmethod
+    def compactar(texto: str) -> str:
+        """Quita palabras genéricas: 'COSCO SHIPPING LINES CO. LTD.' -> 'COSCO'"""
+        tokens = [t for t in normalizar_texto(texto).split() if t not in CARRIER_NOISE_WORDS]
+        return ' '.join(tokens)
+
+    def agregar_alias(self, alias: str, code: str) -> None:
+        self._exactos.setdefault(normalizar_texto(alias), code)
+        compacto = self.compactar(alias)
+        if compacto:
+            self._compactos.setdefault(compacto, code)
+
+    def resolve(self, nombre: str) -> Optional[str]:
+        if not nombre:
+            return None
+        return self._memo(nombre)
+
+    def _resolver(self, nombre: str) -> Optional[str]:
+        normalizado = normalizar_texto(nombre)
+        if normalizado in self._exactos:
+            return self._exactos[normalizado]
+
+        compacto = self.compactar(nombre)
+        if compacto in self._compactos:
+            return self._compactos[compacto]
+
+        # Coincidencia parcial (mismo criterio que get_carrier_code_from_name)
+        for alias, code in self._exactos.items():
+            if alias in normalizado or normalizado in alias:
+                return code
+
+        for alias, code in self._exactos.items():
+            if any(word in normalizado for word in alias.split() if len(word) > 3):
+                return code
+
+        return None
+
+
+_port_resolver: Optional[PortResolver] = None
+_carrier_resolver: Optional[CarrierResolver] = None
+_build_lock = threading.Lock()
+
+
+def _cargar_puertos() -> List[Dict]:
+    from .management.commands.load_ports import DATA_PUERTOS
+
+    puertos = list(DATA_PUERTOS) + list(EXTRA_PUERTOS)
+    try:
+        from .models import Port
+        puertos += [
+            {'locode': p['un_locode'], 'name': p['name']}
+            for p in Port.objects.filter(is_active=True).values('un_locode', 'name')
+        ]
+    except Exception as e:
+        logger.debug(f"Tabla Port no disponible para el resolver: {e}")
+    return puertos
+
+
+def obtener_version_resolvers() -> int:
+    from .shared_versions import leer_version
+    return leer_version(RESOLVERS_VERSION_KEY)
+
+
+def get_port_resolver() -> PortResolver:
+    """
+    Resolver de puertos del proceso (se construye en el primer uso); se
+    reconstruye si otro proceso cambió la tabla Port.
+    """
+    global _port_resolver
+    resolver = _port_resolver
+    if resolver is not None and resolver.version is None:
+        # Instalado con instalar_port_resolver: no se recarga desde la base
+        return resolver
+    version = obtener_version_resolvers()
+    if resolver is None or resolver.version != version:
+        with _build_lock:
+            if _port_resolver is None or _port_resolver.version != version:
+                _port_resolver = PortResolver(_cargar_puertos(), PORT_ALIASES, version=version)
+            resolver = _port_resolver
+    return resolver
+
+
+def instalar_port_resolver(puertos: Iterable[Dict]) -> PortResolver:
+    """
+    Resolver de puertos del proceso a partir de filas ya cargadas (procesos
+    sin acceso a la base); no se reconstruye por cambios de versión.
+    """
+    global _port_resolver
+    with _build_lock:
+        _port_resolver = PortResolver(puertos, PORT_ALIASES)
+    return _port_resolver
+
+
+def get_carrier_resolver() -> CarrierResolver:
+    """Resolver de navieras del proceso (se construye en el primer uso)."""
+    global _carrier_resolver
+    if _carrier_resolver is None:
+        with _build_lock:
+            if _carrier_resolver is None:
+                from .quotation_engine import CARRIER_NAME_TO_CODE
+                _carrier_resolver = CarrierResolver(CARRIER_NAME_TO_CODE)
+    return _carrier_resolver
+
+
+def refresh_resolvers() -> None:
+    """
+    Descarta los resolvers para que se reconstruyan con los datos actuales,
+    en este proceso y (vía la versión compartida) en los demás workers.
+    """
+    from .shared_versions import incrementar_version
+
+    global _port_resolver, _carrier_resolver
+    incrementar_version(RESOLVERS_VERSION_KEY)
+    with _build_lock:
+        _port_resolver = None
+        _carrier_resolver = None
+
+
+def resolve_port(texto: str) -> Optional[str]:
+    """Atajo: UN/LOCODE de un puerto."""
+    return get_port_resolver().resolve(texto)
+
+
+def resolve_carrier(nombre: str) -> Optional[str]:
+    """Atajo: código canónico de una naviera."""
+    return get_carrier_resolver().resolve(nombre)
+
+
+def codigo_destino(texto: str) -> Optional[str]:
+    """
+    Código de destino de las tarifas (ProviderRate.destination: GYE, PSJ,
+    UIO...) de un puerto de Ecuador, o None si no se reconoce.
+    """
+    codigo = resolve_port(texto or '')
+    if codigo and codigo.startswith('EC'):
+        return codigo[2:]
+    limpio = (texto or '').strip().upper()
+    return limpio if len(limpio) == 3 else None
+
+
+def filtro_puerto(campo: str, texto: str):
+    """
+    Q para filtrar un campo de puerto por sus escrituras canónicas (IN exacto).
+    Si el puerto no se reconoce, usa icontains como antes.
+    """
+    from django.db.models import Q
+
+    variantes = get_port_resolver().search_variants(texto)
+    if variantes:
+        return Q(**{f'{campo}__in': variantes})
+    return Q(**{f'{campo}__icontains': texto})
@@ -0,0 +1,73 @@
+"""
+Shared Versions for ImportaYa.ia
+Contadores de versión compartidos entre workers para las estructuras en memoria.
+
+El caché de cotizaciones, el índice de autocompletado, las tablas de
+referencia y el resolver de puertos se compilan una vez por proceso. Cuando
+cambian sus tablas, signals.py incrementa un contador en el caché de Django
+(CACHES en settings: tabla de la base o Redis, visible para todos los workers
+de gunicorn) y cada proceso recompila al ver una versión distinta.
+
+Leer el contador cuesta una consulta al caché compartido, así que cada
+proceso memoriza la versión leída durante SHARED_VERSION_CHECK_S segundos:
+una búsqueda caliente no toca la base, y otro worker ve el cambio a más
+tardar tras ese intervalo. El proceso que incrementa la ve de inmediato.
+"""
+import logging
+import threading
+import time
+from typing import Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Valor por defecto; se puede sobrescribir en settings
+SHARED_VERSION_CHECK_S = 2.0
+
+_lock = threading.Lock()
+_memo: Dict[str, Tuple[int, float]] = {}
+
+
+def intervalo_verificacion() -> float:
+    """Segundos durante los que un proceso reutiliza un valor compartido ya leído."""
+    from django.conf import settings
+    return float(getattr(settings, 'SHARED_VERSION_CHECK_S', SHARED_VERSION_CHECK_S))
+
+
+def leer_version(clave: str, defecto: int = 0) -> int:
+    """Versión compartida de `clave`; consulta el caché como máximo una vez por intervalo."""
+    ahora = time.monotonic()
+    memo = _memo.get(clave)
+    if memo is not None and ahora - memo[1] < intervalo_verificacion():
+        return memo[0]
+    try:
+        from django.core.cache import cache
+        valor = cache.get(clave)
+    except Exception as e:
+        logger.debug(f"Caché compartido no disponible para {clave}: {e}")
+        return memo[0] if memo is not None else defecto
+    version = int(valor) if valor is not None else defecto
+    with _lock:
+        _memo[clave] = (version, ahora)
+    return version
+
+
+def incrementar_version(clave: str) -> int:
+    """Incrementa la versión compartida de `clave` y la devuelve."""
+    from django.core.cache import cache
+
+    cache.add(clave, 0, timeout=None)
+    try:
+        version = cache.incr(clave)
+    except ValueError:
+        # La clave expiró entre add() e incr()
+        cache.set(clave, 1, timeout=None)
+        version = 1
+    with _lock:
+        _memo[clave] = (version, time.monotonic())
+    return version
+
+
+def olvidar_versiones() -> None:
+    """Descarta las versiones memorizadas (la siguiente lectura consulta el caché)."""
+    with _lock:
+        _memo.clear()
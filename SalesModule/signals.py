@@ -1,8 +1,8 @@
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_save, pre_save, post_delete
 from django.dispatch import receiver
 from django.utils import timezone
 from datetime import timedelta
-from .models import Lead
+from .models import Lead, Port, Airport
 
 @receiver(post_save, sender=Lead)
 def auto_update_lead_status(sender, instance, created, **kwargs):
@@ -29,3 +29,76 @@ def update_lead_status_signal(sender, instance, **kwargs):
                     instance.status = 'prospecto'
         except Lead.DoesNotExist:
             pass
+
+
+def invalidate_quote_cache(sender, **kwargs):
+    """
+    Invalidate cached quotation results when any pricing table changes
+    """
+    from .quote_cache import invalidar_cache_cotizaciones, invalidacion_suspendida
+    if invalidacion_suspendida():
+        return
+    invalidar_cache_cotizaciones(motivo=f"({sender.__name__} modificado)")
+
+
+def _connect_pricing_signals():
+    from django.apps import apps
+    from django.core.exceptions import ImproperlyConfigured
+    from .quote_cache import PRICING_MODELS
+
+    for model_name in PRICING_MODELS:
+        try:
+            model = apps.get_model('SalesModule', model_name)
+        except LookupError as e:
+            # Sin la señal, las cotizaciones cacheadas nunca se invalidarían
+            raise ImproperlyConfigured(f"quote_cache.PRICING_MODELS: el modelo {model_name} no existe") from e
+        post_save.connect(invalidate_quote_cache, sender=model, dispatch_uid=f'quote_cache_save_{model_name}')
+        post_delete.connect(invalidate_quote_cache, sender=model, dispatch_uid=f'quote_cache_delete_{model_name}')
+
+
+_connect_pricing_signals()
+
+
+@receiver([post_save, post_delete], sender=Port)
+def refresh_port_resolver(sender, **kwargs):
+    """
+    Rebuild the in-memory port alias table when the port catalog changes
+    """
+    from .resolvers import refresh_resolvers
+    refresh_resolvers()
+
+
+@receiver([post_save, post_delete], sender=Port)
+@receiver([post_save, post_delete], sender=Airport)
+def refresh_autocomplete_index(sender, **kwargs):
+    """
+    Mark the origin/destination autocomplete index as stale on catalog changes
+    """
+    from .autocomplete import invalidar_indice
+    invalidar_indice()
+
+
+def refresh_reference_tables(sender, **kwargs):
+    """
+    Mark the compiled insurance / security / inland tariff tables as stale
+    """
+    from .reference_tables import invalidar_tablas
+    invalidar_tablas()
+
+
+def _connect_reference_table_signals():
+    from django.apps import apps
+    from django.core.exceptions import ImproperlyConfigured
+    from .reference_tables import REFERENCE_MODELS
+
+    for model_name in REFERENCE_MODELS:
+        try:
+            model = apps.get_model('SalesModule', model_name)
+        except LookupError as e:
+            # Sin la señal, las tablas compiladas nunca se recompilarían
+            raise ImproperlyConfigured(f"reference_tables.REFERENCE_MODELS: el modelo {model_name} no existe") from e
+        post_save.connect(refresh_reference_tables, sender=model, dispatch_uid=f'reference_tables_save_{model_name}')
+        post_delete.connect(refresh_reference_tables, sender=model, dispatch_uid=f'reference_tables_delete_{model_name}')
+
+
+_connect_reference_table_signals()
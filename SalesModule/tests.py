@@ -7,7 +7,7 @@ Tests cover:
 2. Integration Tests - All endpoints for cotización, RO, tracking, pre-liquidation
 3. Security Tests - Authentication, authorization, input validation
 """
-from django.test import TestCase, TransactionTestCase
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
@@ -16,6 +16,8 @@ from django.contrib.auth import get_user_model
 from decimal import Decimal
 from datetime import date, timedelta
 import json
+import threading
+import time
 
 from .models import (
     Lead, Opportunity, Quote, LeadCotizacion, QuoteScenario, QuoteLineItem,
@@ -899,3 +901,2676 @@ class RateCalculationTests(TestCase):
         self.assertIsNotNone(cotizacion.flete_usd)
         self.assertIsNotNone(cotizacion.total_usd)
         self.assertGreater(cotizacion.total_usd, Decimal('0'))
+
+
+class QuoteCacheTests(TestCase):
+    """Tests for the quotation result cache"""
+
+    def setUp(self):
+        from .quote_cache import limpiar_cache_cotizaciones
+        limpiar_cache_cotizaciones()
+
+    def test_equivalent_inputs_share_cache_entry(self):
+        from .quote_cache import cachear_cotizacion
+        calls = []
+
+        @cachear_cotizacion('automatica')
+        def fake_quote(pol, pod, transport_type, container_type='20GP', quantity=1,
+                       weight_kg=None, volume_cbm=None, destination_port='GYE', apply_margins=True):
+            calls.append(pol)
+            return {'total': 100.0, 'items': [{'monto': 100.0}]}
+
+        first = fake_quote('Shanghai', 'Guayaquil', 'FCL', weight_kg=Decimal('1000'))
+        first['items'][0]['monto'] = 0
+        second = fake_quote(' shanghai ', 'GUAYAQUIL', 'fcl', weight_kg=1000.0)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(second['items'][0]['monto'], 100.0)
+
+    def test_invalidation_forces_recalculation(self):
+        from .quote_cache import cachear_cotizacion, invalidar_cache_cotizaciones
+        calls = []
+
+        @cachear_cotizacion('multipuerto')
+        def fake_multiport(origin_ports, destination_ports, transport_type, **kwargs):
+            calls.append(1)
+            return {'tarifas': []}
+
+        fake_multiport(['Shanghai', 'Ningbo'], ['GYE'], 'FCL')
+        fake_multiport(['Shanghai', 'Ningbo'], ['GYE'], 'FCL')
+        invalidar_cache_cotizaciones()
+        fake_multiport(['Shanghai', 'Ningbo'], ['GYE'], 'FCL')
+
+        self.assertEqual(len(calls), 2)
+
+    def test_saving_pricing_row_drops_cached_quote(self):
+        from django.conf import settings
+        from django.core.cache.backends.db import DatabaseCache
+        from .models import LogisticsProvider, ProviderRate
+        from .quote_cache import PRICING_VERSION_KEY, cachear_cotizacion, obtener_version_precios
+
+        provider = LogisticsProvider.objects.create(name='MSC', code='MSC', transport_type='FCL')
+        rate = ProviderRate.objects.create(
+            provider=provider, origin_port='SHANGHAI', origin_country='CN', destination='GYE',
+            container_type='40HC', rate_usd=Decimal('2500'), valid_from=date.today(),
+            valid_to=date.today() + timedelta(days=30),
+        )
+        calls = []
+
+        @cachear_cotizacion('automatica')
+        def cotizar(pol, pod, transport_type, **kwargs):
+            calls.append(pol)
+            return {'flete': ProviderRate.objects.get(pk=rate.pk).rate_usd}
+
+        self.assertEqual(cotizar('Shanghai', 'Guayaquil', 'FCL')['flete'], Decimal('2500'))
+        self.assertEqual(cotizar('Shanghai', 'Guayaquil', 'FCL')['flete'], Decimal('2500'))
+        version = obtener_version_precios()
+
+        rate.rate_usd = Decimal('2650')
+        rate.save()
+
+        self.assertEqual(cotizar('Shanghai', 'Guayaquil', 'FCL')['flete'], Decimal('2650'))
+        self.assertEqual(len(calls), 2)
+        # The new version is in the shared cache table, where the other gunicorn workers read it
+        if settings.CACHES['default']['BACKEND'].endswith('DatabaseCache'):
+            otro_worker = DatabaseCache(settings.CACHES['default']['LOCATION'], {})
+            self.assertGreater(otro_worker.get(PRICING_VERSION_KEY), version)
+
+    def test_missing_pricing_model_fails_loudly(self):
+        from unittest import mock
+        from django.core.exceptions import ImproperlyConfigured
+        from . import quote_cache, signals
+
+        with mock.patch.object(quote_cache, 'PRICING_MODELS', ['FreightRateFCL']):
+            with self.assertRaises(ImproperlyConfigured):
+                signals._connect_pricing_signals()
+
+    def test_shared_version_read_once_per_interval(self):
+        from django.core.cache import cache
+        from .shared_versions import incrementar_version, leer_version, olvidar_versiones
+
+        olvidar_versiones()
+        version = incrementar_version('tests:shared_version')
+        with self.assertNumQueries(0):
+            self.assertEqual(leer_version('tests:shared_version'), version)
+
+        # Another worker bumps the version: seen once the check interval has passed
+        cache.set('tests:shared_version', version + 5, timeout=None)
+        self.assertEqual(leer_version('tests:shared_version'), version)
+        with override_settings(SHARED_VERSION_CHECK_S=0):
+            self.assertEqual(leer_version('tests:shared_version'), version + 5)
+
+    def test_active_snapshots_read_once_per_interval(self):
+        from unittest import mock
+        from .quote_cache import construir_clave, limpiar_cache_cotizaciones
+
+        with mock.patch('SalesModule.rate_snapshots.obtener_snapshots_activos',
+                        return_value={'MARITIMO FCL': 7}) as leer:
+            clave = construir_clave('automatica', 'SHANGHAI')
+            self.assertEqual(construir_clave('automatica', 'SHANGHAI'), clave)
+            self.assertEqual(leer.call_count, 1)
+            self.assertIn((('MARITIMO FCL', 7),), clave)
+
+            # This process re-reads them right after clearing (snapshot activation does)
+            leer.return_value = {'MARITIMO FCL': 8}
+            limpiar_cache_cotizaciones()
+            self.assertIn((('MARITIMO FCL', 8),), construir_clave('automatica', 'SHANGHAI'))
+
+            # Other workers see the new snapshot once the check interval has passed
+            leer.return_value = {'MARITIMO FCL': 9}
+            construir_clave('automatica', 'SHANGHAI')
+            self.assertEqual(leer.call_count, 2)
+            with override_settings(SHARED_VERSION_CHECK_S=0):
+                self.assertIn((('MARITIMO FCL', 9),), construir_clave('automatica', 'SHANGHAI'))
+
+
+class RateSnapshotTests(TestCase):
+    """Tests for rate snapshot activation, rollback and quote recording"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    def test_scope_normalization(self):
+        from .rate_snapshots import normalizar_scope, SCOPE_FCL, SCOPE_LCL, SCOPE_AEREO
+        self.assertEqual(normalizar_scope('FCL'), SCOPE_FCL)
+        self.assertEqual(normalizar_scope('maritimo_lcl'), SCOPE_LCL)
+        self.assertEqual(normalizar_scope('Aereo'), SCOPE_AEREO)
+        self.assertIsNone(normalizar_scope('terrestre'))
+
+    def test_quote_submission_records_active_snapshot(self):
+        from .models import RateSnapshot, QuoteSubmission
+        snapshot = RateSnapshot.objects.create(scope='MARITIMO FCL', status='active', rows=[])
+
+        submission = QuoteSubmission.objects.create(
+            origin='Shanghai', destination='Guayaquil', transport_type='FCL',
+            company_name='ACME', contact_name='Ana', contact_email='ana@acme.ec',
+            contact_phone='0999999999', city='Guayaquil'
+        )
+
+        self.assertEqual(submission.rate_snapshot_id, snapshot.pk)
+
+    def _providers(self):
+        from .models import LogisticsProvider
+        self.msc = LogisticsProvider.objects.create(name='MSC', code='MSC', transport_type='FCL')
+        self.saco = LogisticsProvider.objects.create(name='SACO SHIPPING', code='SACO', transport_type='LCL')
+
+    def _row(self, provider, rate, container_type='40HC', origin='SHANGHAI'):
+        return {
+            'provider_id': provider.pk, 'origin_port': origin, 'origin_country': 'CN', 'destination': 'GYE',
+            'container_type': container_type, 'rate_usd': Decimal(rate), 'unit': 'CONTAINER',
+            'valid_from': date.today(), 'valid_to': date.today() + timedelta(days=30),
+        }
+
+    def _live(self, scope):
+        from .rate_snapshots import tarifas_vivas
+        return sorted((r.origin_port, r.rate_usd) for r in tarifas_vivas(scope))
+
+    def test_activation_replaces_only_the_scope_rates_and_archives_previous(self):
+        from .models import ProviderRate
+        from .rate_snapshots import SCOPE_FCL, SCOPE_LCL, activar_snapshot, crear_snapshot, publicar_tarifas
+
+        self._providers()
+        ProviderRate.objects.create(**dict(self._row(self.saco, '65', container_type='', origin='NINGBO'), unit='CBM'))
+        primero = publicar_tarifas('FCL', [self._row(self.msc, '2500')])
+
+        staged = crear_snapshot('FCL', [self._row(self.msc, '2650'), self._row(self.msc, '2400', origin='NINGBO')])
+        self.assertEqual(staged.status, 'staged')
+        self.assertEqual(self._live(SCOPE_FCL), [('SHANGHAI', Decimal('2500'))])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            activo = activar_snapshot(staged)
+
+        primero.refresh_from_db()
+        self.assertEqual(activo.status, 'active')
+        self.assertEqual(activo.previous_id, primero.pk)
+        self.assertEqual(primero.status, 'archived')
+        self.assertEqual(self._live(SCOPE_FCL), [('NINGBO', Decimal('2400')), ('SHANGHAI', Decimal('2650'))])
+        self.assertEqual(self._live(SCOPE_LCL), [('NINGBO', Decimal('65'))])
+        from .rate_snapshots import obtener_snapshot_activo_id
+        self.assertEqual(obtener_snapshot_activo_id('FCL'), activo.pk)
+
+    def test_rows_must_reference_providers_of_the_scope(self):
+        from .rate_snapshots import RateSnapshotError, crear_snapshot
+
+        self._providers()
+        with self.assertRaises(RateSnapshotError):
+            crear_snapshot('FCL', [self._row(self.saco, '65')])
+
+    def test_rollback_restores_previous_rates(self):
+        from .models import RateSnapshot
+        from .rate_snapshots import SCOPE_FCL, RateSnapshotError, publicar_tarifas, rollback_snapshot
+
+        self._providers()
+        with self.assertRaises(RateSnapshotError):
+            rollback_snapshot('FCL')
+
+        primero = publicar_tarifas('FCL', [self._row(self.msc, '2500')])
+        segundo = publicar_tarifas('FCL', [self._row(self.msc, '2900')])
+        self.assertEqual(self._live(SCOPE_FCL), [('SHANGHAI', Decimal('2900'))])
+
+        restaurado = rollback_snapshot('FCL')
+
+        self.assertEqual(restaurado.pk, primero.pk)
+        self.assertEqual(self._live(SCOPE_FCL), [('SHANGHAI', Decimal('2500'))])
+        self.assertEqual(RateSnapshot.objects.get(pk=segundo.pk).status, 'rolled_back')
+        self.assertEqual(RateSnapshot.objects.get(pk=primero.pk).status, 'active')
+
+    def test_incremental_load_registers_live_rates(self):
+        from .models import ProviderRate
+        from .rate_snapshots import publicar_tarifas, registrar_snapshot_activo
+
+        self._providers()
+        publicar_tarifas('FCL', [self._row(self.msc, '2500')])
+        ProviderRate.objects.create(**self._row(self.msc, '2300', origin='NINGBO'))
+
+        snapshot = registrar_snapshot_activo('FCL')
+
+        self.assertEqual(snapshot.row_count, 2)
+        self.assertEqual(snapshot.previous.status, 'archived')
+
+    def test_retention_prunes_old_archived_snapshots(self):
+        from .models import RateSnapshot
+        from .rate_snapshots import SNAPSHOT_RETENTION, publicar_tarifas
+
+        self._providers()
+        snapshots = [publicar_tarifas('FCL', [self._row(self.msc, str(2000 + i))]) for i in range(SNAPSHOT_RETENTION + 3)]
+
+        archivados = RateSnapshot.objects.filter(scope='MARITIMO FCL', status='archived')
+        self.assertEqual(archivados.count(), SNAPSHOT_RETENTION)
+        self.assertFalse(RateSnapshot.objects.filter(pk=snapshots[0].pk).exists())
+        self.assertEqual(RateSnapshot.objects.get(status='active').pk, snapshots[-1].pk)
+
+    def test_retention_keeps_snapshots_referenced_by_quotes(self):
+        from .models import QuoteSubmission, RateSnapshot
+        from .rate_snapshots import SNAPSHOT_RETENTION, publicar_tarifas
+
+        self._providers()
+        primero = publicar_tarifas('FCL', [self._row(self.msc, '2000')])
+        submission = QuoteSubmission.objects.create(
+            origin='Shanghai', destination='Guayaquil', transport_type='FCL',
+            company_name='ACME', contact_name='Ana', contact_email='ana@acme.ec',
+            contact_phone='0999999999', city='Guayaquil'
+        )
+        self.assertEqual(submission.rate_snapshot_id, primero.pk)
+
+        for i in range(SNAPSHOT_RETENTION + 2):
+            publicar_tarifas('FCL', [self._row(self.msc, str(2100 + i))])
+
+        submission.refresh_from_db()
+        self.assertEqual(submission.rate_snapshot_id, primero.pk)
+        self.assertEqual(RateSnapshot.objects.get(pk=primero.pk).rows[0]['rate_usd'], '2000')
+        self.assertEqual(
+            RateSnapshot.objects.filter(scope='MARITIMO FCL', status='archived').count(), SNAPSHOT_RETENTION + 1
+        )
+
+
+class RateImportTransformTests(TestCase):
+    """Tests for the vectorized rate file cleaning"""
+
+    def test_fcl_prices_dates_and_dedupe(self):
+        import pandas as pd
+        from .rate_import import FORMATS, transformar_dataframe
+
+        df = pd.DataFrame({
+            'POL o Puerto de origen': ['shanghai', 'Ningbo', 'shanghai', ''],
+            'POD o Puerto de destino': ['guayaquil', 'Guayaquil', 'guayaquil', 'Guayaquil'],
+            'NAVIERA FCL': ['MSC', 'CMA CGM', 'MSC', 'ONE'],
+            'VIGENCIA HASTA': ['31/12/2025', '2025-11-30', '31/12/2025', '31/12/2025'],
+            '20 GP': ['1,920.00', '', '2,000.50', '100'],
+            '40 NOR': ['0', '3,100', None, None],
+        })
+
+        registros, errores, duplicados = transformar_dataframe(df, FORMATS['fcl'])
+
+        self.assertEqual(duplicados, 1)
+        self.assertEqual(len(errores), 1)
+        por_carrier = {r['carrier_name']: r for r in registros}
+        self.assertEqual(por_carrier['MSC']['cost_20gp'], Decimal('2000.5'))
+        self.assertEqual(por_carrier['MSC']['pol_name'], 'SHANGHAI')
+        self.assertEqual(por_carrier['MSC']['validity_date'], date(2025, 12, 31))
+        self.assertEqual(por_carrier['CMA CGM']['validity_date'], date(2025, 11, 30))
+        self.assertEqual(por_carrier['CMA CGM']['cost_20gp'], Decimal('0.00'))
+        self.assertEqual(por_carrier['CMA CGM']['cost_nor'], Decimal('3100.0'))
+        self.assertEqual(por_carrier['CMA CGM']['free_days'], 21)
+        self.assertEqual(por_carrier['MSC']['transport_type'], 'MARITIMO FCL')
+
+    def test_air_simple_decimal_comma_and_required_cost(self):
+        import pandas as pd
+        from .rate_import import FORMATS, transformar_dataframe
+
+        df = pd.DataFrame({
+            'ORIGEN ': ['Miami', 'Madrid'],
+            'DESTINO': ['UIO', 'GYE'],
+            'LINEA': ['Avianca', 'Iberia'],
+            'MONEDA': ['DOLAR', 'EUROS'],
+            'FLETE AEREO': ['3,45', '/'],
+        })
+
+        registros, errores, _ = transformar_dataframe(df, FORMATS['air_simple'])
+
+        self.assertEqual(len(registros), 1)
+        self.assertEqual(registros[0]['cost_45'], Decimal('3.45'))
+        self.assertEqual(registros[0]['currency'], 'USD')
+        self.assertEqual(len(errores), 1)
+
+
+class RateImportTests(TestCase):
+    """Tests for importing rate sheets into ProviderRate"""
+
+    HEADER = 'POL o Puerto de origen;POD o Puerto de destino;NAVIERA FCL;VIGENCIA HASTA;TIEMPO DE TRANSITO;20 GP;40 HC\n'
+
+    def setUp(self):
+        from django.core.cache import cache
+        from .models import LogisticsProvider
+        cache.clear()
+        self.msc = LogisticsProvider.objects.create(name='MSC', code='MSC', transport_type='FCL')
+
+    def _importar(self, filas, **kwargs):
+        import io
+        from .rate_import import importar_tarifas
+        archivo = io.StringIO(self.HEADER + ''.join(f'{fila}\n' for fila in filas))
+        return importar_tarifas(archivo, 'fcl', nombre_archivo='tarifas.csv', **kwargs)
+
+    def _tarifas(self):
+        from .models import ProviderRate
+        return sorted(
+            (r.provider.name, r.origin_port, r.destination, r.container_type, r.rate_usd)
+            for r in ProviderRate.objects.select_related('provider')
+        )
+
+    def test_upsert_creates_rows_per_container_and_updates_changes(self):
+        from .models import ProviderRate, RateSnapshot
+
+        resultado = self._importar([
+            'SHANGHAI;GUAYAQUIL;MSC;31/12/2099;30-35 DIAS;1,920.00;2,800.00',
+            'NINGBO;POSORJA;MSC;31/12/2099;32;2,000.00;',
+        ])
+
+        self.assertEqual((resultado.created, resultado.updated), (3, 0))
+        self.assertEqual(self._tarifas(), [
+            ('MSC', 'NINGBO', 'PSJ', '20GP', Decimal('2000.00')),
+            ('MSC', 'SHANGHAI', 'GYE', '20GP', Decimal('1920.00')),
+            ('MSC', 'SHANGHAI', 'GYE', '40HC', Decimal('2800.00')),
+        ])
+        tarifa = ProviderRate.objects.get(origin_port='SHANGHAI', container_type='40HC')
+        self.assertEqual((tarifa.origin_country, tarifa.transit_days_min, tarifa.transit_days_max), ('CN', 30, 35))
+        self.assertEqual(RateSnapshot.objects.get(pk=resultado.snapshot_id).row_count, 3)
+
+        resultado = self._importar(['SHANGHAI;GUAYAQUIL;MSC;31/12/2099;30-35 DIAS;1,950.00;2,800.00'])
+
+        self.assertEqual((resultado.created, resultado.updated, resultado.unchanged), (0, 1, 1))
+        self.assertEqual(resultado.changes[0]['fields'], {'rate_usd': ['1920.00', '1950.00']})
+        self.assertEqual(ProviderRate.objects.count(), 3)
+
+    def test_replace_removes_rates_missing_from_file(self):
+        from .models import LogisticsProvider, ProviderRate, RateSnapshot
+
+        self._importar(['SHANGHAI;GUAYAQUIL;MSC;31/12/2099;30;1,920.00;2,800.00'])
+        resultado = self._importar(['NINGBO;GUAYAQUIL;CMA CGM;31/12/2099;30;2,100.00;'], mode='replace')
+
+        self.assertEqual((resultado.created, resultado.deleted), (1, 2))
+        self.assertEqual(self._tarifas(), [('CMA CGM', 'NINGBO', 'GYE', '20GP', Decimal('2100.00'))])
+        cma = LogisticsProvider.objects.get(name='CMA CGM')
+        self.assertEqual((cma.code, cma.transport_type), ('CMACGM', 'FCL'))
+        self.assertEqual(RateSnapshot.objects.get(status='active').pk, resultado.snapshot_id)
+        self.assertEqual(ProviderRate.objects.get().provider.name, 'CMA CGM')
+
+    def test_dry_run_reports_without_writing(self):
+        from .models import LogisticsProvider, ProviderRate, RateSnapshot
+
+        self._importar(['SHANGHAI;GUAYAQUIL;MSC;31/12/2099;30;1,920.00;'])
+        resultado = self._importar([
+            'SHANGHAI;GUAYAQUIL;MSC;31/12/2099;30;1,990.00;',
+            'NINGBO;GUAYAQUIL;ONE;31/12/2099;30;2,100.00;',
+            'BUSAN;LIMA;MSC;31/12/2099;30;2,100.00;',
+        ], mode='replace', dry_run=True)
+
+        self.assertEqual((resultado.created, resultado.updated, resultado.deleted), (1, 1, 0))
+        self.assertEqual(len(resultado.errors), 1)
+        self.assertIsNone(resultado.snapshot_id)
+        self.assertEqual(self._tarifas(), [('MSC', 'SHANGHAI', 'GYE', '20GP', Decimal('1920.00'))])
+        self.assertFalse(LogisticsProvider.objects.filter(name='ONE').exists())
+        self.assertEqual(RateSnapshot.objects.count(), 1)
+
+
+class ResolverTests(TestCase):
+    """Tests for canonical port and carrier resolution"""
+
+    def test_port_spellings_resolve_to_locode(self):
+        from .resolvers import resolve_port
+        for spelling in ['SHANGHAI', 'Shanghai, CN', 'Shanghái', 'CNSHA', 'shanghai china']:
+            self.assertEqual(resolve_port(spelling), 'CNSHA', spelling)
+        self.assertEqual(resolve_port('GYE'), 'ECGYE')
+        self.assertEqual(resolve_port('Xingang'), 'CNTSN')
+        self.assertEqual(resolve_port('Ningbo'), 'CNNBG')
+        self.assertIsNone(resolve_port('Puerto Inexistente'))
+
+    def test_search_variants_include_stored_spellings(self):
+        from .resolvers import get_port_resolver
+        variants = get_port_resolver().search_variants('Tianjin, CN')
+        self.assertIn('TIANJIN', variants)
+        self.assertIn('TIANJIN-XINGANG', variants)
+        self.assertIn('XINGANG', variants)
+
+    def test_carrier_names_resolve_to_code(self):
+        from .quotation_engine import get_carrier_code_from_name
+        self.assertEqual(get_carrier_code_from_name('Cosco Shipping Lines Co. Ltd.'), 'COSCO')
+        self.assertEqual(get_carrier_code_from_name('Hapag-Lloyd AG'), 'HPG')
+        self.assertEqual(get_carrier_code_from_name('CMA CGM'), 'CMA')
+
+    def test_resolution_memo_is_bounded(self):
+        from unittest import mock
+        from .resolvers import CarrierResolver, PortResolver, PORT_ALIASES
+        with mock.patch('SalesModule.resolvers.MAX_MEMO_RESOLUCIONES', 3):
+            puertos = PortResolver([{'locode': 'CNSHA', 'name': 'Shanghai'}], PORT_ALIASES)
+            navieras = CarrierResolver({'MSC': 'MSC'})
+        for i in range(20):
+            puertos.resolve(f'puerto inventado {i}')
+            navieras.resolve(f'naviera inventada {i}')
+        self.assertEqual(puertos._memo.cache_info().currsize, 3)
+        self.assertEqual(navieras._memo.cache_info().currsize, 3)
+        self.assertEqual(puertos.resolve('Shanghai, CN'), 'CNSHA')
+
+    def test_port_changes_in_another_worker_rebuild_the_resolver(self):
+        from django.core.cache import cache
+        from .models import Port
+        from .resolvers import RESOLVERS_VERSION_KEY, obtener_version_resolvers, resolve_port
+        from .shared_versions import olvidar_versiones
+
+        self.assertIsNone(resolve_port('Puerto Nuevo'))
+        # Otro worker guarda el puerto: aquí no llega la señal, solo la versión compartida
+        Port.objects.bulk_create([Port(name='Puerto Nuevo', country='Ecuador', un_locode='ECPNV', region='Latinoamérica')])
+        cache.set(RESOLVERS_VERSION_KEY, obtener_version_resolvers() + 1, timeout=None)
+        self.assertIsNone(resolve_port('Puerto Nuevo'))
+
+        olvidar_versiones()
+        self.assertEqual(resolve_port('Puerto Nuevo'), 'ECPNV')
+
+
+class LocationAutocompleteTests(APITestCase):
+    """Tests for the in-memory port/airport autocomplete index"""
+
+    def setUp(self):
+        from .autocomplete import invalidar_indice
+        invalidar_indice()
+        self.client = APIClient()
+        self.client.force_authenticate(user=TestDataFactory.create_lead_user())
+
+    def test_prefix_ranking_and_accents(self):
+        from .autocomplete import AutocompleteItem, PrefixTrie
+        items = [
+            AutocompleteItem('port', 'CNSHA', 'Shanghai', 'Shanghai', 'China', popularity=3),
+            AutocompleteItem('port', 'CNSZX', 'Shenzhen', 'Shenzhen', 'China', popularity=10),
+            AutocompleteItem('airport', 'SAO', 'São Paulo', 'São Paulo', 'Brasil'),
+        ]
+        trie = PrefixTrie(items)
+        self.assertEqual([i.code for i in trie.buscar('sh')], ['CNSZX', 'CNSHA'])
+        self.assertEqual([i.code for i in trie.buscar('sao pa')], ['SAO'])
+        self.assertEqual([i.code for i in trie.buscar('paulo')], ['SAO'])
+        self.assertEqual(trie.buscar('CNSHA')[0].code, 'CNSHA')
+
+    def test_kind_filter(self):
+        from .autocomplete import get_autocomplete_index
+        index = get_autocomplete_index()
+        resultados = index.search('CN', kind='port', limit=5)
+        self.assertTrue(resultados)
+        self.assertTrue(all(r['kind'] == 'port' for r in resultados))
+
+    def test_endpoint_etag_not_modified(self):
+        url = '/api/sales/autocomplete/locations/'
+        response = self.client.get(url, {'q': 'guaya', 'type': 'port'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['code'], 'ECGYE')
+        etag = response['ETag']
+
+        response = self.client.get(url, {'q': 'guaya', 'type': 'port'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        from .autocomplete import invalidar_indice
+        invalidar_indice()
+        response = self.client.get(url, {'q': 'guaya', 'type': 'port'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class ContainerMixOptimizerTests(TestCase):
+    """Tests for the cost-aware mixed container optimizer"""
+
+    def setUp(self):
+        from .container_logic import CostoContenedor
+        self.costos = {
+            '20GP': CostoContenedor('20GP', flete_usd=1800, local_variable_usd=150, local_fijo_usd=300),
+            '40GP': CostoContenedor('40GP', flete_usd=2600, local_variable_usd=200, local_fijo_usd=300),
+            '40HC': CostoContenedor('40HC', flete_usd=2700, local_variable_usd=200, local_fijo_usd=300),
+        }
+
+    def _fuerza_bruta(self, volumen, peso):
+        import itertools
+        from .container_logic import CONTENEDORES
+        mejor = None
+        for n20, n40, n40hc in itertools.product(range(6), repeat=3):
+            cantidades = {'20GP': n20, '40GP': n40, '40HC': n40hc}
+            if not any(cantidades.values()):
+                continue
+            vol = sum(float(CONTENEDORES[c].volumen_max_cbm) * n for c, n in cantidades.items())
+            kg = sum(float(CONTENEDORES[c].peso_max_kg) * n for c, n in cantidades.items())
+            if vol < volumen or kg < peso:
+                continue
+            costo = sum(self.costos[c].unitario_usd * n for c, n in cantidades.items()) + 300
+            mejor = costo if mejor is None else min(mejor, costo)
+        return mejor
+
+    def test_mixed_plan_beats_single_type(self):
+        from .container_logic import optimizar_mezcla_contenedores
+        planes = optimizar_mezcla_contenedores(90, 20000, costos=self.costos, top_k=3)
+        self.assertEqual(planes[0].cantidades, {'20GP': 1, '40GP': 1})
+        self.assertEqual(planes[0].costo_total_usd, 5050.0)
+        self.assertEqual(len(planes), 3)
+        self.assertEqual([p.costo_total_usd for p in planes], sorted(p.costo_total_usd for p in planes))
+
+    def test_matches_brute_force(self):
+        from .container_logic import optimizar_mezcla_contenedores
+        for volumen, peso in [(20, 26000), (31, 5000), (65, 30000), (100, 80000), (150, 40000)]:
+            plan = optimizar_mezcla_contenedores(volumen, peso, costos=self.costos, top_k=1)[0]
+            self.assertAlmostEqual(plan.costo_total_usd, self._fuerza_bruta(volumen, peso), places=2)
+            self.assertGreaterEqual(plan.capacidad_volumen_cbm, volumen)
+            self.assertGreaterEqual(plan.capacidad_peso_kg, peso)
+
+    def test_large_shipment_is_fast(self):
+        import time
+        from .container_logic import optimizar_mezcla_contenedores
+        inicio = time.perf_counter()
+        planes = optimizar_mezcla_contenedores(600, 150000, costos=self.costos, top_k=5)
+        self.assertLess(time.perf_counter() - inicio, 0.5)
+        self.assertEqual(len(planes), 5)
+
+    def test_without_rates_ranks_by_teu(self):
+        from .container_logic import optimizar_mezcla_contenedores
+        planes = optimizar_mezcla_contenedores(60, 10000, costos={})
+        self.assertIsNone(planes[0].costo_total_usd)
+        self.assertEqual(planes[0].cantidades, {'40HC': 1})
+
+    def test_fixed_local_costs_charged_once_per_bl(self):
+        from .container_logic import CostoContenedor, costo_plan_contenedores, optimizar_mezcla_contenedores
+        costos = dict(self.costos, **{'20GP': CostoContenedor('20GP', flete_usd=1800, local_variable_usd=150, local_fijo_usd=450)})
+
+        # 2 fletes + 2 variables + el mayor fijo (450), no 450 + 300
+        self.assertEqual(costo_plan_contenedores({'20GP': 1, '40GP': 1}, costos), 1950 + 2800 + 450)
+        self.assertEqual(costo_plan_contenedores({'40GP': 2}, costos), 2 * 2800 + 300)
+        self.assertIsNone(costo_plan_contenedores({'40NOR': 1}, costos))
+
+        plan = optimizar_mezcla_contenedores(90, 20000, costos=costos, top_k=1)[0]
+        self.assertEqual(plan.costo_total_usd, costo_plan_contenedores(plan.cantidades, costos))
+
+    def test_costs_from_live_provider_rates(self):
+        from .container_logic import costo_plan_contenedores, obtener_costos_contenedores, optimizar_mezcla_contenedores
+        from .models import LogisticsProvider, ProviderRate
+        msc = LogisticsProvider.objects.create(name='MSC', code='MSC', transport_type='FCL', priority=1)
+        cma = LogisticsProvider.objects.create(name='CMA CGM', code='CMACGM', transport_type='FCL', priority=2)
+        vigencia = {'valid_from': date.today(), 'valid_to': date.today() + timedelta(days=30)}
+        for provider, tipo, flete, thc in [(msc, '20GP', '1800', '150'), (msc, '40HC', '2700', '200'),
+                                           (cma, '40HC', '2900', '100')]:
+            ProviderRate.objects.create(
+                provider=provider, origin_port='SHANGHAI', origin_country='CN', destination='GYE',
+                container_type=tipo, rate_usd=Decimal(flete), thc_destination_usd=Decimal(thc), **vigencia
+            )
+
+        costos = obtener_costos_contenedores('Shanghai', 'Guayaquil')
+
+        self.assertEqual(set(costos), {'20GP', '40HC'})
+        # THC de destino de la naviera del flete (MSC), por contenedor
+        self.assertEqual((costos['40HC'].flete_usd, costos['40HC'].local_variable_usd), (2700.0, 200.0))
+        self.assertEqual((costos['20GP'].flete_usd, costos['20GP'].local_variable_usd), (1800.0, 150.0))
+        self.assertEqual(costos['40HC'].local_fijo_usd, 0.0)
+
+        plan = optimizar_mezcla_contenedores(90, 20000, pol='Shanghai', pod='Guayaquil', top_k=1)[0]
+        self.assertEqual(plan.costo_total_usd, costo_plan_contenedores(plan.cantidades, costos))
+
+    def test_selection_is_compared_with_optimal_plan(self):
+        from .container_logic import validar_seleccion_multicontenedor
+        resultado = validar_seleccion_multicontenedor(
+            [{'tipo': '40HC', 'cantidad': 2}], volumen_cbm=90, peso_kg=20000, costos=self.costos
+        )
+        self.assertTrue(resultado.cubre_carga)
+        self.assertEqual(resultado.costo_seleccion_usd, 2 * 2900 + 300)
+        self.assertEqual(resultado.plan_optimo.cantidades, {'20GP': 1, '40GP': 1})
+        self.assertEqual(resultado.ahorro_usd, 5800 + 300 - 5050)
+
+        resultado = validar_seleccion_multicontenedor(
+            [{'tipo': '20GP', 'cantidad': 1}], volumen_cbm=90, peso_kg=20000, costos=self.costos
+        )
+        self.assertFalse(resultado.cubre_carga)
+        self.assertIn('Sugerencia: 1x20GP + 1x40GP', resultado.advertencias)
+
+    def test_container_plan_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(user=TestDataFactory.create_lead_user())
+        url = '/api/sales/quote-builder/container-plan/'
+
+        response = client.post(url, {'volumen_cbm': 60, 'peso_kg': 10000}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['planes'][0]['resumen'], '1x40HC')
+
+        response = client.post(url, {'volumen_cbm': 60, 'peso_kg': 10000,
+                                     'selecciones': [{'tipo': '20GP', 'cantidad': 1}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data['cubre_carga'])
+        self.assertEqual(response.data['plan_optimo']['resumen'], '1x40HC')
+
+        response = client.post(url, {'volumen_cbm': 60}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BatchChargeableWeightTests(TestCase):
+    """Tests for the vectorized packing-list chargeable weight calculator"""
+
+    LINEAS = [
+        # largo, ancho, alto, unidad, peso, unidad_peso
+        (50, 40, 30, 'CMT', 45, 'KGM'),
+        (120, 100, 80, 'CMT', 200, 'KGM'),
+        (20, 16, 12, 'INH', 100, 'LBR'),
+        (1.2, 0.8, 0.75, 'MTR', 0.35, 'TNE'),
+        (33.333, 21.005, 17.125, 'cm', 2.0005, 'kg'),
+        (10.123456789, 3, 4, 'CMT', 1.5, 'KGM'),
+    ]
+
+    def _columnas(self):
+        return [list(c) for c in zip(*self.LINEAS)]
+
+    def test_matches_scalar_calculator(self):
+        from .batch_calculator import calcular_peso_cobrable_lote
+        from .calculator import calcular_peso_cobrable_completo
+        largo, ancho, alto, ud, peso, up = self._columnas()
+        for tipo in ['AEREO', 'LCL', 'FCL']:
+            lote = calcular_peso_cobrable_lote(largo, ancho, alto, peso, tipo, ud, up)
+            for i, linea in enumerate(self.LINEAS):
+                esperado = calcular_peso_cobrable_completo(*linea[:5], linea[5], tipo)
+                obtenido = lote.resultado(i)
+                for campo in ['peso_bruto_kg', 'peso_volumetrico_kg', 'peso_cobrable',
+                              'unidad_cobrable', 'volumen_cbm', 'base_cobro']:
+                    self.assertEqual(getattr(obtenido, campo), getattr(esperado, campo), f"{tipo} {i} {campo}")
+
+    def test_invalid_lines_are_reported(self):
+        from .batch_calculator import calcular_peso_cobrable_lote
+        lote = calcular_peso_cobrable_lote(
+            [10, -1, 10, 10], [10, 10, 10, 10], [10, 10, 10, 10], [5, 5, 'abc', 5],
+            'AEREO', ['CMT', 'CMT', 'CMT', 'YARDAS']
+        )
+        self.assertEqual(lote.validos.tolist(), [True, False, False, False])
+        self.assertEqual([e['linea'] for e in lote.errores], [1, 2, 3])
+        self.assertEqual(lote.totales()['lineas_validas'], 1)
+
+    def test_totals_apply_pieces(self):
+        from .batch_calculator import calcular_peso_cobrable_lote
+        lote = calcular_peso_cobrable_lote(
+            [100, 60], [100, 50], [100, 40], [300, 5], 'LCL', piezas=[2, 10]
+        )
+        totales = lote.totales()
+        self.assertEqual(totales['piezas'], 12)
+        self.assertEqual(totales['volumen_cbm'], 3.2)
+        self.assertEqual(totales['peso_bruto_kg'], 650.0)
+        self.assertEqual(totales['peso_cobrable'], 3.2)
+        self.assertEqual(totales['unidad_cobrable'], 'CBM')
+
+
+class PackingListIngestionTests(TestCase):
+    """Tests for deterministic XLSX/CSV packing list parsing"""
+
+    def _xlsx(self, filas):
+        import io
+        from openpyxl import Workbook
+        libro = Workbook(write_only=True)
+        hoja = libro.create_sheet('PL')
+        for fila in filas:
+            hoja.append(fila)
+        buffer = io.BytesIO()
+        libro.save(buffer)
+        buffer.seek(0)
+        return buffer
+
+    def test_xlsx_with_title_rows_and_totals(self):
+        from .packing_list import procesar_packing_list
+        archivo = self._xlsx([
+            ['ACME TRADING CO.'],
+            ['PACKING LIST'],
+            [],
+            ['DESCRIPTION', 'QTY (PCS)', 'CTNS', 'N.W. (KGS)', 'G.W. (KGS)', 'CARTON SIZE (CM)', 'MEAS (CBM)'],
+            ['LED lamp', 100, 10, 90.5, 100.25, '50x40x30', 0.6],
+            ['LED strip', 50, 5, 40, 45, '60*40*50', 0.6],
+            ['TOTAL', 150, 15, 130.5, 145.25, '', 1.2],
+        ])
+        resumen = procesar_packing_list(archivo, 'pl.xlsx', 'LCL', chunk_size=1)
+        self.assertEqual(resumen.columnas['piezas'], 'CTNS')
+        self.assertEqual(resumen.unidad_dimensiones, 'CMT')
+        self.assertEqual(resumen.filas_validas, 2)
+        self.assertEqual(resumen.piezas, 15)
+        self.assertEqual(resumen.volumen_cbm, 1.2)
+        self.assertEqual(resumen.peso_bruto_kg, 145.25)
+        self.assertEqual(resumen.peso_neto_kg, 130.5)
+        self.assertTrue(resumen.contenedor['es_lcl'])
+
+    def test_csv_semicolon_latin1_with_unit_inference(self):
+        import io
+        from .packing_list import procesar_packing_list
+        contenido = (
+            "Descripción;Cajas;Peso Bruto;Largo;Ancho;Alto\n"
+            "Sillas;5;120,5;0,6;0,5;0,9\n"
+            "Mesas;2;80;1,2;0,8;0,75\n"
+        ).encode('latin-1')
+        resumen = procesar_packing_list(io.BytesIO(contenido), 'pl.csv', 'aereo')
+        self.assertEqual(resumen.unidad_dimensiones, 'MTR')
+        self.assertEqual(resumen.piezas, 7)
+        self.assertEqual(resumen.volumen_cbm, 2.79)
+        datos = resumen.to_dict()
+        self.assertEqual(datos['unidad_cobrable'], 'KG')
+        self.assertEqual(datos['peso_cobrable'], 465.0)
+
+    def test_gross_weight_total_matches_declared_line_weights(self):
+        import io
+        from .packing_list import procesar_packing_list
+        contenido = (
+            "CTNS,G.W. (KGS),CARTON SIZE (CM)\n"
+            "3,100,50x40x30\n"
+            "7,10.01,60x40x50\n"
+        ).encode()
+        resumen = procesar_packing_list(io.BytesIO(contenido), 'pl.csv', 'LCL', optimizar=False)
+        # round(100/3, 3) × 3 = 99.999: el total debe ser el peso declarado de cada línea
+        self.assertEqual(resumen.peso_bruto_kg, 110.01)
+        self.assertEqual(resumen.piezas, 10)
+        self.assertEqual(resumen.unidad_dimensiones_origen, 'encabezado')
+
+    def test_inferred_dimension_unit_is_reported(self):
+        import io
+        from .packing_list import procesar_packing_list
+        contenido = (
+            "Cajas;Peso Bruto;Largo;Ancho;Alto\n"
+            "5;120;0,6;0,5;0,9\n"
+            "2;80;120;80;75\n"
+        ).encode()
+        resumen = procesar_packing_list(io.BytesIO(contenido), 'pl.csv', 'LCL', chunk_size=1, optimizar=False)
+        datos = resumen.to_dict()
+        self.assertEqual(datos['unidad_dimensiones'], 'MTR')
+        self.assertEqual(datos['unidad_dimensiones_origen'], 'inferida')
+        self.assertEqual(len(datos['advertencias']), 1)
+        self.assertIn('CMT', datos['advertencias'][0])
+
+    def test_unrecognized_file_raises(self):
+        import io
+        from .packing_list import procesar_packing_list, PackingListError
+        with self.assertRaises(PackingListError):
+            procesar_packing_list(io.BytesIO(b"hola,mundo\n1,2\n"), 'otro.csv')
+
+
+class LandedCostSimulatorTests(APITestCase):
+    """Tests for the landed-cost what-if grid simulator"""
+
+    def setUp(self):
+        from unittest import mock
+        from .models import InlandFCLTariff
+        InlandFCLTariff.objects.create(destination_city='Quito', container_type='40HC', rate_usd=Decimal('900.00'))
+
+        self.cotizaciones = []
+
+        def fake_quote(pol, pod, transport_type, container_type='20GP', **kwargs):
+            self.cotizaciones.append((transport_type, container_type))
+            flete = {'FCL': 2000.0 if container_type == '20GP' else 3000.0, 'LCL': 400.0, 'AEREO': 1500.0}[transport_type]
+            return {
+                'totales': {'fletes': flete, 'gastos_locales': 300.0, 'iva': 45.0, 'grand_total_usd': flete + 345.0},
+                'metadata': {'carrier': 'MSC'},
+                'errors': [],
+                'warnings': [],
+            }
+
+        self.seguro = mock.Mock(return_value={'total': 50.0, 'tramo_encontrado': True})
+        self.patch_seguro = mock.patch('SalesModule.quotation_engine.calcular_seguro', self.seguro)
+        patches = [
+            mock.patch('SalesModule.quotation_engine.generar_cotizacion_automatica', side_effect=fake_quote),
+            self.patch_seguro,
+            mock.patch('SalesModule.quotation_engine.calcular_servicios_seguridad',
+                       return_value={'items': [{}], 'total': 230.0, 'has_security': True}),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_grid_loads_each_price_once(self):
+        from .landed_cost_simulator import simular_costos_importacion
+        resultado = simular_costos_importacion(
+            'Shanghai', 'Guayaquil', 10000, peso_kg=5000, volumen_cbm=20,
+            transportes=['FCL', 'LCL'], contenedores=['20GP', '40HC'],
+            ciudades=['Guayaquil', 'Quito'], incoterms=['FOB', 'CIF'], isd=[True, False],
+        )
+        self.assertEqual(len(resultado.escenarios), 24)
+        self.assertEqual(sorted(self.cotizaciones), [('FCL', '20GP'), ('FCL', '40HC'), ('LCL', '20GP')])
+        self.assertEqual(self.seguro.call_count, 1)
+        totales = [e.total_landed_usd for e in resultado.escenarios]
+        self.assertEqual(totales, sorted(totales))
+        self.assertEqual(resultado.mejor.incoterm, 'CIF')
+        self.assertFalse(resultado.mejor.aplica_isd)
+        mejor_fob = next(e for e in resultado.escenarios if e.incoterm == 'FOB')
+        self.assertEqual(mejor_fob.transport_type, 'LCL')
+
+    def test_fob_and_cif_breakdown(self):
+        from .landed_cost_simulator import simular_costos_importacion
+        from .money import Money
+        resultado = simular_costos_importacion(
+            'Shanghai', 'Guayaquil', 10000, transportes='FCL', contenedores=['20GP', '40HC'],
+            ciudades='Quito', incoterms=['FOB', 'CIF'], seguridad=['NINGUNA', 'COMPLETA'],
+        )
+        celdas = {(e.container_type, e.incoterm, e.seguridad): e for e in resultado.escenarios}
+
+        fob = celdas[('20GP', 'FOB', 'NINGUNA')]
+        self.assertEqual(fob.valor_cif_usd, Money.of('12050.00'))
+        self.assertEqual(fob.ad_valorem_usd, Money.of('1205.00'))
+        self.assertEqual(fob.fodinfa_usd, Money.of('60.25'))
+        self.assertEqual(fob.iva_importacion_usd, Money.of('1997.29'))
+        self.assertEqual(fob.isd_usd, Money.of('500.00'))
+        self.assertIn('Sin tarifa de transporte interno a Quito', fob.advertencias)
+
+        cif = celdas[('40HC', 'CIF', 'COMPLETA')]
+        self.assertEqual(cif.flete_usd, Money.of('0.00'))
+        self.assertEqual(cif.seguro_usd, Money.of('0.00'))
+        self.assertEqual(cif.valor_cif_usd, Money.of('10000.00'))
+        self.assertEqual(cif.transporte_interno_usd, Money.of('900.00'))
+        self.assertEqual(cif.seguridad_usd, Money.of('230.00'))
+        self.assertEqual(
+            cif.total_landed_usd,
+            Money.of('10000.00') + Money.of('345.00') + Money.of('900.00') + Money.of('230.00') + cif.tributos_usd,
+        )
+
+    def test_unpriced_scenarios_rank_last(self):
+        from unittest import mock
+        from .landed_cost_simulator import simular_costos_importacion
+
+        def falla_aereo(pol, pod, transport_type, container_type='20GP', **kwargs):
+            if transport_type == 'AEREO':
+                raise ValueError('Sin tarifas aéreas')
+            return {'totales': {'fletes': 400.0, 'gastos_locales': 300.0, 'iva': 45.0}, 'metadata': {}}
+
+        with mock.patch('SalesModule.quotation_engine.generar_cotizacion_automatica', side_effect=falla_aereo):
+            resultado = simular_costos_importacion(
+                'Shanghai', 'Guayaquil', 10000, transportes=['LCL', 'AEREO'], incoterms=['FOB', 'CIF'],
+            )
+
+        self.assertEqual([e.transport_type for e in resultado.escenarios], ['LCL', 'LCL', 'AEREO', 'AEREO'])
+        self.assertEqual(resultado.mejor.transport_type, 'LCL')
+        self.assertEqual(set(resultado.mejor_por_transporte()), {'LCL'})
+        datos = resultado.to_dict()
+        self.assertEqual(datos['escenarios_sin_tarifa'], 2)
+        self.assertFalse(datos['escenarios'][-1]['cotizado'])
+
+    def test_insurance_from_the_active_rate(self):
+        from .landed_cost_simulator import simular_costos_importacion
+        from .models import InsuranceRate
+        from .money import Money
+        self.patch_seguro.stop()
+        InsuranceRate.objects.create(name='Básico', rate_percentage=Decimal('0.350'), min_premium_usd=Decimal('25.00'))
+
+        resultado = simular_costos_importacion(
+            'Shanghai', 'Guayaquil', 10000, transportes='LCL', incoterms=['FOB', 'CIF'],
+        )
+        celdas = {e.incoterm: e for e in resultado.escenarios}
+
+        # 0.35% de 10,000 = 35.00 + IVA 15% = 40.25
+        self.assertEqual(celdas['FOB'].seguro_usd, Money.of('40.25'))
+        self.assertEqual(celdas['CIF'].seguro_usd, Money.of('0.00'))
+        self.assertFalse(any('seguro' in a.lower() for a in celdas['FOB'].advertencias))
+
+    def test_invalid_options(self):
+        from .landed_cost_simulator import simular_costos_importacion
+        with self.assertRaises(ValueError):
+            simular_costos_importacion('Shanghai', 'Guayaquil', 10000, incoterms=['DDP'])
+        with self.assertRaises(ValueError):
+            simular_costos_importacion('Shanghai', 'Guayaquil', 0)
+
+    def test_endpoint(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=TestDataFactory.create_lead_user())
+        url = '/api/sales/simulator/landed-cost/'
+        response = self.client.post(url, {
+            'pol': 'Shanghai', 'pod': 'Guayaquil', 'valor_mercancia_usd': 10000,
+            'transportes': ['LCL', 'AEREO'], 'isd': ['true', 'false'],
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['exito'])
+        self.assertEqual(response.data['total_escenarios'], 4)
+        self.assertEqual(set(response.data['mejor_por_transporte']), {'LCL', 'AEREO'})
+
+        response = self.client.post(url, {'pol': 'Shanghai', 'pod': 'Guayaquil', 'valor_mercancia_usd': 10000,
+                                          'incoterms': ['XYZ']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ProviderRateQuotationTests(TestCase):
+    """Freight lookups and automatic quotes priced from live ProviderRate rows"""
+
+    def setUp(self):
+        from .models import LogisticsProvider, ProviderRate
+        from .quote_cache import limpiar_cache_cotizaciones
+        limpiar_cache_cotizaciones()
+
+        hoy = date.today()
+        msc = LogisticsProvider.objects.create(name='MSC', code='MSC', transport_type='FCL', priority=1)
+        cma = LogisticsProvider.objects.create(name='CMA CGM', code='CMACGM', transport_type='FCL', priority=2)
+        saco = LogisticsProvider.objects.create(name='SACO SHIPPING', code='SACO', transport_type='LCL')
+        latam = LogisticsProvider.objects.create(name='LATAM CARGO', code='LATAM', transport_type='AEREO')
+
+        def tarifa(provider, rate, **kwargs):
+            campos = {
+                'provider': provider, 'origin_port': 'SHANGHAI', 'origin_country': 'CN', 'destination': 'GYE',
+                'rate_usd': Decimal(rate), 'transit_days_min': 30, 'transit_days_max': 35,
+                'valid_from': hoy, 'valid_to': hoy + timedelta(days=30),
+            }
+            campos.update(kwargs)
+            return ProviderRate.objects.create(**campos)
+
+        tarifa(msc, '2000', container_type='20GP')
+        tarifa(msc, '3000', container_type='40HC')
+        tarifa(cma, '2800', container_type='40HC', transit_days_min=28, transit_days_max=28,
+               thc_destination_usd=Decimal('250'))
+        tarifa(cma, '1000', container_type='40HC', valid_from=hoy - timedelta(days=60),
+               valid_to=hoy - timedelta(days=1))
+        tarifa(msc, '2500', container_type='40HC', destination='PSJ')
+        tarifa(saco, '65', unit='CBM')
+        tarifa(latam, '5.00', unit='KG+45')
+        tarifa(latam, '4.20', unit='KG+100')
+
+    def test_freight_from_the_cheapest_live_rate(self):
+        from .quotation_engine import obtener_tarifa_flete
+
+        fcl = obtener_tarifa_flete('Shanghai', 'Guayaquil', 'FCL', container_type='40HC')
+        self.assertEqual((fcl['carrier'], fcl['monto'], fcl['pod']), ('CMA CGM', 2800.0, 'GYE'))
+        self.assertEqual(fcl['transit_time'], '28 días')
+
+        lcl = obtener_tarifa_flete('Shanghai', 'GYE', 'LCL', weight_kg=Decimal('500'), volume_cbm=Decimal('2'))
+        self.assertEqual(lcl['monto'], 130.0)
+
+        aereo = obtener_tarifa_flete('Shanghai', 'GYE', 'AEREO', weight_kg=Decimal('500'), volume_cbm=Decimal('2'))
+        self.assertEqual((aereo['weight_break'], aereo['monto']), ('KG+100', 2100.0))
+        liviano = obtener_tarifa_flete('Shanghai', 'GYE', 'AEREO', weight_kg=Decimal('30'))
+        self.assertEqual((liviano['weight_break'], liviano['monto']), ('KG+45', 150.0))
+
+        self.assertIsNone(obtener_tarifa_flete('Shanghai', 'Guayaquil', 'FCL', container_type='40NOR'))
+
+    def test_scenarios_and_multiport_from_real_rates(self):
+        from .quotation_engine import generar_cotizacion_multipuerto, generar_escenarios_cotizacion
+
+        resultado = generar_escenarios_cotizacion('Shanghai', 'Guayaquil', 'FCL', container_type='40HC')
+        escenarios = {e['escenario']: e['metadata']['carrier'] for e in resultado['escenarios']}
+        # CMA CGM es la más barata y también la más rápida: no hay escenario EXPRESS aparte
+        self.assertEqual(escenarios, {'ECONOMICO': 'CMA CGM', 'ESTANDAR': 'MSC'})
+
+        multipuerto = generar_cotizacion_multipuerto(['Shanghai'], ['GYE', 'Posorja'], 'FCL', container_type='40HC')
+        self.assertEqual([(t['pod'], t['carrier'], t['precio_flete']) for t in multipuerto['tarifas']],
+                         [('Posorja', 'MSC', 2875.0), ('GYE', 'CMA CGM', 3220.0)])
+
+    def test_simulator_prices_every_transport_from_real_rates(self):
+        from .landed_cost_simulator import simular_costos_importacion
+        from .money import Money
+
+        resultado = simular_costos_importacion(
+            'Shanghai', 'Guayaquil', 10000, peso_kg=500, volumen_cbm=2,
+            transportes=['FCL', 'LCL', 'AEREO'], contenedores='40HC', incoterms='FOB',
+        )
+        celdas = {e.transport_type: e for e in resultado.escenarios}
+
+        self.assertTrue(all(e.cotizado for e in resultado.escenarios))
+        # 2800 + 15% y THC de destino de la misma naviera: 250 + 15%
+        self.assertEqual(celdas['FCL'].flete_usd, Money.of('3220.00'))
+        self.assertEqual(celdas['FCL'].gastos_locales_usd, Money.of('287.50'))
+        self.assertEqual(celdas['FCL'].carrier, 'CMA CGM')
+        # 2 CBM × 65 + 15%; 500 kg × 4.20 (escala KG+100) + 15%
+        self.assertEqual(celdas['LCL'].flete_usd, Money.of('149.50'))
+        self.assertEqual(celdas['AEREO'].flete_usd, Money.of('2415.00'))
+
+
+class BatchDutyEngineTests(TestCase):
+    """Tests for the multi-line pre-liquidation duty engine"""
+
+    def setUp(self):
+        from .models import CustomsDutyRate
+        CustomsDutyRate.objects.create(hs_code='8471.30.00', description='Laptops', ad_valorem_percentage=Decimal('0'))
+        CustomsDutyRate.objects.create(hs_code='61091000', description='Camisetas', ad_valorem_percentage=Decimal('25.5'))
+
+    def _escalar(self, cif, ad_valorem_pct):
+        from decimal import ROUND_HALF_UP
+        q = lambda v: v.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        ad_valorem = q(cif * ad_valorem_pct / 100)
+        fodinfa = q(cif * Decimal('0.005'))
+        iva = q((cif + ad_valorem + fodinfa) * Decimal('0.15'))
+        return ad_valorem, fodinfa, iva
+
+    def test_rates_resolved_in_one_query(self):
+        from .duty_engine import resolver_tasas
+        with self.assertNumQueries(1):
+            tasas = resolver_tasas(['84713000', '6109.10.00', '8471.30.00'])
+        self.assertEqual(tasas['84713000']['ad_valorem'], 0)
+        self.assertEqual(tasas['61091000']['ad_valorem'], 2550)
+
+    def test_prorating_and_per_line_tributes(self):
+        from .duty_engine import liquidar_factura
+        lineas = [
+            {'hs_code': '8471.30.00', 'fob_value_usd': '1000.00'},
+            {'hs_code': '6109.10.00', 'cantidad': 3, 'precio_unitario': '333.33'},
+            {'hs_code': '9999.99.99', 'fob_value_usd': '1.01'},
+        ]
+        resultado = liquidar_factura(lineas, flete_usd='100.00', seguro_usd='10.01', aplicar_isd=True)
+        totales = resultado.totales()
+        self.assertEqual(totales['flete_usd'], Decimal('100.00'))
+        self.assertEqual(totales['seguro_usd'], Decimal('10.01'))
+        self.assertEqual(totales['cif_usd'], totales['fob_usd'] + Decimal('110.01'))
+        self.assertEqual(resultado.fuentes, ['CustomsDutyRate', 'CustomsDutyRate', 'default'])
+        self.assertTrue(resultado.advertencias)
+
+        for i, tasa in enumerate([Decimal('0'), Decimal('25.5'), Decimal('10')]):
+            linea = resultado.linea(i)
+            ad_valorem, fodinfa, iva = self._escalar(Decimal(str(linea['cif_usd'])), tasa)
+            self.assertEqual(Decimal(str(linea['ad_valorem_usd'])), ad_valorem)
+            self.assertEqual(Decimal(str(linea['fodinfa_usd'])), fodinfa)
+            self.assertEqual(Decimal(str(linea['iva_usd'])), iva)
+        self.assertEqual(totales['isd_usd'], Decimal('50.00') + Decimal('50.00') + Decimal('0.05'))
+
+    def test_large_invoice_is_fast(self):
+        import random
+        import time
+        from .duty_engine import liquidar_factura
+        random.seed(7)
+        lineas = [
+            {'hs_code': random.choice(['8471.30.00', '6109.10.00', '9403.60.00']),
+             'fob_value_usd': round(random.uniform(1, 5000), 2)}
+            for _ in range(500)
+        ]
+        inicio = time.perf_counter()
+        resultado = liquidar_factura(lineas, flete_usd=4321.09, seguro_usd=87.65)
+        datos = resultado.to_dict()
+        self.assertLess(time.perf_counter() - inicio, 1.0)
+        self.assertEqual(len(datos['lineas']), 500)
+        self.assertAlmostEqual(sum(l['flete_usd'] for l in datos['lineas']), 4321.09, places=2)
+
+    def test_invalid_invoice(self):
+        from .duty_engine import DutyEngineError, liquidar_factura
+        with self.assertRaises(DutyEngineError):
+            liquidar_factura([])
+        with self.assertRaises(DutyEngineError):
+            liquidar_factura([{'hs_code': '8471.30.00'}])
+        with self.assertRaises(DutyEngineError):
+            liquidar_factura([{'hs_code': '8471.30.00', 'fob_value_usd': '-5'}])
+        for valor in ('NaN', 'sNaN', 'Infinity', float('nan'), float('-inf')):
+            with self.assertRaises(DutyEngineError):
+                liquidar_factura([{'hs_code': '8471.30.00', 'fob_value_usd': valor}])
+        with self.assertRaises(DutyEngineError):
+            liquidar_factura([{'hs_code': '8471.30.00', 'fob_value_usd': 100}], flete_usd='NaN')
+        for tasa in ('nan', 'Infinity', '-1', '1e20', 'abc'):
+            for campo in ('ad_valorem_pct', 'ice_pct'):
+                with self.assertRaises(DutyEngineError):
+                    liquidar_factura([{'hs_code': '8471.30.00', 'fob_value_usd': 100, campo: tasa}])
+
+    def test_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(user=TestDataFactory.create_lead_user())
+        url = '/api/sales/pre-liquidations/batch-duties/'
+        response = client.post(url, {
+            'lineas': [{'hs_code': '6109.10.00', 'fob_value_usd': 200}],
+            'flete_usd': 50, 'aplicar_isd': True,
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['totales']['cif_usd'], 250.0)
+        self.assertEqual(response.data['totales']['isd_usd'], 10.0)
+
+        response = client.post(url, {'lineas': 'x'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = client.post(url, {'lineas': [{'hs_code': '6109.10.00', 'fob_value_usd': 'NaN'}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        for tasa in ('nan', 1e20, -5):
+            response = client.post(url, {
+                'lineas': [{'hs_code': '6109.10.00', 'fob_value_usd': 200, 'ad_valorem_pct': tasa}],
+            }, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class MoneyTests(TestCase):
+    """Tests for the integer-cents Money type"""
+
+    def test_rounding_matches_decimal_quantize(self):
+        import random
+        from decimal import ROUND_HALF_UP
+        from .money import Money
+        random.seed(11)
+        for _ in range(2000):
+            monto = Decimal(random.randint(-10 ** 8, 10 ** 8)) / 1000
+            factor = Decimal(random.randint(0, 10 ** 6)) / 10 ** 4
+            esperado = (monto.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP) * factor).quantize(
+                Decimal('0.01'), rounding=ROUND_HALF_UP)
+            self.assertEqual((Money.of(monto) * factor).to_decimal(), esperado)
+
+    def test_arithmetic_is_exact(self):
+        from .money import Money, sumar
+        self.assertEqual(Money.of(0.1) + Money.of(0.2), Money.of('0.30'))
+        self.assertEqual(sumar(Money.of('0.01') for _ in range(1000)), Money.of(10))
+        self.assertEqual(sum([Money.of(1), Money.of('2.50')]), Money.of('3.50'))
+        self.assertEqual(Money.of('100.00').iva(), Money.of(15))
+        self.assertEqual(Money.of('99.99').con_iva(), Money.of('114.99'))
+        self.assertEqual(Money.of(10).margen(15, minimo=5), Money.of(5))
+        self.assertEqual(Money.of(10).to_json(), 10.0)
+
+    def test_immutable_and_currency_safe(self):
+        from .money import Money, MoneyError
+        monto = Money.of(5)
+        with self.assertRaises(AttributeError):
+            monto.cents = 1
+        with self.assertRaises(MoneyError):
+            Money.of(1, 'USD') + Money.of(1, 'EUR')
+        with self.assertRaises(MoneyError):
+            Money.of('abc')
+
+    def test_sub_cent_freight_is_rounded_before_margin(self):
+        from types import SimpleNamespace
+        from .quotation_engine import desglose_margen, monto_flete
+
+        # 45.50/CBM × 12.345 CBM = 561.6975: el margen se calcula sobre 561.70
+        flete = monto_flete(Decimal('45.50'), Decimal('12.345'))
+        self.assertEqual(flete.to_decimal(), Decimal('561.70'))
+        precio = desglose_margen(flete.to_decimal())
+        self.assertEqual(precio['costo_base'], 561.70)
+        self.assertEqual(precio['margen_aplicado'], 84.26)
+        self.assertEqual(precio['precio_final'], 645.96)
+        # Un costo con fracción de centavo da el mismo precio que el ya redondeado
+        self.assertEqual(desglose_margen(Decimal('561.6975')), precio)
+
+        config = SimpleNamespace(
+            name='LCL 10%', margin_type='PERCENTAGE', margin_value=Decimal('10'), minimum_margin=None,
+            calculate_margin=lambda costo: costo * Decimal('0.10'),
+        )
+        precio = desglose_margen(monto_flete(Decimal('7.333'), Decimal('3')), config)
+        self.assertEqual((precio['costo_base'], precio['margen_aplicado'], precio['precio_final']), (22.0, 2.2, 24.2))
+
+    def test_local_costs_iva_with_dthc_exemption(self):
+        from .quotation_engine import calcular_cotizacion_completa
+        cotizacion = calcular_cotizacion_completa(
+            fletes=[{'monto': 1850.1, 'moneda': 'USD'}],
+            gastos_locales=[
+                {'codigo': 'DTHC', 'descripcion': 'THC destino', 'monto': 150.0},
+                {'codigo': 'HANDLING', 'descripcion': 'Handling', 'monto': 33.33},
+                {'codigo': 'DOC', 'descripcion': 'Documentación', 'monto': 0.1},
+            ],
+            transport_type='FCL',
+        )
+        self.assertEqual(cotizacion['gastos_locales']['base_exenta'], 150.0)
+        self.assertEqual(cotizacion['gastos_locales']['base_gravable'], 33.43)
+        self.assertEqual(cotizacion['iva']['monto'], 5.01)
+        self.assertEqual(cotizacion['totales']['grand_total_usd'], 2038.54)
+
+
+class ReferenceTablesTests(TestCase):
+    """Tests for the in-memory insurance / security / inland tariff tables"""
+
+    def setUp(self):
+        from .models import InlandFCLTariff, InlandSecurityTariff
+        from .reference_tables import invalidar_tablas
+        InlandSecurityTariff.objects.create(destination_city='Quito', service_type='CUSTODIA_ARMADA', base_rate_usd=Decimal('200.00'))
+        InlandSecurityTariff.objects.create(destination_city='Quito', service_type='CANDADO_SATELITAL', base_rate_usd=Decimal('100.00'))
+        InlandSecurityTariff.objects.create(destination_city='Quito Norte', service_type='CUSTODIA_ARMADA', base_rate_usd=Decimal('250.00'))
+        self.fcl = InlandFCLTariff.objects.create(destination_city='Cuenca', container_type='40HC', rate_usd=Decimal('700.00'))
+        invalidar_tablas()
+
+    def test_lookups_do_not_query_after_warm_up(self):
+        from .money import Money
+        from .quotation_engine import calcular_servicios_seguridad
+        from .reference_tables import obtener_tablas_referencia
+        tablas = obtener_tablas_referencia()
+        with self.assertNumQueries(0):
+            seguridad = calcular_servicios_seguridad('quito', wants_armed_custody=True, wants_satellite_lock=True)
+            fcl = tablas.transporte_fcl.buscar('CUENCA', '40 HC')
+            self.assertIs(obtener_tablas_referencia(), tablas)
+        # icontains: "Quito" también coincide con "Quito Norte"; gana la primera fila por id
+        self.assertEqual(seguridad['subtotal_antes_iva'], 300.0)
+        self.assertEqual(seguridad['iva_monto'], 45.0)
+        self.assertEqual(seguridad['total'], 345.0)
+        self.assertEqual([t.tarifa for t in fcl], [Money.of(700)])
+        self.assertEqual(tablas.transporte_fcl.buscar('Cuenca', '20GP'), [])
+
+    def test_tariff_change_recompiles_tables(self):
+        from .money import Money
+        from .reference_tables import obtener_tablas_referencia
+        anterior = obtener_tablas_referencia()
+        self.fcl.rate_usd = Decimal('750.00')
+        self.fcl.save()
+        tablas = obtener_tablas_referencia()
+        self.assertGreater(tablas.version, anterior.version)
+        self.assertEqual(tablas.transporte_fcl.buscar('Cuenca')[0].tarifa, Money.of(750))
+
+    def test_insurance_premium_from_active_rate(self):
+        from .models import InsuranceRate
+        from .quotation_engine import calcular_seguro
+        from .reference_tables import obtener_tablas_referencia
+
+        self.assertFalse(calcular_seguro(Decimal('10000'))['tramo_encontrado'])
+
+        InsuranceRate.objects.create(name='Básico', rate_percentage=Decimal('0.350'), min_premium_usd=Decimal('25.00'))
+        InsuranceRate.objects.create(name='Inactivo', rate_percentage=Decimal('1.000'), is_active=False)
+        self.assertEqual(obtener_tablas_referencia().resumen()['tarifas_seguro'], 1)
+
+        with self.assertNumQueries(0):
+            seguro = calcular_seguro(Decimal('10000'))
+        self.assertEqual((seguro['prima_base'], seguro['iva_monto'], seguro['total']), (35.0, 5.25, 40.25))
+        self.assertEqual(seguro['description'], 'Básico')
+        # Por debajo de la prima mínima rige el mínimo
+        self.assertEqual(calcular_seguro(Decimal('1000'), include_iva=False)['total'], 25.0)
+
+    def test_missing_reference_model_fails_loudly(self):
+        from unittest import mock
+        from django.core.exceptions import ImproperlyConfigured
+        from .signals import _connect_reference_table_signals
+        with mock.patch('SalesModule.reference_tables.REFERENCE_MODELS', ['InsuranceBracket']):
+            with self.assertRaises(ImproperlyConfigured):
+                _connect_reference_table_signals()
+
+
+class IntelligentQuotePipelineTests(TestCase):
+    """Tests for the concurrent generate_intelligent_quote pipeline"""
+
+    def _patch(self, objetivo, **kwargs):
+        from unittest import mock
+        patcher = mock.patch(objetivo, **kwargs)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def _gemini_lento(self, segundos):
+        import time
+
+        def llamada(*args, timeout=None):
+            time.sleep(segundos)
+            return {'clasificacion': {'hs_code': '8517.12.00'}, 'escenarios': [{'tipo': 'economico'}], 'ai_status': 'success'}, 'success', None
+        self._patch('SalesModule.gemini_service.GEMINI_AVAILABLE', new=True)
+        self._patch('SalesModule.gemini_service.client', new=object())
+        return self._patch('SalesModule.gemini_service._gemini_intelligent_quote', side_effect=llamada)
+
+    def test_fallback_without_gemini_reports_stage_timings(self):
+        from .gemini_service import generate_intelligent_quote
+        self._patch('SalesModule.gemini_service.GEMINI_AVAILABLE', new=False)
+        resultado = generate_intelligent_quote('Celular Samsung', 'Shanghai', 'Guayaquil', 'LCL', volume_cbm=2)
+        self.assertEqual(resultado['ai_status'], 'fallback_keyword')
+        self.assertEqual(resultado['clasificacion']['hs_code'], '8517.12.00')
+        self.assertTrue(resultado['escenarios'])
+        self.assertEqual(
+            set(resultado['metadata']['etapas_ms']),
+            {'clasificacion_local', 'proveedores', 'tarifa_ruta', 'escenarios'},
+        )
+
+    def test_remote_stage_overlaps_local_stages(self):
+        import time
+        from .gemini_service import generate_intelligent_quote
+        self._gemini_lento(0.4)
+        self._patch('SalesModule.gemini_service.get_providers_for_transport',
+                    side_effect=lambda *a, **k: time.sleep(0.3) or [{'id': 1, 'name': 'MSC', 'code': 'MSC'}])
+        inicio = time.perf_counter()
+        resultado = generate_intelligent_quote('Celular Samsung', 'Shanghai', 'Guayaquil', 'LCL')
+        transcurrido = time.perf_counter() - inicio
+        self.assertEqual(resultado['ai_status'], 'success')
+        self.assertEqual(resultado['escenarios'][0]['proveedor']['codigo'], 'MSC')
+        self.assertLess(transcurrido, 0.65)
+        self.assertEqual(resultado['metadata']['etapas_estado']['clasificacion_ia'], 'ok')
+
+    @override_settings(INTELLIGENT_QUOTE_TIMEOUT_S=0.05)
+    def test_remote_timeout_falls_back_to_keywords(self):
+        from .gemini_service import generate_intelligent_quote
+        self._gemini_lento(0.5)
+        resultado = generate_intelligent_quote('Zapatos de cuero', 'Shanghai', 'Guayaquil', 'AEREO', weight_kg=50)
+        self.assertEqual(resultado['ai_status'], 'timeout')
+        self.assertEqual(resultado['clasificacion']['hs_code'], '6403.99.00')
+        self.assertTrue(resultado['escenarios'])
+        self.assertEqual(resultado['metadata']['etapas_estado']['clasificacion_ia'], 'timeout')
+
+    @override_settings(INTELLIGENT_QUOTE_TIMEOUT_S=2)
+    def test_remote_stage_gets_remaining_deadline_as_gateway_timeout(self):
+        from .gemini_service import generate_intelligent_quote
+        remoto = self._gemini_lento(0)
+        generate_intelligent_quote('Celular Samsung', 'Shanghai', 'Guayaquil', 'LCL')
+        plazo = remoto.call_args.kwargs['timeout']
+        self.assertGreater(plazo, 1.5)
+        self.assertLessEqual(plazo, 2)
+
+    @override_settings(INTELLIGENT_QUOTE_TIMEOUT_S=0.05)
+    def test_local_lookups_are_skipped_after_deadline(self):
+        import time
+        from .gemini_service import generate_intelligent_quote
+        self._patch('SalesModule.gemini_service.GEMINI_AVAILABLE', new=False)
+        self._patch('SalesModule.gemini_service.get_providers_for_transport',
+                    side_effect=lambda *a, **k: time.sleep(0.1) or [])
+        tarifa = self._patch('SalesModule.gemini_service.get_best_rate_for_route')
+        resultado = generate_intelligent_quote('Zapatos de cuero', 'Shanghai', 'Guayaquil', 'AEREO', weight_kg=50)
+        tarifa.assert_not_called()
+        self.assertEqual(resultado['metadata']['etapas_estado']['tarifa_ruta'], 'timeout')
+        self.assertEqual(resultado['clasificacion']['hs_code'], '6403.99.00')
+        self.assertTrue(resultado['escenarios'])
+
+    def test_gateway_deadline_reports_timeout(self):
+        import time
+        from unittest import mock
+        from google.genai import types  # noqa: F401 - first import outside the timing
+        from . import gemini_gateway
+        from .gemini_service import _gemini_intelligent_quote
+        self._patch('SalesModule.gemini_gateway._gateway', new=None)
+        cliente = mock.Mock()
+        cliente.models.generate_content.side_effect = lambda **kwargs: time.sleep(0.3)
+        self._patch('SalesModule.gemini_service.client', new=cliente)
+        inicio = time.perf_counter()
+        data, estado, notas = _gemini_intelligent_quote(
+            'Zapatos de cuero', 'Shanghai', 'Guayaquil', 'AEREO', 50, None, 'FOB', None, timeout=0.05
+        )
+        self.assertLess(time.perf_counter() - inicio, 0.25)
+        self.assertIsNone(data)
+        self.assertEqual(estado, 'timeout')
+        self.assertEqual(gemini_gateway.get_gateway().stats()['timeouts'], 1)
+
+
+class GeminiSingleFlightTests(TestCase):
+    """Tests for coalescing concurrent identical Gemini calls"""
+
+    class FakeClient:
+        """Local stand-in for genai.Client that blocks until released"""
+
+        def __init__(self, texto='{}', error=None):
+            self.liberar = threading.Event()
+            self.llamadas = 0
+            self.texto = texto
+            self.error = error
+            self.models = self
+
+        def generate_content(self, model, contents, config=None):
+            self.llamadas += 1
+            self.liberar.wait(5)
+            if self.error:
+                raise self.error
+            return type('Respuesta', (), {'text': self.texto})()
+
+    def setUp(self):
+        from unittest import mock
+        from . import gemini_gateway
+        gemini_gateway._single_flight.reset_stats()
+        patcher = mock.patch.object(gemini_gateway, '_gateway', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _en_paralelo(self, funciones, esperar_coalescidas, cliente):
+        from . import gemini_gateway
+        resultados, errores = [], []
+
+        def correr(funcion):
+            try:
+                resultados.append(funcion())
+            except Exception as e:
+                errores.append(e)
+
+        hilos = [threading.Thread(target=correr, args=(f,)) for f in funciones]
+        for hilo in hilos:
+            hilo.start()
+        for _ in range(500):
+            if gemini_gateway.obtener_metricas()['coalescidas'] >= esperar_coalescidas:
+                break
+            time.sleep(0.01)
+        cliente.liberar.set()
+        for hilo in hilos:
+            hilo.join(5)
+        return resultados, errores
+
+    def test_identical_normalized_prompts_share_one_call(self):
+        from . import gemini_gateway
+        cliente = self.FakeClient(texto='{"ok": true}')
+        prompts = ['Celular  Samsung', 'celular samsung', ' CELULAR SAMSUNG '] * 2
+        resultados, errores = self._en_paralelo(
+            [lambda p=p: gemini_gateway.generate_content(cliente, model='m', contents=p) for p in prompts], 5, cliente,
+        )
+        self.assertEqual(errores, [])
+        self.assertEqual(cliente.llamadas, 1)
+        self.assertEqual(len(resultados), 6)
+        self.assertEqual(len({id(r) for r in resultados}), 1)
+        metricas = gemini_gateway.obtener_metricas()
+        self.assertEqual((metricas['emitidas'], metricas['coalescidas'], metricas['en_vuelo']), (1, 5, 0))
+
+        # Terminada la llamada, la siguiente vuelve a emitirse
+        gemini_gateway.generate_content(cliente, model='m', contents='celular samsung')
+        self.assertEqual(cliente.llamadas, 2)
+
+    def test_errors_are_shared_and_different_prompts_are_not_coalesced(self):
+        from . import gemini_gateway
+        cliente = self.FakeClient(error=RuntimeError('503'))
+        _, errores = self._en_paralelo(
+            [lambda: gemini_gateway.generate_content(cliente, model='m', contents='a')] * 3, 2, cliente,
+        )
+        self.assertEqual(len(errores), 3)
+        self.assertEqual(cliente.llamadas, 1)
+        self.assertNotEqual(gemini_gateway.clave_prompt('m', 'a'), gemini_gateway.clave_prompt('m', 'b'))
+        self.assertNotEqual(gemini_gateway.clave_prompt('m', 'a'), gemini_gateway.clave_prompt('otro', 'a'))
+
+    def test_suggest_hs_code_coalesces_through_the_gateway(self):
+        from unittest import mock
+        from .gemini_service import suggest_hs_code
+        cliente = self.FakeClient(texto='{"hs_code": "8517.12.00", "confidence": 90}')
+        with mock.patch('SalesModule.gemini_service.GEMINI_AVAILABLE', True), \
+                mock.patch('SalesModule.gemini_service.client', cliente):
+            resultados, errores = self._en_paralelo(
+                [lambda: suggest_hs_code('Celular Samsung Galaxy', 'China', 500)] * 4, 3, cliente,
+            )
+        self.assertEqual(errores, [])
+        self.assertEqual(cliente.llamadas, 1)
+        self.assertEqual({r['suggested_hs_code'] for r in resultados}, {'8517.12.00'})
+
+
+class GeminiGatewayTests(TestCase):
+    """Tests for the Gemini gateway deadlines, concurrency cap and circuit breaker"""
+
+    def _gateway(self, **kwargs):
+        from .gemini_gateway import CircuitBreaker, GeminiGateway
+        self.ahora = [0.0]
+        breaker = CircuitBreaker(umbral=2, espera_s=30, reloj=lambda: self.ahora[0])
+        return GeminiGateway(breaker=breaker, **kwargs)
+
+    def test_deadline_failures_open_the_circuit(self):
+        from .gemini_gateway import CircuitBreaker, GeminiTimeoutError, GeminiUnavailableError
+        gateway = self._gateway(timeout_s=0.05, max_concurrencia=2)
+        liberar = threading.Event()
+        self.addCleanup(liberar.set)
+        for _ in range(2):
+            with self.assertRaises(GeminiTimeoutError):
+                gateway.llamar(lambda: liberar.wait(5))
+        self.assertEqual(gateway.breaker.estado, CircuitBreaker.ABIERTO)
+
+        llamadas = []
+        with self.assertRaises(GeminiUnavailableError):
+            gateway.llamar(lambda: llamadas.append(1))
+        self.assertEqual(llamadas, [])
+
+        # Pasada la espera, una llamada de prueba exitosa cierra el circuito
+        liberar.set()
+        self.ahora[0] = 31
+        self.assertEqual(gateway.llamar(lambda: 'ok', timeout=1), 'ok')
+        self.assertEqual(gateway.breaker.estado, CircuitBreaker.CERRADO)
+        stats = gateway.stats()
+        self.assertEqual((stats['timeouts'], stats['rechazadas_circuito'], stats['exitos']), (2, 1, 1))
+        self.assertEqual(stats['aperturas'], 1)
+
+    def test_concurrency_cap_rejects_without_tripping_the_circuit(self):
+        from .gemini_gateway import CircuitBreaker, GeminiBusyError
+        gateway = self._gateway(timeout_s=0.05, max_concurrencia=1)
+        liberar, empezo = threading.Event(), threading.Event()
+        hilo = threading.Thread(target=lambda: gateway.llamar(lambda: empezo.set() or liberar.wait(5), timeout=5))
+        hilo.start()
+        empezo.wait(5)
+        with self.assertRaises(GeminiBusyError):
+            gateway.llamar(lambda: 'no')
+        liberar.set()
+        hilo.join(5)
+        self.assertEqual(gateway.breaker.estado, CircuitBreaker.CERRADO)
+        self.assertEqual(gateway.stats()['rechazadas_saturacion'], 1)
+        self.assertEqual(gateway.llamar(lambda: 'ok'), 'ok')
+
+    def test_full_semaphore_rejects_without_waiting_for_the_deadline(self):
+        import time
+        from .gemini_gateway import GeminiBusyError
+        gateway = self._gateway(timeout_s=5, max_concurrencia=1)
+        liberar, empezo = threading.Event(), threading.Event()
+        hilo = threading.Thread(target=lambda: gateway.llamar(lambda: empezo.set() or liberar.wait(5)))
+        hilo.start()
+        empezo.wait(5)
+        try:
+            inicio = time.monotonic()
+            with self.assertRaises(GeminiBusyError):
+                gateway.llamar(lambda: 'no')
+            with self.assertRaises(GeminiBusyError):
+                next(gateway.llamar_stream(lambda: iter(['no'])))
+            self.assertLess(time.monotonic() - inicio, 1)
+        finally:
+            liberar.set()
+            hilo.join(5)
+        self.assertEqual(gateway.stats()['rechazadas_saturacion'], 2)
+
+    def test_open_circuit_uses_keyword_fallback(self):
+        from unittest import mock
+        from . import gemini_gateway
+        from .gemini_service import suggest_hs_code
+        gateway = self._gateway()
+        gateway.breaker.registrar_fallo()
+        gateway.breaker.registrar_fallo()
+        cliente = mock.Mock()
+        with mock.patch.object(gemini_gateway, '_gateway', gateway), \
+                mock.patch('SalesModule.gemini_service.GEMINI_AVAILABLE', True), \
+                mock.patch('SalesModule.gemini_service.client', cliente):
+            resultado = suggest_hs_code('Celular Samsung')
+            self.assertFalse(gemini_gateway.disponible(cliente))
+        self.assertEqual(resultado['ai_status'], 'fallback_keyword')
+        self.assertEqual(resultado['suggested_hs_code'], '8517.12.00')
+        cliente.models.generate_content.assert_not_called()
+
+    def test_status_view_requires_admin(self):
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        from .ai_views import GeminiGatewayStatusView
+        vista = GeminiGatewayStatusView.as_view()
+        usuario = TestDataFactory.create_lead_user()
+        solicitud = APIRequestFactory().get('/api/ai/gateway-status/')
+        force_authenticate(solicitud, user=usuario)
+        self.assertEqual(vista(solicitud).status_code, 403)
+
+        solicitud = APIRequestFactory().get('/api/ai/gateway-status/')
+        force_authenticate(solicitud, user=TestDataFactory.create_admin_user())
+        respuesta = vista(solicitud)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('circuito', respuesta.data)
+        self.assertIn('latencia_ms_p95', respuesta.data)
+
+    def test_ai_routes_are_mounted_under_api_ai(self):
+        from django.urls import resolve, reverse
+        from rest_framework.test import APIClient
+        from .ai_views import AduanaChatCancelView, AduanaChatStreamView, GeminiGatewayStatusView
+
+        self.assertEqual(reverse('aduana-chat-stream'), '/api/ai/aduana-chat/stream/')
+        self.assertIs(resolve('/api/ai/aduana-chat/stream/').func.view_class, AduanaChatStreamView)
+        self.assertIs(resolve('/api/ai/aduana-chat/stream/cancel/').func.view_class, AduanaChatCancelView)
+        self.assertIs(resolve('/api/ai/gateway-status/').func.view_class, GeminiGatewayStatusView)
+
+        cliente = APIClient()
+        cliente.force_authenticate(user=TestDataFactory.create_admin_user())
+        self.assertEqual(cliente.get('/api/ai/gateway-status/').status_code, 200)
+
+
+class DocumentExtractionCacheTests(TestCase):
+    """Tests for the content-hash document extraction cache"""
+
+    def setUp(self):
+        import tempfile
+        from django.core.files.storage import FileSystemStorage
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.storage = FileSystemStorage(location=self.tmpdir.name)
+        self.llamadas = []
+
+    def _subir(self, nombre, contenido):
+        from django.core.files.base import ContentFile
+        from .document_extraction import DocumentoFuente
+        storage_name = self.storage.save(nombre, ContentFile(contenido))
+        return DocumentoFuente(storage_name=storage_name, file_name=nombre, document_type='invoice')
+
+    def _extractor(self, parte):
+        self.llamadas.append(parte)
+        return {'invoice_number': parte.descriptor['filename'], 'extraction_confidence': 80}
+
+    def test_reupload_is_served_from_cache(self):
+        from .document_extraction import extraer_documentos
+        from .models import DocumentExtraction
+
+        primero = extraer_documentos(
+            [self._subir('factura.png', b'png-data'), self._subir('notas.txt', b'shipper: ACME')],
+            'test', self._extractor, storage=self.storage,
+        )
+        self.assertEqual(len(self.llamadas), 2)
+        self.assertEqual(self.llamadas[0].data, b'png-data')
+        self.assertEqual(self.llamadas[1].texto, 'shipper: ACME')
+
+        # Mismo contenido con otro nombre (nueva solicitud de cotización)
+        segundo = extraer_documentos(
+            [self._subir('factura_rev2.png', b'png-data')], 'test', self._extractor, storage=self.storage,
+        )
+        self.assertEqual(len(self.llamadas), 2)
+        self.assertEqual(segundo.desde_cache, 1)
+        self.assertEqual(segundo.llamadas_ia, 0)
+        self.assertEqual(segundo.datos['invoice_number'], 'factura.png')
+        self.assertEqual(primero.stats()['llamadas_ia'], 2)
+        self.assertEqual(DocumentExtraction.objects.get(file_name='factura.png').hits, 1)
+
+        # Otro ámbito no comparte resultados
+        extraer_documentos([self._subir('otra.png', b'png-data')], 'otro', self._extractor, storage=self.storage)
+        self.assertEqual(len(self.llamadas), 3)
+
+    def test_failed_extraction_is_not_cached(self):
+        from unittest import mock
+        from . import document_extraction
+        from .document_extraction import extraer_documentos
+
+        with mock.patch.object(document_extraction, 'PYPDF_AVAILABLE', False):
+            resultado = extraer_documentos(
+                [self._subir('factura.pdf', b'%PDF-1.4 sin paginas')], 'test', lambda parte: None, storage=self.storage,
+            )
+        self.assertEqual(resultado.datos, {})
+        self.assertEqual(len(resultado.errores), 1)
+
+        with mock.patch.object(document_extraction, 'PYPDF_AVAILABLE', False):
+            extraer_documentos(
+                [self._subir('factura.pdf', b'%PDF-1.4 sin paginas')], 'test', self._extractor, storage=self.storage,
+            )
+        self.assertEqual(len(self.llamadas), 1)
+
+    def _extractor_paginas(self, parte):
+        self.llamadas.append(parte)
+        if parte.paginas is None:
+            return {'page_text': parte.data.decode(), 'extraction_confidence': 80}
+        return [{'page_text': f'p{numero}', 'extraction_confidence': 80} for numero in parte.paginas]
+
+    def _extraer_pdf(self, paginas, extractor=None):
+        from unittest import mock
+        from . import document_extraction
+
+        class FakeReader:
+            def __init__(self, archivo):
+                self.pages = paginas[archivo.read()]
+
+        with mock.patch.object(document_extraction, 'PYPDF_AVAILABLE', True), \
+                mock.patch.object(document_extraction, 'PdfReader', FakeReader, create=True), \
+                mock.patch.object(document_extraction, '_hash_pagina', lambda p: p), \
+                mock.patch.object(document_extraction, '_pdf_de_paginas', lambda ps: b'+'.join(p.encode() for p in ps)):
+            return [
+                document_extraction.extraer_documentos(
+                    [self._subir('invoice.pdf', contenido)], 'test', extractor or self._extractor_paginas,
+                    storage=self.storage,
+                )
+                for contenido in paginas
+            ]
+
+    def test_unchanged_pdf_pages_are_skipped(self):
+        primero, segundo = self._extraer_pdf({b'%PDF rev1': ['pagina A', 'pagina B'], b'%PDF rev2': ['pagina A', 'pagina C']})
+
+        self.assertEqual(primero.paginas_extraidas, 2)
+        self.assertEqual(segundo.paginas_extraidas, 1)
+        self.assertEqual(segundo.paginas_desde_cache, 1)
+        self.assertEqual([parte.data for parte in self.llamadas], [b'pagina A+pagina B', b'pagina C'])
+        self.assertEqual(self.llamadas[1].descriptor['page'], 2)
+
+    def test_uncached_pdf_pages_share_one_call_with_per_page_cache(self):
+        from .models import DocumentExtraction
+
+        primero, segundo = self._extraer_pdf({
+            b'%PDF rev1': ['pagina A', 'pagina B', 'pagina C'],
+            b'%PDF rev2': ['pagina A', 'pagina D', 'pagina C', 'pagina E'],
+        })
+        self.assertEqual((primero.llamadas_ia, segundo.llamadas_ia), (1, 1))
+        self.assertEqual(self.llamadas[0].paginas, [1, 2, 3])
+        self.assertEqual(self.llamadas[0].descriptor['included_pages'], [1, 2, 3])
+        self.assertEqual(self.llamadas[1].paginas, [2, 4])
+        self.assertEqual(self.llamadas[1].data, b'pagina D+pagina E')
+        self.assertEqual(segundo.paginas_desde_cache, 2)
+        self.assertEqual(
+            DocumentExtraction.objects.get(scope='test', kind='page', content_hash='pagina D').result['page_text'], 'p2',
+        )
+
+    def test_pdf_page_batch_with_wrong_page_count_fails(self):
+        from .models import DocumentExtraction
+
+        resultado, = self._extraer_pdf(
+            {b'%PDF': ['pagina A', 'pagina B']},
+            extractor=lambda parte: [{'page_text': 'solo una'}],
+        )
+        self.assertEqual(resultado.datos, {})
+        self.assertEqual(resultado.errores, ['invoice.pdf p.1,2'])
+        self.assertFalse(DocumentExtraction.objects.filter(scope='test').exists())
+
+    def test_merge_keeps_first_value_and_averages_confidence(self):
+        from .document_extraction import combinar_resultados
+
+        datos = combinar_resultados([
+            {'shipper_name': 'ACME', 'invoice_number': '', 'extraction_confidence': 90},
+            {'shipper_name': 'Otro', 'invoice_number': 'INV-1', 'extraction_confidence': 70},
+            None,
+        ])
+        self.assertEqual(datos, {
+            'shipper_name': 'ACME',
+            'invoice_number': 'INV-1',
+            'extraction_confidence': 80,
+            'field_confidence': {'shipper_name': 90, 'invoice_number': 70},
+            'low_confidence_fields': [],
+        })
+
+    def test_merge_prefers_higher_field_confidence(self):
+        from .document_extraction import combinar_resultados
+
+        datos = combinar_resultados([
+            {'gross_weight_kg': 140, 'incoterm': 'FOB', 'extraction_confidence': 60, 'extraction_source': 'ai'},
+            {'gross_weight_kg': 145.25, 'field_confidence': {'gross_weight_kg': 100}, 'extraction_source': 'packing_list'},
+        ])
+        self.assertEqual(datos['gross_weight_kg'], 145.25)
+        self.assertEqual(datos['field_confidence'], {'gross_weight_kg': 100, 'incoterm': 60})
+        self.assertEqual(datos['low_confidence_fields'], ['incoterm'])
+        self.assertEqual(datos['extraction_source'], 'ai, packing_list')
+
+
+class LocalDocumentExtractionTests(TestCase):
+    """Tests for the deterministic extraction tier tried before Gemini"""
+
+    FACTURA = (
+        "COMMERCIAL INVOICE\n"
+        "Invoice No.: INV-2024-0113        Date: 2024-05-01\n"
+        "Terms of delivery: FOB Shenzhen\n"
+        "Description          HS Code      Qty\n"
+        "LED panels           8539.52.00   200\n"
+        "Total cartons: 50\n"
+        "G.W.: 1,250.50 KGS\n"
+        "N.W.: 1.100,00 KGS\n"
+        "Measurement: 12.5 CBM\n"
+        "TOTAL AMOUNT: USD 18,400.00\n"
+    )
+
+    def test_text_invoice_fields_with_confidence(self):
+        import io
+        from .local_extraction import extraer_local
+
+        extraccion = extraer_local(io.BytesIO(self.FACTURA.encode('utf-8')), 'factura.txt')
+        datos = extraccion.to_dict()
+        self.assertTrue(extraccion.suficiente)
+        self.assertEqual(datos['invoice_number'], 'INV-2024-0113')
+        self.assertEqual(datos['incoterm'], 'FOB')
+        self.assertEqual(datos['hs_codes'], '8539.52.00')
+        self.assertEqual(datos['gross_weight_kg'], 1250.5)
+        self.assertEqual(datos['net_weight_kg'], 1100.0)
+        self.assertEqual(datos['volume_cbm'], 12.5)
+        self.assertEqual(datos['packages_count'], 50)
+        self.assertEqual(datos['invoice_value_usd'], 18400.0)
+        # Código HS sin etiqueta en la misma línea: menor confianza
+        self.assertEqual(datos['field_confidence']['incoterm'], 90)
+        self.assertLess(datos['field_confidence']['hs_codes'], datos['field_confidence']['incoterm'])
+
+    def test_value_on_next_line_and_pounds(self):
+        from .local_extraction import ExtraccionLocal, _buscar_etiquetas
+
+        extraccion = ExtraccionLocal('local_txt')
+        _buscar_etiquetas(['GROSS WEIGHT', '2,204.62 LBS', 'TOTAL: 45 CTNS  9.8 CBM', 'HS CODE: 847130'], extraccion)
+        self.assertAlmostEqual(extraccion.datos['gross_weight_kg'], 1000.0, places=1)
+        self.assertEqual(extraccion.datos['volume_cbm'], 9.8)
+        self.assertEqual(extraccion.datos['hs_codes'], '847130')
+        self.assertEqual(extraccion.confianza['gross_weight_kg'], 75)
+
+    def test_total_line_with_several_values_pairs_numbers_with_units(self):
+        from .local_extraction import ExtraccionLocal, _buscar_etiquetas
+
+        for linea, bultos, volumen in [
+            ('TOTAL: 45 CTNS  1,250.00 KGS  12.50 CBM', 45, 12.5),
+            ('TOTAL 120 PKGS 3,400.5 KGS 28.75 CBM', 120, 28.75),
+            ('TOTAL: 7 CARTONS / 0.85 CBM / USD 1,200.00', 7, 0.85),
+        ]:
+            with self.subTest(linea=linea):
+                extraccion = ExtraccionLocal('local_txt')
+                _buscar_etiquetas([linea], extraccion)
+                self.assertEqual(extraccion.datos['packages_count'], bultos)
+                self.assertEqual(extraccion.datos['volume_cbm'], volumen)
+
+        # Con separador el valor va después de la etiqueta
+        extraccion = ExtraccionLocal('local_txt')
+        _buscar_etiquetas(['G.W. 980 KGS  CTNS: 32  CBM: 4.2'], extraccion)
+        self.assertEqual(extraccion.datos['packages_count'], 32)
+        self.assertEqual(extraccion.datos['volume_cbm'], 4.2)
+
+    def test_xlsx_packing_list_and_invoice_cells(self):
+        import io
+        from openpyxl import Workbook
+        from .local_extraction import extraer_local
+
+        libro = Workbook(write_only=True)
+        hoja = libro.create_sheet('PL')
+        for fila in [
+            ['PACKING LIST'],
+            ['Invoice No.', 'PL-7781'],
+            ['Incoterm', 'CIF'],
+            [],
+            ['DESCRIPTION', 'CTNS', 'G.W. (KGS)', 'MEAS (CBM)'],
+            ['LED lamp', 10, 100.25, 0.6],
+            ['LED strip', 5, 45, 0.6],
+            ['TOTAL', 15, 145.25, 1.2],
+        ]:
+            hoja.append(fila)
+        buffer = io.BytesIO()
+        libro.save(buffer)
+        buffer.seek(0)
+
+        datos = extraer_local(buffer, 'pl.xlsx').to_dict()
+        self.assertEqual(datos['extraction_source'], 'packing_list')
+        self.assertEqual(datos['gross_weight_kg'], 145.25)
+        self.assertEqual(datos['packages_count'], 15)
+        self.assertEqual(datos['field_confidence']['gross_weight_kg'], 100)
+        self.assertEqual(datos['invoice_number'], 'PL-7781')
+        self.assertEqual(datos['incoterm'], 'CIF')
+
+    def test_unreadable_formats_go_to_ai(self):
+        import io
+        from .local_extraction import extraer_local
+
+        self.assertIsNone(extraer_local(io.BytesIO(b'\x89PNG'), 'scan.png'))
+        # Sin pypdf (o PDF escaneado) no hay capa de texto
+        from unittest import mock
+        from . import local_extraction
+        with mock.patch.object(local_extraction, 'PYPDF_AVAILABLE', False):
+            self.assertIsNone(extraer_local(io.BytesIO(b'%PDF-1.4'), 'factura.pdf'))
+
+    def test_pipeline_skips_ai_for_parseable_documents(self):
+        import tempfile
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import FileSystemStorage
+        from .document_extraction import DocumentoFuente, extraer_documentos
+
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        storage = FileSystemStorage(location=tmpdir.name)
+        llamadas = []
+
+        def extractor(parte):
+            llamadas.append(parte)
+            return {'shipper_name': 'ACME', 'extraction_confidence': 80}
+
+        factura = storage.save('factura.txt', ContentFile(self.FACTURA.encode('utf-8')))
+        notas = storage.save('notas.txt', ContentFile(b'Shipper: ACME Ltd'))
+        resultado = extraer_documentos(
+            [DocumentoFuente(factura, 'factura.txt'), DocumentoFuente(notas, 'notas.txt')],
+            'test', extractor, storage=storage, alias_locales={'hs_codes': 'hs_code'},
+        )
+        self.assertEqual(len(llamadas), 1)
+        self.assertEqual(llamadas[0].descriptor['filename'], 'notas.txt')
+        self.assertEqual(resultado.locales, 1)
+        self.assertEqual(resultado.datos['hs_code'], '8539.52.00')
+        self.assertEqual(resultado.datos['shipper_name'], 'ACME')
+        self.assertIn('hs_code', resultado.datos['field_confidence'])
+
+        # Pocos campos locales y la IA falla: se devuelve lo encontrado localmente
+        parcial = storage.save('parcial.txt', ContentFile(b'Incoterm: EXW'))
+        resultado = extraer_documentos(
+            [DocumentoFuente(parcial, 'parcial.txt')], 'test', lambda parte: None, storage=storage,
+        )
+        self.assertEqual(resultado.datos['incoterm'], 'EXW')
+        self.assertEqual(resultado.llamadas_ia, 1)
+
+
+class BatchHSClassificationTests(TestCase):
+    """Tests for batch multi-product HS classification"""
+
+    def _ia(self, fallar_con=None):
+        from unittest import mock
+        from . import hs_classification
+        llamadas = []
+
+        def clasificar_lote(productos):
+            llamadas.append([p.descripcion for p in productos])
+            if fallar_con and fallar_con in productos[0].descripcion:
+                raise RuntimeError("503 UNAVAILABLE")
+            # El último producto de cada paquete se omite en la respuesta
+            return {
+                i: {'suggested_hs_code': '8467.21.00', 'confidence': 80, 'ai_status': 'success'}
+                for i in range(1, len(productos))
+            }
+
+        for nombre, valor in (('_ia_disponible', lambda: True), ('_clasificar_lote_ia', clasificar_lote)):
+            patcher = mock.patch.object(hs_classification, nombre, valor)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        return llamadas
+
+    def test_duplicates_resolved_once_locally(self):
+        from unittest import mock
+        from . import hs_classification
+
+        with mock.patch.object(hs_classification, '_ia_disponible', lambda: False):
+            resultado = hs_classification.clasificar_productos([
+                'Laptop Dell 14"', {'description': '  laptop   dell 14"'}, 'Camiseta de algodón', '',
+            ])
+        lineas = resultado['results']
+        self.assertEqual(resultado['summary']['descripciones_unicas'], 2)
+        self.assertEqual(resultado['summary']['enviadas_ia'], 0)
+        self.assertEqual([l.get('source') for l in lineas], ['keyword', 'keyword', 'keyword', None])
+        self.assertEqual(lineas[0]['classification']['suggested_hs_code'], '8471.30.00')
+        self.assertEqual(lineas[1]['classification']['suggested_hs_code'], '8471.30.00')
+        self.assertEqual(lineas[2]['confidence'], 80)
+        self.assertIn('error', lineas[3])
+
+    @override_settings(HS_BATCH_AI_CHUNK=2, HS_BATCH_AI_CONCURRENCY=2)
+    def test_unmatched_products_packed_into_few_ai_prompts(self):
+        from .hs_classification import clasificar_productos
+
+        llamadas = self._ia()
+        productos = ['Taladro A', 'Taladro B', 'Taladro C', 'Taladro D', 'laptop', 'Taladro A']
+        resultado = clasificar_productos(productos)
+
+        self.assertEqual(len(llamadas), 2)
+        self.assertEqual(sorted(d for lote in llamadas for d in lote), ['Taladro A', 'Taladro B', 'Taladro C', 'Taladro D'])
+        resumen = resultado['summary']
+        self.assertEqual(resumen['enviadas_ia'], 4)
+        self.assertEqual(resumen['lotes_ia'], 2)
+        self.assertEqual(resumen['por_origen'], {'ai': 2, 'fallback': 2, 'keyword': 1})
+
+        por_linea = {l['line']: l for l in resultado['results']}
+        self.assertEqual(por_linea[1]['source'], 'ai')
+        self.assertEqual(por_linea[6]['classification'], por_linea[1]['classification'])
+        self.assertEqual(por_linea[2]['classification']['ai_status'], 'fallback_missing')
+        self.assertEqual(por_linea[5]['source'], 'keyword')
+
+    @override_settings(HS_BATCH_AI_CHUNK=2)
+    def test_failed_prompt_keeps_local_results(self):
+        from .hs_classification import clasificar_productos
+
+        self._ia(fallar_con='maquinaria')
+        resultado = clasificar_productos(['maquinaria textil', 'Taladro X'])
+        self.assertEqual(resultado['summary']['lotes_ia_fallidos'], 1)
+        maquinaria, taladro = resultado['results']
+        # Coincidencia local de baja confianza: se conserva si la IA falla
+        self.assertEqual(maquinaria['source'], 'keyword')
+        self.assertEqual(maquinaria['classification']['suggested_hs_code'], '8479.89.00')
+        self.assertEqual(taladro['classification']['ai_status'], 'fallback_error')
+
+    def test_view_validates_product_list(self):
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        from .ai_views import BatchClassifyProductsView
+
+        user = TestDataFactory.create_lead_user()
+        factory = APIRequestFactory()
+        request = factory.post('/api/ai/classify-products/', {'products': []}, format='json')
+        force_authenticate(request, user=user)
+        self.assertEqual(BatchClassifyProductsView.as_view()(request).status_code, 400)
+
+        request = factory.post('/api/ai/classify-products/', {'products': ['laptop']}, format='json')
+        force_authenticate(request, user=user)
+        response = BatchClassifyProductsView.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['line'], 1)
+
+
+class HSKeywordMatcherTests(TestCase):
+    """Tests for the compiled HS keyword matcher"""
+
+    DESCRIPCIONES = [
+        'Zapatos de cuero para dama',
+        'LAPTOP Dell Inspiron 15',
+        'Equipo de aire acondicionado split 12000 BTU',
+        'Camiseta de algodón estampada',
+        'Máquina de café espresso',
+        'repuestos varios sin clasificar',
+        '',
+    ]
+
+    def _normalizado(self, texto):
+        from .gemini_service import _normalize_text
+        return _normalize_text(texto)
+
+    def _legacy(self, descripcion):
+        from .gemini_service import HS_KEYWORD_MAPPING
+        texto = self._normalizado(descripcion)
+        for keyword in HS_KEYWORD_MAPPING:
+            if keyword in texto:
+                return keyword
+        return None
+
+    def _matcher(self):
+        from .hs_matcher import HSMatcher, _palabras_diccionario
+        return HSMatcher(_palabras_diccionario())
+
+    def test_dictionary_matches_legacy_substring_loop(self):
+        matcher = self._matcher()
+        for descripcion in self.DESCRIPCIONES:
+            palabra = matcher.mejor(descripcion)
+            self.assertEqual(palabra.ref if palabra else None, self._legacy(descripcion), descripcion)
+
+    def test_fallback_suggestion_uses_matcher(self):
+        from .gemini_service import _fallback_hs_suggestion
+        resultado = _fallback_hs_suggestion('Zapatos de cuero')
+        self.assertEqual(resultado['suggested_hs_code'], '6403.99.00')
+        self.assertEqual(resultado['ai_status'], 'fallback_keyword')
+        self.assertIn('"zapato"', resultado['reasoning'])
+        self.assertEqual(_fallback_hs_suggestion('xyz')['suggested_hs_code'], '9999.00.00')
+
+    def test_process_matcher_is_built_once(self):
+        from .hs_matcher import obtener_matcher
+        self.assertIs(obtener_matcher(), obtener_matcher())
+
+    def test_long_description_matches_and_memo_is_bounded(self):
+        from unittest import mock
+        matcher = self._matcher()
+        larga = ' '.join(self.DESCRIPCIONES * 60)[:2000]
+        self.assertGreaterEqual(len(larga), 1900)
+        self.assertEqual(matcher.mejor(larga).ref, self._legacy(larga))
+        self.assertEqual(
+            [p.ref for p in matcher.coincidencias(larga)],
+            [p.ref for p in sorted(
+                (p for p in matcher.palabras if p.texto in self._normalizado(larga)), key=lambda p: p.prioridad
+            )],
+        )
+
+        with mock.patch('SalesModule.hs_matcher.MAX_MEMO_FRAGMENTOS', 5):
+            for i in range(20):
+                matcher.coincidencias(f'producto{i} de cuero')
+            self.assertLessEqual(len(matcher._memo), 5)
+
+
+class GazetteerAddressTests(TestCase):
+    """Tests for local address resolution and the validated address cache"""
+
+    def _gemini(self, resultado):
+        from unittest import mock
+        from . import address_validation_service
+        llamadas = []
+
+        def validar(address, city, country='Ecuador'):
+            llamadas.append((address, city))
+            return dict(resultado)
+
+        patcher = mock.patch.object(address_validation_service, 'validate_address_with_gemini', validar)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return llamadas
+
+    def test_resolves_sector_within_city(self):
+        from .gazetteer import obtener_gazetteer
+        gazetteer = obtener_gazetteer()
+        ubicacion = gazetteer.ubicar('Cdla. Kennedy Norte, Mz. 5 Villa 3', 'GYE')
+        self.assertEqual(ubicacion.ciudad.nombre, 'Guayaquil')
+        self.assertEqual(ubicacion.lugar.nombre, 'Kennedy')
+        self.assertEqual(gazetteer.ubicar('Parque Industrial Itulcachi, galpón 2', 'Quito, Pichincha').lugar.tipo, 'zona_industrial')
+        # Nombres de calle y sectores de otra ciudad no cuentan
+        self.assertEqual(gazetteer.ubicar('Av. Quito 123 y Calle Tarqui', 'Guayaquil').lugar.nombre, 'Guayaquil')
+        self.assertEqual(gazetteer.ubicar('Urdesa Central', 'Cuenca').lugar.nombre, 'Cuenca')
+        self.assertIsNone(gazetteer.ubicar('Calle 1', 'Atlantis'))
+        self.assertEqual(gazetteer.zona_tarifaria('gye'), 'PERIMETRO URBANO')
+
+    def test_known_sector_skips_gemini(self):
+        from .address_validation_service import validate_address
+        llamadas = self._gemini({'success': False})
+        resultado = validate_address('Km 10 Vía a Daule, bodega 4', 'Guayaquil')
+        self.assertEqual(llamadas, [])
+        self.assertEqual(resultado['source'], 'gazetteer')
+        self.assertEqual(resultado['neighborhood'], 'Vía a Daule')
+        self.assertEqual(resultado['tariff_zone'], 'PERIMETRO URBANO')
+        self.assertTrue(resultado['google_maps_link'].startswith('https://www.google.com/maps?q=-2.1'))
+
+    def test_unknown_address_validated_once(self):
+        from .address_validation_service import validate_address
+        llamadas = self._gemini({
+            'success': True, 'validated_address': 'Av. Francisco de Orellana 234, Guayaquil',
+            'latitude': Decimal('-2.170000'), 'longitude': Decimal('-79.896000'),
+            'google_maps_link': 'https://www.google.com/maps?q=-2.17,-79.896', 'confidence': 85,
+        })
+        primero = validate_address('Av. Francisco de Orellana 234', 'GYE')
+        segundo = validate_address('AVENIDA FRANCISCO DE ORELLANA, 234', 'Guayaquil')
+        self.assertEqual(llamadas, [('Av. Francisco de Orellana 234', 'Guayaquil')])
+        self.assertEqual(primero['source'], 'ai')
+        self.assertEqual(segundo['source'], 'cache')
+        self.assertEqual(segundo['latitude'], Decimal('-2.170000'))
+        self.assertEqual(segundo['tariff_zone'], 'PERIMETRO URBANO')
+
+    def test_city_centre_when_gemini_unavailable_or_off_map(self):
+        from .address_validation_service import validate_address
+        from .models import ValidatedAddress
+        self._gemini({'success': True, 'latitude': Decimal('40.4'), 'longitude': Decimal('-3.7')})
+        resultado = validate_address('Calle Bolívar 10-20', 'Cuenca')
+        self.assertEqual(resultado['source'], 'gazetteer')
+        self.assertEqual(resultado['city'], 'Cuenca')
+        self.assertEqual(resultado['confidence'], 50)
+        self.assertFalse(ValidatedAddress.objects.exists())
+
+    def test_inland_tariffs_resolve_city_aliases(self):
+        from .models import InlandFCLTariff
+        from .reference_tables import invalidar_tablas, obtener_tablas_referencia
+        InlandFCLTariff.objects.create(destination_city='PERIMETRO URBANO', container_type='ALL', rate_usd=Decimal('275.00'))
+        invalidar_tablas()
+        tablas = obtener_tablas_referencia()
+        self.assertEqual([t.destination_city for t in tablas.transporte_fcl.buscar('GYE')], ['PERIMETRO URBANO'])
+        self.assertEqual(tablas.transporte_fcl.buscar('Guayaquil'), tablas.transporte_fcl.buscar('gye'))
+        self.assertEqual(tablas.transporte_fcl.buscar('Loja'), [])
+
+
+class AssistantChatStreamTests(TestCase):
+    """Tests for the streaming assistant chat with server-side context"""
+
+    def setUp(self):
+        self.user = TestDataFactory.create_lead_user()
+
+    def _cliente(self, fragmentos):
+        from types import SimpleNamespace
+        from unittest import mock
+        from . import gemini_service
+
+        cliente = SimpleNamespace(llamadas=[], cerrado=False)
+
+        def generate_content_stream(**kwargs):
+            cliente.llamadas.append(kwargs)
+
+            def flujo():
+                try:
+                    for texto in fragmentos:
+                        yield SimpleNamespace(text=texto)
+                finally:
+                    cliente.cerrado = True
+            return flujo()
+
+        cliente.models = SimpleNamespace(generate_content_stream=generate_content_stream)
+        for nombre, valor in (('client', cliente), ('GEMINI_AVAILABLE', True)):
+            patcher = mock.patch.object(gemini_service, nombre, valor)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        return cliente
+
+    def _eventos(self, partes):
+        return [parte.decode('utf-8').split('\n', 1)[0].replace('event: ', '') for parte in partes]
+
+    @override_settings(CHAT_CONTEXT_MAX_TURNS=2, CHAT_TURN_MAX_CHARS=20)
+    def test_streams_tokens_and_keeps_compact_context(self):
+        from .assistant_chat import ChatEnFlujo, obtener_sesion
+        cliente = self._cliente(['El arancel ', 'depende de la partida arancelaria.'])
+        sesion = obtener_sesion(self.user)
+
+        partes = list(iter(ChatEnFlujo(sesion, '¿Cuánto paga un celular?')))
+        self.assertEqual(self._eventos(partes), ['start', 'token', 'token', 'done'])
+        self.assertIn('"text": "El arancel "', partes[1].decode('utf-8'))
+
+        sesion = obtener_sesion(self.user, str(sesion.session_key))
+        self.assertEqual(sesion.turn_count, 1)
+        self.assertEqual([t['role'] for t in sesion.turns], ['user', 'model'])
+        self.assertLessEqual(len(sesion.turns[1]['text']), 20)
+
+        list(iter(ChatEnFlujo(sesion, '¿Y una laptop?')))
+        # Segundo turno: solo el contexto compacto y el mensaje nuevo
+        self.assertEqual(len(cliente.llamadas[1]['contents']), 3)
+        sesion.refresh_from_db()
+        self.assertEqual(sesion.turn_count, 2)
+        self.assertEqual(sesion.turns[0]['text'], '¿Y una laptop?')
+
+    def test_cancel_stops_stream_and_keeps_partial_answer(self):
+        from .assistant_chat import ChatEnFlujo, cancelar_stream, obtener_sesion
+        cliente = self._cliente(['uno ', 'dos ', 'tres ', 'cuatro'])
+        sesion = obtener_sesion(self.user)
+        chat = ChatEnFlujo(sesion, 'Explica el proceso')
+
+        partes = []
+        for parte in chat:
+            partes.append(parte)
+            if parte.startswith(b'event: token'):
+                cancelar_stream(self.user, chat.stream_id)
+        self.assertEqual(self._eventos(partes), ['start', 'token', 'cancelled'])
+        self.assertTrue(cliente.cerrado)
+        sesion.refresh_from_db()
+        self.assertEqual(sesion.turns[1]['text'], 'uno [respuesta interrumpida]')
+
+    def test_cancel_route_uses_the_shared_cache(self):
+        from django.core.cache.backends.db import DatabaseCache
+        from rest_framework.test import APIClient
+        from .assistant_chat import ChatEnFlujo, _clave_cancelacion, obtener_sesion
+        self._cliente(['uno ', 'dos ', 'tres '])
+        chat = ChatEnFlujo(obtener_sesion(self.user), 'Explica el proceso')
+        api = APIClient()
+        api.force_authenticate(user=self.user)
+
+        eventos = []
+        for parte in chat:
+            eventos.append(parte)
+            if parte.startswith(b'event: token'):
+                respuesta = api.post('/api/ai/aduana-chat/stream/cancel/', {'stream_id': chat.stream_id}, format='json')
+                self.assertEqual(respuesta.status_code, 202)
+                # Otro worker lee la misma tabla de caché
+                otro_worker = DatabaseCache('importaya_cache', {})
+                self.assertTrue(otro_worker.get(_clave_cancelacion(self.user.pk, chat.stream_id)))
+        self.assertEqual(self._eventos(eventos), ['start', 'token', 'cancelled'])
+
+    def test_async_iteration_for_asgi(self):
+        from asgiref.sync import async_to_sync
+        from .assistant_chat import ChatEnFlujo, obtener_sesion
+        self._cliente(['Hola', ' mundo'])
+        chat = ChatEnFlujo(obtener_sesion(self.user), 'Hola')
+
+        async def consumir():
+            return [parte async for parte in chat]
+
+        self.assertEqual(self._eventos(async_to_sync(consumir)()), ['start', 'token', 'token', 'done'])
+        chat.sesion.refresh_from_db()
+        self.assertEqual(chat.sesion.turns[1]['text'], 'Hola mundo')
+
+    def test_stream_view(self):
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        from .ai_views import AduanaChatStreamView
+
+        factory = APIRequestFactory()
+        request = factory.post('/api/ai/aduana-chat/stream/', {'message': 'Hola', 'session_id': 'no-existe'}, format='json')
+        force_authenticate(request, user=self.user)
+        self.assertEqual(AduanaChatStreamView.as_view()(request).status_code, 404)
+
+        self._cliente(['Hola'])
+        request = factory.post('/api/ai/aduana-chat/stream/', {'message': 'Hola'}, format='json')
+        force_authenticate(request, user=self.user)
+        response = AduanaChatStreamView.as_view()(request)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        cuerpo = b''.join(response.streaming_content).decode('utf-8')
+        self.assertIn('event: start', cuerpo)
+        self.assertIn('event: done', cuerpo)
+
+
+class AIUsageSchedulerTests(TestCase):
+    """Tests for AI quotas, shared execution slots and usage counters"""
+
+    def setUp(self):
+        from unittest import mock
+        from django.core.cache import cache
+        from . import ai_scheduler
+
+        cache.clear()
+        self.user = TestDataFactory.create_lead_user()
+        self.programador = ai_scheduler.ProgramadorIA(cupos=2)
+        patcher = mock.patch.object(ai_scheduler, '_programador', self.programador)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _clasificar(self, user):
+        from unittest import mock
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        from .ai_views import ClassifyProductView
+
+        request = APIRequestFactory().post('/api/ai/classify-product/', {'description': 'celular'}, format='json')
+        force_authenticate(request, user=user)
+        with mock.patch('SalesModule.gemini_service.suggest_hs_code', return_value={'hs_code': '8517.13.00'}):
+            return ClassifyProductView.as_view()(request)
+
+    def test_user_tiers(self):
+        from .ai_scheduler import clase_usuario
+        from MasterAdmin.authentication import MasterAdminUser
+
+        self.assertEqual(clase_usuario(self.user), 'lead')
+        self.assertEqual(clase_usuario(MasterAdminUser()), 'master_admin')
+        self.assertEqual(clase_usuario(TestDataFactory.create_admin_user()), 'staff')
+
+        cliente = TestDataFactory.create_lead_user(email='cliente@importaya.ia')
+        LeadCotizacion.objects.create(
+            numero_cotizacion='COT-AI-001', lead_user=cliente, tipo_carga='aereo',
+            origen_pais='China', destino_ciudad='Guayaquil', descripcion_mercancia='Celulares',
+            peso_kg=Decimal('100'), valor_mercancia_usd=Decimal('5000'), estado='aprobada',
+        )
+        self.assertEqual(clase_usuario(cliente), 'paying')
+
+    @override_settings(AI_SCHEDULER_CLASSES={'lead': {'capacidad': 2, 'por_minuto': 6}})
+    def test_user_quota_returns_429_with_retry_hint_and_counts_usage(self):
+        from .models import AIUsageCounter
+
+        self.assertEqual(self._clasificar(self.user).status_code, 200)
+        self.assertEqual(self._clasificar(self.user).status_code, 200)
+        response = self._clasificar(self.user)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.data['reason'], 'user_quota')
+        self.assertEqual(response['Retry-After'], str(response.data['retry_after']))
+        self.assertTrue(1 <= response.data['retry_after'] <= 10)
+
+        # Otro usuario de la misma clase tiene su propio bucket
+        otro = TestDataFactory.create_lead_user(email='otro@importaya.ia')
+        self.assertEqual(self._clasificar(otro).status_code, 200)
+
+        contador = AIUsageCounter.objects.get(user=self.user, operation='hs_suggestion')
+        self.assertEqual((contador.requests, contador.rejected, contador.tier), (2, 1, 'lead'))
+        self.assertEqual(self.programador.stats()['en_uso'], 0)
+
+    def test_low_tiers_leave_slots_for_priority_users(self):
+        from .ai_scheduler import CuotaIAExcedida
+        from MasterAdmin.authentication import MasterAdminUser
+
+        turno = self.programador.reservar(self.user, 'chat')
+        with self.assertRaises(CuotaIAExcedida) as ctx:
+            self.programador.reservar(self.user, 'chat')
+        self.assertEqual(ctx.exception.motivo, 'saturated')
+        self.assertGreaterEqual(ctx.exception.espera_s, 1)
+
+        # El cupo reservado queda para master admin
+        with self.programador.reservar(MasterAdminUser(), 'chat'):
+            self.assertEqual(self.programador.stats()['en_uso'], 2)
+        turno.liberar()
+        turno.liberar()
+        self.assertEqual(self.programador.stats()['en_uso'], 0)
+
+    def test_slots_are_shared_between_workers_and_rejected_without_waiting(self):
+        from django.core.cache.backends.db import DatabaseCache
+        from .ai_scheduler import SLOT_KEY, CuotaIAExcedida, ProgramadorIA
+        from MasterAdmin.authentication import MasterAdminUser
+
+        # Otro worker: su propio programador, el mismo caché
+        otro_worker = ProgramadorIA(cupos=2)
+        admin = MasterAdminUser()
+        primero = self.programador.reservar(admin, 'chat')
+        segundo = otro_worker.reservar(admin, 'chat')
+        self.assertEqual(DatabaseCache('importaya_cache', {}).get_many([SLOT_KEY.format(0), SLOT_KEY.format(1)]).keys(),
+                         {SLOT_KEY.format(0), SLOT_KEY.format(1)})
+
+        inicio = time.monotonic()
+        with self.assertRaises(CuotaIAExcedida) as ctx:
+            self.programador.reservar(admin, 'chat')
+        self.assertLess(time.monotonic() - inicio, 0.5)
+        self.assertEqual(ctx.exception.motivo, 'saturated')
+
+        segundo.liberar()
+        self.assertEqual(self.programador.stats()['en_uso'], 1)
+        with self.programador.reservar(admin, 'chat'):
+            self.assertEqual(otro_worker.stats()['en_uso'], 2)
+        primero.liberar()
+        self.assertEqual(otro_worker.stats()['en_uso'], 0)
+
+    @override_settings(AI_SCHEDULER_CLASSES={'lead': {'capacidad': 1, 'por_minuto': 6}})
+    def test_quota_is_enforced_through_the_mounted_route(self):
+        from unittest import mock
+        from rest_framework.test import APIClient
+
+        cliente = APIClient()
+        cliente.force_authenticate(user=self.user)
+        with mock.patch('SalesModule.gemini_service.suggest_hs_code', return_value={'hs_code': '8517.13.00'}):
+            self.assertEqual(cliente.post('/api/ai/classify-product/', {'description': 'celular'}, format='json').status_code, 200)
+            respuesta = cliente.post('/api/ai/classify-product/', {'description': 'celular'}, format='json')
+        self.assertEqual(respuesta.status_code, 429)
+        self.assertEqual(respuesta.json()['reason'], 'user_quota')
+
+    def test_bucket_lock_is_shared_and_released(self):
+        from django.core.cache import cache
+        from .ai_scheduler import BUCKET_LOCK_KEY, CuotaIAExcedida, consumir_fichas
+
+        self.assertEqual(consumir_fichas('user:lock', 2, 60, ahora=1000.0), (True, 0.0))
+        self.assertIsNone(cache.get(BUCKET_LOCK_KEY.format('user:lock')))
+        # Candado tomado por otro worker: se rechaza en milisegundos sin tocar el bucket
+        cache.set(BUCKET_LOCK_KEY.format('user:lock'), 'otro', timeout=5)
+        inicio = time.monotonic()
+        with self.assertRaises(CuotaIAExcedida) as ctx:
+            consumir_fichas('user:lock', 2, 60, ahora=1000.0)
+        self.assertEqual(ctx.exception.motivo, 'saturated')
+        self.assertLess(time.monotonic() - inicio, 0.5)
+        self.assertEqual(cache.get(BUCKET_LOCK_KEY.format('user:lock')), 'otro')
+        cache.delete(BUCKET_LOCK_KEY.format('user:lock'))
+        self.assertEqual(consumir_fichas('user:lock', 2, 60, ahora=1000.0), (True, 0.0))
+        self.assertFalse(consumir_fichas('user:lock', 2, 60, ahora=1000.0)[0])
+
+    def test_master_admin_usage_view(self):
+        from MasterAdmin.authentication import create_master_admin_session
+        from .ai_scheduler import registrar_uso
+
+        registrar_uso(self.user, 'lead', 'chat')
+        registrar_uso(self.user, 'lead', 'chat')
+        registrar_uso(self.user, 'lead', 'hs_batch', costo=3)
+        registrar_uso(self.user, 'lead', 'chat', rechazada=True)
+
+        self.assertEqual(self.client.get('/api/admin/ai-usage/').status_code, 403)
+        response = self.client.get('/api/admin/ai-usage/', HTTP_X_MASTER_ADMIN_TOKEN=create_master_admin_session())
+        self.assertEqual(response.status_code, 200)
+        datos = response.json()
+        self.assertEqual(datos['totals'], {'users': 1, 'requests': 3, 'rejected': 1})
+        usuario = datos['users'][0]
+        self.assertEqual(usuario['email'], self.user.email)
+        self.assertEqual(usuario['units'], 5)
+        self.assertEqual(usuario['by_operation']['chat'], {'requests': 2, 'rejected': 1})
+        self.assertIn('en_uso', datos['scheduler'])
+
+
+class QuotePdfRenderAssetTests(TestCase):
+    """Tests for the process-level style and static flowable cache of quote PDFs"""
+
+    def _quote(self, transport_type, origin='SHANGHAI'):
+        from types import SimpleNamespace
+        return SimpleNamespace(
+            id=7, submission_number='IYA-00007', company_name='Importaciones Ecuador S.A.',
+            contact_name='Carlos Importador', city='Guayaquil', transport_type=transport_type,
+            container_type='1x40HC', incoterm='FOB', destination='Guayaquil', origin=origin,
+            cargo_weight_kg=500, cargo_volume_cbm=3, quantity=1,
+        )
+
+    def _render_all(self):
+        from SalesModule.reports.quote_pdf_generator import generate_quote_pdf, generate_multi_scenario_pdf
+        return [
+            generate_quote_pdf(self._quote('LCL'), {'dias_transito': '30'}).getvalue(),
+            generate_quote_pdf(self._quote('AEREO'), {}).getvalue(),
+            generate_multi_scenario_pdf(self._quote('LCL'), [{'nombre': 'Directo', 'total_usd': 950}]).getvalue(),
+        ]
+
+    def test_cached_assets_render_identical_pdfs(self):
+        from unittest import mock
+        from reportlab import rl_config
+        from SalesModule.reports import render_assets
+
+        with mock.patch.object(rl_config, 'invariant', 1):
+            render_assets.clear()
+            cold = self._render_all()
+            builds = render_assets.stats()['paragraph_builds']
+            warm = self._render_all()
+
+        self.assertEqual(cold, warm)
+        self.assertEqual(render_assets.stats()['paragraph_builds'], builds)
+        self.assertGreater(render_assets.stats()['paragraph_hits'], 0)
+
+    def test_styles_are_built_once(self):
+        from SalesModule.reports.quote_pdf_generator import get_custom_styles
+        styles = get_custom_styles()
+        self.assertIs(get_custom_styles(), styles)
+        self.assertEqual(styles['EmcWarning'].borderWidth, 1)
+
+    def test_benchmark_warm_assets_reduce_cpu_per_pdf(self):
+        import gc
+        from SalesModule.reports import render_assets
+
+        def cpu_por_pdf():
+            inicio = time.process_time()
+            self._render_all()
+            return (time.process_time() - inicio) / 3
+
+        self._render_all()
+        cold = warm = float('inf')
+        gc.disable()
+        try:
+            # Alternar frío y caliente para que el ruido de la máquina afecte a ambos
+            for _ in range(8):
+                render_assets.clear()
+                cold = min(cold, cpu_por_pdf())
+                warm = min(warm, cpu_por_pdf())
+        finally:
+            gc.enable()
+        self.assertLess(warm, cold)
+
+
+class QuotePdfDataAssemblerTests(TestCase):
+    """Tests for the single-query view model behind multi-port quote PDFs"""
+
+    RATES = [
+        {'pol_name': 'SHANGHAI PUDONG', 'carrier_name': 'MSC', 'validity_date': date(2030, 1, 31), 'free_days': 14,
+         'transit_time': '35', 'cost_20gp': Decimal('900'), 'cost_40gp': Decimal('1000'), 'cost_40hc': Decimal('1000')},
+        {'pol_name': 'HUANGPU', 'carrier_name': 'EVERGREEN LINE', 'validity_date': date(2030, 1, 31), 'free_days': 21,
+         'transit_time': '45', 'cost_20gp': Decimal('1100'), 'cost_40gp': Decimal('1200'), 'cost_40hc': Decimal('1250')},
+        {'pol_name': 'SHANGHAI', 'carrier_name': 'COSCO SHIPPING LINES CO. LTD.', 'validity_date': date(2030, 1, 31),
+         'free_days': 21, 'transit_time': '33', 'cost_20gp': Decimal('1200'), 'cost_40gp': Decimal('1300'),
+         'cost_40hc': Decimal('1400')},
+    ]
+    LOCAL_COSTS = [
+        {'code': 'THC_DESTINO', 'carrier_code': 'EMC', 'port': 'GYE', 'cost_usd': Decimal('210')},
+        {'code': 'THC_DESTINO', 'carrier_code': 'COSCO', 'port': 'GYE', 'cost_usd': Decimal('240')},
+        {'code': 'HANDLING', 'carrier_code': 'COSCO', 'port': 'PSJ', 'cost_usd': Decimal('70')},
+        {'code': 'HANDLING', 'carrier_code': 'MSC', 'port': 'GYE', 'cost_usd': Decimal('999')},
+    ]
+
+    def _quote(self, origin):
+        from types import SimpleNamespace
+        return SimpleNamespace(
+            id=9, submission_number=None, company_name='Importaciones Ecuador S.A.', contact_name='Carlos',
+            city='Guayaquil', transport_type='FCL', container_type='1x40HC', incoterm='FOB',
+            destination='Guayaquil', origin=origin, cargo_weight_kg=None, cargo_volume_cbm=None, quantity=2,
+        )
+
+    def test_rate_selection_keeps_exact_before_partial_precedence(self):
+        from SalesModule.reports.quote_data import fcl_ports_data
+
+        ports, carriers = fcl_ports_data(['SHANGHAI', 'GUANGZHOU', 'MANILA'], self.RATES)
+        # Exacto SHANGHAI aunque SHANGHAI PUDONG sea más barato
+        self.assertEqual(ports[0]['carrier'], 'COSCO SHIPPING LINES CO. LTD.')
+        self.assertEqual(ports[1]['pol'], 'HUANGPU-GUANGZHOU')
+        self.assertEqual(ports[2]['validity'], 'Consultar')
+        self.assertEqual(carriers, ['COSCO SHIPPING LINES CO. LTD.', 'EVERGREEN LINE'])
+
+    def test_local_costs_picked_in_memory(self):
+        from SalesModule.reports.quote_data import carrier_local_costs, highest_local_costs
+
+        self.assertEqual(highest_local_costs(self.LOCAL_COSTS, ['EMC', 'COSCO']),
+                         {'thc': Decimal('240'), 'handling': Decimal('70')})
+        self.assertEqual(carrier_local_costs(self.LOCAL_COSTS, 'COSCO'), {'thc': Decimal('240')})
+        self.assertIsNone(carrier_local_costs(self.LOCAL_COSTS, 'ONE'))
+
+    def test_multiport_quote_assembled_with_two_queries_and_rendered_without_orm(self):
+        from unittest import mock
+        from SalesModule.reports import quote_data
+        from SalesModule.reports.quote_pdf_generator import render_quote_pdf
+
+        with mock.patch.object(quote_data, 'fetch_fcl_rates', return_value=self.RATES) as rates, \
+                mock.patch.object(quote_data, 'fetch_local_costs', return_value=self.LOCAL_COSTS) as costs:
+            data = quote_data.assemble_quote_pdf_data(self._quote('SHANGHAI | GUANGZHOU'), '{"dias_libres": 14}')
+        self.assertEqual(rates.call_count, 1)
+        self.assertEqual(costs.call_count, 1)
+        self.assertEqual(sorted(costs.call_args[0][0]), ['COSCO', 'EMC'])
+        self.assertTrue(data.uses_highest_local_costs)
+        self.assertEqual(data.quote_number, 'IYA-00009')
+        self.assertEqual(data.scenario, {'dias_libres': 14})
+
+        with self.assertNumQueries(0):
+            pdf = render_quote_pdf(data).getvalue()
+        self.assertTrue(pdf.startswith(b'%PDF'))
+
+    def test_single_port_quote_fetches_only_carrier_local_costs(self):
+        from unittest import mock
+        from SalesModule.reports import quote_data
+
+        with mock.patch.object(quote_data, 'fetch_fcl_rates') as rates, \
+                mock.patch.object(quote_data, 'fetch_local_costs', return_value=self.LOCAL_COSTS) as costs:
+            data = quote_data.assemble_quote_pdf_data(self._quote('SHANGHAI'), {'carrier_name': 'EVERGREEN LINE'})
+        rates.assert_not_called()
+        costs.assert_called_once_with(['EMC'])
+        self.assertEqual(data.local_costs, {'thc': Decimal('210')})
+        self.assertFalse(data.uses_highest_local_costs)
+
+
+    def test_fetchers_query_live_provider_rates(self):
+        from SalesModule.models import LogisticsProvider, ProviderRate
+        from SalesModule.reports import quote_data
+
+        evergreen = LogisticsProvider.objects.create(name='EVERGREEN LINE', code='EVERGR', transport_type='FCL')
+        cosco = LogisticsProvider.objects.create(name='COSCO SHIPPING LINES CO. LTD.', code='COSCO', transport_type='FCL')
+        saco = LogisticsProvider.objects.create(name='SACO SHIPPING', code='SACO', transport_type='LCL')
+        vigencia = {'valid_from': date.today(), 'valid_to': date.today() + timedelta(days=30)}
+
+        def tarifa(provider, origen, tipo, costo, thc='200', unit='CONTAINER', destino='GYE'):
+            ProviderRate.objects.create(
+                provider=provider, origin_port=origen, origin_country='CN', destination=destino, container_type=tipo,
+                rate_usd=Decimal(costo), unit=unit, thc_destination_usd=Decimal(thc),
+                transit_days_min=33, transit_days_max=33, **vigencia
+            )
+
+        for tipo, costo in [('20GP', '1100'), ('40GP', '1200'), ('40HC', '1250')]:
+            tarifa(evergreen, 'HUANGPU', tipo, costo, thc='210')
+        tarifa(cosco, 'SHANGHAI', '40HC', '1400', thc='240')
+        tarifa(cosco, 'SHANGHAI', '40HC', '900', destino='PSJ')
+        tarifa(saco, 'SHANGHAI', '', '65', unit='CBM')
+
+        rates = quote_data.fetch_fcl_rates(['SHANGHAI', 'GUANGZHOU'])
+        self.assertEqual([(r['pol_name'], r['cost_20gp'], r['cost_40hc']) for r in rates],
+                         [('HUANGPU', Decimal('1100'), Decimal('1250')), ('SHANGHAI', None, Decimal('1400'))])
+        self.assertEqual(rates[1]['transit_time'], '33 días')
+        lcl = quote_data.fetch_lcl_rates(['SHANGHAI'])
+        self.assertEqual([(r['pol_name'], r['lcl_rate_per_cbm']) for r in lcl], [('SHANGHAI', Decimal('65'))])
+
+        with self.assertNumQueries(2):
+            data = quote_data.assemble_quote_pdf_data(self._quote('SHANGHAI | GUANGZHOU'), {})
+        self.assertEqual([p['carrier'] for p in data.ports], ['COSCO SHIPPING LINES CO. LTD.', 'EVERGREEN LINE'])
+        self.assertEqual(data.ports[1]['pol'], 'HUANGPU-GUANGZHOU')
+        self.assertEqual(data.local_costs, {'thc': Decimal('240')})
+
+
+class QuotePdfBatchRenderTests(TestCase):
+    """Tests for batch quote PDF rendering into a streamed ZIP"""
+
+    def _zip(self, content):
+        import io
+        import zipfile
+        return zipfile.ZipFile(io.BytesIO(content))
+
+    def _items(self, count):
+        from SalesModule.management.commands.generate_test_data import sample_quote_submissions
+        from SalesModule.reports.batch_render import prepare_batch
+        return prepare_batch(sample_quote_submissions(count))
+
+    @override_settings(PDF_BATCH_WORKERS=1)
+    def test_in_process_batch_streams_zip_and_reports_progress(self):
+        from SalesModule.reports.batch_render import BatchItem, PdfBatchJob, get_batch_status
+
+        items = self._items(4) + [BatchItem('QS-ROTA.pdf', None, 'sin tarifas')]
+        progress = []
+        job = PdfBatchJob(items, owner_id=7, progress=lambda done, total, name: progress.append((done, total)))
+        chunks = list(job.stream_zip())
+
+        self.assertGreater(len(chunks), 1)
+        archive = self._zip(b''.join(chunks))
+        self.assertEqual(sorted(archive.namelist()), [
+            'ERRORES.txt', 'QS-TEST00001.pdf', 'QS-TEST00002.pdf', 'QS-TEST00003.pdf', 'QS-TEST00004.pdf',
+        ])
+        self.assertIsNone(archive.testzip())
+        self.assertTrue(archive.read('QS-TEST00003.pdf').startswith(b'%PDF'))
+        self.assertIn(b'QS-ROTA.pdf: sin tarifas', archive.read('ERRORES.txt'))
+        self.assertEqual(progress[-1], (5, 5))
+        self.assertEqual(get_batch_status(job.job_id), {
+            'job_id': job.job_id, 'owner_id': 7, 'status': 'completed', 'total': 5, 'done': 5, 'failed': 1,
+        })
+
+    @override_settings(PDF_BATCH_WORKERS=1)
+    def test_multiport_batch_assembled_from_live_rates(self):
+        from SalesModule.management.commands.generate_test_data import sample_quote_submissions
+        from SalesModule.models import LogisticsProvider, ProviderRate
+        from SalesModule.reports.batch_render import PdfBatchJob, prepare_batch
+
+        msc = LogisticsProvider.objects.create(name='MSC', code='MSC', transport_type='FCL')
+        saco = LogisticsProvider.objects.create(name='SACO SHIPPING', code='SACO', transport_type='LCL')
+        vigencia = {'valid_from': date.today(), 'valid_to': date.today() + timedelta(days=30)}
+        for origen, tipo, costo, unit in [('SHANGHAI', '40HC', '2700', 'CONTAINER'), ('NINGBO', '40HC', '2600', 'CONTAINER'),
+                                          ('SHANGHAI', '', '65', 'CBM')]:
+            ProviderRate.objects.create(
+                provider=saco if unit == 'CBM' else msc, origin_port=origen, origin_country='CN', destination='GYE',
+                container_type=tipo, rate_usd=Decimal(costo), unit=unit, thc_destination_usd=Decimal('230'), **vigencia
+            )
+
+        quotes = sample_quote_submissions(2)
+        for quote, _ in quotes:
+            quote.origin = 'SHANGHAI | NINGBO'
+        items = prepare_batch(quotes)
+
+        self.assertEqual([item.error for item in items], ['', ''])
+        fcl, lcl = (item.data for item in items)
+        self.assertEqual([(p['pol'], p['cost_40hc'], p['carrier']) for p in fcl.ports],
+                         [('SHANGHAI', Decimal('2700'), 'MSC'), ('NINGBO', Decimal('2600'), 'MSC')])
+        self.assertEqual(fcl.local_costs, {'thc': Decimal('230')})
+        self.assertEqual([(p['pol'], p['rate_per_cbm']) for p in lcl.ports],
+                         [('SHANGHAI', Decimal('65')), ('NINGBO', Decimal('0'))])
+
+        job = PdfBatchJob(items)
+        archive = self._zip(b''.join(job.stream_zip()))
+        self.assertEqual(sorted(archive.namelist()), ['QS-TEST00001.pdf', 'QS-TEST00002.pdf'])
+        self.assertEqual(job.failed, 0)
+
+    def test_duplicate_quotes_get_distinct_names(self):
+        from SalesModule.management.commands.generate_test_data import sample_quote_submissions
+        from SalesModule.reports.batch_render import prepare_batch
+
+        quote, scenario = sample_quote_submissions(1)[0]
+        names = [item.name for item in prepare_batch([(quote, scenario), (quote, {'dias_transito': '40'})])]
+        self.assertEqual(names, ['QS-TEST00001.pdf', 'QS-TEST00001-2.pdf'])
+
+    @override_settings(PDF_BATCH_WORKERS=2)
+    def test_process_pool_renders_every_pdf(self):
+        from SalesModule.reports import batch_render
+
+        try:
+            job = batch_render.PdfBatchJob(self._items(3))
+            archive = self._zip(job.render_zip())
+        finally:
+            batch_render.shutdown_pool()
+        self.assertEqual(sorted(archive.namelist()), ['QS-TEST00001.pdf', 'QS-TEST00002.pdf', 'QS-TEST00003.pdf'])
+        self.assertEqual(job.failed, 0)
+        for name in archive.namelist():
+            self.assertTrue(archive.read(name).startswith(b'%PDF'))
+
+    @override_settings(PDF_BATCH_WORKERS=1)
+    def test_batch_endpoint_is_staff_only_and_exposes_progress(self):
+        from SalesModule.management.commands.generate_test_data import sample_quote_submissions
+
+        ids = [quote.id for quote, _ in sample_quote_submissions(2, save=True)]
+        client = APIClient()
+        lead = User.objects.create_user(username='lead_pdf', email='lead_pdf@test.com', password='x')
+        staff = User.objects.create_user(username='staff_pdf', email='staff_pdf@test.com', password='x', role='staff')
+
+        client.force_authenticate(user=lead)
+        response = client.post('/api/sales/submissions/pdf-batch/', {'submission_ids': ids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        client.force_authenticate(user=staff)
+        response = client.post('/api/sales/submissions/pdf-batch/', {'submission_ids': ids + [999999]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.data['missing'], [999999])
+
+        response = client.post('/api/sales/submissions/pdf-batch/', {
+            'items': [{'submission_id': ids[0], 'scenario': {'dias_transito': '25'}}],
+            'submission_ids': ids,
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        archive = self._zip(b''.join(response.streaming_content))
+        self.assertEqual(len(archive.namelist()), 3)
+
+        job_id = response['X-Batch-Job-Id']
+        status_response = client.get(f'/api/sales/submissions/pdf-batch/{job_id}/')
+        self.assertEqual(status_response.data['status'], 'completed')
+        self.assertEqual(status_response.data['done'], 3)
+
+        client.force_authenticate(user=lead)
+        self.assertEqual(client.get(f'/api/sales/submissions/pdf-batch/{job_id}/').status_code,
+                         status.HTTP_403_FORBIDDEN)
+
+    @override_settings(PDF_BATCH_WORKERS=1)
+    def test_status_endpoint_reads_progress_from_the_shared_cache(self):
+        from unittest import mock
+        from django.core.cache.backends.db import DatabaseCache
+        from SalesModule.reports.batch_render import PdfBatchJob
+
+        staff = User.objects.create_user(username='staff_poll', email='staff_poll@test.com', password='x', role='staff')
+        client = APIClient()
+        client.force_authenticate(user=staff)
+        vistos = []
+
+        def consultar(done, total, name):
+            # The poll lands on another worker: nothing shared but the cache table
+            with mock.patch('django.core.cache.cache', DatabaseCache('importaya_cache', {})):
+                response = client.get(f'/api/sales/submissions/pdf-batch/{job.job_id}/')
+            vistos.append((response.status_code, response.data['status'], response.data['done']))
+
+        job = PdfBatchJob(self._items(3), owner_id=staff.pk, progress=consultar)
+        job.render_zip()
+        self.assertEqual(vistos, [(200, 'running', 1), (200, 'running', 2), (200, 'completed', 3)])
@@ -7,7 +7,8 @@ from rest_framework_simplejwt.views import (
 # ... tus otras importaciones ...
 from rest_framework.routers import DefaultRouter
 from .views import (
-    UserProfileView, AdminRucApprovalView,
+    UserProfileView, AdminRucApprovalView, LocationAutocompleteView, LandedCostSimulatorView,
+    ContainerPlanView,
     LeadViewSet, OpportunityViewSet, QuoteViewSet, TaskReminderViewSet,
     MeetingViewSet, APIKeyViewSet, BulkLeadImportViewSet,
     QuoteSubmissionViewSet, CostRateViewSet, LeadCotizacionViewSet,
@@ -74,4 +75,7 @@ urlpatterns = [
     # Endpoints especiales existentes
     path('me/', UserProfileView.as_view(), name='user-profile'),
     path('admin/approve-ruc/', AdminRucApprovalView.as_view(), name='admin-ruc-approval'),
+    path('autocomplete/locations/', LocationAutocompleteView.as_view(), name='location-autocomplete'),
+    path('simulator/landed-cost/', LandedCostSimulatorView.as_view(), name='landed-cost-simulator'),
+    path('quote-builder/container-plan/', ContainerPlanView.as_view(), name='container-plan'),
 ]
\ No newline at end of file
@@ -4,6 +4,8 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.views import APIView
 
+from .permissions import IsStaffUser
+
 # Importamos TODOS los modelos y serializadores nuevos
 from .models import (
     Lead, Opportunity, Quote, TaskReminder, Meeting, APIKey, BulkLeadImport,
@@ -95,6 +97,113 @@ class AdminRucApprovalView(APIView):
         except Exception:
             return Response({"error": "RUC no encontrado"}, status=404)
 
+class LocationAutocompleteView(APIView):
+    """
+    Typeahead de puertos y aeropuertos para los selectores de origen/destino.
+    Responde desde el índice en memoria (autocomplete.py), sin consultar la BD.
+    GET ?q=shang&type=port|airport&limit=10
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        from .autocomplete import get_autocomplete_index
+
+        query = request.query_params.get('q', '').strip()
+        kind = request.query_params.get('type') or None
+        if kind not in (None, 'all', 'port', 'airport'):
+            return Response({"error": "type debe ser port, airport o all"}, status=status.HTTP_400_BAD_REQUEST)
+        if kind == 'all':
+            kind = None
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 10)), 50))
+        except ValueError:
+            limit = 10
+
+        index = get_autocomplete_index()
+        etag = index.etag(query, kind, limit)
+        if etag in request.headers.get('If-None-Match', ''):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response({"query": query, "results": index.search(query, kind=kind, limit=limit)})
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, max-age=300'
+        return response
+
+class LandedCostSimulatorView(APIView):
+    """
+    Simulador what-if de costo puesto en destino (landed_cost_simulator.py).
+    Recibe rangos de opciones y devuelve la grilla completa en una sola llamada.
+    POST {"pol": "Shanghai", "pod": "Guayaquil", "valor_mercancia_usd": 25000,
+          "transportes": ["FCL", "LCL"], "incoterms": ["FOB", "CIF"], "isd": [true, false], ...}
+    """
+    permission_classes = [IsAuthenticated]
+
+    CAMPOS = (
+        'peso_kg', 'volumen_cbm', 'transportes', 'contenedores', 'ciudades', 'incoterms',
+        'isd', 'seguridad', 'ad_valorem_pct', 'destination_port', 'cantidad',
+    )
+
+    def post(self, request):
+        from .landed_cost_simulator import simular_costos_importacion_json
+
+        pol = str(request.data.get('pol', '')).strip()
+        pod = str(request.data.get('pod', '')).strip()
+        if not pol or not pod or request.data.get('valor_mercancia_usd') in (None, ''):
+            return Response({"error": "pol, pod y valor_mercancia_usd son obligatorios"}, status=status.HTTP_400_BAD_REQUEST)
+
+        parametros = {campo: request.data[campo] for campo in self.CAMPOS if request.data.get(campo) not in (None, '')}
+        if 'cantidad' in parametros:
+            try:
+                parametros['cantidad'] = int(parametros['cantidad'])
+            except (TypeError, ValueError):
+                return Response({"error": "cantidad debe ser un entero"}, status=status.HTTP_400_BAD_REQUEST)
+
+        resultado = simular_costos_importacion_json(
+            pol=pol, pod=pod, valor_mercancia_usd=request.data.get('valor_mercancia_usd'), **parametros
+        )
+        if not resultado['exito']:
+            return Response(resultado, status=status.HTTP_400_BAD_REQUEST)
+        return Response(resultado)
+
+class ContainerPlanView(APIView):
+    """
+    Plan de contenedores para una cotización FCL (container_logic.py).
+    Sin "selecciones" devuelve las mezclas más baratas que cubren la carga; con
+    "selecciones" valida la elección del LEAD y la compara con el plan óptimo.
+    POST {"volumen_cbm": 90, "peso_kg": 20000, "pol": "Shanghai", "pod": "Guayaquil",
+          "selecciones": [{"tipo": "40HC", "cantidad": 2}]}
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        from .container_logic import optimizar_mezcla_contenedores_json, validar_seleccion_multicontenedor_json
+
+        volumen = request.data.get('volumen_cbm')
+        peso = request.data.get('peso_kg')
+        if volumen in (None, '') or peso in (None, ''):
+            return Response({"error": "volumen_cbm y peso_kg son obligatorios"}, status=status.HTTP_400_BAD_REQUEST)
+
+        ruta = {
+            'pol': str(request.data.get('pol', '')).strip() or None,
+            'pod': str(request.data.get('pod', '')).strip() or None,
+            'destination_port': str(request.data.get('destination_port') or 'GYE').strip().upper(),
+        }
+        selecciones = request.data.get('selecciones')
+        if selecciones:
+            if not isinstance(selecciones, list) or not all(isinstance(s, dict) for s in selecciones):
+                return Response({"error": "selecciones debe ser una lista de {tipo, cantidad}"}, status=status.HTTP_400_BAD_REQUEST)
+            resultado = validar_seleccion_multicontenedor_json(selecciones, volumen_cbm=volumen, peso_kg=peso, **ruta)
+        else:
+            try:
+                top_k = min(max(int(request.data.get('top_k', 3)), 1), 10)
+            except (TypeError, ValueError):
+                return Response({"error": "top_k debe ser un entero"}, status=status.HTTP_400_BAD_REQUEST)
+            resultado = optimizar_mezcla_contenedores_json(volumen, peso, top_k=top_k, **ruta)
+
+        if not resultado['exito']:
+            return Response(resultado, status=status.HTTP_400_BAD_REQUEST)
+        return Response(resultado)
+
 # --- VIEWSETS STANDARD (CRUD para todos los modelos) ---
 
 class LeadViewSet(viewsets.ModelViewSet):
@@ -124,6 +233,54 @@ class QuoteSubmissionViewSet(viewsets.ModelViewSet): # Cotizaciones de la App
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
 
+    @action(detail=False, methods=['post'], url_path='pdf-batch', permission_classes=[IsStaffUser])
+    def pdf_batch(self, request):
+        """
+        Descarga masiva de PDFs de cotización en un ZIP (renderizado en paralelo).
+        Body: {"submission_ids": [1, 2]} y/o {"items": [{"submission_id": 1, "scenario": {...}}]};
+        "job_id" opcional para consultar el progreso desde el inicio.
+        """
+        from django.conf import settings
+        from django.http import StreamingHttpResponse
+        from .reports import batch_render
+
+        pedidos = [(pk, None) for pk in request.data.get('submission_ids') or []]
+        pedidos += [(item.get('submission_id'), item.get('scenario')) for item in request.data.get('items') or []
+                    if isinstance(item, dict)]
+        if not pedidos:
+            return Response({'error': 'submission_ids o items es requerido'}, status=status.HTTP_400_BAD_REQUEST)
+        maximo = getattr(settings, 'PDF_BATCH_MAX_ITEMS', batch_render.PDF_BATCH_MAX_ITEMS)
+        if len(pedidos) > maximo:
+            return Response({'error': f'Máximo {maximo} PDFs por lote'}, status=status.HTTP_400_BAD_REQUEST)
+        job_id = str(request.data.get('job_id') or '').lower() or None
+        if job_id and not batch_render.JOB_ID_RE.match(job_id):
+            return Response({'error': 'job_id inválido'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            cotizaciones = QuoteSubmission.objects.in_bulk({int(pk) for pk, _ in pedidos})
+        except (TypeError, ValueError):
+            return Response({'error': 'IDs de cotización inválidos'}, status=status.HTTP_400_BAD_REQUEST)
+        faltantes = sorted({int(pk) for pk, _ in pedidos} - set(cotizaciones))
+        if faltantes:
+            return Response({'error': 'Cotizaciones no encontradas', 'missing': faltantes}, status=status.HTTP_404_NOT_FOUND)
+
+        items = batch_render.prepare_batch((cotizaciones[int(pk)], escenario) for pk, escenario in pedidos)
+        job = batch_render.PdfBatchJob(items, job_id=job_id, owner_id=request.user.pk)
+        response = StreamingHttpResponse(job.stream_zip(), content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="cotizaciones-{job.job_id[:8]}.zip"'
+        response['X-Batch-Job-Id'] = job.job_id
+        return response
+
+    @action(detail=False, methods=['get'], url_path=r'pdf-batch/(?P<job_id>[0-9a-f]+)', permission_classes=[IsStaffUser])
+    def pdf_batch_status(self, request, job_id=None):
+        """Progreso de una descarga masiva: total, done, failed y status."""
+        from .reports.batch_render import get_batch_status
+
+        estado = get_batch_status(job_id)
+        if not estado or (estado['owner_id'] != request.user.pk and not request.user.is_superuser):
+            return Response({'error': 'Lote no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(estado)
+
 class BulkLeadImportViewSet(viewsets.ModelViewSet): # <--- EL QUE FALTABA
     queryset = BulkLeadImport.objects.all()
     serializer_class = BulkLeadImportSerializer
@@ -218,6 +375,29 @@ class PreLiquidationViewSet(viewsets.ModelViewSet):
     queryset = PreLiquidation.objects.all()
     serializer_class = PreLiquidationSerializer
 
+    @action(detail=False, methods=['post'], url_path='batch-duties')
+    def batch_duties(self, request):
+        """
+        Pre-liquidación de una factura de varias líneas (duty_engine.py).
+        POST {"lineas": [{"hs_code": "8471.30.00", "fob_value_usd": 1200}, ...],
+              "flete_usd": 800, "seguro_usd": 40, "aplicar_isd": true}
+        """
+        from .duty_engine import liquidar_factura_json
+
+        lineas = request.data.get('lineas')
+        if not isinstance(lineas, list) or not all(isinstance(linea, dict) for linea in lineas):
+            return Response({"error": "lineas debe ser una lista de objetos"}, status=status.HTTP_400_BAD_REQUEST)
+
+        resultado = liquidar_factura_json(
+            lineas,
+            flete_usd=request.data.get('flete_usd', 0),
+            seguro_usd=request.data.get('seguro_usd', 0),
+            aplicar_isd=str(request.data.get('aplicar_isd', False)).lower() in ('1', 'true', 'si', 'yes'),
+        )
+        if not resultado['exito']:
+            return Response(resultado, status=status.HTTP_400_BAD_REQUEST)
+        return Response(resultado)
+
     # --- PEGA ESTO AL FINAL DE SalesModule/views.py ---
 
 class ShippingInstructionViewSet(viewsets.ModelViewSet):
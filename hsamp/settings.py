@@ -154,6 +154,21 @@ SPECTACULAR_SETTINGS = {
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
 
+# --- Caché compartido ---
+# gunicorn corre varios workers: versiones de caché, cuotas de IA, cancelaciones
+# de chat y progreso de lotes deben verse desde todos. LocMem es por proceso.
+# CACHE_URL=redis://... usa Redis; sin él, la tabla de caché en la base
+# (python manage.py createcachetable).
+CACHE_URL = config('CACHE_URL', default='')
+if CACHE_URL.startswith(('redis://', 'rediss://')):
+    CACHES = {
+        'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': CACHE_URL},
+    }
+else:
+    CACHES = {
+        'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'importaya_cache'},
+    }
+
 CELERY_BROKER_URL = config('CELERY_BROKER_URL', default='redis://localhost:6379/0')
 CELERY_RESULT_BACKEND = config('CELERY_RESULT_BACKEND', default='redis://localhost:6379/0')
 CELERY_ACCEPT_CONTENT = ['json']
@@ -15,6 +15,9 @@ urlpatterns = [
     # Asegúrate de que SalesModule tenga un archivo urls.py. 
     # Si te da error aquí, comenta esta línea con un # al inicio.
     path('api/sales/', include('SalesModule.urls')),
+
+    # --- 3.0.1 Rutas de IA (chat aduanero, clasificación, estado del gateway) ---
+    path('api/ai/', include('SalesModule.ai_urls')),
     
     # --- 3.1 Rutas de Autenticación (accounts) ---
     # --- 3.1 Rutas de Autenticación (accounts) ---
@@ -12,6 +12,12 @@ fi
 echo "Collecting static files..."
 python manage.py collectstatic --noinput
 
+# Shared cache table (CACHES in settings): quote versions, AI quotas and batch progress seen by every worker
+echo "Creating cache table..."
+python manage.py createcachetable
+
 # Start Gunicorn server immediately to open port
+# Sync workers: a streaming chat response (/api/ai/aduana-chat/stream/) holds its worker until it ends;
+# serving hsamp.asgi:application with an ASGI worker class is what frees workers while tokens arrive
 echo "Starting Gunicorn server on port 5000..."
 exec gunicorn --bind=0.0.0.0:5000 --reuse-port --workers=2 --timeout=120 --access-logfile - --error-logfile - hsamp.wsgi:application